@@ -0,0 +1,52 @@
+'''
+Micro-benchmark of the account readiness checks on the saved account page fixtures, comparing the old
+BeautifulSoup + soup.find(lambda tag: tag.get_text() ...) approach (when bs4 is installed) with AccountPageScanner.
+
+    python -m benchmarks.account_page_parse --iterations 50
+'''
+import argparse
+import time
+from pathlib import Path
+
+from src.utils.page_state import AccountPageScanner
+
+FIXTURES_FOLDER = Path(__file__).parent / "fixtures"
+FIXTURES = ["account_payment_methods.html", "account_delivery_addresses.html"]
+
+def soup_lambda_search(page_html: str):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_html, 'html.parser')
+    payment = soup.find(lambda tag: tag and tag.get_text().casefold() == "Default Payment Method".casefold())
+    address = soup.find(lambda tag: tag and tag.get_text().casefold() == "Default Delivery Address".casefold())
+    return payment is not None, address is not None
+
+def scanner_search(page_html: str):
+    state = AccountPageScanner.scan(page_html)
+    return state.default_payment_set, state.default_address_set
+
+def time_per_call_ms(search, page_html: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        search(page_html)
+    return (time.perf_counter() - started) / iterations * 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    searches = {"scanner": scanner_search}
+    try:
+        import bs4
+        searches["bs4_lambda"] = soup_lambda_search
+    except ImportError:
+        print("bs4 is not installed, only timing the scanner")
+
+    for fixture in FIXTURES:
+        page_html = (FIXTURES_FOLDER / fixture).read_text()
+        for name, search in searches.items():
+            print(f"{fixture:>32} {name:>10}: {time_per_call_ms(search, page_html, args.iterations):8.3f} ms/page -> {search(page_html)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+'''
+Calibrates the ServerClockCalibrator against a local stand-in that serves a deliberately skewed clock and reports how
+close the estimate got to the real skew.
+
+    python -m benchmarks.clock_calibration_accuracy --skew 3.37 --runs 5
+'''
+import argparse
+
+from src.testing.stand_in_server import StandInServer
+from src.utils.clock_calibration import HttpDateSampler, ServerClockCalibrator
+
+def run(skew_seconds: float, runs: int):
+    errors = []
+    with StandInServer(clock_skew_seconds=skew_seconds) as stand_in:
+        calibrator = ServerClockCalibrator(HttpDateSampler(stand_in.base_url + "/"))
+        for run_index in range(runs):
+            offset = calibrator.calibrate()
+            errors.append(offset - skew_seconds)
+            print(f"run {run_index}: estimated {offset:.4f}s (+/- {calibrator.uncertainty_seconds:.4f}s), error {errors[-1] * 1000:.1f}ms")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skew", type=float, default=3.37, help="seconds the stand-in clock runs ahead of ours")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    errors = run(args.skew, args.runs)
+    print(f"worst absolute error: {max(abs(error) for error in errors) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
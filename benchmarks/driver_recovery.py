@@ -0,0 +1,166 @@
+'''
+Kills the browser part way through a watch list on a FakeNikeSite, FakeWebDriver and VirtualClock and reports what
+came of the shoes, once with nothing to fall back on and once with the driver watchdog rebuilding the browser, along
+with how long it took from the driver dying to a working one being back (on the virtual clock, so it is the heartbeat
+and recheck delays plus every command it took to reopen the tabs).
+
+With --restart it also stops a run part way through and starts a new one off its checkpoint file, to show shoes that
+were already bought are not bought again and the rest pick up where they were.
+
+    python -m benchmarks.driver_recovery --shoes 12 --waves 3 --crash-offsets -60 0.01 --restart
+'''
+import argparse
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from selenium.common.exceptions import WebDriverException
+
+from benchmarks.release_to_submit import ENGINES, next_release_at
+from local_config import LocalConfig
+from src.testing.fake_nike_site import FakeNikeSite
+from src.testing.fake_web_driver import FakeWebDriver
+from src.utils.clock import VirtualClock
+
+class CrashingWebDriver(FakeWebDriver):
+    '''
+    Answers every command like a FakeWebDriver until crash_at on its clock, then fails every one like a dead session
+    '''
+
+    def __init__(self, site, command_seconds: float, crash_at: float = None):
+        self.crash_at = crash_at
+        super().__init__(site, command_seconds=command_seconds)
+
+    def _command(self):
+        if self.crash_at is not None and self.clock.monotonic() >= self.crash_at:
+            raise WebDriverException("chrome not reachable")
+        super()._command()
+
+class Killed(BaseException):
+    '''
+    Stands in for the app being killed, nothing in the process catches it
+    '''
+
+def build_watch_list(site: FakeNikeSite, clock: VirtualClock, shoes: int, waves: int, wave_seconds: float, lead_seconds: float):
+    '''
+    :return: tuple of (the sneakers, clock.monotonic() the first wave drops at)
+    '''
+    sneakers = []
+    for shoe in range(shoes):
+        url = site.product_url(f"driver-recovery-shoe-{shoe}")
+        site.schedule_product_release(url, next_release_at(site, lead_seconds + (shoe % waves) * wave_seconds))
+        sneakers.append({"shoe_url": url, "size": "M 11"})
+    first_drop = clock.monotonic() + (next_release_at(site, lead_seconds) - site.server_time())
+    return sneakers, first_drop
+
+def summarize(process, events: Counter) -> dict:
+    states = Counter(state.name for state in process.get_purchase_states().values())
+    return {
+        "purchased": states.get("PURCHASED", 0),
+        "errored": states.get("ERROR", 0),
+        "rolled_back": events.get("ROLLED_BACK", 0),
+        "tabs_recovered": events.get("TAB_RECOVERED", 0),
+        "resumed": events.get("RESUMED_FROM_CHECKPOINT", 0),
+        "watchdog": process.get_watchdog_stats(),
+    }
+
+def run_crash(shoes: int, waves: int, wave_seconds: float, lead_seconds: float, crash_offset: float, command_seconds: float,
+              watchdog: bool, engine: str) -> dict:
+    '''
+    :param crash_offset: seconds from the first wave dropping to the browser dying, negative is before the drop
+    '''
+    LocalConfig.RELEASE_CACHE_PATH = None
+    LocalConfig.HTTP_PRE_RELEASE_MONITOR = False
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock)
+    sneakers, first_drop = build_watch_list(site, clock, shoes, waves, wave_seconds, lead_seconds)
+    driver = CrashingWebDriver(site, command_seconds, crash_at=first_drop + crash_offset)
+    rebuilt = []
+
+    def driver_factory():
+        rebuilt.append(CrashingWebDriver(site, command_seconds))
+        return rebuilt[-1]
+
+    process = ENGINES[engine](driver, sneakers=sneakers, clock=clock, clock_sampler=site.date_sampler(),
+                              driver_factory=driver_factory if watchdog else None)
+    events = Counter()
+    process.event_sink = lambda event: events.update([event.code.name])
+    started_at = time.perf_counter()
+    process.start_monitoring_sneakers()
+
+    stats = summarize(process, events)
+    stats["drivers_built"] = len(rebuilt)
+    stats["wall_seconds"] = time.perf_counter() - started_at
+    return stats
+
+def run_restart(shoes: int, waves: int, wave_seconds: float, lead_seconds: float, command_seconds: float, engine: str) -> dict:
+    '''
+    Kills the first run once a wave has been bought and resumes a second run off the same checkpoint file. The kill
+    comes on the event after the last purchase of the wave, a kill between a payment going in and the state change
+    after it is the one window a checkpoint cannot cover.
+    '''
+    LocalConfig.HTTP_PRE_RELEASE_MONITOR = False
+    LocalConfig.RESUME_FROM_CHECKPOINTS = True
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock)
+    sneakers, _ = build_watch_list(site, clock, shoes, waves, wave_seconds, lead_seconds)
+    first_wave = -(-shoes // waves)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        LocalConfig.RELEASE_CACHE_PATH = str(Path(temp_dir) / "checkpoints.sqlite3")
+        runs = {}
+        bought_first = set()
+        for run_name in ("killed", "resumed"):
+            # the asyncio engine runs the sink on its driver thread, where nothing would stop the loop waiting on it
+            engine_class = ENGINES["thread"] if run_name == "killed" else ENGINES[engine]
+            process = engine_class(FakeWebDriver(site, command_seconds=command_seconds), sneakers=sneakers, clock=clock,
+                                      clock_sampler=site.date_sampler())
+            events = Counter()
+
+            def sink(event, run_name=run_name, events=events):
+                if run_name == "killed" and len(bought_first) >= first_wave:
+                    raise Killed()
+                events.update([event.code.name])
+                if event.code.name == "PURCHASED" and run_name == "killed":
+                    bought_first.add(event.sneaker_url)
+
+            process.event_sink = sink
+            try:
+                process.start_monitoring_sneakers()
+            except Killed:
+                pass
+            runs[run_name] = summarize(process, events)
+            if run_name == "resumed":
+                runs[run_name]["bought_again"] = sum(1 for url, stages in process.get_stage_times().items()
+                                                     if url in bought_first and "payment_submitted" in stages)
+    return runs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=12)
+    parser.add_argument("--waves", type=int, default=3, help="how many separate drops the shoes are spread over")
+    parser.add_argument("--wave-minutes", type=float, default=20.0, help="minutes between drops")
+    parser.add_argument("--lead", type=float, default=300.0, help="minimum seconds between starting and the first drop")
+    parser.add_argument("--crash-offsets", type=float, nargs="+", default=[-60.0, 0.01],
+                        help="seconds from the first drop to the browser dying, one run each, by default while waiting on it and as it is being bought")
+    parser.add_argument("--command-ms", type=float, default=5.0, help="virtual milliseconds every fake driver command takes")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="thread")
+    parser.add_argument("--restart", action="store_true", help="also kill a run part way through and resume a new one off its checkpoints")
+    args = parser.parse_args()
+
+    for crash_offset in args.crash_offsets:
+        for watchdog in (False, True):
+            stats = run_crash(args.shoes, args.waves, args.wave_minutes * 60.0, args.lead, crash_offset, args.command_ms / 1000.0, watchdog, args.engine)
+            print(f"--- browser dies {crash_offset:+.2f}s from the first drop, {'driver watchdog' if watchdog else 'no watchdog'}")
+            for name, value in stats.items():
+                print(f"{name:>16}: {value:.3f}" if isinstance(value, float) else f"{name:>16}: {value}")
+
+    if args.restart:
+        for run_name, stats in run_restart(args.shoes, args.waves, args.wave_minutes * 60.0, args.lead, args.command_ms / 1000.0, args.engine).items():
+            print(f"--- restart, {run_name} run")
+            for name, value in stats.items():
+                print(f"{name:>16}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+'''
+Checks hundreds of pre-release product pages on the local nike stand-in with the HttpReleaseMonitor, reporting how
+long a full sweep takes and how much memory it holds, then moves the release and checks that every page picks up the
+change.
+
+    python -m benchmarks.http_release_monitor --shoes 500 --sweeps 3
+'''
+import argparse
+import datetime
+import time
+import tracemalloc
+
+from src.http_release_monitor import HttpReleaseMonitor
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.testing.nike_stand_in_server import NikeStandInServer
+
+def parse_release(availability_text: str):
+    return SneakerPurchaseProcess.parse_availability_text(availability_text, datetime.datetime.now().astimezone())
+
+def run(shoes: int, sweeps: int):
+    # a day out and on a minute boundary, so the banner shows exactly the time we scripted
+    release_at = (int(time.time()) // 60 + 24 * 60) * 60
+    with NikeStandInServer(release_at=release_at) as stand_in:
+        urls = [stand_in.product_url(f"benchmark-shoe-{index}") for index in range(shoes)]
+
+        tracemalloc.start()
+        monitor = HttpReleaseMonitor(parse_release)
+        try:
+            for sweep in range(sweeps):
+                started_at = time.perf_counter()
+                observations = monitor.check_many(urls)
+                elapsed = time.perf_counter() - started_at
+                parsed = sum(1 for observation in observations if observation.release_dt is not None)
+                print(f"sweep {sweep}: {len(urls)} pages in {elapsed * 1000:.1f}ms ({len(urls) / elapsed:.0f} pages/s), {parsed} release times read")
+
+            stand_in.schedule_release(release_at + 15 * 60)
+            started_at = time.perf_counter()
+            observations = monitor.check_many(urls)
+            elapsed = time.perf_counter() - started_at
+            changed = sum(1 for observation in observations if observation.changed)
+            print(f"release moved: {changed}/{len(urls)} changes detected in {elapsed * 1000:.1f}ms")
+
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"python memory held: {current / 1024:.0f}KiB, peak {peak / 1024:.0f}KiB ({current / len(urls):.0f}B per shoe)")
+        finally:
+            monitor.stop()
+            tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=500)
+    parser.add_argument("--sweeps", type=int, default=3)
+    args = parser.parse_args()
+    run(args.shoes, args.sweeps)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Times how long a log call on the checkout path holds up the caller, comparing LocalLogging's queued background writer
+against writing to the file and console synchronously on the calling thread the way it used to.
+
+    python -m benchmarks.log_overhead --calls 20000
+'''
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from src.config import local_logging
+from src.config.local_logging import JsonLinesFormatter, LocalLogging
+
+# what one pass down the checkout path logs
+CHECKOUT_MESSAGES = [
+    "Wake up for sneaker at : {url} is in PurchaseState.NEAR_RELEASE state and was handled 0.0004 after its deadline!",
+    "Sneaker with url - {url} cannot find availability element! Might now be purchasable!",
+    "Attempting to purchase shoe!",
+    "Sucessfully purchased sneaker!",
+]
+
+def time_calls(logger, calls: int):
+    url = "https://www.nike.com/launch/t/benchmark-shoe"
+    durations = []
+    for call in range(calls):
+        message = CHECKOUT_MESSAGES[call % len(CHECKOUT_MESSAGES)]
+        started_at = time.perf_counter()
+        logger.info(message.format(url=url), extra={"sneaker_url": url, "state": "RELEASED"})
+        durations.append(time.perf_counter() - started_at)
+    return durations
+
+def report(name: str, durations):
+    durations = sorted(durations)
+    mean_us = sum(durations) / len(durations) * 1e6
+    print(f"{name}: mean {mean_us:.1f}us p50 {durations[len(durations) // 2] * 1e6:.1f}us "
+          f"p99 {durations[int(len(durations) * 0.99)] * 1e6:.1f}us max {durations[-1] * 1e6:.1f}us")
+
+def run(calls: int, console: bool):
+    with tempfile.TemporaryDirectory() as log_dir, open(os.devnull, "w") as devnull:
+        # the old way, every handler writes on the calling thread
+        synchronous_logger = logging.getLogger("log_overhead_synchronous")
+        synchronous_logger.propagate = False
+        synchronous_logger.setLevel(logging.INFO)
+        file_handler = logging.FileHandler(os.path.join(log_dir, "synchronous.log"), "w")
+        file_handler.setFormatter(JsonLinesFormatter())
+        synchronous_logger.addHandler(file_handler)
+        if console:
+            synchronous_logger.addHandler(logging.StreamHandler(devnull))
+        report("synchronous", time_calls(synchronous_logger, calls))
+        file_handler.close()
+
+        local_logging.LOG_FILE = os.path.join(log_dir, "queued.log")
+        local_logging.LOG_TO_CONSOLE = console
+        queued_logger = LocalLogging.get_local_logger("log_overhead_queued")
+        if console:
+            # send the background console writes to devnull too, so both sides do the same work
+            for handler in LocalLogging._listener.handlers:
+                if type(handler) is logging.StreamHandler:
+                    handler.setStream(devnull)
+        report("queued", time_calls(queued_logger, calls))
+
+        started_at = time.perf_counter()
+        LocalLogging.flush()
+        print(f"background writer caught up {(time.perf_counter() - started_at) * 1000:.1f}ms after the last call")
+        # let go of the file before the temp dir goes away
+        LocalLogging.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--console", action="store_true", help="also write every line to a console handler (pointed at devnull)")
+    args = parser.parse_args()
+    run(args.calls, args.console)
+
+if __name__ == "__main__":
+    main()
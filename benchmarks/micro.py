@@ -0,0 +1,263 @@
+'''
+Microbenchmarks of the CPU side hot paths, all offline: reading release text, matching the configured size against
+the size grid, scanning the account pages, one pass of the monitoring loop at 10, 100 and 1000 shoes (on a
+FakeWebDriver and VirtualClock, so it is only our own code being timed) and a log call.
+
+Every case is warmed up and then timed over --rounds rounds, the results are written out as json. With --compare
+every case is checked against a baseline written by an earlier run, one whose median got more than --threshold percent
+slower is flagged as a regression and the exit code is 1.
+
+    python -m benchmarks.micro --output micro_baseline.json
+    python -m benchmarks.micro --output micro_results.json --compare micro_baseline.json --threshold 15
+    python -m benchmarks.micro --results micro_results.json --compare micro_baseline.json
+'''
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.account_page_parse import FIXTURES, FIXTURES_FOLDER, scanner_search, soup_lambda_search
+from benchmarks.log_overhead import CHECKOUT_MESSAGES
+from benchmarks.release_time_parse import FIXTURE as RELEASE_TIMES_FIXTURE
+from local_config import LocalConfig
+from src.config import local_logging
+from src.config.local_logging import LocalLogging
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.testing.fake_nike_site import FakeNikeSite
+from src.testing.fake_web_driver import FakeWebDriver
+from src.utils.clock import VirtualClock
+from src.utils.release_time_parser import ReleaseTimeParser, parse_release_parts
+from src.utils.size_grid import SizeGrid
+
+RESULTS_VERSION = 1
+LOOP_SHOES = [10, 100, 1000]
+
+class MicroCase():
+    '''
+    One thing to time. make() is called before every round, untimed, and hands back (run, ops, cleanup): run is what
+    gets timed, ops how many operations one run does so results are per operation, cleanup an optional callable run
+    after the round, also untimed.
+    '''
+
+    def __init__(self, name: str, make, description: str, rounds: int = None):
+        '''
+        :param rounds: rounds to time this case over instead of --rounds, for cases too slow to run that often
+        '''
+        self.name = name
+        self.make = make
+        self.description = description
+        self.rounds = rounds
+
+def release_text_cases():
+    corpus = json.loads(RELEASE_TIMES_FIXTURE.read_text())
+    now = datetime.datetime.fromisoformat(corpus["now"])
+    release_parser = ReleaseTimeParser(corpus["source_timezone"])
+    texts = [case["text"] for case in corpus["cases"]]
+
+    def make_cold():
+        # what _extract_tab_availablity_date does with text it has never seen
+        parse_release_parts.cache_clear()
+        return (lambda: [parse(release_parser, text, now) for text in texts]), len(texts), None
+
+    def make_warm():
+        for text in texts:
+            parse(release_parser, text, now)
+        return (lambda: [parse(release_parser, text, now) for text in texts]), len(texts), None
+
+    return [
+        MicroCase("release_text_parse_cold", make_cold, "release banner text -> datetime, nothing memoized"),
+        MicroCase("release_text_parse_warm", make_warm, "release banner text -> datetime, text seen before"),
+    ]
+
+def parse(release_parser: ReleaseTimeParser, text: str, now: datetime.datetime):
+    try:
+        return release_parser.parse(text, now)
+    except Exception:
+        # the corpus has text that is meant not to parse, that is timed too
+        return None
+
+def size_match_case():
+    men = [f"M {size / 2:g}" for size in range(7, 31)]
+    labels = [f"{size} / W {float(size[2:]) + 1.5:g}" for size in men]
+    configured = ["M 11", "w 12.5", "M11", "M 1", "W 20"]
+
+    def make():
+        entries = [(label, object()) for label in labels]
+
+        def run():
+            # _purchase_sneaker builds the grid off the page and looks the configured size up in it
+            size_grid = SizeGrid(entries)
+            return [size_grid.find(size) for size in configured]
+        return run, 1, None
+
+    return MicroCase("size_match", make, f"size grid of {len(labels)} labels built and {len(configured)} sizes looked up, per grid")
+
+def account_page_cases():
+    pages = [(FIXTURES_FOLDER / fixture).read_text() for fixture in FIXTURES]
+    searches = {"account_page_scan": scanner_search}
+    try:
+        import bs4
+        searches["account_page_bs4"] = soup_lambda_search
+    except ImportError:
+        pass
+
+    cases = []
+    for name, search in searches.items():
+        def make(search=search):
+            return (lambda: [search(page) for page in pages]), len(pages), None
+        cases.append(MicroCase(name, make, "default payment and address search of an account page, per page"))
+    return cases
+
+def monitor_loop_case(shoes: int):
+    def make():
+        LocalConfig.RELEASE_CACHE_PATH = None
+        LocalConfig.HTTP_PRE_RELEASE_MONITOR = False
+        LocalConfig.SNEAKER_CONFIG_HOT_RELOAD = False
+        clock = VirtualClock()
+        site = FakeNikeSite(clock=clock)
+        sneakers = []
+        for shoe in range(shoes):
+            url = site.product_url(f"micro-shoe-{shoe}")
+            site.schedule_product_release(url, site.server_time() + 3600.0 + shoe)
+            sneakers.append({"shoe_url": url, "size": "M 11"})
+        process = SneakerPurchaseProcess(FakeWebDriver(site), sneakers=sneakers, clock=clock, clock_sampler=site.date_sampler())
+        # every shoe is queued up to be read for the first time, the pass handles all of them
+        process._start_monitoring()
+        return process._monitor_once, 1, process._stop_monitoring
+
+    return MicroCase(f"monitor_loop_{shoes}_shoes", make, f"one pass of the monitoring loop with {shoes} shoes due at once",
+                     rounds=3 if shoes >= 1000 else None)
+
+def log_call_case():
+    calls = 2000
+    url = "https://www.nike.com/launch/t/micro-shoe"
+    messages = [message.format(url=url) for message in CHECKOUT_MESSAGES]
+
+    def make():
+        logger = LocalLogging.get_local_logger("micro_log_call")
+
+        def run():
+            for call in range(calls):
+                logger.info(messages[call % len(messages)], extra={"sneaker_url": url, "state": "RELEASED"})
+        # what the writer is still behind on is not this rounds cost
+        return run, calls, LocalLogging.flush
+
+    return MicroCase("log_call", make, "LocalLogging info call with sneaker context, time the caller is held up")
+
+def all_cases() -> list:
+    return [*release_text_cases(), size_match_case(), *account_page_cases(),
+            *(monitor_loop_case(shoes) for shoes in LOOP_SHOES), log_call_case()]
+
+def time_case(case: MicroCase, rounds: int, warmup: int) -> dict:
+    rounds = case.rounds or rounds
+    samples = []
+    ops = None
+    for round_number in range(warmup + rounds):
+        run, ops, cleanup = case.make()
+        started_at = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - started_at
+        if cleanup:
+            cleanup()
+        if round_number >= warmup:
+            samples.append(elapsed / ops * 1e6)
+
+    return {
+        "description": case.description,
+        "unit": "us",
+        "ops_per_round": ops,
+        "rounds": rounds,
+        "median_us": statistics.median(samples),
+        "mean_us": statistics.fmean(samples),
+        "min_us": min(samples),
+        "max_us": max(samples),
+        "stdev_us": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+def run_suite(rounds: int, warmup: int, only=None) -> dict:
+    '''
+    :param only: case names (or prefixes of them) to run, None runs every case
+    :return: the results document that gets written out as json
+    '''
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        # the process under test logs a lot, keep it off the console and out of the real log file
+        local_logging.LOG_TO_CONSOLE = False
+        local_logging.LOG_FILE = os.path.join(log_dir, "micro.log")
+        LocalLogging.shutdown()
+
+        for case in all_cases():
+            if only and not any(case.name.startswith(name) for name in only):
+                continue
+            results[case.name] = time_case(case, rounds, warmup)
+            print(f"{case.name:>28}: median {results[case.name]['median_us']:12.2f} us  "
+                  f"(min {results[case.name]['min_us']:.2f}, stdev {results[case.name]['stdev_us']:.2f})")
+        # let go of the log file before the temp dir goes away
+        LocalLogging.shutdown()
+
+    return {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold_pct: float) -> list:
+    '''
+    :return: names of the cases whose median is more than threshold_pct percent slower than the baseline
+    '''
+    if baseline.get("platform") != current.get("platform") or baseline.get("python") != current.get("python"):
+        print(f"baseline is from {baseline.get('platform')} python {baseline.get('python')}, timings may not be comparable")
+
+    regressions = []
+    print(f"{'case':>28} {'baseline_us':>12} {'current_us':>12} {'change':>8}")
+    for name, result in current["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None:
+            print(f"{name:>28} {'-':>12} {result['median_us']:12.2f}      new")
+            continue
+        change_pct = (result["median_us"] - baseline_result["median_us"]) / baseline_result["median_us"] * 100.0 if baseline_result["median_us"] else 0.0
+        regressed = change_pct > threshold_pct
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>28} {baseline_result['median_us']:12.2f} {result['median_us']:12.2f} {change_pct:+7.1f}%{'  REGRESSION' if regressed else ''}")
+    for name in baseline["results"]:
+        if name not in current["results"]:
+            print(f"{name:>28} in the baseline but not in these results")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--warmup", type=int, default=2, help="untimed rounds before the timed ones")
+    parser.add_argument("--cases", nargs="+", help="only run the cases whose name starts with one of these")
+    parser.add_argument("--output", help="path to write the results to as json")
+    parser.add_argument("--results", help="compare these already written results instead of running the suite")
+    parser.add_argument("--compare", help="baseline results to check these against")
+    parser.add_argument("--threshold", type=float, default=15.0, help="percent slower than the baseline that counts as a regression")
+    args = parser.parse_args()
+
+    if args.results:
+        current = json.loads(Path(args.results).read_text())
+    else:
+        current = run_suite(args.rounds, args.warmup, args.cases)
+    if args.output:
+        Path(args.output).write_text(json.dumps(current, indent=2))
+
+    if args.compare:
+        regressions = compare(current, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regressed more than {args.threshold:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"no case regressed more than {args.threshold:g}%")
+
+if __name__ == "__main__":
+    main()
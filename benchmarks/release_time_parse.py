@@ -0,0 +1,100 @@
+'''
+Checks the ReleaseTimeParser against the release text corpus in fixtures/release_times.json, then times it against the
+old uncompiled re.search + strptime parsing on a drop's worth of shoes: cold (nothing memoized), warm (memoized on the
+text) and through the batch parse_many.
+
+    python -m benchmarks.release_time_parse --shoes 500 --rounds 20
+'''
+import argparse
+import datetime
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+from src.utils.release_time_parser import ReleaseTimeParser, parse_release_parts
+
+FIXTURE = Path(__file__).parent / "fixtures" / "release_times.json"
+
+OLD_AVAILABILITY_PATTERN = r'Available\s+(\d{1,2}/\d{1,2})\s+at\s+(\d{1,2}:\d{2}\s+(?:AM|PM))'
+
+def old_parse(availability_text: str, now: datetime.datetime, release_timezone):
+    '''
+    How SneakerPurchaseProcess parsed release text before ReleaseTimeParser
+    '''
+    match = re.search(OLD_AVAILABILITY_PATTERN, availability_text)
+    if not match:
+        return None
+    target_dt = datetime.datetime.strptime(f"{now.year}/{match.group(1)} {match.group(2)}", "%Y/%m/%d %I:%M %p")
+    target_dt = target_dt.replace(tzinfo=release_timezone)
+    if target_dt < now:
+        target_dt = target_dt.replace(year=now.year + 1)
+    return target_dt
+
+def check_corpus(parser: ReleaseTimeParser, now: datetime.datetime, cases: list) -> int:
+    '''
+    :param now: when the corpus is read, cases can override it with their own "now"
+    '''
+    old_read = 0
+    mismatches = 0
+    for case in cases:
+        case_now = datetime.datetime.fromisoformat(case["now"]) if "now" in case else now
+        parsed = parser.parse_many([case["text"]], case_now)[0]
+        got = parsed.isoformat() if parsed else None
+        try:
+            if old_parse(case["text"], case_now, parser.source_timezone) is not None:
+                old_read += 1
+        except ValueError:
+            # the old parser raised on these, which sent the shoe to ERROR
+            pass
+        if got != case["expected"]:
+            mismatches += 1
+            print(f"MISMATCH {case['text']!r}: expected {case['expected']} got {got}")
+    print(f"corpus: {len(cases) - mismatches}/{len(cases)} as expected, the old parser read {old_read} of the "
+          f"{sum(1 for case in cases if case['expected'])} that hold a release time")
+    return mismatches
+
+def time_us(parse_all, rounds: int, per_round: int, before_round=None) -> float:
+    elapsed = 0.0
+    for _ in range(rounds):
+        if before_round:
+            before_round()
+        started_at = time.perf_counter()
+        parse_all()
+        elapsed += time.perf_counter() - started_at
+    return elapsed / (rounds * per_round) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=500)
+    parser.add_argument("--distinct-releases", type=int, default=12, help="how many different release texts the shoes share")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = json.loads(FIXTURE.read_text())
+    now = datetime.datetime.fromisoformat(corpus["now"])
+    release_parser = ReleaseTimeParser(corpus["source_timezone"])
+    mismatches = check_corpus(release_parser, now, corpus["cases"])
+
+    # the old format only, so both sides parse every shoe
+    shoe_random = random.Random(7)
+    releases = [f"Available {shoe_random.randint(1, 12)}/{shoe_random.randint(1, 28)} at {shoe_random.randint(1, 12)}:{shoe_random.choice(['00', '30'])} {shoe_random.choice(['AM', 'PM'])}"
+                for _ in range(args.distinct_releases)]
+    texts = [shoe_random.choice(releases) for _ in range(args.shoes)]
+
+    timings = {
+        "old re+strptime": time_us(lambda: [old_parse(text, now, release_parser.source_timezone) for text in texts], args.rounds, len(texts)),
+        "parse cold": time_us(lambda: [release_parser.parse(text, now) for text in texts], args.rounds, len(texts), parse_release_parts.cache_clear),
+        "parse warm": time_us(lambda: [release_parser.parse(text, now) for text in texts], args.rounds, len(texts)),
+        "parse_many warm": time_us(lambda: release_parser.parse_many(texts, now), args.rounds, len(texts)),
+    }
+    for name, us_per_shoe in timings.items():
+        print(f"{name:>18}: {us_per_shoe:7.2f} us/shoe ({timings['old re+strptime'] / us_per_shoe:5.1f}x the old parser)")
+    print(f"memo: {ReleaseTimeParser.cache_info()}")
+
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
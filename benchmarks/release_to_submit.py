@@ -0,0 +1,149 @@
+'''
+End to end benchmark of the hot path, from the release going live to the "Submit Payment" order reaching the site.
+
+Runs the real SneakerPurchaseProcess in a real Chrome against the local NikeStandInServer. Release times on the site
+only have minute resolution, so every run scripts its release for the next minute boundary that is at least --lead
+seconds away, meaning each run takes up to a minute.
+
+With --fake it runs against the same timeline on a FakeWebDriver and a VirtualClock instead, so a run takes
+milliseconds and the stage times are virtual, every driver command taking --command-ms and page loads --load-ms on
+top. That checks the whole path works end to end rather than measuring Chrome. --align picks how the reload that
+should see the release is timed, a --lead of a few minutes gives it the warm up reloads to time it with.
+
+    python -m benchmarks.release_to_submit --runs 5 --output release_to_submit.json
+    python -m benchmarks.release_to_submit --fake --runs 100 --engine asyncio
+    python -m benchmarks.release_to_submit --fake --runs 20 --lead 180 --load-ms 800 --align response
+'''
+import argparse
+import json
+import math
+import tempfile
+import time
+from pathlib import Path
+
+from local_config import LocalConfig
+from src.async_sneaker_purchase_process import AsyncSneakerPurchaseProcess
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.testing.fake_nike_site import FakeNikeSite
+from src.testing.fake_web_driver import FakeWebDriver
+from src.testing.nike_stand_in_server import NikeStandInServer
+from src.utils.clock import SYSTEM_CLOCK, VirtualClock
+from src.utils.percentiles import percentile
+from src.utils.web_driver_factory import WebDriverFactory
+
+# Stages in the order they happen, the first and last are recorded by the stand-in the rest by SneakerPurchaseProcess
+STAGES = ["release_live", "release_detected", "size_selected", "added_to_bag", "checkout_clicked", "cvv_entered",
+          "order_review_clicked", "payment_submitted", "order_received"]
+
+class StandInPurchaseProcess(SneakerPurchaseProcess):
+    '''
+    The stand-in is not served off nike.com so checkout is recognized by its path instead
+    '''
+    checkout_url_fragment = NikeStandInServer.checkout_path
+
+class AsyncStandInPurchaseProcess(AsyncSneakerPurchaseProcess):
+    checkout_url_fragment = NikeStandInServer.checkout_path
+
+ENGINES = {"thread": StandInPurchaseProcess, "asyncio": AsyncStandInPurchaseProcess}
+
+def next_release_at(stand_in: NikeStandInServer, lead_seconds: float) -> float:
+    return math.ceil((stand_in.server_time() + lead_seconds) / 60.0) * 60.0
+
+def run_once(driver, stand_in, size: str, lead_seconds: float, clock=None, clock_sampler=None, engine: str = "thread") -> dict:
+    '''
+    :param stand_in: NikeStandInServer, or FakeNikeSite when driver is a FakeWebDriver
+    :param engine: which of ENGINES runs the sneaker
+    :return: milliseconds after the release went live that each reached stage happened at
+    '''
+    clock = clock or SYSTEM_CLOCK
+    shoe_url = stand_in.product_url("stand-in-shoe")
+    stand_in.schedule_release(next_release_at(stand_in, lead_seconds))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        shoes_file = Path(temp_dir) / "shoes_to_snag.json"
+        shoes_file.write_text(json.dumps([{"shoe_url": shoe_url, "size": size}]))
+        process = ENGINES[engine](driver, shoes_file, clock=clock, clock_sampler=clock_sampler)
+
+    home_tab = driver.current_window_handle
+    try:
+        process.start_monitoring_sneakers()
+    finally:
+        for tab in process.sneaker_tabs.values():
+            if tab:
+                driver.switch_to.window(tab)
+                driver.close()
+        driver.switch_to.window(home_tab)
+
+    # the order is posted asynchronously from the page, give it a moment to land
+    give_up_at = clock.monotonic() + 5
+    while "order_received" not in stand_in.events and clock.monotonic() < give_up_at:
+        clock.sleep(0.01)
+
+    stage_times = dict(process.get_stage_times()[shoe_url])
+    stage_times.update(stand_in.events)
+    release_live = stage_times["release_live"]
+    return {stage: (stage_times[stage] - release_live) * 1000.0 for stage in STAGES if stage in stage_times}
+
+def summarize(runs) -> dict:
+    summary = {}
+    for stage in STAGES:
+        samples = [run[stage] for run in runs if stage in run]
+        if samples:
+            summary[stage] = {
+                "count": len(samples),
+                "p50_ms": percentile(samples, 50),
+                "p90_ms": percentile(samples, 90),
+                "p99_ms": percentile(samples, 99),
+                "max_ms": max(samples),
+            }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--size", default="M 11")
+    parser.add_argument("--lead", type=float, default=10.0, help="minimum seconds between opening the tab and the release")
+    parser.add_argument("--output", help="optional path to write the raw runs and summary to as json")
+    parser.add_argument("--fake", action="store_true", help="run on a FakeWebDriver and VirtualClock instead of Chrome")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="thread", help="monitoring engine that runs the sneaker")
+    parser.add_argument("--command-ms", type=float, default=5.0, help="virtual milliseconds every fake driver command takes")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="virtual milliseconds a fake page load takes on top of the command")
+    parser.add_argument("--align", choices=["response", "interactive", "off"], default=LocalConfig.RELEASE_RELOAD_ALIGN or "off",
+                        help="how the reload that should see the release is timed, off reloads at the release")
+    args = parser.parse_args()
+
+    LocalConfig.RELEASE_RELOAD_ALIGN = None if args.align == "off" else args.align
+    runs = []
+    if args.fake:
+        # every run is its own fresh release, a cached one from the run before would only get in the way
+        LocalConfig.RELEASE_CACHE_PATH = None
+        clock = VirtualClock()
+        site = FakeNikeSite(clock=clock)
+        driver = FakeWebDriver(site, command_seconds=args.command_ms / 1000.0, load_seconds=args.load_ms / 1000.0)
+        started_at = time.perf_counter()
+        for run_index in range(args.runs):
+            runs.append(run_once(driver, site, args.size, args.lead, clock, site.date_sampler(), args.engine))
+            print(f"run {run_index}: " + ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in runs[-1].items()))
+        print(f"{args.runs} fake runs took {(time.perf_counter() - started_at) * 1000.0:.1f}ms of real time")
+    else:
+        with NikeStandInServer() as stand_in:
+            # Calibrate against the stand-in instead of nike.com
+            LocalConfig.CLOCK_CALIBRATION_URL = stand_in.base_url + "/"
+            driver = WebDriverFactory().get_chrome_web_driver()
+            try:
+                for run_index in range(args.runs):
+                    runs.append(run_once(driver, stand_in, args.size, args.lead, engine=args.engine))
+                    print(f"run {run_index}: " + ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in runs[-1].items()))
+            finally:
+                driver.quit()
+
+    summary = summarize(runs)
+    print(f"{'stage':>22} {'count':>5} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+    for stage, stats in summary.items():
+        print(f"{stage:>22} {stats['count']:>5} {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"runs": runs, "summary": summary}, indent=2))
+
+if __name__ == "__main__":
+    main()
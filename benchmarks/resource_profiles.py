@@ -0,0 +1,124 @@
+'''
+Loads a product page off the local NikeStandInServer, with its heavy assets turned on, in a real Chrome under every
+resource profile and reports how many bytes and how much load time each one saves over a tab with no profile at all.
+Bytes are counted both by the stand-in (body bytes it wrote out) and by the tabs own resource timing (transfer bytes).
+
+Every profile gets a fresh tab, profiles only apply to the tab they were sent to. The stand-in serves its analytics
+script off localhost instead of the host the page is on, so here the profiles that block analytics domains block
+localhost as well.
+
+    python -m benchmarks.resource_profiles --loads 10 --asset-latency-ms 30 --output resource_profiles.json
+'''
+import argparse
+import json
+import time
+from pathlib import Path
+
+from local_config import LocalConfig
+from src.testing.nike_stand_in_server import NikeStandInServer
+from src.utils.percentiles import percentile
+from src.utils.resource_profiles import RESOURCE_PROFILES, TabResourceProfiles
+from src.utils.web_driver_factory import WebDriverFactory
+
+NO_PROFILE = "none"
+
+def benchmark_profiles() -> dict:
+    '''
+    :return: the real profiles, with the stand-ins third party host blocked wherever analytics domains are
+    '''
+    return {name: profile.with_blocked_domains("localhost") if profile.blocked_domains else profile
+            for name, profile in RESOURCE_PROFILES.items()}
+
+def run_profile(driver, stand_in: NikeStandInServer, profile_name: str, loads: int, settle_seconds: float) -> list:
+    '''
+    Opens a fresh tab, gives it the profile and loads the product page in it loads times
+    :return: one dict of measurements per load
+    '''
+    existing_handles = driver.window_handles
+    driver.execute_script("window.open();")
+    tab_handle = next(handle for handle in driver.window_handles if handle not in existing_handles)
+    driver.switch_to.window(tab_handle)
+    resource_profiles = TabResourceProfiles(driver, benchmark_profiles())
+    if profile_name != NO_PROFILE:
+        resource_profiles.apply(profile_name, tab_handle)
+
+    samples = []
+    try:
+        for load in range(loads):
+            stand_in.reset_counters()
+            driver.get(stand_in.product_url(f"resource-profile-shoe-{load}"))
+            # media keeps streaming after the load event, give it a moment so the stand-in has counted it
+            time.sleep(settle_seconds)
+            measured = resource_profiles.measure_page_load()
+            samples.append({
+                "load_ms": measured["load_ms"],
+                "served_bytes": stand_in.bytes_served,
+                "served_responses": stand_in.responses_served,
+                "transfer_bytes": measured["document_bytes"] + measured["resource_bytes"],
+                "resources": measured["resources"],
+                "heap_bytes": measured["heap_bytes"],
+            })
+    finally:
+        driver.close()
+        driver.switch_to.window(existing_handles[0])
+    return samples
+
+def summarize(samples: list) -> dict:
+    def mean(key):
+        values = [sample[key] for sample in samples if sample[key] is not None]
+        return sum(values) / len(values) if values else None
+
+    return {
+        "loads": len(samples),
+        "mean_load_ms": mean("load_ms"),
+        "p90_load_ms": percentile([sample["load_ms"] for sample in samples], 90) if samples else None,
+        "mean_served_bytes": mean("served_bytes"),
+        "mean_transfer_bytes": mean("transfer_bytes"),
+        "mean_resources": mean("resources"),
+        "mean_heap_bytes": mean("heap_bytes"),
+    }
+
+def add_savings(summaries: dict):
+    '''
+    Adds what every profile saved against the tab with no profile
+    '''
+    baseline = summaries[NO_PROFILE]
+    for summary in summaries.values():
+        summary["served_bytes_saved"] = baseline["mean_served_bytes"] - summary["mean_served_bytes"]
+        summary["served_bytes_saved_pct"] = 100.0 * summary["served_bytes_saved"] / baseline["mean_served_bytes"] if baseline["mean_served_bytes"] else 0.0
+        summary["load_ms_saved"] = baseline["mean_load_ms"] - summary["mean_load_ms"]
+        summary["load_ms_saved_pct"] = 100.0 * summary["load_ms_saved"] / baseline["mean_load_ms"] if baseline["mean_load_ms"] else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loads", type=int, default=5, help="page loads per profile")
+    parser.add_argument("--asset-latency-ms", type=float, default=20.0, help="how long every asset takes to start coming back")
+    parser.add_argument("--settle-ms", type=float, default=250.0, help="how long to wait after the load event before counting bytes")
+    parser.add_argument("--output", help="optional path to write the raw loads and summary to as json")
+    args = parser.parse_args()
+
+    # every tab gets exactly the profile being measured and nothing else
+    LocalConfig.TAB_RESOURCE_PROFILES = False
+    LocalConfig.BLOCK_NEW_RELIC = False
+
+    runs = {}
+    with NikeStandInServer(heavy_assets=True, asset_latency_seconds=args.asset_latency_ms / 1000.0) as stand_in:
+        driver = WebDriverFactory().get_chrome_web_driver(use_profile=False)
+        try:
+            for profile_name in [NO_PROFILE, *RESOURCE_PROFILES]:
+                runs[profile_name] = run_profile(driver, stand_in, profile_name, args.loads, args.settle_ms / 1000.0)
+        finally:
+            driver.quit()
+
+    summaries = {profile_name: summarize(samples) for profile_name, samples in runs.items()}
+    add_savings(summaries)
+    print(f"{'profile':>12} {'load_ms':>9} {'served_kb':>10} {'transfer_kb':>12} {'kb_saved':>9} {'ms_saved':>9}")
+    for profile_name, summary in summaries.items():
+        print(f"{profile_name:>12} {summary['mean_load_ms']:>9.1f} {summary['mean_served_bytes'] / 1024:>10.1f} "
+              f"{summary['mean_transfer_bytes'] / 1024:>12.1f} {summary['served_bytes_saved'] / 1024:>9.1f} {summary['load_ms_saved']:>9.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"runs": runs, "summary": summaries}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+'''
+Schedules a wake-up for a few hundred fake sneakers on the DeadlineScheduler and reports how late they were dispatched.
+
+    python -m benchmarks.scheduler_jitter --shoes 500 --spread 3
+'''
+import argparse
+import random
+import threading
+
+from src.utils.deadline_scheduler import DeadlineScheduler
+
+def run(shoes: int, spread_seconds: float) -> dict:
+    scheduler = DeadlineScheduler("scheduler_jitter_bench")
+    finished = threading.Semaphore(0)
+
+    scheduler.start()
+    try:
+        for shoe in range(shoes):
+            scheduler.schedule_in(random.uniform(0.05, spread_seconds), finished.release, key=f"shoe-{shoe}")
+        for _ in range(shoes):
+            finished.acquire()
+    finally:
+        scheduler.stop()
+
+    return scheduler.get_lag_stats()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=500)
+    parser.add_argument("--spread", type=float, default=3.0, help="wake-ups are spread uniformly over this many seconds")
+    args = parser.parse_args()
+
+    stats = run(args.shoes, args.spread)
+    for name, value in stats.items():
+        print(f"{name:>12}: {value:.3f}" if isinstance(value, float) else f"{name:>12}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+'''
+Starts the app the way main.py does in a fresh interpreter each run and reports how long it took until the first tab
+had a page loaded. Runs in "launch" mode boot a new chrome every time, runs in "attach" mode attach to a chrome left
+running on the debugger address (the first attach run has to start it).
+
+Needs chrome installed, the page loaded is a product page on the local nike stand-in.
+
+    python -m benchmarks.startup_time --mode launch --runs 3
+    python -m benchmarks.startup_time --mode attach --runs 3 --debugger-address 127.0.0.1:9222
+'''
+import time
+
+STARTED_AT = time.perf_counter()
+
+import argparse
+import json
+import subprocess
+import sys
+
+def run_child(mode: str, debugger_address: str, page_url: str):
+    '''
+    One cold start, prints its timings as a single JSON line
+    '''
+    from local_config import LocalConfig
+    LocalConfig.CHROME_DEBUGGER_ADDRESS = debugger_address if mode == "attach" else None
+
+    import main
+    timings = {"imports": time.perf_counter() - STARTED_AT}
+
+    web_driver, _, sneakers = main.start_browser_and_load_config()
+    timings["browser_and_config"] = time.perf_counter() - STARTED_AT
+
+    from src.utils.wait_conditions import ReadinessWaiter, document_ready
+    web_driver.get(page_url)
+    ReadinessWaiter(web_driver).until(document_ready())
+    timings["first_tab_ready"] = time.perf_counter() - STARTED_AT
+
+    # an attached chrome is left running for the next run to attach to
+    if mode == "launch":
+        web_driver.quit()
+    print(json.dumps(timings))
+
+def run(mode: str, runs: int, debugger_address: str):
+    from src.testing.nike_stand_in_server import NikeStandInServer
+
+    results = []
+    with NikeStandInServer() as stand_in:
+        page_url = stand_in.product_url("startup-benchmark-shoe")
+        for run_index in range(runs):
+            started_at = time.perf_counter()
+            child = subprocess.run([sys.executable, "-m", "benchmarks.startup_time", "--child", "--mode", mode,
+                                    "--debugger-address", debugger_address, "--page-url", page_url],
+                                   capture_output=True, text=True)
+            wall_seconds = time.perf_counter() - started_at
+            if child.returncode != 0:
+                print(child.stderr)
+                raise Exception(f"Startup run {run_index} failed")
+
+            timings = json.loads(child.stdout.strip().splitlines()[-1])
+            results.append(timings)
+            print(f"run {run_index}: imports {timings['imports']:.2f}s, browser and config {timings['browser_and_config']:.2f}s, "
+                  f"first tab ready {timings['first_tab_ready']:.2f}s (wall {wall_seconds:.2f}s)")
+
+    ready = sorted(timings["first_tab_ready"] for timings in results)
+    print(f"{mode}: first tab ready median {ready[len(ready) // 2]:.2f}s, best {ready[0]:.2f}s, worst {ready[-1]:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["launch", "attach"], default="launch")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--debugger-address", default="127.0.0.1:9222")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--page-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.mode, args.debugger_address, args.page_url)
+    else:
+        run(args.mode, args.runs, args.debugger_address)
+
+if __name__ == "__main__":
+    main()
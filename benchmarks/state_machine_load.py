@@ -0,0 +1,152 @@
+'''
+Drives thousands of simulated sneakers through the PurchaseStateMachine on a virtual clock, no browser and no sleeping,
+and reports how many transitions a second it gets through and how much CPU each handled wake-up costs.
+
+    python -m benchmarks.state_machine_load --shoes 5000 --purchase-success 0.3
+'''
+import argparse
+import datetime
+import heapq
+import random
+import time
+from collections import Counter
+
+from src.purchase_state_machine import PageActions, PurchaseState, PurchaseStateMachine
+
+EPOCH = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+class SimulatedPages(PageActions):
+    '''
+    Pages that show their release time until a virtual clock passes it, with wake-ups kept on a heap instead of timers
+    '''
+
+    def __init__(self, release_seconds: dict, purchase_success: float, wakeup_jitter: float, seed: int):
+        self.release_seconds = release_seconds
+        self.purchase_success = purchase_success
+        self.wakeup_jitter = wakeup_jitter
+        self.random = random.Random(seed)
+        self.now = 0.0
+        self.wakeups = []
+        # url -> sequence number of its pending wake-up, anything else on the heap for it has been replaced
+        self.pending = {}
+        self.sequence = 0
+        self.event_counts = Counter()
+
+    def load(self, sneaker_url: str, state: PurchaseState) -> bool:
+        return True
+
+    def read_release(self, sneaker_url: str):
+        release_seconds = self.release_seconds[sneaker_url]
+        if self.now < release_seconds:
+            return EPOCH + datetime.timedelta(seconds=release_seconds)
+        return None
+
+    def purchase(self, sneaker_url: str, attempt: int) -> bool:
+        return self.random.random() < self.purchase_success
+
+    def schedule_wakeup_at(self, sneaker_url: str, server_dt: datetime.datetime) -> float:
+        # the clocks never quite agree, so wake-ups at the release land a little either side of it
+        wakeup_seconds = (server_dt - EPOCH).total_seconds() + self.random.uniform(-self.wakeup_jitter, self.wakeup_jitter)
+        wait_seconds = max(wakeup_seconds - self.now, 0.0)
+        self.schedule_wakeup(sneaker_url, wait_seconds)
+        return wait_seconds
+
+    def schedule_wakeup(self, sneaker_url: str, wait_seconds: float):
+        self.sequence += 1
+        self.pending[sneaker_url] = self.sequence
+        heapq.heappush(self.wakeups, (self.now + wait_seconds, self.sequence, sneaker_url))
+
+    def record(self, sneaker_url: str, code, **payload):
+        self.event_counts[code.name] += 1
+
+    def next_wakeup(self):
+        '''
+        :return: the url of the next due wake-up with the clock moved to it, None once there are none left
+        '''
+        while self.wakeups:
+            due_at, sequence, sneaker_url = heapq.heappop(self.wakeups)
+            if self.pending.get(sneaker_url) != sequence:
+                continue
+            del self.pending[sneaker_url]
+            self.now = max(self.now, due_at)
+            return sneaker_url
+        return None
+
+def run(shoes: int, purchase_success: float, release_spread: float, already_released: float, wakeup_jitter: float, seed: int) -> dict:
+    shoe_random = random.Random(seed)
+    release_seconds = {}
+    for shoe in range(shoes):
+        url = f"https://www.nike.com/launch/t/load-test-shoe-{shoe}"
+        if shoe_random.random() < already_released:
+            release_seconds[url] = -1.0
+        else:
+            release_seconds[url] = shoe_random.uniform(300.0, release_spread)
+
+    pages = SimulatedPages(release_seconds, purchase_success, wakeup_jitter, seed)
+    machine = PurchaseStateMachine(pages, release_seconds)
+    for url in release_seconds:
+        pages.schedule_wakeup(url, 0)
+
+    handle_cpu_seconds = []
+    wall_started_at = time.perf_counter()
+    cpu_started_at = time.process_time()
+    while not machine.is_finished():
+        url = pages.next_wakeup()
+        if url is None:
+            break
+        handle_started_at = time.process_time()
+        state = machine.handle(url)
+        # same as the monitoring loop, anything still in play that did not schedule itself is retried as fast as allowed
+        if state not in machine.TERMINAL_STATES and url not in pages.pending:
+            pages.schedule_wakeup(url, machine.fastest_refresh_seconds)
+        handle_cpu_seconds.append(time.process_time() - handle_started_at)
+    cpu_seconds = time.process_time() - cpu_started_at
+    wall_seconds = time.perf_counter() - wall_started_at
+
+    # what __have_all_been_purchased used to cost every loop, against the machines running counts
+    scan_started_at = time.perf_counter()
+    for _ in range(100):
+        any(state not in machine.TERMINAL_STATES for state in machine.states.values())
+    scan_seconds = (time.perf_counter() - scan_started_at) / 100
+    count_started_at = time.perf_counter()
+    for _ in range(100):
+        machine.is_finished()
+    count_seconds = (time.perf_counter() - count_started_at) / 100
+
+    handle_cpu_seconds.sort()
+    handled = len(handle_cpu_seconds)
+    return {
+        "shoes": shoes,
+        "handled": handled,
+        "transitions": machine.transition_count,
+        "virtual_hours": pages.now / 3600.0,
+        "wall_seconds": wall_seconds,
+        "transitions_per_second": machine.transition_count / wall_seconds if wall_seconds else 0.0,
+        "handled_per_second": handled / wall_seconds if wall_seconds else 0.0,
+        "cpu_per_handle_mean_us": cpu_seconds / handled * 1e6 if handled else 0.0,
+        "cpu_per_handle_p50_us": handle_cpu_seconds[handled // 2] * 1e6 if handled else 0.0,
+        "cpu_per_handle_p99_us": handle_cpu_seconds[int(handled * 0.99)] * 1e6 if handled else 0.0,
+        "cpu_per_handle_max_us": handle_cpu_seconds[-1] * 1e6 if handled else 0.0,
+        "finished_check_scan_us": scan_seconds * 1e6,
+        "finished_check_counts_us": count_seconds * 1e6,
+        "purchased": machine.counts[PurchaseState.PURCHASED],
+        "errored": machine.counts[PurchaseState.ERROR],
+        "events": dict(pages.event_counts),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=5000)
+    parser.add_argument("--purchase-success", type=float, default=0.3, help="chance each purchase attempt goes through")
+    parser.add_argument("--release-spread", type=float, default=6 * 3600.0, help="releases are spread uniformly over this many virtual seconds")
+    parser.add_argument("--already-released", type=float, default=0.05, help="fraction of shoes that are out before the first look")
+    parser.add_argument("--wakeup-jitter", type=float, default=1.5, help="how many seconds either side of the release wake-ups land")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    stats = run(args.shoes, args.purchase_success, args.release_spread, args.already_released, args.wakeup_jitter, args.seed)
+    for name, value in stats.items():
+        print(f"{name:>26}: {value:.3f}" if isinstance(value, float) else f"{name:>26}: {value}")
+
+if __name__ == "__main__":
+    main()
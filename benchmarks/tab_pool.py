@@ -0,0 +1,91 @@
+'''
+Runs a watch list whose shoes drop in waves spread over the next hours on a FakeNikeSite, FakeWebDriver and
+VirtualClock, once with one tab per shoe for the whole run and once with the tab pool, and reports how many tabs were
+open at the peak, how many were opened in total and how long each shoe took from its drop to the payment going in.
+
+    python -m benchmarks.tab_pool --shoes 40 --waves 4 --wave-minutes 30 --max-tabs 12
+'''
+import argparse
+import time
+from collections import Counter
+
+from benchmarks.release_to_submit import StandInPurchaseProcess, next_release_at
+from local_config import LocalConfig
+from src.testing.fake_nike_site import FakeNikeSite
+from src.testing.fake_web_driver import FakeWebDriver
+from src.utils.clock import VirtualClock
+from src.utils.percentiles import percentile
+
+class TabCountingWebDriver(FakeWebDriver):
+    '''
+    Keeps track of how many tabs were ever open at once
+    '''
+
+    def __init__(self, site, command_seconds: float):
+        self.tabs_opened = 0
+        self.peak_tabs = 0
+        super().__init__(site, command_seconds=command_seconds)
+
+    def _open_tab(self):
+        tab = super()._open_tab()
+        self.tabs_opened += 1
+        self.peak_tabs = max(self.peak_tabs, len(self._tabs))
+        return tab
+
+def run(shoes: int, waves: int, wave_seconds: float, lead_seconds: float, max_tabs, command_seconds: float) -> dict:
+    LocalConfig.RELEASE_CACHE_PATH = None
+    LocalConfig.HTTP_PRE_RELEASE_MONITOR = False
+    LocalConfig.TAB_POOL_MAX_TABS = max_tabs
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock)
+    driver = TabCountingWebDriver(site, command_seconds)
+
+    sneakers = []
+    release_live = {}
+    for shoe in range(shoes):
+        url = site.product_url(f"tab-pool-shoe-{shoe}")
+        release_at = next_release_at(site, lead_seconds + (shoe % waves) * wave_seconds)
+        site.schedule_product_release(url, release_at)
+        release_live[url] = clock.monotonic() + (release_at - site.server_time())
+        sneakers.append({"shoe_url": url, "size": "M 11"})
+    process = StandInPurchaseProcess(driver, sneakers=sneakers, clock=clock, clock_sampler=site.date_sampler())
+
+    events = Counter()
+    process.event_sink = lambda event: events.update([event.code.name])
+    started_at = time.perf_counter()
+    process.start_monitoring_sneakers()
+    wall_seconds = time.perf_counter() - started_at
+
+    submitted_ms = [(stages["payment_submitted"] - release_live[url]) * 1000.0
+                    for url, stages in process.get_stage_times().items() if "payment_submitted" in stages]
+    return {
+        "max_tabs": max_tabs,
+        "purchased": sum(1 for state in process.get_purchase_states().values() if state == process.PurchaseState.PURCHASED),
+        # the first tab is the one the driver started on, it is not a sneaker tab
+        "peak_sneaker_tabs": driver.peak_tabs - 1,
+        "sneaker_tabs_opened": driver.tabs_opened - 1,
+        "p50_drop_to_submit_ms": percentile(submitted_ms, 50),
+        "max_drop_to_submit_ms": max(submitted_ms) if submitted_ms else None,
+        "pool": process.get_pool_stats(),
+        "tab_events": {code: count for code, count in sorted(events.items()) if code.startswith("TAB_") or code == "HANDED_OFF_TO_TAB"},
+        "wall_seconds": wall_seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=40)
+    parser.add_argument("--waves", type=int, default=4, help="how many separate drops the shoes are spread over")
+    parser.add_argument("--wave-minutes", type=float, default=30.0, help="minutes between drops")
+    parser.add_argument("--lead", type=float, default=300.0, help="minimum seconds between starting and the first drop")
+    parser.add_argument("--max-tabs", type=int, default=12, help="tab pool cap")
+    parser.add_argument("--command-ms", type=float, default=5.0, help="virtual milliseconds every fake driver command takes")
+    args = parser.parse_args()
+
+    for max_tabs in (None, args.max_tabs):
+        stats = run(args.shoes, args.waves, args.wave_minutes * 60.0, args.lead, max_tabs, args.command_ms / 1000.0)
+        print(f"--- {'one tab per shoe' if max_tabs is None else f'tab pool of {max_tabs}'}")
+        for name, value in stats.items():
+            print(f"{name:>24}: {value:.3f}" if isinstance(value, float) else f"{name:>24}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+Runs a whole drop of many sneakers on a FakeNikeSite, FakeWebDriver and VirtualClock and reports how many window
+switches it took and what they cost. "requested" is how many switches the process asked for, which is what it paid
+before switches to the tab the driver was already on were skipped, "switched" is how many reached the driver.
+
+    python -m benchmarks.tab_switching --shoes 50 --switch-ms 20
+'''
+import argparse
+import time
+
+from benchmarks.release_to_submit import StandInPurchaseProcess, next_release_at
+from local_config import LocalConfig
+from src.testing.fake_nike_site import FakeNikeSite
+from src.testing.fake_web_driver import FakeWebDriver
+from src.utils.clock import VirtualClock
+
+class SlowSwitchWebDriver(FakeWebDriver):
+    '''
+    Switching windows costs extra on a real browser, it has to bring the tab to the front and reattach to it
+    '''
+
+    def __init__(self, site, command_seconds: float, switch_seconds: float):
+        super().__init__(site, command_seconds=command_seconds)
+        self.switch_seconds = switch_seconds
+        self.window_switches = 0
+        window = self.switch_to.window
+
+        def slow_window(window_name):
+            self.window_switches += 1
+            self.clock.sleep(self.switch_seconds)
+            window(window_name)
+
+        self.switch_to.window = slow_window
+
+def run(shoes: int, command_seconds: float, switch_seconds: float, lead_seconds: float) -> dict:
+    LocalConfig.RELEASE_CACHE_PATH = None
+    LocalConfig.HTTP_PRE_RELEASE_MONITOR = False
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock)
+    driver = SlowSwitchWebDriver(site, command_seconds, switch_seconds)
+    site.schedule_release(next_release_at(site, lead_seconds))
+
+    sneakers = [{"shoe_url": site.product_url(f"tab-switching-shoe-{shoe}"), "size": "M 11"} for shoe in range(shoes)]
+    process = StandInPurchaseProcess(driver, sneakers=sneakers, clock=clock, clock_sampler=site.date_sampler())
+
+    started_at = time.perf_counter()
+    process.start_monitoring_sneakers()
+    wall_seconds = time.perf_counter() - started_at
+
+    switch_stats = process.get_switch_stats()
+    release_live = site.events["release_live"]
+    stage_times = process.get_stage_times().values()
+    submitted = [stages["payment_submitted"] - release_live for stages in stage_times if "payment_submitted" in stages]
+    return {
+        "shoes": shoes,
+        "purchased": sum(1 for state in process.get_purchase_states().values() if state == process.PurchaseState.PURCHASED),
+        "window_switches_seen_by_driver": driver.window_switches,
+        **{f"switch_{name}": value for name, value in switch_stats.items()},
+        "switch_ms_per_shoe": switch_stats["total_ms"] / shoes,
+        "requested_switch_ms_before": switch_stats["requested"] * switch_seconds * 1000.0,
+        "last_payment_submitted_ms": max(submitted) * 1000.0 if submitted else None,
+        "wall_seconds": wall_seconds,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shoes", type=int, default=50)
+    parser.add_argument("--command-ms", type=float, default=5.0, help="virtual milliseconds every fake driver command takes")
+    parser.add_argument("--switch-ms", type=float, default=20.0, help="extra virtual milliseconds a window switch takes")
+    parser.add_argument("--lead", type=float, default=600.0, help="minimum seconds between opening the tabs and the release")
+    args = parser.parse_args()
+
+    stats = run(args.shoes, args.command_ms / 1000.0, args.switch_ms / 1000.0, args.lead)
+    for name, value in stats.items():
+        print(f"{name:>30}: {value:.3f}" if isinstance(value, float) else f"{name:>30}: {value}")
+
+if __name__ == "__main__":
+    main()
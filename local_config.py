@@ -1,4 +1,6 @@
 
+import os.path
+
 class LocalConfig():
     '''
     Utility class that is meant to be a place where we can hang global variables and settings so we can "turn things
@@ -12,6 +14,77 @@ class LocalConfig():
     USE_STEALTH = False
     BLOCK_NEW_RELIC = True
     CHROME_PROFILE = "BobBurger"
+    # "host:port" of a chrome to attach to instead of launching one, it is started there if it is not running yet and
+    # left running so restarts skip booting the browser and logging in. None launches a fresh browser every run
+    CHROME_DEBUGGER_ADDRESS = None
+    # Give every tab the resource profile (src/utils/resource_profiles.py) for what it is doing, product pages being
+    # watched skip images, video, fonts and analytics. New Relic is only blocked when BLOCK_NEW_RELIC is on either way
+    TAB_RESOURCE_PROFILES = True
+    # Most sneaker tabs kept open at once, None opens one per sneaker for the whole run. Sneakers whose next wake up is
+    # more than TAB_POOL_PARK_AFTER_SECONDS away give their tab back until that wake up, and blanked tabs are reused
+    TAB_POOL_MAX_TABS = 12
+    TAB_POOL_IDLE_TABS = 1
+    TAB_POOL_PARK_AFTER_SECONDS = 600
+
+    # Pick up shoes added to or removed from shoes_to_snag.json while the app is running, with a single browser only
+    SNEAKER_CONFIG_HOT_RELOAD = True
 
     CVV_NUMBER = "900"
 
+    # Timezone the release times on the site are shown in (e.g. "America/New_York"), None means the same as this pc
+    RELEASE_TIMEZONE = None
+    # Page whose Date header is used to work out how far our clock is from the sites clock, it is sent a HEAD request
+    # every few minutes (from every worker). None trusts this pc's clock as is
+    CLOCK_CALIBRATION_URL = None
+
+    # What runs the sneakers on a single browser, the "thread" monitoring loop or the "asyncio" event loop with a
+    # coroutine per sneaker (the user input watcher then runs on the same event loop)
+    MONITORING_ENGINE = "thread"
+
+    # How many browsers to split the sneakers across, and whether each one runs on a "thread" or its own "process"
+    BROWSER_WORKERS = 1
+    BROWSER_WORKER_MODE = "thread"
+
+    # Watch sneakers over plain HTTP before their release and only open a browser tab for them close to the drop
+    HTTP_PRE_RELEASE_MONITOR = False
+
+    # SQLite file that release times, size grids and purchase states are cached in between runs, None turns it off.
+    # Relative paths are from the folder this file is in, not from wherever the app was started
+    RELEASE_CACHE_PATH = "release_cache.sqlite3"
+
+    # Checkpoint where every sneaker is on a heartbeat, to the release cache file when there is one (in memory otherwise). With the watchdog on
+    # a browser that stops answering is rebuilt and every sneaker picked back up on the new one without a restart
+    PURCHASE_CHECKPOINTS = True
+    # Have a restarted run pick every sneaker up from the checkpoints of the last run (from the last 24 hours), sneakers
+    # it already purchased are skipped. Only turn on to continue a run that was cut short, and back off after
+    RESUME_FROM_CHECKPOINTS = False
+    DRIVER_WATCHDOG = True
+    DRIVER_HEARTBEAT_SECONDS = 10
+
+    # Have key presses on the message tab pushed to us over a devtools connection the moment they happen instead of
+    # polling the page for them, falls back to polling on its own when the browser will not give us the connection or
+    # the tab never signals over it. Off by default, the bindings and scripts it adds to the tab are a devtools
+    # footprint bot detection looks for
+    PUSH_KEY_EVENTS = False
+
+    # Start the reload that should see a sneaker released ahead of the release, by how long its page has been taking to
+    # load, instead of losing a whole page load after the drop. "response" has the site answer it just after the release,
+    # "interactive" has the page ready to read at the release (only for pages that fetch their availability once they
+    # have loaded), None reloads at the release. Its page is reloaded RELEASE_WARMUP_RELOADS times in the minute before
+    # to measure it, and reloads after the release are spaced by how long one takes. Off by default, the extra reloads
+    # right before a drop are more traffic for the sites bot detection to look at
+    RELEASE_RELOAD_ALIGN = None
+    RELEASE_WARMUP_RELOADS = 3
+
+    # Time every WebDriver call and write the latency histograms out at the end of a run, .prom for Prometheus text
+    DRIVER_TRACING = False
+    DRIVER_TRACE_FILE = "driver_trace.json"
+
+    @staticmethod
+    def resolve_path(path: str) -> str:
+        '''
+        :return: the path of a file setting, relative ones taken from the folder this file is in so every run reads and
+        writes the same files whatever folder it was started from
+        '''
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.expanduser(path))
+
@@ -1,11 +1,16 @@
+import argparse
+import asyncio
+import importlib
 import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
 from typing import Tuple
 
+from local_config import LocalConfig
 from src.config.local_logging import LocalLogging
-from src.nike_purchaser import NikePurchaser
+from src.config.sneaker_config import load_sneaker_config
 from src.utils.web_driver_factory import WebDriverFactory
 
 main_logger = LocalLogging.get_local_logger("main_script.py")
@@ -19,8 +24,9 @@ def load_config() -> Tuple:
         # Define and validate the data folder
         data_folder = Path("data_folder")
         shoes_to_snag_file = data_folder / "shoes_to_snag.json"
+        sneakers = load_sneaker_config(shoes_to_snag_file)
 
-        return (shoes_to_snag_file)
+        return (shoes_to_snag_file, sneakers)
 
     except FileNotFoundError as fnf:
         main_logger.error(f"File not found: {fnf}")
@@ -31,14 +37,44 @@ def load_config() -> Tuple:
     except Exception as e:
         main_logger.exception(f"An unexpected error occurred: {e}")
 
+def start_browser_and_load_config() -> Tuple:
+    '''
+    Boots (or attaches to) the browser on a background thread and loads the config and the heavy modules while it
+    does, since the browser is by far the slowest part of starting up
+    returns a tuple of the web driver, the shoes file and the sneakers in it
+    '''
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="browser_launch") as launcher:
+        driver_future = launcher.submit(WebDriverFactory().get_chrome_web_driver)
+
+        config = load_config()
+        importlib.import_module("src.nike_purchaser")
+
+        web_driver = driver_future.result()
+        if config is None:
+            raise Exception("Unable to load the config, see the errors above")
+        return (web_driver,) + config
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Snags the sneakers in data_folder/shoes_to_snag.json")
+    parser.add_argument("--engine", choices=["thread", "asyncio"], default=LocalConfig.MONITORING_ENGINE,
+                        help="what runs the sneakers, the monitoring loop thread or an asyncio event loop")
+    return parser.parse_args()
+
 def main():
-    shoes_file_path = load_config()
+    args = parse_args()
+    LocalConfig.MONITORING_ENGINE = args.engine
     account_snagging_threads = []
-    webFactor = WebDriverFactory()
 
     try:
-        web_driver = webFactor.get_chrome_web_driver()
-        purchaser = NikePurchaser(web_driver, shoes_file_path)
+        web_driver, shoes_file_path, sneakers = start_browser_and_load_config()
+        from src.nike_purchaser import NikePurchaser
+
+        purchaser = NikePurchaser(web_driver, shoes_file_path, sneakers=sneakers)
+        if args.engine == "asyncio":
+            # the user input watcher, its waits and every sneaker share this one event loop
+            asyncio.run(purchaser.setup_for_monitoring_async())
+            return
+
         thread = threading.Thread(target=purchaser.setup_for_monitoring)
         thread.start()
         account_snagging_threads.append(thread)
@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.utils.driver_executor import DriverExecutor
+from src.utils.percentiles import percentile
+
+class SneakerWakeup():
+    '''
+    The one pending wake-up of a sneaker, its coroutine sleeps on waiter until the deadline passes or it is moved
+    '''
+    __slots__ = ("deadline", "waiter", "task")
+
+    def __init__(self):
+        # clock.monotonic() the sneaker should next be handled at, None when nothing is scheduled
+        self.deadline = None
+        self.waiter = None
+        self.task = None
+
+class AsyncSneakerPurchaseProcess(SneakerPurchaseProcess):
+    '''
+    SneakerPurchaseProcess run on an asyncio event loop instead of the monitoring loop and its DeadlineScheduler thread.
+    Every sneaker is its own coroutine that sleeps until its deadline, which can be moved or cancelled at any time, and
+    then hands the page work off to a DriverExecutor so there is still only ever one driver call in flight. Messages from
+    the background threads (clock calibration, HTTP monitor, config watcher) still come through the ready queue.
+
+    On a VirtualClock nothing sleeps for real, once every sneaker is waiting and the driver is free the clock is jumped
+    straight to the earliest deadline.
+    '''
+
+    # Driver calls that can be queued up behind the one running before coroutines have to wait their turn
+    __MAX_PENDING_DRIVER_CALLS = 64
+    # How many of the most recent wake-up lags to keep for percentiles
+    __LAG_SAMPLE_SIZE = 4096
+    # Put on the ready queue to stop the message pump
+    __STOP_PUMP = object()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.driver_calls = None
+        self._loop = None
+        self._wakeups = {}
+        self._done = None
+        # only used on a virtual clock, heap of (deadline, sequence, waiter)
+        self._timers = []
+        self._timer_sequence = itertools.count()
+        self._sleeping = 0
+        self._maybe_idle = None
+
+        self._dispatched_count = 0
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+        self._lag_samples = deque(maxlen=self.__LAG_SAMPLE_SIZE)
+
+    def start_monitoring_sneakers(self):
+        '''
+        Runs the sneakers on a fresh event loop until they are all purchased or errored
+        '''
+        asyncio.run(self.monitor_async())
+
+    async def monitor_async(self, driver_calls: DriverExecutor = None):
+        '''
+        Runs the sneakers on the running event loop until they are all purchased or errored
+        :param driver_calls: executor every other user of the driver goes through, one of our own when not given
+        '''
+        self._loop = asyncio.get_running_loop()
+        owns_driver_calls = driver_calls is None
+        self.driver_calls = driver_calls or DriverExecutor(self.__MAX_PENDING_DRIVER_CALLS, clock=self.clock)
+        self._done = self._loop.create_future()
+        self._maybe_idle = asyncio.Event()
+        self.driver_calls.add_listener(self._maybe_idle.set)
+        for sneaker_url in self.sneaker_urls:
+            self._wakeups.setdefault(sneaker_url, SneakerWakeup())
+
+        background = []
+        try:
+            await self.driver_calls.call(self._start_monitoring)
+            # what starting up queued is armed before any sneaker can go to sleep on an empty schedule
+            while not self.ready_sneakers.empty():
+                await self._handle_message(self.ready_sneakers.get_nowait())
+            background.append(self._loop.create_task(self._pump_messages()))
+            if self.clock.is_virtual:
+                background.append(self._loop.create_task(self._keep_virtual_time()))
+            for sneaker_url in list(self._wakeups):
+                self._start_sneaker(sneaker_url)
+            self._check_finished()
+            await self._done
+        finally:
+            for wakeup in self._wakeups.values():
+                if wakeup.task:
+                    wakeup.task.cancel()
+            for task in background:
+                task.cancel()
+            self.ready_sneakers.put(self.__STOP_PUMP)
+            await asyncio.gather(*background, *(wakeup.task for wakeup in self._wakeups.values() if wakeup.task), return_exceptions=True)
+            self.driver_calls.remove_listener(self._maybe_idle.set)
+            try:
+                await self.driver_calls.call(self._stop_monitoring)
+            finally:
+                if owns_driver_calls:
+                    self.driver_calls.shutdown()
+
+    def _start_sneaker(self, sneaker_url: str):
+        wakeup = self._wakeups.setdefault(sneaker_url, SneakerWakeup())
+        if wakeup.task is None or wakeup.task.done():
+            wakeup.task = self._loop.create_task(self._run_sneaker(sneaker_url, wakeup), name=f"sneaker {sneaker_url}")
+
+    async def _run_sneaker(self, sneaker_url: str, wakeup: SneakerWakeup):
+        try:
+            while self.sneaker_purchase_states.get(sneaker_url) not in self.purchase_machine.TERMINAL_STATES:
+                deadline = wakeup.deadline
+                if deadline is None or deadline > self.clock.monotonic():
+                    # wakes up when the deadline passes or the sneaker is rescheduled, either way look again
+                    await self._sleep(wakeup, deadline)
+                    continue
+
+                wakeup.deadline = None
+                self._record_lag(self.clock.monotonic() - deadline)
+                await self.driver_calls.call(self._handle_ready_sneaker, sneaker_url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._check_finished()
+
+    async def _sleep(self, wakeup: SneakerWakeup, deadline: float):
+        waiter = self._loop.create_future()
+        wakeup.waiter = waiter
+        timer = None
+        if deadline is not None and self.clock.is_virtual:
+            heapq.heappush(self._timers, (deadline, next(self._timer_sequence), waiter))
+        elif deadline is not None:
+            timer = self._loop.call_at(self._loop.time() + (deadline - self.clock.monotonic()), self._resolve, waiter)
+
+        self._sleeping += 1
+        self._maybe_idle.set()
+        try:
+            await waiter
+        finally:
+            self._sleeping -= 1
+            wakeup.waiter = None
+            if timer:
+                timer.cancel()
+
+    @staticmethod
+    def _resolve(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _wake(self, sneaker_url: str):
+        wakeup = self._wakeups.get(sneaker_url)
+        if wakeup and wakeup.waiter:
+            self._resolve(wakeup.waiter)
+
+    def _call_on_loop(self, callback, *args):
+        '''
+        Runs the callback on the event loop, wake-ups are moved from the driver thread while its work runs
+        '''
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(callback, *args)
+
+    async def _keep_virtual_time(self):
+        '''
+        Jumps the virtual clock to the earliest deadline whenever every sneaker is asleep and the driver is free
+        '''
+        try:
+            while True:
+                await self._maybe_idle.wait()
+                self._maybe_idle.clear()
+                alive = sum(1 for wakeup in self._wakeups.values() if wakeup.task and not wakeup.task.done())
+                if alive == 0 or self._sleeping < alive or self.driver_calls.pending:
+                    continue
+
+                while self._timers and self._timers[0][2].done():
+                    heapq.heappop(self._timers)
+                if not self._timers:
+                    raise Exception("Nothing is ready and nothing is scheduled, the virtual clock would never move!")
+                self.clock.advance_to(self._timers[0][0])
+                now = self.clock.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    self._resolve(heapq.heappop(self._timers)[2])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+
+    async def _pump_messages(self):
+        '''
+        Hands messages off the ready queue to the loop, a bare url means handle that sneaker right away
+        '''
+        try:
+            while True:
+                message = await self._loop.run_in_executor(None, self.ready_sneakers.get)
+                if message is self.__STOP_PUMP:
+                    return
+                await self._handle_message(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+
+    async def _handle_message(self, message):
+        if isinstance(message, str):
+            if message in self.sneaker_purchase_states:
+                self._schedule_wakeup_deadline(message, self.clock.monotonic())
+                self._start_sneaker(message)
+            return
+        await self.driver_calls.call(self._queue_ready, message)
+        self._maybe_idle.set()
+
+    def _schedule_wakeup_deadline(self, sneaker_url: str, deadline: float):
+        self.sneaker_wakeup_deadlines[sneaker_url] = deadline
+        wakeup = self._wakeups.setdefault(sneaker_url, SneakerWakeup())
+        wakeup.deadline = deadline
+        self._call_on_loop(self._wake, sneaker_url)
+
+    def _has_pending_wakeup(self, sneaker_url: str) -> bool:
+        wakeup = self._wakeups.get(sneaker_url)
+        return wakeup is not None and wakeup.deadline is not None
+
+    def _cancel_wakeup(self, sneaker_url: str):
+        wakeup = self._wakeups.pop(sneaker_url, None)
+        if wakeup and wakeup.task:
+            self._call_on_loop(wakeup.task.cancel)
+
+    def _fail(self, e: Exception):
+        if self._done and not self._done.done():
+            self._done.set_exception(e)
+
+    def _check_finished(self):
+        if self._done and not self._done.done() and self.purchase_machine.is_finished():
+            self._done.set_result(None)
+
+    def _record_lag(self, lag: float):
+        self._dispatched_count += 1
+        self._total_lag += lag
+        self._max_lag = max(self._max_lag, lag)
+        self._lag_samples.append(lag)
+
+    def get_scheduler_stats(self):
+        def lag_ms(pct):
+            return (percentile(self._lag_samples, pct) or 0.0) * 1000.0
+
+        stats = {
+            "dispatched": self._dispatched_count,
+            "mean_lag_ms": (self._total_lag / self._dispatched_count * 1000.0) if self._dispatched_count else 0.0,
+            "max_lag_ms": self._max_lag * 1000.0,
+            "p50_lag_ms": lag_ms(50),
+            "p99_lag_ms": lag_ms(99),
+        }
+        if self.driver_calls:
+            stats["driver_calls"] = self.driver_calls.get_stats()
+        return stats
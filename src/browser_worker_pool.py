@@ -0,0 +1,246 @@
+import multiprocessing
+import queue
+import threading
+
+from local_config import LocalConfig
+from src.config.local_logging import LocalLogging
+from src.config.sneaker_config import compile_sneakers
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.utils.clock import SYSTEM_CLOCK
+from src.utils.driver_tracing import DriverTracer
+from src.utils.event_store import SneakerEventStore
+from src.utils.web_driver_factory import WebDriverFactory
+
+def propagate_session(driver, base_url: str, cookies):
+    '''
+    Copies the logged in session onto a fresh driver by loading the site and adding every cookie from the logged in one
+    '''
+    driver.get(base_url)
+    for cookie in cookies:
+        cookie = dict(cookie)
+        # chromedriver is picky about these coming back in the shape get_cookies hands them out
+        if "expiry" in cookie:
+            cookie["expiry"] = int(cookie["expiry"])
+        if cookie.get("sameSite") not in ("Strict", "Lax", "None"):
+            cookie.pop("sameSite", None)
+        try:
+            driver.add_cookie(cookie)
+        except Exception:
+            # cookies for other domains cannot be set from this page, they are not needed to purchase
+            continue
+    driver.refresh()
+
+def _monitoring_driver():
+    return WebDriverFactory().get_chrome_web_driver(use_profile=False, resource_profile="monitoring")
+
+def new_session_driver(driver_factory, base_url: str, cookies):
+    '''
+    :return: a new driver from driver_factory with the logged in session copied onto it
+    '''
+    driver = driver_factory()
+    propagate_session(driver, base_url, cookies)
+    return driver
+
+def _quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception:
+        # a browser that died on us has nothing left to quit
+        pass
+
+def _run_worker(worker_id: int, driver, sneakers, event_put, driver_factory=None, clock=None) -> dict:
+    '''
+    Runs one SneakerPurchaseProcess over the given shard on the given driver
+    :param event_put: callable that each (SNEAKER_EVENT, worker id, sneaker url, SneakerEvent, time) event is handed to
+    :param driver_factory: callable that builds a logged in driver to replace the given one with if it dies
+    :param clock: clock the worker and its process run on, defaults to the real one
+    :return: the throughput stats of the worker
+    '''
+    clock = clock or SYSTEM_CLOCK
+    started_at = clock.monotonic()
+    process = SneakerPurchaseProcess(driver, sneakers=sneakers, driver_factory=driver_factory, clock=clock,
+                                     event_sink=lambda event: event_put((BrowserWorkerPool.SNEAKER_EVENT, worker_id, event.sneaker_url, event, clock.time())))
+    try:
+        process.start_monitoring_sneakers()
+    finally:
+        # a driver the watchdog built belongs to this worker, the one it was handed was quit when it was replaced
+        if process.watchdog and process.watchdog.recoveries:
+            _quit_driver(process.driver)
+    elapsed = clock.monotonic() - started_at
+
+    states = process.get_purchase_states()
+    return {
+        "worker_id": worker_id,
+        "shoes": len(sneakers),
+        "handled": process.handled_count,
+        "purchased": sum(1 for state in states.values() if state == SneakerPurchaseProcess.PurchaseState.PURCHASED),
+        "errored": sum(1 for state in states.values() if state == SneakerPurchaseProcess.PurchaseState.ERROR),
+        "elapsed_seconds": elapsed,
+        "busy_seconds": process.busy_seconds,
+        "handled_per_second": process.handled_count / elapsed if elapsed else 0.0,
+        "utilization": process.busy_seconds / elapsed if elapsed else 0.0,
+        "watchdog": process.get_watchdog_stats(),
+    }
+
+def _run_worker_process(worker_id: int, sneakers, base_url: str, cookies, event_queue):
+    '''
+    Entry point of a worker running in its own process, it owns its own browser and reports back through event_queue.
+    A clock cannot be handed to another process, so it always runs on the real one
+    '''
+    driver = None
+    stats = {"worker_id": worker_id, "shoes": len(sneakers), "error": None}
+    try:
+        driver = new_session_driver(_monitoring_driver, base_url, cookies)
+        stats = _run_worker(worker_id, driver, sneakers, event_queue.put,
+                            driver_factory=lambda: new_session_driver(_monitoring_driver, base_url, cookies))
+    except Exception as e:
+        stats["error"] = str(e)
+    finally:
+        if driver:
+            _quit_driver(driver)
+        if LocalConfig.DRIVER_TRACING:
+            # this process has its own tracer, so it writes its own trace file
+            try:
+                stats["driver_trace_file"] = DriverTracer.shared().dump(LocalConfig.resolve_path(LocalConfig.DRIVER_TRACE_FILE))
+            except Exception as e:
+                stats["driver_trace_error"] = str(e)
+        event_queue.put((BrowserWorkerPool.STATS_EVENT, worker_id, None, stats, SYSTEM_CLOCK.time()))
+
+class BrowserWorkerPool():
+    '''
+    Splits the sneakers across several browsers so a slow page load or checkout on one tab only holds up the sneakers
+    sharing its browser. Workers are either threads or processes that each own a driver, the first worker reuses the
+    already logged in driver and every other one gets the logged in session copied over through its cookies.
+
+    Events from every worker are merged back into a single stream, and each worker reports throughput stats when it
+    finishes so the pool can be sized for the hardware it runs on.
+    '''
+
+    THREAD_MODE = "thread"
+    PROCESS_MODE = "process"
+    # Kinds of messages on the event queue, every event is (kind, worker id, sneaker url, SneakerEvent or stats, time)
+    SNEAKER_EVENT = "sneaker_event"
+    STATS_EVENT = "worker_stats"
+
+    def __init__(self, sneakers, worker_count: int, logged_in_driver, base_url: str, mode: str = THREAD_MODE, driver_factory=None,
+                 clock=None):
+        '''
+        :param sneakers: list of SneakerConfigEntry (or raw {"shoe_url": ..., "size": ...}) to snag
+        :param logged_in_driver: driver with the logged in session, used by the first worker and copied to the others
+        :param driver_factory: callable that creates a driver for the extra thread workers
+        :param clock: clock the thread workers run on, process workers always run on the real one
+        '''
+        if mode not in (self.THREAD_MODE, self.PROCESS_MODE):
+            raise Exception(f"Unknown browser worker mode {mode}, expected {self.THREAD_MODE} or {self.PROCESS_MODE}")
+
+        self.logger = LocalLogging.get_local_logger("browser_worker_pool")
+        sneakers = compile_sneakers(sneakers)
+        self.worker_count = max(1, min(worker_count, len(sneakers)))
+        self.logged_in_driver = logged_in_driver
+        self.base_url = base_url
+        self.mode = mode
+        self.driver_factory = driver_factory or _monitoring_driver
+        self.clock = clock or SYSTEM_CLOCK
+
+        # Round robin so sneakers listed next to each other (often the same drop) end up in different browsers
+        self.shards = [sneakers[worker_id::self.worker_count] for worker_id in range(self.worker_count)]
+        self.events = multiprocessing.Queue() if mode == self.PROCESS_MODE else queue.Queue()
+        # the shards are fixed when the workers start, so shoes added to or removed from the sneaker file are not picked up
+        if LocalConfig.SNEAKER_CONFIG_HOT_RELOAD:
+            self.logger.info("Sneaker config hot reload is off with more than one browser worker, restart to pick up changes to the sneaker file")
+        self.sneaker_events = SneakerEventStore([sneaker.url for sneaker in sneakers], clock=self.clock)
+        self.worker_stats = {}
+
+    def start_monitoring_sneakers(self):
+        '''
+        Starts every worker and blocks until they have all finished, logging their events as they come in
+        '''
+        cookies = self.logged_in_driver.get_cookies()
+        self.logger.info(f"Starting {self.worker_count} browser {self.mode} workers for {sum(len(shard) for shard in self.shards)} sneakers")
+
+        if self.mode == self.PROCESS_MODE:
+            workers = self._start_process_workers(cookies)
+        else:
+            workers = self._start_thread_workers(cookies)
+
+        while len(self.worker_stats) < self.worker_count:
+            try:
+                self._handle_event(self.events.get(timeout=1))
+            except queue.Empty:
+                # a worker that died without reporting should not hang the pool forever
+                if not any(worker.is_alive() for worker in workers):
+                    break
+
+        for worker in workers:
+            worker.join()
+        self._drain_events()
+
+        for worker_id, stats in sorted(self.worker_stats.items()):
+            self.logger.info(f"Worker {worker_id} stats: {stats}")
+
+    def get_purchase_logs(self):
+        return self.sneaker_events.get_messages()
+
+    def get_event_store(self):
+        return self.sneaker_events
+
+    def get_worker_stats(self):
+        return self.worker_stats
+
+    def _start_thread_workers(self, cookies):
+        workers = []
+        for worker_id, shard in enumerate(self.shards):
+            worker = threading.Thread(target=self._thread_worker, args=(worker_id, shard, cookies), name=f"browser_worker_{worker_id}")
+            worker.start()
+            workers.append(worker)
+        return workers
+
+    def _thread_worker(self, worker_id: int, shard, cookies):
+        owns_driver = worker_id != 0
+        driver = None
+        stats = {"worker_id": worker_id, "shoes": len(shard), "error": None}
+        try:
+            if owns_driver:
+                driver = new_session_driver(self.driver_factory, self.base_url, cookies)
+            else:
+                driver = self.logged_in_driver
+            # the logged in driver is shared with the NikePurchaser showing its messages on it, so it is not swapped out
+            stats = _run_worker(worker_id, driver, shard, self.events.put,
+                                driver_factory=(lambda: new_session_driver(self.driver_factory, self.base_url, cookies)) if owns_driver else None,
+                                clock=self.clock)
+        except Exception as e:
+            self.logger.error(f"Browser worker {worker_id} failed - {e}")
+            stats["error"] = str(e)
+        finally:
+            if owns_driver and driver:
+                _quit_driver(driver)
+            self.events.put((self.STATS_EVENT, worker_id, None, stats, self.clock.time()))
+
+    def _start_process_workers(self, cookies):
+        workers = []
+        for worker_id, shard in enumerate(self.shards):
+            if worker_id == 0:
+                # the logged in driver cannot be handed to another process, so it runs its shard on a thread here
+                worker = threading.Thread(target=self._thread_worker, args=(worker_id, shard, cookies), name="browser_worker_0")
+            else:
+                worker = multiprocessing.Process(target=_run_worker_process, args=(worker_id, shard, self.base_url, cookies, self.events),
+                                                 name=f"browser_worker_{worker_id}")
+            worker.start()
+            workers.append(worker)
+        return workers
+
+    def _drain_events(self):
+        while True:
+            try:
+                self._handle_event(self.events.get_nowait())
+            except queue.Empty:
+                return
+
+    def _handle_event(self, event):
+        kind, worker_id, sneaker_url, message, event_time = event
+        if kind == self.STATS_EVENT:
+            self.worker_stats[worker_id] = message
+            return
+
+        self.sneaker_events.add(message)
+        self.logger.info(f"[worker {worker_id}] {sneaker_url} - {message}")
@@ -1,26 +1,157 @@
+import atexit
+import datetime
+import json
 import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 LOG_TO_FILE = True
 LOG_TO_CONSOLE = True
 LOG_LEVEL = logging.INFO
 
+LOG_FILE = "local_logs.log"
+# Write the file as JSON lines, or the same plain lines as the console
+LOG_AS_JSON = True
+# Roll the file over to local_logs.log.1 ... once it gets this big
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# Every logger handed out hangs off this one so the handlers are only attached once per process
+ROOT_LOGGER_NAME = "sneaker_snagger"
+
+class JsonLinesFormatter(logging.Formatter):
+    '''
+    One JSON object per line, with the sneaker url and state when the log call passed them through extra=
+    '''
+
+    # Fields copied off the record when the log call set them
+    structured_fields = ("sneaker_url", "state", "stage")
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "monotonic": getattr(record, "monotonic", None),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.processName,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for field in self.structured_fields:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = getattr(value, "name", value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class MonotonicQueueHandler(QueueHandler):
+    '''
+    Hands records to the background writer, stamping them with time.monotonic() on the way so they line up with the
+    scheduler and stage timings
+    '''
+
+    def prepare(self, record):
+        record.monotonic = time.monotonic()
+        # The stock prepare formats and copies every record on the calling thread. The queue never leaves this process
+        # so the record can go as is, only args that might change before the writer gets to them are merged in now
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 class LocalLogging():
+    '''
+    Every logger logs onto an in memory queue and a single background thread per process does the slow console and
+    file writes, so logging from the checkout path never waits on the disk.
+    '''
+
+    _lock = threading.Lock()
+    _configured_pid = None
+    _listener = None
+
     @staticmethod
     def get_local_logger(logger_name: str):
-        logger = logging.getLogger(logger_name)
-        logger.setLevel(LOG_LEVEL)  # Set the logging level to INFO
+        LocalLogging._configure_process()
+        return logging.getLogger(f"{ROOT_LOGGER_NAME}.{logger_name}")
+
+    @staticmethod
+    def flush():
+        '''
+        Blocks until every record queued so far has been written, then keeps writing in the background
+        '''
+        with LocalLogging._lock:
+            if LocalLogging._listener and LocalLogging._configured_pid == os.getpid():
+                LocalLogging._listener.stop()
+                LocalLogging._listener.start()
+
+    @staticmethod
+    def shutdown():
+        '''
+        Writes out everything queued so far and closes the log files, the next get_local_logger sets them up again
+        '''
+        with LocalLogging._lock:
+            if LocalLogging._listener and LocalLogging._configured_pid == os.getpid():
+                LocalLogging._stop_listener(LocalLogging._listener)
+                for handler in LocalLogging._listener.handlers:
+                    handler.close()
+            LocalLogging._listener = None
+            LocalLogging._configured_pid = None
+
+    @staticmethod
+    def _configure_process():
+        with LocalLogging._lock:
+            if LocalLogging._configured_pid == os.getpid():
+                return
 
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            root_logger = logging.getLogger(ROOT_LOGGER_NAME)
+            root_logger.setLevel(LOG_LEVEL)
+            root_logger.propagate = False
+            # a forked worker inherits its parents handlers and a queue nobody in this process is listening to
+            for handler in list(root_logger.handlers):
+                root_logger.removeHandler(handler)
+
+            log_queue = queue.SimpleQueue()
+            root_logger.addHandler(MonotonicQueueHandler(log_queue))
+
+            LocalLogging._listener = QueueListener(log_queue, *LocalLogging._create_handlers(), respect_handler_level=True)
+            LocalLogging._listener.start()
+            LocalLogging._configured_pid = os.getpid()
+            atexit.register(LocalLogging._stop_listener, LocalLogging._listener)
+
+    @staticmethod
+    def _create_handlers():
+        handlers = []
+        plain_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         if LOG_TO_FILE:
-            file_handler = logging.FileHandler('local_logs.log', 'w')  # Log to a file named 'app.log'
-            file_handler.setLevel(LOG_LEVEL)  # Set the file handler level to INFO
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
+            log_file = LOG_FILE
+            # processes cannot share one rotating file, so worker processes each get their own
+            if multiprocessing.parent_process() is not None:
+                root, extension = os.path.splitext(LOG_FILE)
+                log_file = f"{root}.{multiprocessing.current_process().name}{extension}"
+            file_handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+            file_handler.setLevel(LOG_LEVEL)
+            file_handler.setFormatter(JsonLinesFormatter() if LOG_AS_JSON else plain_formatter)
+            handlers.append(file_handler)
 
         if LOG_TO_CONSOLE:
-            console_handler = logging.StreamHandler()  # Log to the console
-            console_handler.setLevel(logging.INFO)  # Set the console handler level to INFO
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.INFO)
+            console_handler.setFormatter(plain_formatter)
+            handlers.append(console_handler)
+        return handlers
 
-        return logger
+    @staticmethod
+    def _stop_listener(listener):
+        # only the process that started the listener can stop it, a forked child just has a copy of it
+        if LocalLogging._listener is listener and LocalLogging._configured_pid == os.getpid() and listener._thread is not None:
+            listener.stop()
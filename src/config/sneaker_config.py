@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+from src.config.local_logging import LocalLogging
+from src.utils.clock import SYSTEM_CLOCK
+from src.utils.size_grid import SizeGrid
+
+# What shoes_to_snag.json has to look like, keys besides these are logged and ignored
+SNEAKER_CONFIG_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "shoe_url": {"type": "string", "pattern": r"^\s*https?://[^\s/]+/\S*\s*$"},
+            "size": {"type": "string", "pattern": r"\S"},
+        },
+        "required": ["shoe_url", "size"],
+    },
+}
+
+class InvalidSneakerConfigException(Exception):
+    pass
+
+class SneakerConfigEntry():
+    '''
+    One sneaker to snag, compiled out of its config entry so nothing has to re-parse the url or size later
+    '''
+    __slots__ = ("url", "parsed_url", "slug", "size")
+
+    def __init__(self, shoe_url: str, size: str):
+        parsed_url = urlsplit(shoe_url.strip())
+        # scheme and host are case insensitive and the fragment never reaches the site, so they dont make it a new shoe
+        self.parsed_url = parsed_url._replace(scheme=parsed_url.scheme.lower(), netloc=parsed_url.netloc.lower(), fragment="")
+        self.url = urlunsplit(self.parsed_url)
+        self.slug = self.parsed_url.path.rstrip("/").rsplit("/", 1)[-1]
+        self.size = SizeGrid.normalize_size(size)
+
+    def __eq__(self, other):
+        return isinstance(other, SneakerConfigEntry) and self.url == other.url and self.size == other.size
+
+    def __hash__(self):
+        return hash((self.url, self.size))
+
+    def __repr__(self):
+        return f"SneakerConfigEntry({self.url}, size={self.size})"
+
+_validator = None
+_validator_lock = threading.Lock()
+
+def _get_validator():
+    # jsonschema takes a while to import and compile, only pay for it once and only when a file is actually read
+    global _validator
+    with _validator_lock:
+        if _validator is None:
+            from jsonschema import Draft7Validator
+            Draft7Validator.check_schema(SNEAKER_CONFIG_SCHEMA)
+            _validator = Draft7Validator(SNEAKER_CONFIG_SCHEMA)
+        return _validator
+
+def compile_sneakers(sneakers, source="sneaker config"):
+    '''
+    Validates raw sneaker entries and compiles them, entries that are already compiled are passed through. Keys the
+    schema does not know and urls listed more than once are only warned about, the first entry for an url is snagged
+    :param source: what to call the entries in error messages, e.g. the file they came from
+    :return: list of SneakerConfigEntry in the order they were given
+    :raises InvalidSneakerConfigException: listing every problem with the entries
+    '''
+    raw_entries = [sneaker for sneaker in sneakers if not isinstance(sneaker, SneakerConfigEntry)]
+    problems = []
+    for error in sorted(_get_validator().iter_errors(raw_entries), key=lambda error: list(error.path)):
+        location = "/".join(str(part) for part in error.path) or "top level"
+        problems.append(f"{location}: {error.message}")
+    if problems:
+        raise InvalidSneakerConfigException(f"Invalid {source} - " + "; ".join(problems))
+
+    logger = LocalLogging.get_local_logger("sneaker_config")
+    known_keys = SNEAKER_CONFIG_SCHEMA["items"]["properties"].keys()
+    entries = []
+    seen_urls = set()
+    for index, sneaker in enumerate(sneakers):
+        if isinstance(sneaker, SneakerConfigEntry):
+            entry = sneaker
+        else:
+            unknown_keys = sorted(set(sneaker) - known_keys)
+            if unknown_keys:
+                logger.warning(f"{source} entry {index} has keys that are not used, ignoring them - {unknown_keys}")
+            entry = SneakerConfigEntry(sneaker["shoe_url"], sneaker["size"])
+        if entry.url in seen_urls:
+            logger.warning(f"{source} lists {entry.url} more than once, only its first entry is snagged")
+            continue
+        seen_urls.add(entry.url)
+        entries.append(entry)
+    return entries
+
+def load_sneaker_config(sneaker_file: Path):
+    '''
+    Reads the sneakers to snag and validates them against SNEAKER_CONFIG_SCHEMA
+    :return: list of SneakerConfigEntry in the order they are in the file
+    :raises InvalidSneakerConfigException: if the file is not valid json or does not match the schema
+    '''
+    with open(sneaker_file, "r") as f:
+        try:
+            sneakers = json.load(f)
+        except json.JSONDecodeError as e:
+            raise InvalidSneakerConfigException(f"{sneaker_file} is not valid json - {e}")
+
+    if not isinstance(sneakers, list):
+        raise InvalidSneakerConfigException(f"Expected {sneaker_file} to hold a list of sneakers")
+    return compile_sneakers(sneakers, str(sneaker_file))
+
+class SneakerConfigWatcher():
+    '''
+    Polls the sneaker file for changes and hands what changed to a callback, so shoes can be added or retired on a
+    running process without logging in again. An edit that does not validate is logged and ignored, the last good
+    config stays in place.
+    '''
+
+    __POLL_SECONDS = 1.0
+
+    def __init__(self, sneaker_file: Path, entries, on_change, poll_seconds: float = None, clock=None):
+        '''
+        :param entries: the SneakerConfigEntry list currently being monitored
+        :param on_change: callable(added entries, retired urls, resized entries) run on the watcher thread
+        '''
+        self.sneaker_file = Path(sneaker_file)
+        self.entries = {entry.url: entry for entry in entries}
+        self.on_change = on_change
+        self.poll_seconds = poll_seconds or self.__POLL_SECONDS
+        self.clock = clock or SYSTEM_CLOCK
+        self.logger = LocalLogging.get_local_logger("sneaker_config_watcher")
+        self._last_stat = self._stat()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="sneaker_config_watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self._thread = None
+
+    def check(self) -> bool:
+        '''
+        Reloads the file if it changed since the last check
+        :return: true if the monitored sneakers changed
+        '''
+        stat = self._stat()
+        if stat == self._last_stat:
+            return False
+        self._last_stat = stat
+
+        try:
+            entries = load_sneaker_config(self.sneaker_file)
+        except Exception as e:
+            self.logger.error(f"Ignoring change to {self.sneaker_file}, keeping the previous sneakers - {e}")
+            return False
+
+        new_entries = {entry.url: entry for entry in entries}
+        added = [entry for url, entry in new_entries.items() if url not in self.entries]
+        retired = [url for url in self.entries if url not in new_entries]
+        resized = [entry for url, entry in new_entries.items() if url in self.entries and self.entries[url].size != entry.size]
+        self.entries = new_entries
+        if not (added or retired or resized):
+            return False
+
+        self.logger.info(f"{self.sneaker_file} changed: {len(added)} added, {len(retired)} retired, {len(resized)} resized")
+        self.on_change(added, retired, resized)
+        return True
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.sneaker_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _run(self):
+        while not self.clock.wait(self._stop_event, self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Sneaker config watcher failed to apply a change - {e}")
@@ -0,0 +1,163 @@
+import hashlib
+import html
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+from src.config.local_logging import LocalLogging
+from src.utils.clock import SYSTEM_CLOCK
+
+class ReleaseObservation():
+    '''
+    What a single plain HTTP fetch of a product page said about its release
+    '''
+    __slots__ = ("url", "availability_text", "release_dt", "content_hash", "changed", "error")
+
+    def __init__(self, url: str, availability_text=None, release_dt=None, content_hash=None, changed=False, error=None):
+        self.url = url
+        self.availability_text = availability_text
+        # timezone aware release time, None if the page did not show one we could parse
+        self.release_dt = release_dt
+        self.content_hash = content_hash
+        # whether the release time differs from the previous observation of this url
+        self.changed = changed
+        self.error = error
+
+    def __repr__(self):
+        return f"ReleaseObservation(url={self.url}, release_dt={self.release_dt}, changed={self.changed}, error={self.error})"
+
+class HttpReleaseMonitor():
+    '''
+    Watches product pages before their release with a pooled plain HTTP client instead of a browser tab. A tab costs
+    a whole renderer process for days just to read the availability banner once, where this costs one small request
+    per check. Shoes are handed over to a browser tab once they get close to their release.
+    '''
+
+    __MAX_CONNECTIONS_PER_HOST = 8
+    __REQUEST_TIMEOUT_SECONDS = 10
+    __FETCH_THREADS = 8
+
+    __availability_pattern = re.compile(r"<div[^>]*\bclass=[\"']available-date-component[\"'][^>]*>(.*?)</div>", re.IGNORECASE | re.DOTALL)
+    __tag_pattern = re.compile(r"<[^>]+>")
+    __whitespace_pattern = re.compile(r"\s+")
+
+    # Look like the browser the tabs would have been, the site serves bots a different page
+    __default_headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9",
+    }
+
+    def __init__(self, parse_release, headers: dict = None, clock=None):
+        '''
+        :param parse_release: callable that turns availability text into a timezone aware datetime or raises
+        '''
+        self.parse_release = parse_release
+        self.clock = clock or SYSTEM_CLOCK
+        self.logger = LocalLogging.get_local_logger("http_release_monitor")
+        self.http = urllib3.PoolManager(
+            maxsize=self.__MAX_CONNECTIONS_PER_HOST,
+            block=True,
+            headers=headers or self.__default_headers,
+            timeout=urllib3.Timeout(total=self.__REQUEST_TIMEOUT_SECONDS),
+            retries=urllib3.Retry(total=2, backoff_factor=0.5),
+        )
+        self.executor = ThreadPoolExecutor(max_workers=self.__FETCH_THREADS, thread_name_prefix="http_release_monitor")
+
+        # url -> last ReleaseObservation
+        self.observations = {}
+        self._watched_urls = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._watch_thread = None
+
+    def check(self, url: str) -> ReleaseObservation:
+        '''
+        Fetches the product page and reads its release time, marking the observation as changed if it moved
+        '''
+        try:
+            response = self.http.request("GET", url)
+            if response.status >= 400:
+                raise Exception(f"Got status {response.status}")
+            page_html = response.data.decode(errors="replace")
+        except Exception as e:
+            observation = ReleaseObservation(url, error=f"Unable to fetch {url} - {e}")
+            with self._lock:
+                self.observations.setdefault(url, observation)
+            return observation
+
+        availability_text = self.extract_availability_text(page_html)
+        release_dt = None
+        error = None
+        if availability_text:
+            try:
+                release_dt = self.parse_release(availability_text)
+            except Exception as e:
+                error = f"Unable to parse availability text {availability_text} - {e}"
+
+        with self._lock:
+            previous = self.observations.get(url)
+            changed = previous is not None and previous.release_dt != release_dt
+            observation = ReleaseObservation(url, availability_text, release_dt,
+                                             hashlib.blake2b(page_html.encode(), digest_size=16).hexdigest(), changed, error)
+            self.observations[url] = observation
+        return observation
+
+    def check_many(self, urls):
+        '''
+        Checks every url concurrently over the shared connection pool
+        :return: list of observations in the same order as urls
+        '''
+        return list(self.executor.map(self.check, urls))
+
+    @classmethod
+    def extract_availability_text(cls, page_html: str):
+        '''
+        :return: text of the first available-date-component on the page or None if there is not one
+        '''
+        match = cls.__availability_pattern.search(page_html)
+        if not match:
+            return None
+        text = html.unescape(cls.__tag_pattern.sub(" ", match.group(1)))
+        return cls.__whitespace_pattern.sub(" ", text).strip() or None
+
+    def watch(self, url: str):
+        with self._lock:
+            self._watched_urls.add(url)
+
+    def unwatch(self, url: str):
+        with self._lock:
+            self._watched_urls.discard(url)
+
+    def start_watching(self, interval_seconds: float, on_change):
+        '''
+        Re-checks every watched url on a background thread every interval_seconds
+        :param on_change: callable that is given each observation whose release time moved
+        '''
+        if self._watch_thread:
+            return
+        self._stop_event.clear()
+        self._watch_thread = threading.Thread(target=self._watch_loop, args=(interval_seconds, on_change), name="http_release_watcher", daemon=True)
+        self._watch_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._watch_thread:
+            self._watch_thread.join()
+        self._watch_thread = None
+        self.executor.shutdown(wait=False)
+        self.http.clear()
+
+    def _watch_loop(self, interval_seconds: float, on_change):
+        while not self.clock.wait(self._stop_event, interval_seconds):
+            with self._lock:
+                urls = list(self._watched_urls)
+            for observation in self.check_many(urls):
+                if observation.changed:
+                    self.logger.info(f"Release time for {observation.url} changed to {observation.release_dt}")
+                    try:
+                        on_change(observation)
+                    except Exception as e:
+                        self.logger.error(f"Release change listener raised an exception - {e}")
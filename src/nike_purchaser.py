@@ -1,16 +1,21 @@
-import json
 import traceback
-from multiprocessing import Process
 from pathlib import Path
 
-from bs4 import BeautifulSoup
-
 from selenium.webdriver.remote.webdriver import BaseWebDriver
-from selenium.webdriver.common.by import By
-import time
 
+from local_config import LocalConfig
+from src.async_sneaker_purchase_process import AsyncSneakerPurchaseProcess
+from src.browser_worker_pool import BrowserWorkerPool, new_session_driver
 from src.config.local_logging import LocalLogging
 from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.utils.clock import SYSTEM_CLOCK
+from src.utils.driver_executor import DriverExecutor
+from src.utils.driver_tracing import trace_driver
+from src.utils.key_channel import MessageOverlay, open_key_channel
+from src.utils.page_state import PageStateExtractor
+from src.utils.tab_focus import TabFocus
+from src.utils.wait_conditions import ReadinessWaiter, network_idle
+from src.utils.web_driver_factory import WebDriverFactory
 
 class NikePurchaser():
     '''
@@ -23,60 +28,44 @@ class NikePurchaser():
     shipping_account_url = "https://www.nike.com/member/settings/delivery-addresses"
     display_element_id = "nike-helper-custom-message-box"
 
-    desktop_nav_list_xpath = "//ul[@class='desktop-list']"
     address_name_xpath = "//div[@data-testid='address-item']/div/div"
 
+    # How long to wait for the user to do something on the message tab before re-rendering it, when their key presses
+    # are pushed to us anything that changes the message wakes us up so it is only a fallback
+    __USER_INPUT_TIMEOUT_SECONDS = 1
+    __PUSHED_USER_INPUT_TIMEOUT_SECONDS = 30
+    __USER_INPUT_POLL_SECONDS = 0.1
+    # How long the account settings pages get to finish loading their javascript
+    __SETTINGS_PAGE_TIMEOUT_SECONDS = 10
 
-    # JavaScript to track clicks with Shift key pressed
-    __messanger_script = """
-        if (!document.getElementById('{elem_id}')) {{
-            // Create status container
-            const statusDiv = document.createElement('div');
-            statusDiv.id = '{elem_id}'
-            statusDiv.style.position = 'fixed';
-            statusDiv.style.top = '50%';
-            statusDiv.style.left = '50%';
-            statusDiv.style.backgroundColor = '{color}';
-            statusDiv.style.transform = 'translate(-50%, -50%)';
-            statusDiv.style.padding = '10px';
-            statusDiv.style.zIndex = '9999';
-            statusDiv.innerHTML = '{msg}';
-            document.body.appendChild(statusDiv);
-        }}
-   """
-
-    # Inject JavaScript to monitor button clicks
-    monitoring_script = """
-    // Global array to store key presses
-    window.keyEvents = [];
-    
-    // Function to log key presses
-    function logKeyPress(event) {
-        window.keyEvents.push({
-            key: event.key,
-            code: event.code,
-            shift: event.shiftKey,
-            ctrl: event.ctrlKey,
-            alt: event.altKey,
-            meta: event.metaKey
-        });
-    }
-    
-    // Attach event listener to the document
-    document.addEventListener('keydown', logKeyPress, true); // Use capturing phase
-    """
-
-    def __init__(self, driver: BaseWebDriver, shoes_file_path: Path):
-        self.driver = driver
+
+    def __init__(self, driver: BaseWebDriver, shoes_file_path: Path, sneakers=None, clock=None):
+        '''
+        :param sneakers: the sneakers already loaded out of shoes_file_path, read from the file when not given
+        :param clock: clock every wait runs on, handed down to the purchaser, defaults to the real one
+        '''
+        self.driver = trace_driver(driver) if LocalConfig.DRIVER_TRACING else driver
         self.shoes_file_path = shoes_file_path
+        self.sneakers = sneakers
         self.logger = LocalLogging.get_local_logger("Nike_Purchaser")
+        self.page_state_extractor = PageStateExtractor(self.driver)
+        self.clock = clock or SYSTEM_CLOCK
+        self.waiter = ReadinessWaiter(self.driver, clock=self.clock)
+        # shared with the purchaser we hand the driver to, so neither switches to a tab the driver is already on
+        self.tab_focus = TabFocus(self.driver, self.clock)
         self.message_tab = self.driver.current_window_handle
+        self.tab_focus.current = self.message_tab
         self.execution_tab = None # this is the tab that the user will login too and we will use to snag
         self.failed_login = False
-        self.purchase_process = None
-        self.driver.get(self.base_url)
+        self.purchaser = None # either a SneakerPurchaseProcess or a BrowserWorkerPool once we are ready to snag
+        self.driver_calls = None # the DriverExecutor every driver call goes through when running on an event loop
+        # an attached browser might already be sitting on the site from the last run
+        if not self.driver.current_url.startswith(self.base_url):
+            self.driver.get(self.base_url)
 
-        self.last_message = ""
+        # what the message tab shows, only re-rendered when the message changes
+        self.overlay = MessageOverlay(self.driver, NikePurchaser.display_element_id)
+        self.key_channel = None # opened on the message tab the first time we read from it
 
         self.states = ["INIT", "LOGGING_IN", "PAYMENT_REQUIRED", "DEFAULT_ADDRESS_REQUIRED", "READY_TO_SNAG"]
         self.state = self.states[0]
@@ -104,45 +93,149 @@ class NikePurchaser():
         max_bad_attempts = 5
 
         while bad_attempts < max_bad_attempts:
-            current_tab = self.driver.current_window_handle
+            script_failed, key_handled = self._read_user_input()
+            if script_failed:
+                bad_attempts += 1
 
-            # Handle the user returning to the original message tab
-            if current_tab == self.message_tab:
-                self._display_state_message()
+            # If we started the purchase process then we can exit this loop and just chill
+            if key_handled and self.purchaser:
+                self.logger.info(f"Starting purchase process LETS GO!")
                 try:
-                    # Allow the user to tell the program things via entering keys on the message tab
-                    key_events = self.driver.execute_script("return window.keyEvents;")
-                    if key_events == None:
-                        try:
-                            self.driver.execute_script(NikePurchaser.monitoring_script)
-                        except Exception as scriptException:
-                            self.logger.error(f"Unable to execute script which tracks input! Defaulting to just running snagging! - {scriptException}")
-                            bad_attempts += 1
-                    elif len(key_events) > 0:
-                        key_code_pressed = key_events[0]['code']
-                        self._handle_user_interaction(key_code_pressed)
-                        # clear the key events.
-                        self.driver.execute_script("window.keyEvents = [];")
-                        # If we started the purchase process then we can exit this loop and just chill
-                        if self.purchaser:
-                            self.logger.info(f"Starting purchase process LETS GO!")
-                            try:
-                                self.purchaser.start_monitoring_sneakers()
-                                break
-                            except Exception as purchaser_exception:
-                                self.logger.error(f"Unable to run purchaser threads!! - {purchaser_exception}")
-
-                except Exception as scriptException:
-                    self.logger.error(f"Unable to execute script which tracks input! Defaulting to just running snagging! - {scriptException}")
-
-            time.sleep(1)  # Check every 500ms
+                    self.purchaser.start_monitoring_sneakers()
+                    break
+                except Exception as purchaser_exception:
+                    self.logger.error(f"Unable to run purchaser threads!! - {purchaser_exception}")
+                finally:
+                    self._finish_purchaser_run()
+
+            # Wake up as soon as a key is pressed instead of sleeping a fixed second
+            key_channel = self._open_key_channel()
+            key_channel.wait(self._user_input_timeout(key_channel))
+        self._close_key_channel()
+
+    async def setup_for_monitoring_async(self):
+        '''
+        setup_for_monitoring on the running event loop, the user input watcher, its waits and an asyncio purchaser all
+        share the loop and go through one DriverExecutor so the driver is still only used from one thread
+        '''
+        self.driver_calls = DriverExecutor(clock=self.clock)
+        try:
+            await self._wait_for_user_input_async()
+        finally:
+            self.driver_calls.shutdown()
+
+    async def _wait_for_user_input_async(self):
+        self.state = "LOGGING_IN"
+        bad_attempts = 0
+        max_bad_attempts = 5
+
+        while bad_attempts < max_bad_attempts:
+            script_failed, key_handled = await self.driver_calls.call(self._read_user_input)
+            if script_failed:
+                bad_attempts += 1
+
+            if key_handled and self.purchaser:
+                self.logger.info(f"Starting purchase process LETS GO!")
+                try:
+                    if isinstance(self.purchaser, AsyncSneakerPurchaseProcess):
+                        await self.purchaser.monitor_async(self.driver_calls)
+                    else:
+                        # a worker pool or the threaded engine blocks, so give it the driver thread until it is done
+                        await self.driver_calls.call(self.purchaser.start_monitoring_sneakers)
+                    break
+                except Exception as purchaser_exception:
+                    self.logger.error(f"Unable to run purchaser threads!! - {purchaser_exception}")
+                finally:
+                    self._finish_purchaser_run()
+
+            key_channel = await self.driver_calls.call(self._open_key_channel)
+            await key_channel.wait_async(self._user_input_timeout(key_channel), self.driver_calls)
+        await self.driver_calls.call(self._close_key_channel)
+
+    def _read_user_input(self):
+        '''
+        Shows the message for the current state on the message tab and handles the first key the user pressed on it
+        :return: tuple of whether the script that tracks input could not be added, and whether a key was handled
+        '''
+        key_channel = self._open_key_channel()
+        current_tab = self.tab_focus.current
+        if current_tab is None:
+            # something switched tabs without telling tab_focus, ask the driver once where it is
+            current_tab = self.tab_focus.current = self.driver.current_window_handle
+
+        # Handle the user returning to the original message tab
+        if current_tab != self.message_tab:
+            return False, False
+
+        try:
+            # Allow the user to tell the program things via entering keys on the message tab
+            key_codes, page_changed = key_channel.take()
+        except Exception as scriptException:
+            self.logger.error(f"Unable to execute script which tracks input! Defaulting to just running snagging! - {scriptException}")
+            return False, False
+        if page_changed:
+            # a reloaded page lost the message box and whatever was listening for keys
+            self.overlay.invalidate()
+            try:
+                key_channel.listen()
+            except Exception as scriptException:
+                self.logger.error(f"Unable to execute script which tracks input! Defaulting to just running snagging! - {scriptException}")
+                return True, False
+
+        self._display_state_message()
+        if key_codes:
+            self._handle_user_interaction(key_codes[0])
+            return False, True
+        return False, False
+
+    def _open_key_channel(self):
+        '''
+        :return: the channel key presses on the message tab come in on, a push channel that lost its connection is
+            swapped for polling
+        '''
+        if self.key_channel is not None and self.key_channel.listening():
+            return self.key_channel
+        push = LocalConfig.PUSH_KEY_EVENTS
+        if self.key_channel is not None:
+            self.logger.error("Lost the devtools connection to the message tab, polling it for keys from now on")
+            push = False
+        self.key_channel = open_key_channel(self.driver, self.waiter, self.tab_focus, self.message_tab, push,
+                                            poll_seconds=self.__USER_INPUT_POLL_SECONDS)
+        # whatever the channel, the page has to be rendered fresh for it
+        self.overlay.invalidate()
+        return self.key_channel
+
+    def _close_key_channel(self):
+        if self.key_channel is None:
+            return
+        self.logger.info(f"Message tab stats: {dict(self.key_channel.get_stats(), **self.overlay.get_stats())}")
+        self.key_channel.stop()
+        self.key_channel = None
+
+    def _user_input_timeout(self, key_channel) -> float:
+        return self.__PUSHED_USER_INPUT_TIMEOUT_SECONDS if key_channel.pushes else self.__USER_INPUT_TIMEOUT_SECONDS
+
+    def _finish_purchaser_run(self):
+        self.logger.info(f"Window switch stats: {self.tab_focus.get_switch_stats()}")
+        self._dump_driver_trace()
+
+    def _dump_driver_trace(self):
+        if not LocalConfig.DRIVER_TRACING:
+            return
+        try:
+            trace_file = self.driver.tracer.dump(LocalConfig.resolve_path(LocalConfig.DRIVER_TRACE_FILE))
+            self.logger.info(f"Wrote driver latency trace to {trace_file}")
+        except Exception as e:
+            self.logger.error(f"Unable to write driver latency trace - {e}")
 
     def _display_state_message(self, error_msg=None):
         if self.state == "LOGGING_IN":
             if self.failed_login:
                 self._show_user_message("You indicated that you have logged in on another tab, however we couldnt see any tab where you were logged in! Make sure you see your account name like \"Hi Caleb\" in the top right on one tab other than this one and try again!", "red")
             else:
-                if len(self.driver.window_handles) <= 1:
+                # a push channel keeps count of the tabs as they open, polling has to ask the driver
+                tab_count = self.key_channel.tab_count() if self.key_channel else None
+                if (tab_count if tab_count is not None else len(self.driver.window_handles)) <= 1:
                     self._show_user_message("You need to Open a new tab, and log in. Then return to this page for more instructions!" )
                 else:
                     self._show_user_message("If you are having trouble logging in, open a new tab and try again. Once you are logged in on a tab, leave it open and return to this tab. A:Press Enter to tell the program you have finished logging in.", "blue")
@@ -173,7 +266,45 @@ class NikePurchaser():
             elif self.state == "DEFAULT_ADDRESS_REQUIRED":
                 self.state = "DEFAULT_ADDRESS_REQUIRED" if self._require_default_shipping_address() else "READY_TO_SNAG"
             elif self.state == "READY_TO_SNAG":
-                self.purchaser = SneakerPurchaseProcess(self.driver, self.shoes_file_path)
+                self.purchaser = self._create_purchaser()
+
+    def _create_purchaser(self):
+        '''
+        Snags everything on this driver, or splits the sneakers over a pool of browsers that share the logged in session
+        '''
+        sneakers = self.sneakers if self.sneakers is not None else SneakerPurchaseProcess.load_sneakers(self.shoes_file_path)
+        if LocalConfig.BROWSER_WORKERS <= 1:
+            engine = AsyncSneakerPurchaseProcess if LocalConfig.MONITORING_ENGINE == "asyncio" else SneakerPurchaseProcess
+            # if the browser dies mid run it is rebuilt with the session the user is logged in with right now
+            if self.execution_tab:
+                self.tab_focus.focus(self.execution_tab)
+            cookies = self.driver.get_cookies()
+            purchaser = engine(self.driver, self.shoes_file_path, sneakers=sneakers, clock=self.clock, tab_focus=self.tab_focus,
+                               driver_factory=lambda: new_session_driver(WebDriverFactory().get_chrome_web_driver, self.base_url, cookies))
+            purchaser.add_driver_listener(self._driver_replaced)
+            return purchaser
+
+        # the pool copies the session from whatever tab the driver is on, so make sure it is the logged in one
+        if self.execution_tab:
+            self.tab_focus.focus(self.execution_tab)
+        return BrowserWorkerPool(sneakers, LocalConfig.BROWSER_WORKERS, self.driver, self.base_url, LocalConfig.BROWSER_WORKER_MODE,
+                                 clock=self.clock)
+
+    def _driver_replaced(self, driver):
+        '''
+        Moves over to the browser the purchaser rebuilt after ours died, the tab it starts on shows the messages from now on
+        '''
+        self.driver = driver
+        self.page_state_extractor = PageStateExtractor(driver)
+        self.waiter.driver = driver
+        self.message_tab = driver.current_window_handle
+        self.execution_tab = None
+        self.tab_focus.current = self.message_tab
+        # the old browser took its message box and devtools connection with it
+        self.overlay = MessageOverlay(driver, NikePurchaser.display_element_id)
+        if self.key_channel is not None:
+            self.key_channel.stop()
+            self.key_channel = None
 
     def _show_user_message(self, user_msg: str, color="green"):
         '''
@@ -183,76 +314,59 @@ class NikePurchaser():
         :return:
         '''
         try:
-            display_element = self.driver.find_element(By.ID, NikePurchaser.display_element_id)
-            # Avoid trying to display the same message over and over again
-            if display_element.text == user_msg:
-                return
-        except Exception:
-            display_element = None
-
-        try:
-            if not display_element: #If the page doesnt have the element yet, add it
-                escaped_msg = json.dumps(user_msg)
-                self.driver.execute_script(
-                    NikePurchaser.__messanger_script.format(
-                        elem_id=NikePurchaser.display_element_id,
-                        color=color,
-                        msg=escaped_msg
-                    )
-                )
-                self.driver.execute_script(NikePurchaser.__messanger_script.format(elem_id=NikePurchaser.display_element_id, color=color, msg=user_msg))
-                self.last_message = user_msg
-            else: # The page has the element, so grab it and update its color and message
-                escaped_msg = json.dumps(user_msg)
-                self.driver.execute_script(f"document.getElementById('{NikePurchaser.display_element_id}').innerHTML = {escaped_msg};")
-                self.driver.execute_script(f"document.getElementById('{NikePurchaser.display_element_id}').style.backgroundColor = '{color}';")
-                self.last_message = user_msg
+            self.overlay.render(user_msg, color)
         except Exception as display_exception:
+            # the page may be half loaded, render it again next time around
+            self.overlay.invalidate()
             self.logger.error(display_exception)
             self.logger.error(traceback.format_exc())
             return None
 
-
     def _requires_login(self):
         '''
         Cycles through all tabs but our "message Tab" and checks if they are on the nike domain, if so checks if any of them
         are logged in. When one is finally logged in, it will attempt to store that tab as the "execution tab"
         '''
 
-        # cycle through all the tabs only considering ones that
-        for tab in self.driver.window_handles:
+        # Assume nothing until we actually see a logged in tab
+        self.failed_login = True
+
+        # cycle through all the tabs only considering ones that, the one that was logged in last time is the best bet so it goes first
+        tabs = self.driver.window_handles
+        if self.execution_tab in tabs:
+            tabs.remove(self.execution_tab)
+            tabs.insert(0, self.execution_tab)
+        for tab in tabs:
 
             # The idea is the message tab is untouched
             if tab == self.message_tab:
                 continue
 
             try:
-                self.driver.switch_to.window(tab)
-                if "nike.com" in self.driver.current_url: #only consider tabs that the user went too.
-                    desktop_nav = self.driver.find_element(By.XPATH, self.desktop_nav_list_xpath)
-                    list_elements = desktop_nav.find_elements(By.XPATH, "./li")
-                # 3 elements means they have logged in
-                if len(list_elements) == 3:
+                self.tab_focus.focus(tab)
+                if "nike.com" not in self.driver.current_url: #only consider tabs that the user went too.
+                    continue
+
+                # 3 nav elements means they have logged in, 4 means they have not
+                page_state = self.page_state_extractor.get_state(tab)
+                if page_state.logged_in:
                     self.logger.info("Found that the user is logged in!")
                     self.execution_tab = tab
                     self.failed_login = False
                     # Break early, we dont need to consider the other tabs
                     break
-                elif len(list_elements) == 4:
+                elif page_state.logged_in is False:
                     self.logger.info("Found that the user is NOT logged in!")
-                    self.failed_login = True
                 else:
-                    self.logger.error(f"Unable to determine if the user is logged in or not! Found {len(list_elements)} elements in the nav elememnt")
-                    self.failed_login = True
+                    self.logger.error(f"Unable to determine if the user is logged in or not! Found {page_state.nav_item_count} elements in the nav elememnt")
             except Exception as e:
                 self.logger.error("Script is broken, unable to find login element, maybe we dont need to be checking at this point?")
-                self.failed_login = True
 
-        self.driver.switch_to.window(self.message_tab)
+        self.tab_focus.focus(self.message_tab)
 
     def _require_default_payment_method(self):
         '''
-        goes to the user setting after they have been logged in, and makes sure that there is BS4 Tag that reads
+        goes to the user setting after they have been logged in, and makes sure that there is a Tag that reads
         "Default Payment Method", if not displays a message to the user that one must be set
         :return: the the user account has had its default payment method set on the session
         '''
@@ -260,32 +374,27 @@ class NikePurchaser():
             self.logger.error("Unable to check if default payment method is set as there is not an execution tab created yet!")
             return False
 
-        self.driver.switch_to.window(self.execution_tab)
-        time.sleep(.5)
+        self.tab_focus.focus(self.execution_tab)
 
         # Janky but not checking login
         self.driver.get(NikePurchaser.payment_account_url)
-        time.sleep(.5)
-        page_html = self.driver.page_source
-        soup = BeautifulSoup(page_html, 'html.parser')
+        self._wait_for_settings_page("payment_settings_page")
         payment_set = False
 
-        # Remove all the heavy strings that likely load with javascript
+        # Looks for a tag that reads "Default Payment Method" in one pass over the page
         try:
-            default_payment_method_tag = soup.find(lambda tag: tag and tag.get_text().casefold() == "Default Payment Method".casefold())
-            if default_payment_method_tag:
-                payment_set = True
+            payment_set = self.page_state_extractor.get_state(self.execution_tab).default_payment_set
         except Exception as e:
-            self.logger(e)
+            self.logger.error(e)
             self.logger.error(traceback.format_exc())
             payment_set = False
 
-        self.driver.switch_to.window(self.message_tab)
+        self.tab_focus.focus(self.message_tab)
         return not payment_set
 
     def _require_default_shipping_address(self):
         '''
-        goes to the user setting after they have been logged in, and makes sure that there is BS4 Tag that reads
+        goes to the user setting after they have been logged in, and makes sure that there is a Tag that reads
         "Default Delivery Address", if not displays a message to the user that one must be set
         :return: the the user account has had its default payment method set on the session
         '''
@@ -293,25 +402,27 @@ class NikePurchaser():
             self.logger.error("Unable to check if default shipping address is set as there is not an execution tab created yet!")
             return False
 
-        self.driver.switch_to.window(self.execution_tab)
-        time.sleep(.5)
+        self.tab_focus.focus(self.execution_tab)
 
         # Janky but not checking login
         self.driver.get(NikePurchaser.shipping_account_url)
-        time.sleep(.5)
-        page_html = self.driver.page_source
-        soup = BeautifulSoup(page_html, 'html.parser')
+        self._wait_for_settings_page("shipping_settings_page")
         default_address_set = False
 
-        # Remove all the heavy strings that likely load with javascript
+        # Looks for a tag that reads "Default Delivery Address" in one pass over the page
         try:
-            default_shipping_address_tag = soup.find(lambda tag: tag and tag.get_text().casefold() == "Default Delivery Address".casefold())
-            if default_shipping_address_tag:
-                default_address_set = True
+            default_address_set = self.page_state_extractor.get_state(self.execution_tab).default_address_set
         except Exception as e:
-            self.logger(e)
+            self.logger.error(e)
             self.logger.error(traceback.format_exc())
             default_address_set = False
 
-        self.driver.switch_to.window(self.message_tab)
-        return not default_address_set
\ No newline at end of file
+        self.tab_focus.focus(self.message_tab)
+        return not default_address_set
+
+    def _wait_for_settings_page(self, step: str):
+        '''
+        The settings pages fill themselves in with javascript after loading, so wait for the network to go quiet
+        '''
+        if not self.waiter.until_or_none(network_idle(), self.__SETTINGS_PAGE_TIMEOUT_SECONDS, step=step):
+            self.logger.error(f"Settings page for {step} did not finish loading in time, checking it anyways")
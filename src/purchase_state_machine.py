@@ -0,0 +1,372 @@
+import datetime
+from abc import ABC, abstractmethod
+from enum import Enum
+
+from src.config.local_logging import LocalLogging
+from src.utils.event_store import SneakerEventCode
+from src.utils.release_time_parser import ReleaseTimeParseException
+
+class PurchaseState(Enum):
+    NOT_STARTED = 1
+    PRE_RELEASE = 2
+    NEAR_RELEASE = 3
+    RELEASED = 4
+    PURCHASED = 5
+    ERROR = 6
+
+class PageObservation(Enum):
+    # The page still shows when the sneaker will be available
+    RELEASE_SHOWN = 1
+    # The availability banner is gone (or could not be found), so it might be purchasable
+    RELEASE_GONE = 2
+    # The banner is there but its text is not a release time we know how to read, e.g. the site changed its wording
+    RELEASE_UNREADABLE = 3
+
+class WakeupPolicy(Enum):
+    NONE = 0
+    # Some minutes before the release so we are on the page and refreshing when it drops
+    BEFORE_RELEASE = 1
+    # Exactly when the release is, on the sites clock, or as close after it as the page can be reloaded again
+    AT_RELEASE = 2
+    # As soon as we allow ourselves to refresh again
+    SOON = 3
+    # Again once reloading could show something new, for a page that should have shown the sneaker released by now
+    RETRY_RELEASE = 4
+    # Later every time in a row the page could not be read, so a page we will never read is not hammered
+    BACKOFF = 5
+
+class Transition():
+    '''
+    Row of the transition table, what to move to and do when a sneaker in some state makes some observation
+    '''
+    __slots__ = ("next_state", "wakeup", "purchase", "purchase_retries", "event_code")
+
+    def __init__(self, next_state: PurchaseState, wakeup: WakeupPolicy = WakeupPolicy.NONE, purchase: bool = False,
+                 purchase_retries: int = None, event_code: SneakerEventCode = None):
+        '''
+        :param purchase_retries: how many failed purchases are retried, None means the machine's maximum
+        '''
+        self.next_state = next_state
+        self.wakeup = wakeup
+        self.purchase = purchase
+        self.purchase_retries = purchase_retries
+        self.event_code = event_code
+
+class PageActions(ABC):
+    '''
+    Everything the state machine needs done to a sneakers page, implemented on a real driver by SneakerTabActions and
+    on simulated pages by the load test
+    '''
+
+    @abstractmethod
+    def load(self, sneaker_url: str, state: PurchaseState) -> bool:
+        '''
+        Gets the page showing what the site says right now, e.g. by opening or reloading its tab
+        :return: false if the page could not be loaded at all
+        '''
+
+    @abstractmethod
+    def read_release(self, sneaker_url: str):
+        '''
+        :return: the timezone aware release datetime the page shows, None if it does not show one
+        :raises ReleaseTimeParseException: if the page shows a release time that cannot be read
+        '''
+
+    @abstractmethod
+    def purchase(self, sneaker_url: str, attempt: int) -> bool:
+        '''
+        :return: true if the sneaker was purchased
+        '''
+
+    @abstractmethod
+    def schedule_wakeup_at(self, sneaker_url: str, server_dt: datetime.datetime) -> float:
+        '''
+        :return: how many seconds from now the wake-up will be
+        '''
+
+    @abstractmethod
+    def schedule_wakeup(self, sneaker_url: str, wait_seconds: float):
+        pass
+
+    @abstractmethod
+    def record(self, sneaker_url: str, code: SneakerEventCode, **payload):
+        pass
+
+    def schedule_release_reload(self, sneaker_url: str, release_dt: datetime.datetime, retry_seconds: float) -> float:
+        '''
+        Schedules the reload that should see the sneaker released, at the release, or in retry_seconds once it passed
+        :return: how many seconds from now the wake-up will be
+        '''
+        wait_seconds = self.schedule_wakeup_at(sneaker_url, release_dt)
+        if wait_seconds > 0:
+            return wait_seconds
+        self.schedule_wakeup(sneaker_url, retry_seconds)
+        return retry_seconds
+
+    def release_retry_seconds(self, sneaker_url: str, fastest_refresh_seconds: float) -> float:
+        '''
+        :return: how long to wait before reloading a page that should have shown the sneaker released by now
+        '''
+        return fastest_refresh_seconds
+
+class SneakerTabActions(PageActions):
+    '''
+    What the purchase state machine does to a sneaker, done on the browser tabs of a SneakerPurchaseProcess
+    '''
+
+    def __init__(self, process):
+        '''
+        :param process: the SneakerPurchaseProcess whose tabs, wake-ups and events the sneakers go through
+        '''
+        self.process = process
+
+    def load(self, sneaker_url: str, state: PurchaseState) -> bool:
+        process = self.process
+        sneaker_deadline = process.sneaker_wakeup_deadlines[sneaker_url]
+        if sneaker_deadline is not None:
+            process._record_event(sneaker_url, SneakerEventCode.WAKEUP_HANDLED, lag_seconds=process.clock.monotonic() - sneaker_deadline)
+
+        # Sneakers watched over HTTP do not have a tab until their first wake up, a freshly opened tab is already current
+        if process.sneaker_tabs[sneaker_url] is None:
+            return process._hand_off_to_tab(sneaker_url)
+
+        # reload so we see what the site says now, not what it said when the tab was first opened
+        if sneaker_deadline is not None:
+            # the reload timed to land on the release, and everything after it, is not held up measuring the site
+            release_dt = process._release_reloads.pop(sneaker_url, None)
+            try:
+                process._reload_tab(sneaker_url, measure_response=release_dt is None and state != PurchaseState.RELEASED)
+            except Exception as e:
+                process.logger.error(f"Unable to reload the tab of {sneaker_url} - {e}", extra=process._log_context(sneaker_url))
+            if release_dt is not None:
+                process._record_release_landing(sneaker_url, release_dt)
+        return True
+
+    def read_release(self, sneaker_url: str):
+        try:
+            # extract when it says it will be available from the nike website
+            return self.process._extract_tab_availablity_date(sneaker_url)
+        except ReleaseTimeParseException as e:
+            # there is a release banner, we just cannot read it, let the state machine decide rather than buying blind
+            self.process.logger.error(f"Sneaker with url - {sneaker_url} shows a release time we cannot read - {e}",
+                                      extra=self.process._log_context(sneaker_url))
+            raise
+        except Exception as e:
+            self.process.logger.info(f"Sneaker with url - {sneaker_url} cannot find availability element! Might now be purchasable! - {e}",
+                                     extra=self.process._log_context(sneaker_url))
+            return None
+
+    def purchase(self, sneaker_url: str, attempt: int) -> bool:
+        self.process.logger.info(f"Attempting to purchase shoe! Attempt {attempt}", extra=self.process._log_context(sneaker_url))
+        return self.process._purchase_sneaker(sneaker_url)
+
+    def schedule_wakeup_at(self, sneaker_url: str, server_dt: datetime.datetime) -> float:
+        return self.process._schedule_wakeup_at(sneaker_url, server_dt)
+
+    def schedule_wakeup(self, sneaker_url: str, wait_seconds: float):
+        self.process._schedule_wakeup(sneaker_url, wait_seconds)
+
+    def schedule_release_reload(self, sneaker_url: str, release_dt: datetime.datetime, retry_seconds: float) -> float:
+        if self.process.release_timer is None:
+            return super().schedule_release_reload(sneaker_url, release_dt, retry_seconds)
+        return self.process._schedule_release_reload(sneaker_url, release_dt, retry_seconds)
+
+    def release_retry_seconds(self, sneaker_url: str, fastest_refresh_seconds: float) -> float:
+        if self.process.release_timer is None:
+            return fastest_refresh_seconds
+        return self.process.release_timer.retry_seconds(sneaker_url, fastest_refresh_seconds)
+
+    def record(self, sneaker_url: str, code: SneakerEventCode, **payload):
+        self.process._record_event(sneaker_url, code, **payload)
+
+class PurchaseStateMachine():
+    '''
+    The purchase flow of every sneaker as a transition table, with no driver in it. Each time a sneaker is handled
+    its page is loaded and read once, and the (state, observation) row decides the next state, when to wake up and
+    whether to try buying. Counts per state are kept up to date on every change so checking whether everything is
+    finished never scans the sneakers.
+    '''
+
+    TERMINAL_STATES = frozenset([PurchaseState.PURCHASED, PurchaseState.ERROR])
+
+    transitions = {
+        (PurchaseState.NOT_STARTED, PageObservation.RELEASE_SHOWN):
+            Transition(PurchaseState.PRE_RELEASE, WakeupPolicy.BEFORE_RELEASE, event_code=SneakerEventCode.PRE_RELEASE_SCHEDULED),
+        # a shoe that was already out when we first looked gets one try
+        (PurchaseState.NOT_STARTED, PageObservation.RELEASE_GONE):
+            Transition(PurchaseState.RELEASED, purchase=True, purchase_retries=0),
+        (PurchaseState.PRE_RELEASE, PageObservation.RELEASE_SHOWN):
+            Transition(PurchaseState.NEAR_RELEASE, WakeupPolicy.AT_RELEASE, event_code=SneakerEventCode.NEAR_RELEASE_SCHEDULED),
+        # dropped early, or before we woke up
+        (PurchaseState.PRE_RELEASE, PageObservation.RELEASE_GONE):
+            Transition(PurchaseState.RELEASED, purchase=True, event_code=SneakerEventCode.RELEASE_DETECTED),
+        # our wake-up was slightly early (or only there to warm up), go again at the release or right after it
+        (PurchaseState.NEAR_RELEASE, PageObservation.RELEASE_SHOWN):
+            Transition(PurchaseState.NEAR_RELEASE, WakeupPolicy.AT_RELEASE, event_code=SneakerEventCode.NEAR_RELEASE_RETRY),
+        (PurchaseState.NEAR_RELEASE, PageObservation.RELEASE_GONE):
+            Transition(PurchaseState.RELEASED, purchase=True, event_code=SneakerEventCode.RELEASE_DETECTED),
+        (PurchaseState.RELEASED, PageObservation.RELEASE_SHOWN):
+            Transition(PurchaseState.RELEASED, WakeupPolicy.RETRY_RELEASE, event_code=SneakerEventCode.WAKEUP_RETRY),
+        (PurchaseState.RELEASED, PageObservation.RELEASE_GONE):
+            Transition(PurchaseState.RELEASED, purchase=True),
+        # a banner we cannot read is not a released shoe, stay put and look again later rather than buying blind, until
+        # max_unreadable_reads in a row give up on it
+        (PurchaseState.NOT_STARTED, PageObservation.RELEASE_UNREADABLE):
+            Transition(PurchaseState.NOT_STARTED, WakeupPolicy.BACKOFF, event_code=SneakerEventCode.STATE_UNKNOWN),
+        (PurchaseState.PRE_RELEASE, PageObservation.RELEASE_UNREADABLE):
+            Transition(PurchaseState.PRE_RELEASE, WakeupPolicy.BACKOFF, event_code=SneakerEventCode.STATE_UNKNOWN),
+        (PurchaseState.NEAR_RELEASE, PageObservation.RELEASE_UNREADABLE):
+            Transition(PurchaseState.NEAR_RELEASE, WakeupPolicy.BACKOFF, event_code=SneakerEventCode.STATE_UNKNOWN),
+        (PurchaseState.RELEASED, PageObservation.RELEASE_UNREADABLE):
+            Transition(PurchaseState.RELEASED, WakeupPolicy.BACKOFF, event_code=SneakerEventCode.STATE_UNKNOWN),
+    }
+    # Taken instead of the row above once a page could not be read max_unreadable_reads times in a row
+    __UNREADABLE_GIVE_UP = Transition(PurchaseState.ERROR, event_code=SneakerEventCode.STATE_UNKNOWN)
+
+    def __init__(self, actions: PageActions, sneaker_urls=(), minutes_before_release: float = 2,
+                 fastest_refresh_seconds: float = 1, max_purchase_retries: int = 3, max_unreadable_reads: int = 8,
+                 max_backoff_seconds: float = 60, on_transition=None):
+        '''
+        :param max_unreadable_reads: how many reads in a row of a page we cannot make sense of before the sneaker errors
+        :param max_backoff_seconds: the longest the wait between two of those reads gets, it doubles from
+        fastest_refresh_seconds
+        :param on_transition: optional callable(sneaker url, old state, new state) run whenever a state changes
+        '''
+        self.actions = actions
+        self.minutes_before_release = minutes_before_release
+        self.fastest_refresh_seconds = fastest_refresh_seconds
+        self.max_purchase_retries = max_purchase_retries
+        self.max_unreadable_reads = max_unreadable_reads
+        self.max_backoff_seconds = max_backoff_seconds
+        self.on_transition = on_transition
+        self.logger = LocalLogging.get_local_logger("purchase_state_machine")
+
+        self.states = {}
+        # How many failed purchases each sneaker has had retried
+        self.attempts = {}
+        # How many reads in a row of each sneaker could not be made sense of, only sneakers with at least one
+        self.unreadable_reads = {}
+        self.counts = {state: 0 for state in PurchaseState}
+        self.transition_count = 0
+        for sneaker_url in sneaker_urls:
+            self.add(sneaker_url)
+
+    def add(self, sneaker_url: str, state: PurchaseState = PurchaseState.NOT_STARTED):
+        if sneaker_url in self.states:
+            return
+        self.states[sneaker_url] = state
+        self.attempts[sneaker_url] = 0
+        self.counts[state] += 1
+
+    def remove(self, sneaker_url: str):
+        state = self.states.pop(sneaker_url, None)
+        if state is not None:
+            self.counts[state] -= 1
+        self.attempts.pop(sneaker_url, None)
+        self.unreadable_reads.pop(sneaker_url, None)
+
+    def set_state(self, sneaker_url: str, state: PurchaseState):
+        old_state = self.states[sneaker_url]
+        if old_state == state:
+            return
+        self.states[sneaker_url] = state
+        self.counts[old_state] -= 1
+        self.counts[state] += 1
+        self.transition_count += 1
+        if self.on_transition:
+            self.on_transition(sneaker_url, old_state, state)
+
+    def active_count(self) -> int:
+        return len(self.states) - self.counts[PurchaseState.PURCHASED] - self.counts[PurchaseState.ERROR]
+
+    def is_finished(self) -> bool:
+        '''
+        :return: true once every sneaker has been purchased or errored out
+        '''
+        return self.active_count() == 0
+
+    def handle(self, sneaker_url: str) -> PurchaseState:
+        '''
+        Loads and reads the sneakers page once and applies the matching transition
+        :return: the state the sneaker is in afterwards
+        '''
+        state = self.states[sneaker_url]
+        if state in self.TERMINAL_STATES:
+            return state
+
+        if not self.actions.load(sneaker_url, state):
+            self.set_state(sneaker_url, PurchaseState.ERROR)
+            return PurchaseState.ERROR
+
+        payload = {}
+        try:
+            release_dt = self.actions.read_release(sneaker_url)
+            observation = PageObservation.RELEASE_SHOWN if release_dt is not None else PageObservation.RELEASE_GONE
+        except ReleaseTimeParseException as e:
+            release_dt = None
+            observation = PageObservation.RELEASE_UNREADABLE
+            payload["error"] = str(e)
+        except Exception as e:
+            self.logger.info(f"Could not read the release of {sneaker_url}, treating it as released - {e}")
+            release_dt = None
+            observation = PageObservation.RELEASE_GONE
+
+        transition = self.transitions[(state, observation)]
+        if observation == PageObservation.RELEASE_UNREADABLE:
+            unreadable_reads = self.unreadable_reads.get(sneaker_url, 0) + 1
+            self.unreadable_reads[sneaker_url] = unreadable_reads
+            payload["unreadable_reads"] = unreadable_reads
+            if unreadable_reads >= self.max_unreadable_reads:
+                self.logger.error(f"Could not read the page of {sneaker_url} {unreadable_reads} times in a row, giving up on it")
+                transition = self.__UNREADABLE_GIVE_UP
+        else:
+            self.unreadable_reads.pop(sneaker_url, None)
+
+        wait_seconds = None
+        if transition.wakeup == WakeupPolicy.BEFORE_RELEASE:
+            wait_seconds = self.actions.schedule_wakeup_at(sneaker_url, release_dt - datetime.timedelta(minutes=self.minutes_before_release))
+        elif transition.wakeup == WakeupPolicy.AT_RELEASE:
+            wait_seconds = self.actions.schedule_release_reload(sneaker_url, release_dt,
+                                                                self.actions.release_retry_seconds(sneaker_url, self.fastest_refresh_seconds))
+        elif transition.wakeup == WakeupPolicy.SOON:
+            wait_seconds = self.fastest_refresh_seconds
+            self.actions.schedule_wakeup(sneaker_url, wait_seconds)
+        elif transition.wakeup == WakeupPolicy.RETRY_RELEASE:
+            wait_seconds = self.actions.release_retry_seconds(sneaker_url, self.fastest_refresh_seconds)
+            self.actions.schedule_wakeup(sneaker_url, wait_seconds)
+        elif transition.wakeup == WakeupPolicy.BACKOFF:
+            wait_seconds = min(self.fastest_refresh_seconds * 2 ** (self.unreadable_reads[sneaker_url] - 1), self.max_backoff_seconds)
+            self.actions.schedule_wakeup(sneaker_url, wait_seconds)
+
+        # events are recorded against the state the sneaker was in when it happened
+        if wait_seconds is not None:
+            payload["wait_seconds"] = wait_seconds
+        if transition.event_code:
+            self.actions.record(sneaker_url, transition.event_code, **payload)
+        self.set_state(sneaker_url, transition.next_state)
+
+        if transition.purchase:
+            retries = self.max_purchase_retries if transition.purchase_retries is None else transition.purchase_retries
+            self._purchase(sneaker_url, retries)
+        return self.states[sneaker_url]
+
+    def _purchase(self, sneaker_url: str, retries: int):
+        try:
+            purchased = self.actions.purchase(sneaker_url, self.attempts[sneaker_url] + 1)
+        except Exception as e:
+            self.logger.error(f"Purchase attempt of {sneaker_url} failed - {e}")
+            purchased = False
+
+        if purchased:
+            self.actions.record(sneaker_url, SneakerEventCode.PURCHASED)
+            self.set_state(sneaker_url, PurchaseState.PURCHASED)
+            return
+
+        self.actions.record(sneaker_url, SneakerEventCode.PURCHASE_FAILED)
+        # the purchase can give up on the sneaker itself, e.g. once it is stuck part way through checkout
+        if self.states[sneaker_url] in self.TERMINAL_STATES:
+            return
+        if self.attempts[sneaker_url] < retries:
+            self.attempts[sneaker_url] += 1
+        else:
+            self.set_state(sneaker_url, PurchaseState.ERROR)
@@ -1,16 +1,31 @@
+import contextlib
 import datetime
-import json
-import re
-import threading
-import time
-from enum import Enum
+import queue
 from pathlib import Path
 
-from bs4 import BeautifulSoup
 from selenium.webdriver.common.by import By
 
 from local_config import LocalConfig
 from src.config.local_logging import LocalLogging
+from src.config.sneaker_config import SneakerConfigEntry, SneakerConfigWatcher, compile_sneakers, load_sneaker_config
+from src.http_release_monitor import HttpReleaseMonitor
+from src.purchase_state_machine import PurchaseState, PurchaseStateMachine, SneakerTabActions
+from src.utils.clock import SYSTEM_CLOCK
+from src.utils.clock_calibration import HttpDateSampler, ServerClockCalibrator
+from src.utils.deadline_scheduler import DeadlineScheduler
+from src.utils.driver_tracing import DriverTracer, trace_driver
+from src.utils.driver_watchdog import DriverWatchdog
+from src.utils.event_store import SneakerEventCode, SneakerEventStore
+from src.utils.purchase_checkpoint import PurchaseCheckpointStore, SneakerCheckpoint
+from src.utils.release_time_parser import ReleaseTimeParser
+from src.utils.release_cache import ReleaseMetadataCache
+from src.utils.release_timing import RESPONSE_START_SCRIPT, ReleaseReloadTimer
+from src.utils.resource_profiles import TabResourceProfiles
+from src.utils.size_grid import SizeGrid, SizeGridExtractor
+from src.utils.tab_focus import TabFocus, TabWorkQueue
+from src.utils.tab_pool import TabPool
+from src.utils.wait_conditions import (ReadinessWaiter, element_clickable, element_present, element_value_filled,
+                                       element_with_text, iframe_ready, new_window_opened, url_contains)
 
 class SneakerPurchaseProcess():
     '''
@@ -32,8 +47,22 @@ class SneakerPurchaseProcess():
     # Maximum amount of times
     __MAXIMUM_PURCHASE_RETRIES = 3
 
-    # This regex expects "Available <M/D> at <H:MM AM/PM>"
-    availability_pattern = r'Available\s+(\d{1,2}/\d{1,2})\s+at\s+(\d{1,2}:\d{2}\s+(?:AM|PM))'
+    # How long each step of opening a tab and checking out gets before we give up on it
+    __NEW_TAB_TIMEOUT_SECONDS = 5
+    __CHECKOUT_STEP_TIMEOUT_SECONDS = 10
+    __CVV_ENTRY_TIMEOUT_SECONDS = 2
+
+    # How often sneakers that are only watched over plain HTTP get re-checked for a changed release time
+    __HTTP_RECHECK_SECONDS = 5 * 60
+
+    # Put on the ready queue instead of a url when the server clock offset moved and wall clock wake-ups need rescheduling
+    __CLOCK_RECALIBRATED = object()
+    # Put on the ready queue together with a url, as (__RELEASE_CHANGED, url), when the HTTP monitor saw its release move
+    __RELEASE_CHANGED = object()
+    # Put on the ready queue as (__CONFIG_CHANGED, added entries, retired urls, resized entries) when the sneaker file changed
+    __CONFIG_CHANGED = object()
+    # Put on the ready queue every DRIVER_HEARTBEAT_SECONDS to health check the driver and checkpoint the sneakers
+    __HEARTBEAT = object()
 
     # XPATHS BELOW
     availability_xpath = "//div[@class='available-date-component']" # there is a list, but the first one is all we care about
@@ -49,332 +78,1090 @@ class SneakerPurchaseProcess():
     payment_error_xpath = "//h1[@id='modal-error']"
     payment_error_reason_xpath = "//p[contains(@class, 'error-code-msg')]"
 
-    class PurchaseState(Enum):
-        NOT_STARTED = 1
-        PRE_RELEASE = 2
-        NEAR_RELEASE = 3
-        RELEASED = 4
-        PURCHASED = 5
-        ERROR = 6
+    # What the url has to contain once the checkout button has taken us to checkout
+    checkout_url_fragment = "nike.com/checkout"
 
-    class TabTimingThread():
+    # The states live with the state machine now, kept here so SneakerPurchaseProcess.PurchaseState still works
+    PurchaseState = PurchaseState
+
+    def __init__(self, driver, sneaker_file: Path = None, sneakers=None, event_sink=None, clock=None, clock_sampler=None, tab_focus=None,
+                 driver_factory=None):
         '''
-        Utility class that will let us know when a tab is ready to be refreshed
+        :param sneaker_file: json file of the sneakers to snag, ignored when sneakers is given
+        :param sneakers: list of SneakerConfigEntry (or raw {"shoe_url": ..., "size": ...}) to snag instead of reading them
+        from sneaker_file, the file is still watched for changes if it is given
+        :param event_sink: optional callable(SneakerEvent) that every sneaker event is also handed to
+        :param clock: clock every wait and wake-up runs on, a VirtualClock lets the whole release play out in no time
+        :param clock_sampler: what to calibrate against the sites clock with, defaults to the Date header of CLOCK_CALIBRATION_URL
+        when it is set
+        :param tab_focus: TabFocus of whoever else switches tabs on this driver, so we both know which tab it is on
+        :param driver_factory: callable that builds a new logged in driver, when given a driver that stops answering is
+        replaced with one from it and every sneaker picked back up where it was
         '''
-        def __init__(self, time_to_wait):
-            self.time_to_wait = time_to_wait
-            self.finished_at = None
-            self.thread = threading.Thread(target=self._run)
-            self.thread.start()
-
-        def _run(self):
-            time.sleep(self.time_to_wait)
-            self.finished_at = time.time()
-
-        def has_finished_waiting(self):
-            return self.finished_at is not None
-
-        def how_long_ago_did_it_finish(self):
-            if not self.has_finished_waiting():
-                return None
-            return time.time() - self.finished_at
-
-    def __init__(self, driver, sneaker_file: Path):
+        # Time every driver call so a slow checkout shows which step ate the time, a virtual clock gets a tracer of its own
+        if LocalConfig.DRIVER_TRACING:
+            driver = trace_driver(driver, DriverTracer(clock) if clock is not None and clock.is_virtual else None)
         self.driver = driver
+        self.tracer = getattr(driver, "tracer", None)
+        self.event_sink = event_sink
+        self.clock = clock or SYSTEM_CLOCK
         self.logger = LocalLogging.get_local_logger("sneaker_purchase_process")
+        self.size_grid_extractor = SizeGridExtractor(driver)
+        self.waiter = ReadinessWaiter(driver, clock=self.clock)
+        # Every tab switch goes through here so switching to the tab we are already on is skipped
+        self.tab_focus = tab_focus or TabFocus(driver, self.clock)
+        # Sneakers that came due together, grouped by tab and run most urgent first
+        self.tab_work = TabWorkQueue()
+        # Sneaker tabs skip what they do not need to load, product pages being watched most of all
+        self.resource_profiles = TabResourceProfiles(driver) if LocalConfig.TAB_RESOURCE_PROFILES else None
+        # Caps how many sneaker tabs are open, sneakers whose next wake up is far away give theirs back until then
+        self.tab_pool = None
+        if LocalConfig.TAB_POOL_MAX_TABS:
+            self.tab_pool = TabPool(driver, self.tab_focus, self._open_blank_tab, LocalConfig.TAB_POOL_MAX_TABS, LocalConfig.TAB_POOL_IDLE_TABS)
+        # Sneakers that lost their tab, parked in the pool or left behind in a browser that died, and the event to
+        # record when they get one again at their next wake up
+        self.tabless_sneakers = {}
 
         try:
-            with open(sneaker_file, "r") as f:
-                sneakers = json.load(f)
-                self.sneaker_urls = [sneaker["shoe_url"] for sneaker in sneakers]
-                self.sneaker_sizes = {sneaker["shoe_url"]: sneaker["size"] for sneaker in sneakers}
+            if sneakers is None:
+                sneakers = self.load_sneakers(sneaker_file)
+            self.sneaker_entries = compile_sneakers(sneakers)
+            self.sneaker_urls = [entry.url for entry in self.sneaker_entries]
+            self.sneaker_sizes = {entry.url: entry.size for entry in self.sneaker_entries}
         except Exception as e:
-            raise Exception("Cannot create Sneaker Purchaser Process, exception occured while extracting sneaker file")
+            raise Exception(f"Cannot create Sneaker Purchaser Process, exception occured while extracting sneaker file - {e}")
 
-        # Holds list of strings for the logs
-        self.sneaker_events = {sneaker_url : [] for sneaker_url in self.sneaker_urls}
+        # Holds the most recent events of each sneaker for the logs
+        self.sneaker_events = SneakerEventStore(self.sneaker_urls, clock=self.clock)
+        # Decides what each sneaker does next from what its page shows, every state change goes through it
+        self.purchase_machine = PurchaseStateMachine(SneakerTabActions(self), self.sneaker_urls,
+                                                     minutes_before_release=self.__MINUTES_BEFORE_SALE_WAKEUP,
+                                                     fastest_refresh_seconds=self.__FASTEST_REFRESH_SECONDS,
+                                                     max_purchase_retries=self.__MAXIMUM_PURCHASE_RETRIES,
+                                                     on_transition=self._on_state_transition)
         # Holds a list of each sneaker and its purchase state
-        self.sneaker_purchase_states = {sneaker_url : self.PurchaseState.NOT_STARTED for sneaker_url in self.sneaker_urls}
+        self.sneaker_purchase_states = self.purchase_machine.states
         # Holds a list of each sneaker and its tab to switch too
         self.sneaker_tabs = {sneaker_url : None for sneaker_url in self.sneaker_urls}
-        # Holds a list of each sneaker and its timer for when to move to the next state
-        self.sneaker_timing_threads = {sneaker_url : None for sneaker_url in self.sneaker_urls}
+        # Holds the monotonic deadline of each sneakers next scheduled wake-up, None until the first one is scheduled
+        self.sneaker_wakeup_deadlines = {sneaker_url : None for sneaker_url in self.sneaker_urls}
+        # Holds the timezone aware server time each sneaker should wake up at, None for wake-ups that are just a delay
+        self.sneaker_wakeup_targets = {sneaker_url : None for sneaker_url in self.sneaker_urls}
         # Allow for up to 3 attempts on each sneaker to be purchased
-        self.sneaker_purchase_attempts = {sneaker_url : 0 for sneaker_url in self.sneaker_urls}
+        self.sneaker_purchase_attempts = self.purchase_machine.attempts
+        # How many times sneakers were handled and how long that took, used to size worker pools
+        self.handled_count = 0
+        self.busy_seconds = 0.0
+        # Holds the clock.monotonic() each sneaker reached each stage of the release -> checkout path, used for latency reporting
+        self.sneaker_stage_times = {sneaker_url : {} for sneaker_url in self.sneaker_urls}
+
+        # One heap of wake-ups for every sneaker, when one is due its url is handed to the monitoring loop through the queue
+        self.scheduler = DeadlineScheduler("sneaker_wakeup_scheduler", self.clock)
+        self.ready_sneakers = queue.Queue()
+
+        # Times the reload that decides each drop off how long the sneakers page has been taking to load
+        self.release_timer = None
+        if LocalConfig.RELEASE_RELOAD_ALIGN:
+            self.release_timer = ReleaseReloadTimer(LocalConfig.RELEASE_RELOAD_ALIGN, LocalConfig.RELEASE_WARMUP_RELOADS)
+        # sneaker url -> release datetime, for sneakers whose pending wake-up is the reload timed to land on their release
+        self._release_reloads = {}
+
+        # Release times are read off the site, so keep track of how far our clock is from theirs
+        self.release_time_parser = ReleaseTimeParser(LocalConfig.RELEASE_TIMEZONE or None)
+        if clock_sampler is None and LocalConfig.CLOCK_CALIBRATION_URL:
+            clock_sampler = HttpDateSampler(LocalConfig.CLOCK_CALIBRATION_URL, clock=self.clock)
+        self.clock_calibrator = ServerClockCalibrator(clock_sampler, clock=self.clock)
+        self.clock_calibrator.add_listener(lambda offset: self.ready_sneakers.put(self.__CLOCK_RECALIBRATED))
+
+        # Before the drop, sneakers can be watched over plain HTTP and only get a browser tab close to their release
+        self.http_release_monitor = HttpReleaseMonitor(self._parse_availability_text, clock=self.clock) if LocalConfig.HTTP_PRE_RELEASE_MONITOR else None
+        # What previous runs read off each page, so wake-ups can be scheduled without reading it again
+        cache_path = LocalConfig.resolve_path(LocalConfig.RELEASE_CACHE_PATH) if LocalConfig.RELEASE_CACHE_PATH else None
+        self.release_cache = ReleaseMetadataCache(cache_path, clock=self.clock) if cache_path else None
+        # Where every sneaker was at the last heartbeat, to pick them back up from on a new browser or after a restart
+        self.checkpoints = PurchaseCheckpointStore(cache_path, clock=self.clock) if LocalConfig.PURCHASE_CHECKPOINTS else None
+        # Sneakers that moved since their last checkpoint
+        self._dirty_checkpoints = set()
+        # Rebuilds the browser through driver_factory when the driver stops answering
+        self.driver_factory = driver_factory
+        self.watchdog = DriverWatchdog(self.clock) if driver_factory and LocalConfig.DRIVER_WATCHDOG else None
+        self._driver_listeners = []
+
+        # Shoes added to or retired from the sneaker file while we run are picked up without restarting
+        self.config_watcher = None
+        if sneaker_file is not None and LocalConfig.SNEAKER_CONFIG_HOT_RELOAD:
+            self.config_watcher = SneakerConfigWatcher(sneaker_file, self.sneaker_entries,
+                                                       lambda added, retired, resized: self.ready_sneakers.put((self.__CONFIG_CHANGED, added, retired, resized)),
+                                                       clock=self.clock)
 
     def start_monitoring_sneakers(self):
         '''
         Method will attempt to launch a tab for each sneaker_url and an internal thread that times when to go check that
         that tab again to attempt to purchase the sneaker.
         '''
+        self._start_monitoring()
+        try:
+            # end if all of them error out or are purchased
+            while self.__have_all_been_purchased():
+                self._monitor_once()
+        finally:
+            self._stop_monitoring()
+
+    def _monitor_once(self):
+        '''
+        One pass of the monitoring loop, blocks until the next sneaker is due, no polling, then takes everything else
+        that is due along with it and handles them tab by tab
+        '''
+        self._queue_ready(self._next_ready())
+        while not self.ready_sneakers.empty():
+            self._queue_ready(self.ready_sneakers.get_nowait())
+
+        for url in self.tab_work.drain(self.tab_focus.current):
+            # wake-ups of a sneaker that was retired while they were queued
+            if url in self.sneaker_purchase_states:
+                self._handle_ready_sneaker(url)
+
+    def _start_monitoring(self):
+        '''
+        Starts the background timing and watching, schedules whatever can be scheduled without a tab, opens a tab for the
+        rest and queues those up to be handled right away
+        '''
         self.logger.info("Starting process!")
+        self.scheduler.start()
+        self.clock_calibrator.start()
+
+        # A previous run that did not get to finish is picked up where it was, only when asked to
+        if self.checkpoints and LocalConfig.RESUME_FROM_CHECKPOINTS:
+            self._resume_from_checkpoints()
+
+        # Anything with a far enough away release, cached from a previous run or read over HTTP, gets scheduled without opening a tab
+        if self.release_cache:
+            self._schedule_sneakers_from_cache()
+        if self.http_release_monitor:
+            self._schedule_sneakers_over_http()
+
         # Open a tab and go to it for each sneaker_URL
         for url, tab in self.sneaker_tabs.items():
             # If it is a new tab, then create a tab and go to it
-            if tab == None:
-                tab_handle = self._open_new_tab(url)
-                self.sneaker_tabs[url] = tab_handle
+            if tab == None and self.sneaker_purchase_states[url] == self.PurchaseState.NOT_STARTED:
+                # the ones that do not fit in the tab pool get a tab when they are first handled
+                if self.tab_pool and self.tab_pool.is_full():
+                    continue
+                self._open_sneaker_tab(url)
 
-                if tab_handle == None:
-                    self.sneaker_events[url].append(f"Could not create tab for sneaker at : {url}")
-                    self.sneaker_purchase_states[url] = self.PurchaseState.ERROR
-                else:
-                    self.sneaker_events[url].append(f"Created Tab for sneaker at : {url}")
-                    self.sneaker_purchase_states[url] = self.PurchaseState.NOT_STARTED
+        # Every sneaker that is still in play gets handled once right away to extract its start time, after that it is
+        # only handled again when its scheduled wake-up hands it back to us
+        for url, state in self.sneaker_purchase_states.items():
+            if state == self.PurchaseState.NOT_STARTED:
+                self.ready_sneakers.put(url)
 
-        # Extract the start times for each URL. If there is not a release date on it mark it as error
-        any_not_processed_or_error = self.__have_all_been_purchased()
+        if self.config_watcher:
+            self.config_watcher.start()
 
-        while any_not_processed_or_error:
-            for url, state in self.sneaker_purchase_states.items():
-                # we only set up timers if the url started
-                if state == self.PurchaseState.ERROR or state == self.PurchaseState.PURCHASED:
-                    continue
+        if self.checkpoints:
+            self._dirty_checkpoints.update(self.sneaker_urls)
+            self._save_checkpoints()
+        if self.checkpoints or self.watchdog:
+            self._schedule_heartbeat()
+
+    def _stop_monitoring(self):
+        if self.config_watcher:
+            self.config_watcher.stop()
+        if self.http_release_monitor:
+            self.http_release_monitor.stop()
+        self.clock_calibrator.stop()
+        self.scheduler.stop()
+        if self.release_cache:
+            self._cache_purchase_states()
+        if self.checkpoints:
+            self._save_checkpoints()
+            self.checkpoints.close()
+        self.logger.info(f"Finished monitoring sneakers, wake-up dispatch stats: {self.get_scheduler_stats()}, "
+                         f"window switch stats: {self.tab_focus.get_switch_stats()}")
+        if self.resource_profiles:
+            self.logger.info(f"Tabs given each resource profile: {self.resource_profiles.get_stats()}")
+        if self.tab_pool:
+            self.logger.info(f"Tab pool stats: {self.tab_pool.get_pool_stats()}")
+        if self.watchdog:
+            self.logger.info(f"Driver watchdog stats: {self.watchdog.get_stats()}")
+        if self.release_timer:
+            self.logger.info(f"Release reload timing stats: {self.release_timer.get_stats()}")
+
+    def _queue_ready(self, url):
+        '''
+        Handles a message off the ready queue right away, or queues a due sneaker up on its tab
+        '''
+        if url is self.__CLOCK_RECALIBRATED:
+            self._reschedule_wall_clock_wakeups()
+        elif isinstance(url, tuple) and url[0] is self.__RELEASE_CHANGED:
+            self._handle_http_release_change(url[1])
+        elif isinstance(url, tuple) and url[0] is self.__CONFIG_CHANGED:
+            self._apply_config_change(*url[1:])
+        elif url is self.__HEARTBEAT:
+            self._heartbeat()
+        elif url in self.sneaker_purchase_states:
+            # a sneaker about to be bought beats one that is only being checked on
+            state = self.sneaker_purchase_states[url]
+            priority = 0 if state == self.PurchaseState.RELEASED else 1 if state == self.PurchaseState.NEAR_RELEASE else 2
+            self.tab_work.put(self.sneaker_tabs[url], url, self.sneaker_wakeup_deadlines[url], priority)
+
+    def _handle_ready_sneaker(self, url):
+        attempts = self.sneaker_purchase_attempts.get(url, 0)
+        handle_started_at = self.clock.monotonic()
+        with self._span("handle_sneaker", url):
+            self._handle_sneaker_tab_state(url)
+        self.handled_count += 1
+        self.busy_seconds += self.clock.monotonic() - handle_started_at
+
+        # A failed purchase or error is what a dead driver looks like from here, so check on it now rather than at the
+        # next heartbeat, before the sneaker burns through its retries on it
+        if self.watchdog and (self.sneaker_purchase_states[url] == self.PurchaseState.ERROR or self.sneaker_purchase_attempts.get(url, 0) != attempts):
+            self._check_driver()
+
+        # Anything still in play that did not schedule its own next step gets retried as fast as we allow
+        state = self.sneaker_purchase_states[url]
+        if state != self.PurchaseState.ERROR and state != self.PurchaseState.PURCHASED and not self._has_pending_wakeup(url):
+            self._schedule_wakeup(url, self.__FASTEST_REFRESH_SECONDS)
+
+        # a tab that will sit idle until a wake-up far away is better off given back
+        if self.tab_pool and self.sneaker_tabs.get(url) is not None and self._can_park(url):
+            self._park_tab(url)
+
+    def _next_ready(self):
+        '''
+        :return: the next url (or message) off the ready queue. A virtual clock never moves by itself, so when nothing is
+        ready yet it is jumped straight to the next wake-up instead of waiting on it
+        '''
+        if self.clock.is_virtual:
+            while self.ready_sneakers.empty():
+                next_deadline = self.scheduler.next_deadline()
+                if next_deadline is None:
+                    raise Exception("Nothing is ready and nothing is scheduled, the virtual clock would never move!")
+                self.clock.advance_to(next_deadline)
+        return self.ready_sneakers.get()
+
+    @staticmethod
+    def load_sneakers(sneaker_file: Path):
+        '''
+        :return: list of the SneakerConfigEntry in the validated json file
+        '''
+        return load_sneaker_config(sneaker_file)
+
+    def add_sneaker(self, entry: SneakerConfigEntry):
+        '''
+        Starts monitoring a sneaker on the running process, has to be called on the monitoring loop's thread
+        '''
+        if entry.url in self.sneaker_purchase_states:
+            return
+        url = entry.url
+        self.sneaker_entries.append(entry)
+        self.sneaker_urls.append(url)
+        self.sneaker_sizes[url] = entry.size
+        self.sneaker_events.add_sneaker(url)
+        self.purchase_machine.add(url)
+        self.sneaker_tabs[url] = None
+        self.sneaker_wakeup_deadlines[url] = None
+        self.sneaker_wakeup_targets[url] = None
+        self.sneaker_stage_times[url] = {}
+
+        if self._open_sneaker_tab(url):
+            self.ready_sneakers.put(url)
+
+    def retire_sneaker(self, sneaker_url: str):
+        '''
+        Stops monitoring a sneaker and closes its tab, has to be called on the monitoring loop's thread. Its events are
+        kept for the logs.
+        '''
+        if sneaker_url not in self.sneaker_purchase_states:
+            return
+        self._cancel_wakeup(sneaker_url)
+        if self.http_release_monitor:
+            self.http_release_monitor.unwatch(sneaker_url)
+
+        self.tabless_sneakers.pop(sneaker_url, None)
+        tab_handle = self.sneaker_tabs[sneaker_url]
+        if tab_handle is not None:
+            try:
+                if self.tab_pool:
+                    self.tab_pool.close(sneaker_url)
                 else:
-                    self._handle_sneaker_tab_state(url)
+                    self.tab_focus.close(tab_handle)
+            except Exception as e:
+                self.logger.error(f"Unable to close the tab of retired sneaker {sneaker_url} - {e}")
+            if self.resource_profiles:
+                self.resource_profiles.forget(tab_handle)
 
-            # end if all of them error out or are purchased
-            any_not_processed_or_error = self.__have_all_been_purchased()
-            # wait half a second then check on timers again
-            time.sleep(.5)
+        self._release_reloads.pop(sneaker_url, None)
+        if self.release_timer:
+            self.release_timer.forget(sneaker_url)
+
+        self._record_event(sneaker_url, SneakerEventCode.RETIRED)
+        if self.checkpoints:
+            self.checkpoints.remove(sneaker_url)
+        self._dirty_checkpoints.discard(sneaker_url)
+        self.sneaker_entries = [entry for entry in self.sneaker_entries if entry.url != sneaker_url]
+        self.sneaker_urls.remove(sneaker_url)
+        self.purchase_machine.remove(sneaker_url)
+        for tracked in (self.sneaker_sizes, self.sneaker_tabs, self.sneaker_wakeup_deadlines, self.sneaker_wakeup_targets):
+            tracked.pop(sneaker_url, None)
+
+    def _apply_config_change(self, added, retired, resized):
+        for sneaker_url in retired:
+            self.retire_sneaker(sneaker_url)
+        for entry in resized:
+            if entry.url in self.sneaker_sizes:
+                self.sneaker_sizes[entry.url] = entry.size
+                self.sneaker_entries = [entry if existing.url == entry.url else existing for existing in self.sneaker_entries]
+                self._record_event(entry.url, SneakerEventCode.RESIZED, size=entry.size)
+        for entry in added:
+            self.add_sneaker(entry)
 
     def get_purchase_logs(self):
+        '''
+        :return: sneaker url -> messages of its most recent events
+        '''
+        return self.sneaker_events.get_messages()
+
+    def get_event_store(self):
         return self.sneaker_events
 
+    def get_purchase_states(self):
+        return self.sneaker_purchase_states
+
+    def get_scheduler_stats(self):
+        return self.scheduler.get_lag_stats()
+
+    def get_stage_times(self):
+        return self.sneaker_stage_times
+
+    def get_wait_stats(self):
+        return self.waiter.get_wait_stats()
+
+    def get_switch_stats(self):
+        return self.tab_focus.get_switch_stats()
+
+    def get_pool_stats(self):
+        '''
+        :return: how many tabs the tab pool has open and what it did with them, None when there is no pool
+        '''
+        return self.tab_pool.get_pool_stats() if self.tab_pool else None
+
+    def get_release_timing_stats(self):
+        '''
+        :return: how long reloads took and how close to the release the timed ones landed, None when they are not timed
+        '''
+        return self.release_timer.get_stats() if self.release_timer else None
+
+    def get_watchdog_stats(self):
+        '''
+        :return: how often the driver was checked and how long getting a working one back took, None without a watchdog
+        '''
+        return self.watchdog.get_stats() if self.watchdog else None
+
+    def add_driver_listener(self, listener):
+        '''
+        :param listener: callable(driver) called on the driver thread whenever the driver was replaced with a new one
+        '''
+        self._driver_listeners.append(listener)
+
+    def _record_event(self, sneaker_url: str, code: SneakerEventCode, **payload):
+        event = self.sneaker_events.record(sneaker_url, code, self.sneaker_purchase_states.get(sneaker_url), **payload)
+        # the event is only turned into a string once the background log writer gets to it
+        self.logger.info(event, extra=self._log_context(sneaker_url))
+        if self.checkpoints:
+            self._dirty_checkpoints.add(sneaker_url)
+        if self.event_sink:
+            self.event_sink(event)
+
+    def _log_context(self, sneaker_url: str) -> dict:
+        '''
+        :return: the extra= that tags a log line with the sneaker and the state it is in
+        '''
+        return {"sneaker_url": sneaker_url, "state": self.sneaker_purchase_states.get(sneaker_url)}
+
+    def _on_state_transition(self, sneaker_url: str, old_state: PurchaseState, new_state: PurchaseState):
+        if self.checkpoints:
+            self._dirty_checkpoints.add(sneaker_url)
+        if new_state == self.PurchaseState.RELEASED:
+            self._mark_stage(sneaker_url, "release_detected")
+            # the cart and checkout pages are loaded with what the payment form might need
+            self._apply_resource_profile(sneaker_url, "checkout")
+
+    def _apply_resource_profile(self, sneaker_url: str, profile_name: str):
+        '''
+        Gives the sneakers tab the resource profile, a profile that could not be applied only costs load time so it is
+        logged and the purchase carries on
+        '''
+        tab_handle = self.sneaker_tabs.get(sneaker_url)
+        if self.resource_profiles is None or tab_handle is None:
+            return
+        try:
+            self.tab_focus.focus(tab_handle)
+            self.resource_profiles.apply(profile_name, tab_handle)
+        except Exception as e:
+            self.logger.error(f"Unable to apply the {profile_name} resource profile to {sneaker_url} - {e}", extra=self._log_context(sneaker_url))
+
+    def _span(self, name: str, sneaker_url: str = None, attempt: int = None):
+        '''
+        :return: context manager timing a span of the driver trace, or doing nothing when tracing is off
+        '''
+        if self.tracer is None:
+            return contextlib.nullcontext()
+        return self.tracer.span(name, sneaker_url, attempt)
+
+    def _mark_stage(self, sneaker_url: str, stage: str):
+        '''
+        Records when the sneaker reached the given stage, only the first time counts so retries dont hide the first attempt
+        '''
+        self.sneaker_stage_times[sneaker_url].setdefault(stage, self.clock.monotonic())
+
+    def _schedule_wakeup(self, sneaker_url: str, wait_seconds: float):
+        '''
+        Schedules the sneaker to be handed back to the monitoring loop in wait_seconds, replacing any pending wake-up
+        '''
+        self.sneaker_wakeup_targets[sneaker_url] = None
+        self._schedule_wakeup_deadline(sneaker_url, self.clock.monotonic() + wait_seconds)
+
+    def _schedule_wakeup_at(self, sneaker_url: str, server_dt: datetime.datetime) -> float:
+        '''
+        Schedules the sneaker to be handed back to the monitoring loop when the servers clock reads server_dt
+        :return: how many seconds from now the wake-up will happen
+        '''
+        self.sneaker_wakeup_targets[sneaker_url] = server_dt
+        deadline = self.clock_calibrator.to_monotonic_deadline(server_dt)
+        self._schedule_wakeup_deadline(sneaker_url, deadline)
+        return deadline - self.clock.monotonic()
+
+    def _schedule_wakeup_deadline(self, sneaker_url: str, deadline: float):
+        self.sneaker_wakeup_deadlines[sneaker_url] = deadline
+        self.scheduler.schedule_at(deadline, lambda: self.ready_sneakers.put(sneaker_url), key=sneaker_url)
+
+    def _schedule_release_reload(self, sneaker_url: str, release_dt: datetime.datetime, retry_seconds: float) -> float:
+        '''
+        Schedules the next reload of a sneaker waiting on its release: a warm up reload to measure its page while there
+        is still time for one, then the decisive reload started early enough to land on the release, and once that has
+        passed a retry spaced by how long a reload takes
+        :return: how many seconds from now the wake-up will happen
+        '''
+        timer = self.release_timer
+        self._release_reloads.pop(sneaker_url, None)
+        lead_seconds = timer.lead_seconds(sneaker_url, self.clock_calibrator.uncertainty_seconds)
+        reload_dt = release_dt - datetime.timedelta(seconds=lead_seconds)
+        reload_in_seconds = self.clock_calibrator.to_monotonic_deadline(reload_dt) - self.clock.monotonic()
+        if reload_in_seconds <= 0:
+            # too late to land on the release, reload at it if it is still to come
+            release_in_seconds = self.clock_calibrator.to_monotonic_deadline(release_dt) - self.clock.monotonic()
+            wait_seconds = min(release_in_seconds, retry_seconds) if release_in_seconds > 0 else retry_seconds
+            self._schedule_wakeup(sneaker_url, wait_seconds)
+            return wait_seconds
+
+        warmup_seconds = timer.next_warmup(sneaker_url, release_dt, reload_in_seconds)
+        if warmup_seconds is not None:
+            self._schedule_wakeup(sneaker_url, warmup_seconds)
+            return warmup_seconds
+
+        self._release_reloads[sneaker_url] = release_dt
+        if lead_seconds:
+            self._record_event(sneaker_url, SneakerEventCode.RELEASE_RELOAD_TIMED, lead_seconds=lead_seconds, align=timer.align)
+        return self._schedule_wakeup_at(sneaker_url, reload_dt)
+
+    def _has_pending_wakeup(self, sneaker_url: str) -> bool:
+        return self.scheduler.has_pending(sneaker_url)
+
+    def _cancel_wakeup(self, sneaker_url: str):
+        self.scheduler.cancel(sneaker_url)
+
+    def _reschedule_wall_clock_wakeups(self):
+        '''
+        Moves every pending wake-up that was tied to a server time onto the newly calibrated clock offset
+        '''
+        for sneaker_url, server_dt in self.sneaker_wakeup_targets.items():
+            if server_dt is not None and self._has_pending_wakeup(sneaker_url):
+                self._schedule_wakeup_at(sneaker_url, server_dt)
+        self.logger.info(f"Rescheduled wake ups for a server clock offset of {self.clock_calibrator.offset_seconds:.3f}s")
+
+    def _schedule_pre_release_without_tab(self, sneaker_url: str, release_dt: datetime.datetime, source: str) -> bool:
+        '''
+        Schedules the wake-up before the release and moves the sneaker to PRE_RELEASE without it ever getting a tab
+        :param source: where the release time came from, for the event log
+        :return: false if the release is too close for that, so the sneaker needs a tab right away
+        '''
+        wakeup_dt = release_dt - datetime.timedelta(minutes=self.__MINUTES_BEFORE_SALE_WAKEUP)
+        if wakeup_dt <= self.clock_calibrator.server_now():
+            return False
+
+        wait_seconds = self._schedule_wakeup_at(sneaker_url, wakeup_dt)
+        self.purchase_machine.set_state(sneaker_url, self.PurchaseState.PRE_RELEASE)
+        self._record_event(sneaker_url, SneakerEventCode.PRE_RELEASE_SCHEDULED_WITHOUT_TAB, source=source, wait_seconds=wait_seconds)
+        return True
+
+    def _schedule_sneakers_from_cache(self):
+        '''
+        Schedules every sneaker whose release time is still cached from a previous run, the tab read at its wake-up
+        double checks the release before anything is bought
+        '''
+        for sneaker_url in self.sneaker_urls:
+            release_dt = self.release_cache.get_release(sneaker_url)
+            # a sneaker resumed from its checkpoint is already past this
+            if release_dt is not None and self.sneaker_purchase_states[sneaker_url] == self.PurchaseState.NOT_STARTED:
+                self._schedule_pre_release_without_tab(sneaker_url, release_dt, "Release cache")
+
+            # a size that was missing last time is worth shouting about now rather than at the drop
+            size_labels = self.release_cache.get_size_labels(sneaker_url)
+            if size_labels and SizeGrid([(label, label) for label in size_labels]).find(self.sneaker_sizes[sneaker_url]) is None:
+                self.logger.error(f"Size {self.sneaker_sizes[sneaker_url]} was not one of the sizes last seen for {sneaker_url}: {size_labels}")
+
+            # only to let the user know how the last run went for it, nothing is skipped over it
+            last_state = self.release_cache.get_page_state(sneaker_url)
+            if last_state in (self.PurchaseState.PURCHASED.name, self.PurchaseState.ERROR.name):
+                self.logger.info(f"The last run left {sneaker_url} {last_state}")
+        self.logger.info(f"Release cache had {self.release_cache.hits} of {len(self.sneaker_urls)} sneakers")
+
+    def _schedule_sneakers_over_http(self):
+        '''
+        Reads every sneakers release time over plain HTTP, the ones that are not due to wake up yet get scheduled
+        straight into PRE_RELEASE without a tab and keep being watched over HTTP in case their release moves.
+        Anything the monitor cannot read a release time for is left to be opened in a tab like normal.
+        '''
+        not_started = [sneaker_url for sneaker_url in self.sneaker_urls if self.sneaker_purchase_states[sneaker_url] == self.PurchaseState.NOT_STARTED]
+        for observation in self.http_release_monitor.check_many(not_started):
+            if observation.release_dt is None:
+                self.logger.info(f"HTTP monitor could not read a release for {observation.url}, it will get a tab - {observation.error}")
+                continue
+
+            self._cache_release(observation.url, observation.availability_text, observation.release_dt)
+            if self._schedule_pre_release_without_tab(observation.url, observation.release_dt, "HTTP monitor"):
+                self.http_release_monitor.watch(observation.url)
+
+        self.http_release_monitor.start_watching(self.__HTTP_RECHECK_SECONDS, lambda observation: self.ready_sneakers.put((self.__RELEASE_CHANGED, observation.url)))
+
+    def _handle_http_release_change(self, sneaker_url: str):
+        '''
+        Reschedules a sneaker that is only being watched over HTTP after its release time moved
+        '''
+        if self.sneaker_tabs.get(sneaker_url) is not None or self.sneaker_purchase_states.get(sneaker_url) != self.PurchaseState.PRE_RELEASE:
+            return
+
+        release_dt = self.http_release_monitor.observations[sneaker_url].release_dt
+        if release_dt is None:
+            # The banner went away, it might have dropped early so get a tab on it right now
+            self._schedule_wakeup(sneaker_url, 0)
+            self._record_event(sneaker_url, SneakerEventCode.HTTP_RELEASE_LOST)
+            return
+
+        self._cache_release(sneaker_url, self.http_release_monitor.observations[sneaker_url].availability_text, release_dt)
+        wait_seconds = self._schedule_wakeup_at(sneaker_url, release_dt - datetime.timedelta(minutes=self.__MINUTES_BEFORE_SALE_WAKEUP))
+        self._record_event(sneaker_url, SneakerEventCode.HTTP_RELEASE_MOVED, release_dt=release_dt, wait_seconds=wait_seconds)
+
+    def _hand_off_to_tab(self, sneaker_url: str) -> bool:
+        '''
+        Moves a sneaker that was only watched over HTTP, parked, did not fit in the tab pool or lost its tab with a browser
+        that died into its own browser tab
+        :return: true if the tab was opened
+        '''
+        if self.http_release_monitor:
+            self.http_release_monitor.unwatch(sneaker_url)
+        if self.sneaker_purchase_states[sneaker_url] == self.PurchaseState.NOT_STARTED:
+            return self._open_sneaker_tab(sneaker_url)
+
+        tab_handle = self._open_new_tab(sneaker_url)
+        self.sneaker_tabs[sneaker_url] = tab_handle
+        if tab_handle is None:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_OPEN_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
+            return False
+
+        self._record_event(sneaker_url, self.tabless_sneakers.pop(sneaker_url, SneakerEventCode.HANDED_OFF_TO_TAB))
+        return True
+
+    def _open_sneaker_tab(self, sneaker_url: str) -> bool:
+        '''
+        Opens the sneakers tab, moving it to ERROR if that did not work
+        :return: true if the tab was opened
+        '''
+        tab_handle = self._open_new_tab(sneaker_url)
+        self.sneaker_tabs[sneaker_url] = tab_handle
+        if tab_handle is None:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_OPEN_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
+            return False
+
+        self._record_event(sneaker_url, SneakerEventCode.TAB_CREATED)
+        return True
+
     def _open_new_tab(self, url :str):
         try:
-            self.driver.execute_script("window.open();")
-            time.sleep(self.__FASTEST_REFRESH_SECONDS)
-            tab_handle = self.driver.window_handles[-1]
-            self.driver.switch_to.window(tab_handle)
+            tab_handle = self._acquire_tab(url) if self.tab_pool else self._open_blank_tab()
+            self.tab_focus.focus(tab_handle)
+            # before the first load, so even that skips what a watched product page does not need
+            if self.resource_profiles:
+                self.resource_profiles.apply("monitoring", tab_handle)
             self.driver.get(url)
         except Exception as e:
-            self.logger.error("Unable to open new tab for driver..." + e)
+            self.logger.error(f"Unable to open new tab for driver... {e}")
+            if self.tab_pool:
+                self._close_pooled_tab(url)
             return None
 
         return tab_handle
 
+    def _open_blank_tab(self) -> str:
+        '''
+        :return: handle of a newly opened tab, which the driver is switched to
+        '''
+        existing_handles = self.driver.window_handles
+        # window.open needs a window to run in, the one the driver was on might have just been closed
+        if self.tab_focus.current not in existing_handles:
+            self.tab_focus.focus(existing_handles[0])
+        self.driver.execute_script("window.open();")
+        tab_handle = self.waiter.until(new_window_opened(existing_handles), self.__NEW_TAB_TIMEOUT_SECONDS, step="new_tab")
+        self.tab_focus.focus(tab_handle)
+        return tab_handle
+
+    def _acquire_tab(self, sneaker_url: str) -> str:
+        '''
+        Gets the sneaker a tab out of the tab pool, when it is full a finished sneaker or the one whose next wake-up is
+        furthest away gives up theirs
+        :return: handle of the tab
+        '''
+        if self.tab_pool.is_full():
+            victim_url = self.tab_pool.pick_victim(self._tab_eviction_rank)
+            if victim_url is not None:
+                self._park_tab(victim_url, evicted_for=sneaker_url)
+
+        tab_handle, how = self.tab_pool.acquire(sneaker_url)
+        if how == TabPool.REUSED:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_REUSED)
+        elif how == TabPool.OVER_CAP:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_OVER_CAP, max_tabs=self.tab_pool.max_tabs)
+        return tab_handle
+
+    def _tab_eviction_rank(self, sneaker_url: str):
+        '''
+        :return: sort key of how willingly the sneaker gives its tab up, finished sneakers first and then the furthest
+        wake-up first, None if it needs its tab
+        '''
+        if self.sneaker_purchase_states.get(sneaker_url) in self.purchase_machine.TERMINAL_STATES:
+            return (0, 0.0)
+        if self._can_park(sneaker_url):
+            return (1, -self.sneaker_wakeup_deadlines[sneaker_url])
+        return None
+
+    def _can_park(self, sneaker_url: str) -> bool:
+        '''
+        :return: true if the sneaker is waiting on a wake-up before its release far enough away that it is not worth
+        keeping a tab open for, that wake-up gets it a tab again like it would a sneaker only watched over HTTP
+        '''
+        if self.sneaker_purchase_states.get(sneaker_url) != self.PurchaseState.PRE_RELEASE or not self._has_pending_wakeup(sneaker_url):
+            return False
+        return self.sneaker_wakeup_deadlines[sneaker_url] - self.clock.monotonic() > LocalConfig.TAB_POOL_PARK_AFTER_SECONDS
+
+    def _park_tab(self, sneaker_url: str, evicted_for: str = None):
+        '''
+        Gives the sneakers tab back to the pool, a finished sneaker is done with it, anything else gets a tab again at
+        its next wake-up
+        :param evicted_for: url of the sneaker the tab is being taken for, None when it is given back by itself
+        '''
+        self.tab_pool.release(sneaker_url)
+        self.sneaker_tabs[sneaker_url] = None
+        if self.sneaker_purchase_states[sneaker_url] in self.purchase_machine.TERMINAL_STATES:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_RECLAIMED, evicted_for=evicted_for)
+            return
+
+        self.tabless_sneakers[sneaker_url] = SneakerEventCode.TAB_UNPARKED
+        if self.http_release_monitor:
+            self.http_release_monitor.watch(sneaker_url)
+        wait_seconds = self.sneaker_wakeup_deadlines[sneaker_url] - self.clock.monotonic()
+        if evicted_for is None:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_PARKED, wait_seconds=wait_seconds)
+        else:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_EVICTED, evicted_for=evicted_for, wait_seconds=wait_seconds)
+
+    def _close_pooled_tab(self, sneaker_url: str):
+        tab_handle = self.tab_pool.tabs.get(sneaker_url)
+        try:
+            self.tab_pool.close(sneaker_url)
+        except Exception as e:
+            self.logger.error(f"Unable to close the tab of {sneaker_url} - {e}")
+        if tab_handle is not None and self.resource_profiles:
+            self.resource_profiles.forget(tab_handle)
+
+    def _schedule_heartbeat(self):
+        self.scheduler.schedule_in(LocalConfig.DRIVER_HEARTBEAT_SECONDS, lambda: self.ready_sneakers.put(self.__HEARTBEAT), key=self.__HEARTBEAT)
+
+    def _heartbeat(self):
+        '''
+        Checks the driver is still answering and checkpoints every sneaker that moved since the last heartbeat. A driver
+        that stopped answering is replaced first, so a checkpoint is never taken of sneakers erroring on a dead browser
+        '''
+        driver_answering = not self.watchdog or self._check_driver()
+        if driver_answering and self.checkpoints:
+            self._save_checkpoints()
+        self._schedule_heartbeat()
+
+    def _check_driver(self) -> bool:
+        '''
+        :return: true if the driver answered or was replaced with one that does, false if it is still down
+        '''
+        if self.watchdog.check(self.driver):
+            return True
+        self.logger.error("Driver stopped answering, replacing it with a new browser")
+        return self._recover_driver()
+
+    def _recover_driver(self) -> bool:
+        '''
+        Builds a new driver, puts every sneaker that moved since its last checkpoint back to where it was and reopens
+        the tabs of every sneaker that needs one, the rest get theirs at their next wake-up
+        :return: true if there is a working driver again, false if building one failed and the next heartbeat should retry
+        '''
+        try:
+            driver = self.driver_factory()
+        except Exception as e:
+            self.watchdog.recovery_failed()
+            self.logger.error(f"Unable to build a new driver, trying again at the next heartbeat - {e}")
+            return False
+
+        try:
+            self.driver.quit()
+        except Exception:
+            # it is already gone, that is why it is being replaced
+            pass
+        self._replace_driver(driver)
+        for listener in self._driver_listeners:
+            listener(self.driver)
+
+        rolled_back = self._roll_back_to_checkpoints()
+        for sneaker_url, state in list(self.sneaker_purchase_states.items()):
+            if state in self.purchase_machine.TERMINAL_STATES:
+                continue
+            if state == self.PurchaseState.NOT_STARTED:
+                # its first handling opens its tab like normal, it is still queued for that unless it was just put back
+                if sneaker_url in rolled_back:
+                    self.ready_sneakers.put(sneaker_url)
+            elif self.tab_pool and self._can_park(sneaker_url):
+                self.tabless_sneakers[sneaker_url] = SneakerEventCode.TAB_RECOVERED
+            elif self._reopen_tab(sneaker_url) and (sneaker_url in rolled_back or not self._has_pending_wakeup(sneaker_url)):
+                self.ready_sneakers.put(sneaker_url)
+
+        recovery_seconds = self.watchdog.recovered()
+        self.logger.info(f"Back on a new browser {recovery_seconds * 1000.0:.0f}ms after the driver stopped answering, "
+                         f"{len(rolled_back)} sneakers put back from their checkpoints")
+        return True
+
+    def _replace_driver(self, driver):
+        '''
+        Moves everything that talks to the driver over to the new one, none of the old tabs exist on it
+        '''
+        if LocalConfig.DRIVER_TRACING:
+            driver = trace_driver(driver, self.tracer)
+        self.driver = driver
+        self.tracer = getattr(driver, "tracer", None)
+        self.size_grid_extractor = SizeGridExtractor(driver)
+        self.waiter.driver = driver
+        self.tab_focus.driver = driver
+        self.tab_focus.forget()
+        if self.resource_profiles:
+            self.resource_profiles.reset(driver)
+        if self.tab_pool:
+            self.tab_pool.reset(driver)
+        for sneaker_url in self.sneaker_tabs:
+            self.sneaker_tabs[sneaker_url] = None
+
+    def _roll_back_to_checkpoints(self) -> list:
+        '''
+        Puts sneakers that moved since their last checkpoint back to the state and attempts they were checkpointed with,
+        whatever they read off a dying browser cannot be trusted and is read again on the new one. A purchase is never
+        rolled back.
+        :return: urls of the sneakers that were put back
+        '''
+        rolled_back = []
+        if not self.checkpoints:
+            return rolled_back
+        for sneaker_url, state in list(self.sneaker_purchase_states.items()):
+            checkpoint = self.checkpoints.get(sneaker_url)
+            if (checkpoint is None or state == self.PurchaseState.PURCHASED or
+                checkpoint.state in (self.PurchaseState.ERROR.name, self.PurchaseState.PURCHASED.name) or
+                (checkpoint.state == state.name and checkpoint.attempts == self.sneaker_purchase_attempts.get(sneaker_url, 0))):
+                continue
+            self.sneaker_purchase_attempts[sneaker_url] = checkpoint.attempts
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState[checkpoint.state])
+            self._record_event(sneaker_url, SneakerEventCode.ROLLED_BACK, restored_state=checkpoint.state)
+            rolled_back.append(sneaker_url)
+        return rolled_back
+
+    def _reopen_tab(self, sneaker_url: str) -> bool:
+        '''
+        Opens a tab for a sneaker that is part way through, moving it to ERROR if that did not work
+        :return: true if the tab was opened
+        '''
+        tab_handle = self._open_new_tab(sneaker_url)
+        self.sneaker_tabs[sneaker_url] = tab_handle
+        if tab_handle is None:
+            self._record_event(sneaker_url, SneakerEventCode.TAB_OPEN_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
+            return False
+
+        self.tabless_sneakers.pop(sneaker_url, None)
+        self._record_event(sneaker_url, SneakerEventCode.TAB_RECOVERED)
+        return True
+
+    def _checkpoint(self, sneaker_url: str) -> SneakerCheckpoint:
+        wakeup_target = self.sneaker_wakeup_targets.get(sneaker_url) if self._has_pending_wakeup(sneaker_url) else None
+        return SneakerCheckpoint(sneaker_url, self.sneaker_purchase_states[sneaker_url].name, self.sneaker_purchase_attempts.get(sneaker_url, 0),
+                                 wakeup_target, self.sneaker_tabs.get(sneaker_url) is not None, self.clock.time())
+
+    def _save_checkpoints(self):
+        '''
+        Checkpoints every sneaker that moved since its last checkpoint, all in one write
+        '''
+        dirty = [sneaker_url for sneaker_url in self._dirty_checkpoints if sneaker_url in self.sneaker_purchase_states]
+        self._dirty_checkpoints = set()
+        try:
+            self.checkpoints.save(self._checkpoint(sneaker_url) for sneaker_url in dirty)
+        except Exception as e:
+            # they are tried again at the next heartbeat
+            self._dirty_checkpoints.update(dirty)
+            self.logger.error(f"Unable to checkpoint {len(dirty)} sneakers - {e}")
+
+    def _resume_from_checkpoints(self):
+        '''
+        Picks every sneaker up from where a previous run checkpointed it. Purchased ones stay purchased, ones waiting on
+        a wake-up still to come are scheduled for it without a tab, ones closer to their release get their tab back
+        straight away. Sneakers that errored or whose wake-up already passed start over.
+        '''
+        try:
+            checkpoints = self.checkpoints.load()
+        except Exception as e:
+            self.logger.error(f"Unable to read purchase checkpoints, every sneaker starts over - {e}")
+            return
+
+        server_now = self.clock_calibrator.server_now()
+        for sneaker_url in self.sneaker_urls:
+            checkpoint = checkpoints.get(sneaker_url)
+            if checkpoint is None or checkpoint.state not in self.PurchaseState.__members__:
+                continue
+            state = self.PurchaseState[checkpoint.state]
+            wakeup_ahead = checkpoint.wakeup_target is not None and checkpoint.wakeup_target > server_now
+            if state in (self.PurchaseState.NOT_STARTED, self.PurchaseState.ERROR) or (state == self.PurchaseState.PRE_RELEASE and not wakeup_ahead):
+                continue
+
+            self.sneaker_purchase_attempts[sneaker_url] = checkpoint.attempts
+            self.purchase_machine.set_state(sneaker_url, state)
+            self._record_event(sneaker_url, SneakerEventCode.RESUMED_FROM_CHECKPOINT)
+            saved_minutes_ago = (self.clock.time() - checkpoint.saved_at) / 60.0
+            if state == self.PurchaseState.PURCHASED:
+                self.logger.warning(f"Skipping {sneaker_url}, a run {saved_minutes_ago:.0f} minutes ago already purchased it. Turn off "
+                                    f"RESUME_FROM_CHECKPOINTS to buy it again", extra=self._log_context(sneaker_url))
+                continue
+            self.logger.warning(f"Picking {sneaker_url} up in {state.name} from a run {saved_minutes_ago:.0f} minutes ago",
+                                extra=self._log_context(sneaker_url))
+            if state == self.PurchaseState.PRE_RELEASE:
+                self.tabless_sneakers[sneaker_url] = SneakerEventCode.TAB_RECOVERED
+                self._schedule_wakeup_at(sneaker_url, checkpoint.wakeup_target)
+            elif self._reopen_tab(sneaker_url):
+                if wakeup_ahead:
+                    self._schedule_wakeup_at(sneaker_url, checkpoint.wakeup_target)
+                else:
+                    self.ready_sneakers.put(sneaker_url)
+
     def _handle_sneaker_tab_state(self, sneaker_url: str):
         '''
-        Given a sneaker URL, attempt to grab its state, and do the following:
-        - Check if the given timer is null or should be processed yet, if so exits
-        - Refresh the page/go to the url
-        - extract the value of when it will be released
-        - Update the state of the thread based on how much time is left
-        - Attempt to purchase if it is now available
-        - create new timer if it has moved state
+        Given a sneaker URL whose wake-up has come due, hands it to the state machine which reloads its tab, reads when
+        it will be released, moves its state, schedules the next wake-up and attempts to purchase it once it is out.
         :param sneaker_url: url of the sneaker we are looking at
         '''
-        if (sneaker_url not in self.sneaker_timing_threads or
+        if (sneaker_url not in self.sneaker_wakeup_deadlines or
             sneaker_url not in self.sneaker_tabs or
             sneaker_url not in self.sneaker_purchase_states or
             sneaker_url not in self.sneaker_events):
             raise Exception("Unknown sneaker urls that was not present at instantiation of purchaser process!")
 
-        if self.sneaker_purchase_states[sneaker_url] == self.PurchaseState.ERROR or self.sneaker_purchase_states[sneaker_url] == self.PurchaseState.PURCHASED:
-            return
-
-        # Handle the first time (when there is no timer)
-        sneaker_timer = self.sneaker_timing_threads[sneaker_url]
-        sneaker_state = self.sneaker_purchase_states[sneaker_url]
+        self.purchase_machine.handle(sneaker_url)
 
-        if not sneaker_timer:
-            if sneaker_state == self.PurchaseState.NOT_STARTED:
+    def _reload_tab(self, sneaker_url, measure_response: bool = False):
+        '''
+        :param measure_response: also ask the page how long the site took to answer, one more round trip so it is only
+        done when nothing is waiting on the reload
+        '''
+        self.tab_focus.focus(self.sneaker_tabs[sneaker_url])
+        started_at = self.clock.monotonic()
+        self.driver.get(sneaker_url)
+        if self.release_timer:
+            navigation_seconds = self.clock.monotonic() - started_at
+            response_seconds = None
+            if measure_response:
                 try:
-                    # extract when it says it will be available from the nike website
-                    availability_dt = self._extract_tab_availablity_date(sneaker_url)
-
-                    # from not started, we will wait until minutes until before sale
-                    wakeup_dt = availability_dt - datetime.timedelta(minutes=self.__MINUTES_BEFORE_SALE_WAKEUP)
-                    now = datetime.datetime.now()
-                    wait_seconds = (wakeup_dt - now).total_seconds()
-
-                    # Create a timer, so that we can wait and start trying to grab it
-                    self.sneaker_timing_threads[sneaker_url] = self.TabTimingThread(wait_seconds)
-                    self.sneaker_events[sneaker_url].append(f"Created timer that will wake up in {wait_seconds} for url: {sneaker_url} and moved state to Pre Release")
-                    self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.PRE_RELEASE
+                    response_seconds = self.driver.execute_script(RESPONSE_START_SCRIPT)
                 except Exception as e:
-                    # If the url given is for a shoe that is already purchasa-able we will try to purchase it still
-                    self.logger.info(f"Attempting to purchase shoe one time.")
-                    purchase_worked = self._purchase_sneaker(sneaker_url)
-                    if purchase_worked:
-                        self.sneaker_events[sneaker_url].append(f"Sucessfully purchased sneaker!")
-                        self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.PURCHASED
-                    else:
-                        self.sneaker_events[sneaker_url].append(f"Could not process the state for sneaker at : {sneaker_url}. Given error is {e}")
-                        self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+                    self.logger.error(f"Unable to read how long the reload of {sneaker_url} took to answer - {e}", extra=self._log_context(sneaker_url))
+            self.release_timer.record(sneaker_url, navigation_seconds, response_seconds)
 
-            else:
-                self.logger(f"Somehowe had a sneaker url at : {sneaker_url} and it has no timer and is past a started state!")
-        elif sneaker_timer.has_finished_waiting(): # only consider the tab if the timer has finished waiting
-            self.sneaker_events[sneaker_url].append(f"Timer for sneaker at : {sneaker_url} is in {sneaker_state} state and has finished and it has been {sneaker_timer.how_long_ago_did_it_finish()} since it finished!")
-            try:
-                # extract when it says it will be available from the nike website
-                availability_dt = self._extract_tab_availablity_date()
-
-                # If it is pre-release then double check and set a timer to try reload right as it releases
-                if sneaker_state == self.PurchaseState.PRE_RELEASE:
-                    # wait until exactly the time it releases then try and buy.
-                    now = datetime.datetime.now()
-                    wait_seconds = (availability_dt - now).total_seconds()
-
-                    # NOTE: Might want to have it load 1 seconds before because there might be like 1 second of lag on selenium
-                    self.sneaker_timing_threads[sneaker_url] = self.TabTimingThread(wait_seconds)
-                    self.sneaker_events[sneaker_url].append(f"Created timer that will wake up in {wait_seconds} for url: {sneaker_url} and moved state to NEAR_RELEASE")
-                    self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.NEAR_RELEASE
-                # If we found that there is still an availability_dt element then our timer is just super slightly off so create a really small timer to go again
-                elif sneaker_state == self.PurchaseState.NEAR_RELEASE:
-                    self.sneaker_timing_threads[sneaker_url] = self.TabTimingThread(self.__FASTEST_REFRESH_SECONDS)
-                    self.sneaker_events[sneaker_url].append(f"Created timer that will wake up in {self.__FASTEST_REFRESH_SECONDS} for url: {sneaker_url} and moved state to NEAR_RELEASE")
-                    self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.NEAR_RELEASE
-            except Exception as e:
-                self.logger.info(f"Sneaker with url - {sneaker_url} cannot find availability element! Might now be purchasable!")
-                # If it was near release, and it cant find its element, it is now considered released
-                if sneaker_state == self.PurchaseState.NEAR_RELEASE:
-                    self.sneaker_events[sneaker_url].append(f"Sneaker cannot find availability element! Might now be purchasable!")
-                    self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.RELEASED
-
-                # anything that is released we can try to purchase
-                if self.sneaker_purchase_states[sneaker_url] == self.PurchaseState.RELEASED:
-                    self.logger.info(f"Attempting to purchase shoe!")
-                    purchase_worked = self._purchase_sneaker(sneaker_url)
-                    if purchase_worked:
-                        self.sneaker_events[sneaker_url].append(f"Sucessfully purchased sneaker!")
-                        self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.PURCHASED
-                    else:
-                        self.sneaker_events[sneaker_url].append(f"Failed to purchase sneaker!")
-                        if self.sneaker_purchase_attempts[sneaker_url] < self.__MAXIMUM_PURCHASE_RETRIES:
-                            self.sneaker_purchase_attempts[sneaker_url] += 1
-                        else:
-                            self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+    def _record_release_landing(self, sneaker_url: str, release_dt: datetime.datetime):
+        '''
+        Keeps track of how far off the release the decisive reload of a sneaker had its page ready
+        '''
+        self.release_timer.record_landing(self.clock.monotonic() - self.clock_calibrator.to_monotonic_deadline(release_dt))
 
     def _extract_tab_availablity_date(self, sneaker_url):
         '''
         Attempts to get a sneakers availablity.
-        :return: the datetime that this sneaker should be available.
+        :return: the timezone aware datetime that this sneaker should be available.
+        :raises ReleaseTimeParseException: if the element is there but its text is not a release time we can read
         '''
         try:
-            # Switch to the window for the sneaker itself
-            self.driver.switch_to.window(self.sneaker_tabs[sneaker_url])
+            # Switch to the window for the sneaker itself, which it usually already is on after the reload
+            self.tab_focus.focus(self.sneaker_tabs[sneaker_url])
             availability_element = self.driver.find_element(By.XPATH, self.availability_xpath)
             availability_text = availability_element.text
         except Exception as e:
             raise Exception("Was not able to find availability element!")
-
-        # make sure it has a string
-        if not availability_text:
+        # an empty banner is one that is hidden, which the site does once the sneaker is out
+        if not availability_text or not availability_text.strip():
             raise Exception("First found availability element found to not have any availability text!")
 
-        # make sure that it is valid
-        match = re.search(self.availability_pattern, availability_text)
-        if not match:
-            raise Exception(f"First found availability element has text of {availability_text} which does not match our expected format of Available <M/D> at <H:MM AM/PM>")
+        availability_dt = self._parse_availability_text(availability_text)
+        self._cache_release(sneaker_url, availability_text, availability_dt)
+        return availability_dt
 
-        # I love AI generated code! This regex and all this stupid formatting BS im having it handle
-        date_str = match.group(1)  # e.g., "2/22"
-        time_str = match.group(2)  # e.g., "9:00 AM"
+    def _cache_release(self, sneaker_url: str, availability_text: str, release_dt: datetime.datetime):
+        if not self.release_cache:
+            return
+        try:
+            if self.release_cache.put_release(sneaker_url, availability_text, release_dt):
+                self.logger.info(f"Availability of {sneaker_url} changed since it was cached, now {availability_text}")
+        except Exception as e:
+            # the cache is only ever a head start, a locked or broken cache file should not stop a purchase
+            self.logger.error(f"Unable to cache release of {sneaker_url} - {e}")
 
-        # Assume current year; construct a datetime object.
-        current_year = datetime.datetime.now().year
-        target_time_str = f"{current_year}/{date_str} {time_str}"
+    def _cache_size_grid(self, sneaker_url: str, size_grid: SizeGrid):
+        if not self.release_cache:
+            return
         try:
-            target_dt = datetime.datetime.strptime(target_time_str, "%Y/%m/%d %I:%M %p")
+            self.release_cache.put_size_labels(sneaker_url, size_grid.labels)
         except Exception as e:
-            raise Exception("Error parsing target datetime:", e)
+            self.logger.error(f"Unable to cache size grid of {sneaker_url} - {e}")
 
-        # I added this in for if its december and they drop on january
-        now = datetime.datetime.now()
-        if target_dt < now:
-            target_dt = target_dt.replace(year=current_year + 1)
+    def _cache_purchase_states(self):
+        try:
+            for sneaker_url, state in self.sneaker_purchase_states.items():
+                self.release_cache.put_page_state(sneaker_url, state.name)
+            self.release_cache.close()
+        except Exception as e:
+            self.logger.error(f"Unable to cache purchase states - {e}")
 
-        return target_dt
+    def _parse_availability_text(self, availability_text: str) -> datetime.datetime:
+        '''
+        Parses availability text read off the site against the sites clock and timezone
+        '''
+        return self.release_time_parser.parse(availability_text, self.clock_calibrator.server_now())
+
+    @classmethod
+    def parse_availability_text(cls, availability_text: str, now: datetime.datetime, release_timezone=None) -> datetime.datetime:
+        '''
+        Parses release text like "Available <M/D> at <H:MM AM/PM>" into the timezone aware datetime the sneaker becomes
+        available, see ReleaseTimeParser for every format it understands
+        :param now: timezone aware current time, used to work out the year
+        :param release_timezone: timezone the text is in, None means the same as this pc
+        '''
+        return ReleaseTimeParser(release_timezone).parse(availability_text, now)
 
     def _purchase_sneaker(self, sneaker_url):
         '''
-        Attempts to get a sneakers availablity.
-        :return: the datetime that this sneaker should be available.
+        Attempts to select the configured size, add it to the bag and checkout.
+        :return: true if the sneaker was purchased, false otherwise.
         '''
-        try:
-            # Switch to the window for the sneaker itself
-            self.driver.switch_to.window(self.sneaker_tabs[sneaker_url])
-            sizes_elements = self.driver.find_elements(By.XPATH, self.sizes_xpath)
-            purchase_button_element = self.driver.find_element(By.XPATH, self.purchase_button_xpath)
-        except Exception as e:
-            raise Exception("Was not able to find sizes or purchase elements!")
+        with self._span("purchase_attempt", sneaker_url, attempt=self.sneaker_purchase_attempts[sneaker_url] + 1):
+            try:
+                # Switch to the window for the sneaker itself, then grab every size and the buy button in one round trip
+                self.tab_focus.focus(self.sneaker_tabs[sneaker_url])
+                size_grid = self.size_grid_extractor.extract(self.sizes_xpath, self.purchase_button_xpath)
+            except Exception as e:
+                raise Exception("Was not able to find sizes or purchase elements!")
 
-        purchase_size = self.sneaker_sizes[sneaker_url]
+            if not size_grid.purchase_button:
+                raise Exception("Was not able to find sizes or purchase elements!")
+
+            # the size txt will be M # / W # and the grid is indexed on each half, so this is an exact match
+            size_button = size_grid.find(self.sneaker_sizes[sneaker_url])
+            if size_button is None:
+                self.logger.error(f"Size {self.sneaker_sizes[sneaker_url]} is not one of the {len(size_grid)} sizes on the page: {size_grid.labels}", extra=self._log_context(sneaker_url))
+                self._cache_size_grid(sneaker_url, size_grid)
+                return False
 
-        # Find the size for shoe
-        for size_element in sizes_elements:
             try:
-                button = size_element.find_element(By.TAG_NAME, "button")  # Find the button inside the <li>
-                size_text = button.text
-                # the size txt will be M # / F # so search for our specific size as a substring
-                if purchase_size in size_text:
-                    button.click()
-                    purchase_button_element.click()
-                    return self.__checkout(sneaker_url)
+                size_button.click()
+                self._mark_stage(sneaker_url, "size_selected")
+                size_grid.purchase_button.click()
+                self._mark_stage(sneaker_url, "added_to_bag")
             except Exception as e:
-                self.logger.error("Failed to find a size button on the size list element! Xpath schema broken!")
-                continue
+                self.logger.error(f"Failed to click the size or purchase button! - {e}", extra=self._log_context(sneaker_url))
+                return False
 
-        return False
+            with self._span("checkout"):
+                purchased = self.__checkout(sneaker_url)
+            # cached after checkout so the write never sits between the drop and the order
+            self._cache_size_grid(sneaker_url, size_grid)
+            return purchased
 
     def __checkout(self, sneaker_url):
         '''
         Attempts to flow through the checkout process
         :return: true if it was able to log out, false if an exception or error occured.
         '''
-        # Try to click the checkout button that should have appeared
+        # Try to click the checkout button once it has appeared
         try:
-            checkout_element = self.driver.find_element(By.XPATH, self.checkout_botton_xpath)
+            checkout_element = self.waiter.until(element_clickable(self.checkout_botton_xpath), self.__CHECKOUT_STEP_TIMEOUT_SECONDS, step="checkout_button")
             checkout_element.click()
+            self._mark_stage(sneaker_url, "checkout_clicked")
         except Exception as e:
-            self.sneaker_events[sneaker_url].append("Was not able to find and click the checkout element!")
-            self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+            self._record_event(sneaker_url, SneakerEventCode.CHECKOUT_BUTTON_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
             return False
 
-        if "nike.com/checkout" not in self.driver.current_url:
-            self.sneaker_events[sneaker_url].append(f"Clicked checkout button but was not able to navigate to checkout page!")
-            self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+        if not self.waiter.until_or_none(url_contains(self.checkout_url_fragment), self.__CHECKOUT_STEP_TIMEOUT_SECONDS, step="checkout_page"):
+            self._record_event(sneaker_url, SneakerEventCode.CHECKOUT_NAVIGATION_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
             return False
 
         #Input the cvv number
         try:
-            # the payment ui changes based on what is selected so we need to grab the iframe and switch to that.
-            cvv_iframe = self.driver.find_element(By.XPATH, self.cvv_iframe_xpath)
-            self.driver.switch_to.frame(cvv_iframe)
+            # the payment ui changes based on what is selected so we need to wait on the iframe and switch to that.
+            self.waiter.until(iframe_ready(self.cvv_iframe_xpath), self.__CHECKOUT_STEP_TIMEOUT_SECONDS, step="cvv_iframe")
+            # whatever happens in the frame the tab has to come back out of it, later commands on it would run in there
+            try:
+                # Remove all the heavy strings that likely load with javascript
+                cvv_element = self.waiter.until(element_present(self.cvv_input_xpath), self.__CHECKOUT_STEP_TIMEOUT_SECONDS, step="cvv_input")
+                cvv_element.send_keys(LocalConfig.CVV_NUMBER)
+                # The frame may mask or reformat the cvv, so only check something its length went in and carry on either way
+                if not self.waiter.until_or_none(element_value_filled(self.cvv_input_xpath, len(LocalConfig.CVV_NUMBER)),
+                                                 self.__CVV_ENTRY_TIMEOUT_SECONDS, step="cvv_entry"):
+                    self.logger.warning(f"Could not see the cvv in the payment frame for {sneaker_url}, checking out anyway")
+            finally:
+                self.driver.switch_to.default_content()
 
-            # Remove all the heavy strings that likely load with javascript
-            cvv_element = self.driver.find_element(By.XPATH, self.cvv_input_xpath)
-            cvv_element.send_keys(LocalConfig.CVV_NUMBER)
-            time.sleep(.25)
-            self.driver.switch_to.default_content()
+            self._mark_stage(sneaker_url, "cvv_entered")
 
-            order_review_btn = self.driver.find_element(By.XPATH, self.order_review_btn_xpath)
+            order_review_btn = self.waiter.until(element_clickable(self.order_review_btn_xpath), self.__CHECKOUT_STEP_TIMEOUT_SECONDS, step="order_review_button")
             order_review_btn.click()
+            self._mark_stage(sneaker_url, "order_review_clicked")
         except Exception as e:
-            self.sneaker_events[sneaker_url].append("Could not find cvv element or order review button to checkout!")
-            self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+            self._record_event(sneaker_url, SneakerEventCode.CVV_OR_ORDER_REVIEW_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
             return False
 
         # Finally click the submit payment button and make sure it went through!
         try:
-            btn_elements = self.driver.find_elements(By.XPATH, self.general_btn_xpath)
-            submit_btn_element = None
-            for e in btn_elements:
-                if e.text and "Submit Payment" in e.text:
-                    submit_btn_element = e
-                    break
+            submit_btn_element = self.waiter.until_or_none(element_with_text(self.general_btn_xpath, "Submit Payment"), self.__CHECKOUT_STEP_TIMEOUT_SECONDS, step="submit_payment_button")
 
             if submit_btn_element:
                 submit_btn_element.click()
+                self._mark_stage(sneaker_url, "payment_submitted")
             else:
                 # raise an exception here so we can do the logging and state change in the catch
                 raise Exception()
         except Exception as e:
-            self.sneaker_events[sneaker_url].append("Could not find and click the submit payment button!")
-            self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+            self._record_event(sneaker_url, SneakerEventCode.SUBMIT_PAYMENT_FAILED)
+            self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
             return False
 
         # Make sure there isnt a payment error modal
@@ -383,8 +1170,8 @@ class SneakerPurchaseProcess():
             if payment_error_element:
                 payment_error_reason_element = self.driver.find_element(By.XPATH, self.payment_error_reason_xpath)
                 error_text = payment_error_reason_element.text
-                self.sneaker_events[sneaker_url].append(f"Payment was submitted but rejected by website for some error - {error_text}")
-                self.sneaker_purchase_states[sneaker_url] = self.PurchaseState.ERROR
+                self._record_event(sneaker_url, SneakerEventCode.PAYMENT_REJECTED, error_text=error_text)
+                self.purchase_machine.set_state(sneaker_url, self.PurchaseState.ERROR)
                 return False
         except Exception as e:
             # An error occured while looking for an error, The enemy of my enemy is my friend
@@ -393,8 +1180,4 @@ class SneakerPurchaseProcess():
         return True
 
     def __have_all_been_purchased(self):
-        any_not_processed_or_error = False
-        for state in self.sneaker_purchase_states.values():
-            if state != self.PurchaseState.ERROR and state != self.PurchaseState.PURCHASED:
-                any_not_processed_or_error = True
-        return any_not_processed_or_error
\ No newline at end of file
+        return not self.purchase_machine.is_finished()
@@ -0,0 +1,118 @@
+import datetime
+import threading
+
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.testing.fake_web_driver import FakeElement, FakePage, FakeSite
+from src.testing.nike_stand_in_server import NikeStandInServer
+
+class FakeNikeSite(FakeSite):
+    '''
+    The NikeStandInServer timeline as FakePages for a FakeWebDriver, built on the same XPaths SneakerPurchaseProcess
+    looks for. Product pages show the "Available M/D at H:MM AM/PM" element until the scripted release passes on the
+    sites clock, then the sizes and buy button. Buying shows the checkout button, which leads to the checkout page with
+    the CVV iframe, order review and submit payment buttons.
+
+    Events (release_live, order_received) are recorded on the clocks monotonic() like the stand-in does, so they line
+    up with the stage times of a process running on the same clock.
+    '''
+
+    base_url = "https://www.nike.com"
+    product_path_prefix = NikeStandInServer.product_path_prefix
+    checkout_path = NikeStandInServer.checkout_path
+    default_sizes = NikeStandInServer.default_sizes
+
+    def __init__(self, release_at: float = None, sizes=None, clock=None, clock_skew_seconds: float = 0.0, payment_error: str = None):
+        '''
+        :param payment_error: reason to reject the payment with, None lets the order through
+        '''
+        super().__init__(clock=clock, clock_skew_seconds=clock_skew_seconds)
+        self.sizes = sizes or self.default_sizes
+        self.payment_error = payment_error
+        self._lock = threading.Lock()
+        self.release_at = None
+        # product url -> epoch seconds it releases at, for products that do not drop with everything else
+        self.product_releases = {}
+        # clock.monotonic() of scripted events in the timeline
+        self.events = {}
+        # how many orders were submitted
+        self.orders = 0
+        self.add_page(self.base_url + self.checkout_path, self._render_checkout_page)
+        if release_at is not None:
+            self.schedule_release(release_at)
+
+    def schedule_release(self, release_at: float):
+        '''
+        Scripts the release for release_at (epoch seconds on the sites clock) and clears the previous timeline
+        '''
+        with self._lock:
+            self.release_at = release_at
+            self.events = {"release_live": self.clock.monotonic() + (release_at - self.server_time())}
+
+    def schedule_product_release(self, url: str, release_at: float):
+        '''
+        Scripts a release for just the product at url, it is not part of the timeline in events
+        '''
+        with self._lock:
+            self.product_releases[url] = release_at
+
+    def is_released(self, url: str = None) -> bool:
+        release_at = self.product_releases.get(url, self.release_at)
+        return release_at is not None and self.server_time() >= release_at
+
+    def product_url(self, slug: str) -> str:
+        return f"{self.base_url}{self.product_path_prefix}{slug}"
+
+    def load(self, url: str) -> FakePage:
+        if url.startswith(self.base_url + self.product_path_prefix):
+            return self._render_product_page(url)
+        return super().load(url)
+
+    def _render_product_page(self, url: str) -> FakePage:
+        title = url.rsplit("/", 1)[-1].replace("-", " ").title()
+        if not self.is_released(url):
+            # Show the release in local time the way the stand-in does
+            release_at = self.product_releases.get(url, self.release_at)
+            release_dt = datetime.datetime.fromtimestamp(release_at if release_at is not None else self.server_time() + 86400)
+            hour = release_dt.hour % 12 or 12
+            availability_text = f"Available {release_dt.month}/{release_dt.day} at {hour}:{release_dt.minute:02d} {'AM' if release_dt.hour < 12 else 'PM'}"
+            return FakePage(title, {SneakerPurchaseProcess.availability_xpath: [FakeElement(availability_text)]})
+
+        sizes = [FakeElement(size, "li", {"data-qa": "size-available"}, children={"button": [FakeElement(size, "button")]})
+                 for size in self.sizes]
+        checkout_button = FakeElement("Checkout", "button", {"data-qa": "checkout-link"}, displayed=False,
+                                      on_click=lambda driver: driver.get(self.base_url + self.checkout_path))
+
+        def show_checkout(driver):
+            checkout_button.displayed = True
+
+        purchase_button = FakeElement("Add to Bag", "button", on_click=show_checkout)
+        return FakePage(title, {
+            SneakerPurchaseProcess.sizes_xpath: sizes,
+            SneakerPurchaseProcess.purchase_button_xpath: [purchase_button],
+            SneakerPurchaseProcess.checkout_botton_xpath: [checkout_button],
+        })
+
+    def _render_checkout_page(self, url: str) -> FakePage:
+        cvv_frame = FakePage(elements={SneakerPurchaseProcess.cvv_input_xpath: [FakeElement(tag_name="input", attributes={"id": "cvNumber"})]})
+        page = FakePage("Checkout", {
+            SneakerPurchaseProcess.cvv_iframe_xpath: [FakeElement(tag_name="iframe", frame=cvv_frame)],
+        })
+        submit_button = FakeElement("Submit Payment", "button", {"type": "button"}, displayed=False,
+                                    on_click=lambda driver: self._submit_order(page))
+
+        def show_order_review(driver):
+            submit_button.displayed = True
+
+        page.add_element(SneakerPurchaseProcess.order_review_btn_xpath,
+                         FakeElement("Continue to Order Review", "button", on_click=show_order_review))
+        page.add_element(SneakerPurchaseProcess.general_btn_xpath, submit_button)
+        return page
+
+    def _submit_order(self, page: FakePage):
+        with self._lock:
+            self.orders += 1
+            if self.payment_error:
+                page.add_element(SneakerPurchaseProcess.payment_error_xpath, FakeElement("Payment Error", "h1"))
+                page.add_element(SneakerPurchaseProcess.payment_error_reason_xpath, FakeElement(self.payment_error, "p"))
+                return
+            self.events.setdefault("order_received", self.clock.monotonic())
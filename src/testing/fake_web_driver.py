@@ -0,0 +1,390 @@
+import itertools
+import math
+
+from selenium.common.exceptions import ElementNotInteractableException, NoSuchElementException, NoSuchWindowException
+
+from src.utils.clock import SYSTEM_CLOCK
+
+class FakeElement():
+    '''
+    An element on a FakePage. Clicking it runs its on_click with the driver, typing into it appends to its value, and
+    like selenium a hidden element has no text.
+    '''
+
+    def __init__(self, text: str = "", tag_name: str = "div", attributes: dict = None, displayed: bool = True,
+                 enabled: bool = True, on_click=None, children: dict = None, frame=None):
+        '''
+        :param on_click: optional callable(driver) run every time the element is clicked
+        :param children: locator -> list of FakeElement found inside this element
+        :param frame: the FakePage an iframe element holds
+        '''
+        self._text = text
+        self.tag_name = tag_name
+        self.attributes = dict(attributes or {})
+        self.displayed = displayed
+        self.enabled = enabled
+        self.on_click = on_click
+        self.children = children or {}
+        self.frame = frame
+        self.value = self.attributes.pop("value", "")
+        self.click_count = 0
+        # set by the driver when the page holding the element is loaded, so clicks know who clicked them
+        self.driver = None
+
+    @property
+    def text(self) -> str:
+        return self._text if self.displayed else ""
+
+    @text.setter
+    def text(self, text: str):
+        self._text = text
+
+    def get_attribute(self, name: str):
+        if name == "value":
+            return self.value
+        return self.attributes.get(name)
+
+    get_property = get_attribute
+    get_dom_attribute = get_attribute
+
+    def is_displayed(self) -> bool:
+        return self.displayed
+
+    def is_enabled(self) -> bool:
+        return self.enabled
+
+    def is_selected(self) -> bool:
+        return bool(self.attributes.get("selected"))
+
+    def click(self):
+        if not (self.displayed and self.enabled):
+            raise ElementNotInteractableException(f"{self!r} is not displayed and enabled")
+        self.click_count += 1
+        if self.on_click:
+            self.on_click(self.driver)
+
+    def send_keys(self, *keys):
+        self.value += "".join(str(key) for key in keys)
+
+    def clear(self):
+        self.value = ""
+
+    def find_element(self, by=None, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"No child {value} in {self!r}")
+        return elements[0]
+
+    def find_elements(self, by=None, value=None):
+        return list(self.children.get(value, ()))
+
+    def __repr__(self):
+        return f"FakeElement({self.tag_name}, {self._text!r})"
+
+class FakePage():
+    '''
+    What a url shows once it is loaded. Elements are looked up by the exact locator (xpath, id, ...) the code asks
+    for, whatever the By it is asked with.
+    '''
+
+    def __init__(self, title: str = "", elements: dict = None, html: str = None, ready_state: str = "complete"):
+        '''
+        :param elements: locator -> list of FakeElement
+        :param html: page source to hand back, made up from the element texts when not given
+        '''
+        self.title = title
+        self.elements = {locator: list(found) for locator, found in (elements or {}).items()}
+        self.html = html
+        self.ready_state = ready_state
+        # anything scripts store on window, e.g. the key events NikePurchaser listens for
+        self.window = {}
+
+    def find_elements(self, locator: str):
+        return list(self.elements.get(locator, ()))
+
+    def add_element(self, locator: str, element: FakeElement):
+        self.elements.setdefault(locator, []).append(element)
+
+    def all_elements(self):
+        for found in self.elements.values():
+            for element in found:
+                yield element
+                for children in element.children.values():
+                    yield from children
+
+    @property
+    def page_source(self) -> str:
+        if self.html is not None:
+            return self.html
+        body = "".join(f"<{element.tag_name}>{element.text}</{element.tag_name}>" for element in self.all_elements())
+        return f"<html><head><title>{self.title}</title></head><body>{body}</body></html>"
+
+class FakeSite():
+    '''
+    The pages a FakeWebDriver can load. A page is either a FakePage handed out as is, or a callable(url) building a
+    fresh FakePage on every load so it can show whatever the scripted timeline says right then.
+    '''
+
+    not_found_title = "404"
+
+    def __init__(self, pages: dict = None, clock=None, clock_skew_seconds: float = 0.0):
+        self.pages = dict(pages or {})
+        self.clock = clock or SYSTEM_CLOCK
+        self.clock_skew_seconds = clock_skew_seconds
+
+    def add_page(self, url: str, page):
+        self.pages[url] = page
+
+    def server_time(self) -> float:
+        '''
+        :return: what the sites (possibly skewed) clock reads as epoch seconds
+        '''
+        return self.clock.time() + self.clock_skew_seconds
+
+    def load(self, url: str) -> FakePage:
+        page = self.pages.get(url)
+        if page is None:
+            return FakePage(self.not_found_title)
+        return page(url) if callable(page) else page
+
+    def date_sampler(self):
+        '''
+        :return: a clock sampler for ServerClockCalibrator that reads the sites clock the way its Date header would
+        '''
+        return FakeDateSampler(self)
+
+class FakeDateSampler():
+    def __init__(self, site: FakeSite):
+        self.site = site
+
+    def take_sample(self):
+        sent_at = self.site.clock.time()
+        # the Date header only has a resolution of one second
+        return sent_at, self.site.clock.time(), float(math.floor(self.site.server_time()))
+
+class _FakeTab():
+    __slots__ = ("handle", "url", "page", "frame", "load_count")
+
+    def __init__(self, handle: str):
+        self.handle = handle
+        self.url = "about:blank"
+        self.page = FakePage()
+        self.frame = None
+        self.load_count = 0
+
+class FakeSwitchTo():
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, window_name: str):
+        if window_name not in self._driver._tabs:
+            raise NoSuchWindowException(f"No window with handle {window_name}")
+        self._driver._current = self._driver._tabs[window_name]
+        self._driver._current.frame = None
+
+    def frame(self, frame_reference):
+        if not isinstance(frame_reference, FakeElement) or frame_reference.frame is None:
+            raise NoSuchElementException(f"{frame_reference!r} is not an iframe")
+        self._driver._current.frame = frame_reference.frame
+
+    def default_content(self):
+        self._driver._current.frame = None
+
+    def parent_frame(self):
+        self._driver._current.frame = None
+
+class FakeWebDriver():
+    '''
+    In process stand-in for the parts of the WebDriver API the app uses, running on the scripted pages of a FakeSite
+    instead of a browser. Scripts are not run, the ones the app sends are recognised by what they do and answered from
+    the page, anything else is recorded in executed_scripts and answers None.
+
+    Every command can be made to take command_seconds on the drivers clock, so on a VirtualClock the timings still
+    look like something happened. Navigating takes load_seconds on top of that, the site renders the page half way
+    through it, like a real one answers the request before the page has finished loading.
+    '''
+
+    def __init__(self, site: FakeSite = None, clock=None, command_seconds: float = 0.0, load_seconds: float = 0.0):
+        self.clock = clock or (site.clock if site else SYSTEM_CLOCK)
+        self.site = site or FakeSite(clock=self.clock)
+        self.command_seconds = command_seconds
+        self.load_seconds = load_seconds
+        self.switch_to = FakeSwitchTo(self)
+        # (script, args) of every script that was not recognised
+        self.executed_scripts = []
+        self.cdp_commands = []
+        self.quit_called = False
+
+        self._handle_numbers = itertools.count(1)
+        self._tabs = {}
+        self._current = self._open_tab()
+
+    @property
+    def window_handles(self):
+        self._command()
+        return list(self._tabs)
+
+    @property
+    def current_window_handle(self) -> str:
+        self._command()
+        return self._current_tab().handle
+
+    @property
+    def current_url(self) -> str:
+        self._command()
+        return self._current_tab().url
+
+    @property
+    def title(self) -> str:
+        self._command()
+        return self._current_tab().page.title
+
+    @property
+    def page_source(self) -> str:
+        self._command()
+        tab = self._current_tab()
+        return (tab.frame or tab.page).page_source
+
+    def get(self, url: str):
+        self._command()
+        tab = self._current_tab()
+        if self.load_seconds:
+            self.clock.sleep(self.load_seconds / 2.0)
+        self._load(tab, url)
+        if self.load_seconds:
+            self.clock.sleep(self.load_seconds / 2.0)
+
+    def refresh(self):
+        self.get(self._current_tab().url)
+
+    def close(self):
+        self._command()
+        del self._tabs[self._current_tab().handle]
+
+    def quit(self):
+        self.quit_called = True
+        self._tabs.clear()
+
+    def find_element(self, by=None, value=None):
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f"Unable to locate element {value} on {self._current_tab().url}")
+        return elements[0]
+
+    def find_elements(self, by=None, value=None):
+        self._command()
+        tab = self._current_tab()
+        return (tab.frame or tab.page).find_elements(value)
+
+    def execute_script(self, script: str, *args):
+        self._command()
+        tab = self._current_tab()
+        page = tab.frame or tab.page
+
+        if "window.open(" in script:
+            self._open_tab()
+            return None
+        if "responseStart" in script:
+            # how far into the navigation the site answered
+            return self.load_seconds / 2.0
+        if "performance.getEntriesByType" in script:
+            # network idle, nothing is ever loading in the background here
+            return page.ready_state == "complete"
+        if "document.readyState" in script and "return" in script and "performance.timeOrigin" not in script:
+            return page.ready_state
+        if "getBoundingClientRect" in script:
+            # element clickable
+            elements = page.find_elements(args[0])
+            if elements and elements[0].displayed and elements[0].enabled:
+                return elements[0]
+            return None
+        if "ORDERED_NODE_SNAPSHOT_TYPE" in script:
+            # the size grid, every size label with its button and the buy button
+            sizes = []
+            for element in page.find_elements(args[0]):
+                buttons = element.find_elements(value="button")
+                button = buttons[0] if buttons else element
+                sizes.append([button.text, button])
+            purchase_buttons = page.find_elements(args[1])
+            return [sizes, purchase_buttons[0] if purchase_buttons else None]
+        if "performance.timeOrigin" in script:
+            # page snapshot keyed on the navigation, the html only when it changed
+            key = f"{tab.handle}|{tab.load_count}|{tab.url}|{sum(1 for _ in page.all_elements())}"
+            return [key, None] if key == args[0] else [key, page.page_source]
+        if "window.keyEvents = []" in script and "return" in script:
+            # key events drained, None when the page has no listener
+            key_events = page.window.get("keyEvents")
+            if key_events is not None:
+                page.window["keyEvents"] = []
+            return key_events
+        if "window.keyEvents = []" in script:
+            page.window["keyEvents"] = []
+            return None
+        if "statusDiv" in script:
+            self._render_message_box(page, *args)
+            return None
+
+        self.executed_scripts.append((script, args))
+        return None
+
+    def execute_async_script(self, script: str, *args):
+        self._command()
+        self.executed_scripts.append((script, args))
+        return None
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict):
+        self._command()
+        self.cdp_commands.append((cmd, cmd_args))
+        return {}
+
+    def get_cookies(self):
+        return []
+
+    def add_cookie(self, cookie_dict: dict):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def set_window_size(self, width, height, windowHandle: str = "current"):
+        pass
+
+    def press_key(self, code: str, key: str = None, handle: str = None):
+        '''
+        Pretends the user pressed a key on the given tab (the current one by default), for pages listening to keydown
+        '''
+        tab = self._tabs[handle] if handle else self._current_tab()
+        key_events = tab.page.window.setdefault("keyEvents", [])
+        key_events.append({"key": key or code, "code": code, "shift": False, "ctrl": False, "alt": False, "meta": False})
+
+    def _open_tab(self) -> _FakeTab:
+        tab = _FakeTab(f"fake-tab-{next(self._handle_numbers)}")
+        self._tabs[tab.handle] = tab
+        return tab
+
+    def _current_tab(self) -> _FakeTab:
+        if self._current.handle not in self._tabs:
+            raise NoSuchWindowException("The current window was closed")
+        return self._current
+
+    def _load(self, tab: _FakeTab, url: str):
+        tab.url = url
+        tab.page = self.site.load(url)
+        tab.frame = None
+        tab.load_count += 1
+        for element in tab.page.all_elements():
+            element.driver = self
+            if element.frame is not None:
+                for frame_element in element.frame.all_elements():
+                    frame_element.driver = self
+
+    def _render_message_box(self, page: FakePage, element_id: str, message: str, color: str):
+        elements = page.find_elements(element_id)
+        if not elements:
+            page.add_element(element_id, FakeElement(message, attributes={"id": element_id}))
+        for element in elements:
+            element.text = message
+
+    def _command(self):
+        if self.command_seconds:
+            self.clock.sleep(self.command_seconds)
@@ -0,0 +1,167 @@
+import datetime
+import threading
+import time
+from urllib.parse import urlsplit
+
+from src.testing.stand_in_server import StandInServer
+
+class NikeStandInServer(StandInServer):
+    '''
+    Stand-in for the nike launch site that serves pages matching every XPath SneakerPurchaseProcess relies on. Every
+    product page under /launch/t/ shows an "Available M/D at H:MM AM/PM" banner until the scripted release time on the
+    stand-ins clock passes, after which it serves the size list and buy button. Buying leads to a checkout page with the
+    CVV iframe, order review and submit payment buttons.
+
+    The stand-in records (time.monotonic()) when the release went live and when the order was submitted so a benchmark
+    running in the same process can measure the whole release-to-submit path.
+
+    With heavy_assets the product pages also pull in what the real ones do, hero images, a video, a web font and an
+    analytics script. The analytics script is served off localhost rather than the host the pages are on, so it can be
+    blocked as a third party domain.
+    '''
+
+    product_path_prefix = "/launch/t/"
+    checkout_path = "/checkout"
+
+    default_sizes = ["M 3.5 / W 5", "M 4 / W 5.5", "M 4.5 / W 6", "M 5 / W 6.5", "M 5.5 / W 7", "M 6 / W 7.5",
+                     "M 6.5 / W 8", "M 7 / W 8.5", "M 7.5 / W 9", "M 8 / W 9.5", "M 8.5 / W 10", "M 9 / W 10.5",
+                     "M 9.5 / W 11", "M 10 / W 11.5", "M 10.5 / W 12", "M 11 / W 12.5", "M 11.5 / W 13",
+                     "M 12 / W 13.5", "M 13 / W 14.5", "M 14 / W 15.5"]
+
+    assets_path_prefix = "/assets/"
+
+    # path under assets_path_prefix -> (content type, size in bytes), roughly what a nike product page pulls in
+    heavy_asset_sizes = {
+        "site.css": ("text/css", 0),
+        "analytics.js": ("application/javascript", 96 * 1024),
+        "fonts/brand.woff2": ("font/woff2", 80 * 1024),
+        "images/hero-1.jpg": ("image/jpeg", 180 * 1024),
+        "images/hero-2.jpg": ("image/jpeg", 180 * 1024),
+        "images/hero-3.jpg": ("image/jpeg", 180 * 1024),
+        "images/hero-4.jpg": ("image/jpeg", 180 * 1024),
+        "videos/hero.mp4": ("video/mp4", 1536 * 1024),
+    }
+
+    __site_css = """@font-face {{ font-family: Brand; src: url('{prefix}fonts/brand.woff2') format('woff2'); }}
+body {{ font-family: Brand, sans-serif; }}"""
+
+    __heavy_assets = """
+  <link rel="stylesheet" href="{prefix}site.css">
+  <script src="http://localhost:{port}{prefix}analytics.js"></script>
+  <img src="{prefix}images/hero-1.jpg"><img src="{prefix}images/hero-2.jpg">
+  <img src="{prefix}images/hero-3.jpg"><img src="{prefix}images/hero-4.jpg">
+  <video src="{prefix}videos/hero.mp4" autoplay muted loop preload="auto"></video>"""
+
+    __pre_release_page = """<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body>{assets}
+  <h1>{title}</h1>
+  <div class="available-date-component">Available {month}/{day} at {hour}:{minute:02d} {meridiem}</div>
+</body></html>"""
+
+    __released_page = """<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body>{assets}
+  <h1>{title}</h1>
+  <ul class="size-grid">{sizes}</ul>
+  <button class="ncss-btn buying-tools-cta-button" type="button"
+          onclick="document.getElementById('checkout-modal').style.display = 'block';">Add to Bag</button>
+  <div id="checkout-modal" style="display: none;">
+    <button data-qa="checkout-link" onclick="window.location.href = '{checkout_path}';">Checkout</button>
+  </div>
+</body></html>"""
+
+    __size_item = """<li data-qa="size-available"><button type="button" onclick="this.classList.add('selected');">{size}</button></li>"""
+
+    __checkout_page = """<!DOCTYPE html>
+<html><head><title>Checkout</title></head>
+<body>
+  <iframe data-attr="credit-card-iframe-cvv" src="{checkout_path}/cvv"></iframe>
+  <button data-attr="continueToOrderReviewBtn"
+          onclick="document.getElementById('order-review').style.display = 'block';">Continue to Order Review</button>
+  <div id="order-review" style="display: none;">
+    <button type="button" onclick="fetch('{checkout_path}/order', {{method: 'POST'}}).then(() => document.title = 'Order Placed');">Submit Payment</button>
+  </div>
+</body></html>"""
+
+    __cvv_page = """<!DOCTYPE html>
+<html><body>
+  <form id="creditCardForm"><input id="cvNumber" type="text" autocomplete="off"></form>
+</body></html>"""
+
+    def __init__(self, release_at: float = None, sizes=None, clock_skew_seconds: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 heavy_assets: bool = False, asset_latency_seconds: float = 0.0):
+        '''
+        :param heavy_assets: have product pages pull in images, video, a font and analytics like the real ones do
+        :param asset_latency_seconds: how long every asset takes to start coming back, standing in for a CDN
+        '''
+        super().__init__(clock_skew_seconds, host, port)
+        self.sizes = sizes or self.default_sizes
+        self.heavy_assets = heavy_assets
+        self.asset_latency_seconds = asset_latency_seconds
+        self._lock = threading.Lock()
+        self.release_at = None
+        # time.monotonic() of scripted events in the timeline, e.g. release_live and order_received
+        self.events = {}
+        if release_at is not None:
+            self.schedule_release(release_at)
+
+    def schedule_release(self, release_at: float):
+        '''
+        Scripts the release for release_at (epoch seconds on the stand-ins clock) and clears the previous timeline
+        '''
+        with self._lock:
+            self.release_at = release_at
+            # the release goes live at an exact point on the timeline, so it is recorded up front instead of when it happens
+            self.events = {"release_live": time.monotonic() + (release_at - self.server_time())}
+
+    def is_released(self) -> bool:
+        return self.release_at is not None and self.server_time() >= self.release_at
+
+    def product_url(self, slug: str) -> str:
+        return f"{self.base_url}{self.product_path_prefix}{slug}"
+
+    def handle_request(self, method: str, path: str):
+        path = urlsplit(path).path
+
+        if path.startswith(self.product_path_prefix):
+            return 200, "text/html; charset=utf-8", self._render_product_page(path[len(self.product_path_prefix):]).encode()
+        if path == self.checkout_path:
+            return 200, "text/html; charset=utf-8", self.__checkout_page.format(checkout_path=self.checkout_path).encode()
+        if path == self.checkout_path + "/cvv":
+            return 200, "text/html; charset=utf-8", self.__cvv_page.encode()
+        if path.startswith(self.assets_path_prefix) and path[len(self.assets_path_prefix):] in self.heavy_asset_sizes:
+            return self._render_asset(path[len(self.assets_path_prefix):])
+        if path == self.checkout_path + "/order" and method == "POST":
+            self._mark_event("order_received")
+            return 200, "application/json", b'{"status": "ok"}'
+        return super().handle_request(method, path)
+
+    def _render_asset(self, name: str):
+        if self.asset_latency_seconds:
+            time.sleep(self.asset_latency_seconds)
+        content_type, size = self.heavy_asset_sizes[name]
+        if name == "site.css":
+            return 200, content_type, self.__site_css.format(prefix=self.assets_path_prefix).encode()
+        if name == "analytics.js":
+            return 200, content_type, (b"window.standInAnalytics = true;\n" + b"/" * size)[:size]
+        # the browser still downloads all of it before finding out it is not a real image, video or font
+        return 200, content_type, bytes(size)
+
+    def _render_product_page(self, slug: str) -> str:
+        title = slug.replace("-", " ").title()
+        assets = self.__heavy_assets.format(prefix=self.assets_path_prefix, port=self.port) if self.heavy_assets else ""
+        if not self.is_released():
+            # Show the release in the stand-ins local time the way the site does
+            release_dt = datetime.datetime.fromtimestamp(self.release_at if self.release_at is not None else self.server_time() + 86400)
+            hour = release_dt.hour % 12 or 12
+            return self.__pre_release_page.format(title=title, assets=assets, month=release_dt.month, day=release_dt.day,
+                                                  hour=hour, minute=release_dt.minute,
+                                                  meridiem="AM" if release_dt.hour < 12 else "PM")
+
+        sizes = "".join(self.__size_item.format(size=size) for size in self.sizes)
+        return self.__released_page.format(title=title, assets=assets, sizes=sizes, checkout_path=self.checkout_path)
+
+    def _mark_event(self, event_name: str):
+        with self._lock:
+            self.events.setdefault(event_name, time.monotonic())
@@ -0,0 +1,108 @@
+import email.utils
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StandInServer():
+    '''
+    Local HTTP stand-in for the nike site so that pieces of the app can be exercised without going to nike.com.
+    The clock it reports through the Date header can be deliberately skewed to check that calibration picks it up.
+    '''
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        # Keep the socket open between requests like the real site does
+        protocol_version = "HTTP/1.1"
+
+        def date_time_string(self, timestamp=None):
+            if timestamp is None:
+                timestamp = self.server.stand_in.server_time()
+            return email.utils.formatdate(timestamp, usegmt=True)
+
+        def do_HEAD(self):
+            self._respond(include_body=False)
+
+        def do_GET(self):
+            self._respond(include_body=True)
+
+        def do_POST(self):
+            # Drain whatever was posted so the connection can be reused
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._respond(include_body=True)
+
+        def _respond(self, include_body: bool):
+            status, content_type, body = self.server.stand_in.handle_request(self.command, self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            if include_body:
+                self.wfile.write(body)
+                self.server.stand_in.record_response(self.path, len(body))
+
+        def log_message(self, format, *args):
+            # Keep the console clean, the stand in gets hammered during benchmarks
+            pass
+
+    def __init__(self, clock_skew_seconds: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.clock_skew_seconds = clock_skew_seconds
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+        self._counter_lock = threading.Lock()
+        # body bytes written out and how many responses they were spread over
+        self.bytes_served = 0
+        self.responses_served = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def server_time(self) -> float:
+        '''
+        :return: what the stand ins (possibly skewed) clock reads as epoch seconds
+        '''
+        return time.time() + self.clock_skew_seconds
+
+    def handle_request(self, method: str, path: str):
+        '''
+        :return: tuple of (status, content type, body bytes) for the given request method and path
+        '''
+        return 200, "text/html; charset=utf-8", b"<html><body>stand in</body></html>"
+
+    def record_response(self, path: str, body_bytes: int):
+        '''
+        Called by the handler threads for every body written out in full
+        '''
+        with self._counter_lock:
+            self.bytes_served += body_bytes
+            self.responses_served += 1
+
+    def reset_counters(self):
+        with self._counter_lock:
+            self.bytes_served = 0
+            self.responses_served = 0
+
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self.RequestHandler)
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand_in_server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,113 @@
+import threading
+import time
+
+class SystemClock():
+    '''
+    The real clocks. Everything that sleeps, waits or reads the time takes a clock so it can be handed a VirtualClock
+    instead, and falls back on SYSTEM_CLOCK when it is not given one.
+    '''
+
+    is_virtual = False
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event: threading.Event, timeout: float = None) -> bool:
+        '''
+        Waits until the event is set or the timeout passes
+        :return: true if the event was set
+        '''
+        return event.wait(timeout)
+
+    def add_listener(self, listener):
+        # the real clock moves by itself, nobody needs telling
+        pass
+
+    def remove_listener(self, listener):
+        pass
+
+SYSTEM_CLOCK = SystemClock()
+
+class VirtualClock():
+    '''
+    Clock that only moves when it is told to, so minutes of waiting for a release go by in no time at all. Sleeping
+    on it jumps it forward by the sleep, and whatever has to run when time passes (e.g. a DeadlineScheduler) registers
+    a listener that is called with the new monotonic time every time the clock moves.
+
+    Threads waiting on it in the background (config watcher, clock calibration, ...) are woken whenever it moves, but
+    never move it themselves.
+    '''
+
+    is_virtual = True
+
+    # How often a background wait re-checks its event in real time, events do not notify the clock when they are set
+    __EVENT_POLL_SECONDS = 0.05
+
+    def __init__(self, start_time: float = None, start_monotonic: float = 1000.0):
+        '''
+        :param start_time: epoch seconds the clock starts at, defaults to right now
+        '''
+        self._time = time.time() if start_time is None else start_time
+        self._monotonic = start_monotonic
+        self._condition = threading.Condition()
+        self._listeners = []
+
+    def monotonic(self) -> float:
+        with self._condition:
+            return self._monotonic
+
+    def time(self) -> float:
+        with self._condition:
+            return self._time
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        '''
+        Moves the clock forward and runs the listeners on the calling thread
+        '''
+        with self._condition:
+            seconds = max(seconds, 0.0)
+            self._time += seconds
+            self._monotonic += seconds
+            now = self._monotonic
+            listeners = list(self._listeners)
+            self._condition.notify_all()
+
+        for listener in listeners:
+            listener(now)
+
+    def advance_to(self, monotonic_deadline: float):
+        '''
+        Moves the clock to the monotonic deadline, a deadline that already passed still runs the listeners
+        '''
+        self.advance(monotonic_deadline - self.monotonic())
+
+    def wait(self, event: threading.Event, timeout: float = None) -> bool:
+        if timeout is None:
+            return event.wait()
+        with self._condition:
+            give_up_at = self._monotonic + timeout
+            while not event.is_set() and self._monotonic < give_up_at:
+                self._condition.wait(self.__EVENT_POLL_SECONDS)
+        return event.is_set()
+
+    def add_listener(self, listener):
+        '''
+        Registers a callable that gets the new monotonic time every time the clock moves
+        '''
+        with self._condition:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._condition:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
@@ -0,0 +1,196 @@
+import datetime
+import email.utils
+import threading
+import urllib.error
+import urllib.request
+
+from src.config.local_logging import LocalLogging
+from src.utils.clock import SYSTEM_CLOCK
+
+class HttpDateSampler():
+    '''
+    Takes clock samples by sending a HEAD request to the given url and reading the Date header off the response
+    '''
+
+    def __init__(self, url: str, timeout_seconds: float = 5, clock=None):
+        self.url = url
+        self.timeout_seconds = timeout_seconds
+        self.clock = clock or SYSTEM_CLOCK
+
+    def take_sample(self):
+        '''
+        :return: tuple of (local send time, local receive time, server Date header as epoch seconds) with both local
+        times taken from the samplers clock
+        '''
+        request = urllib.request.Request(self.url, method="HEAD")
+        sent_at = self.clock.time()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_seconds) as response:
+                received_at = self.clock.time()
+                date_header = response.headers.get("Date")
+        except urllib.error.HTTPError as http_error:
+            # Error responses still carry a Date header which is all we care about
+            received_at = self.clock.time()
+            date_header = http_error.headers.get("Date")
+
+        if not date_header:
+            raise Exception(f"Response from {self.url} did not include a Date header to calibrate against!")
+        return sent_at, received_at, email.utils.parsedate_to_datetime(date_header).timestamp()
+
+class DriverDateSampler():
+    '''
+    Takes clock samples through the browser itself, the page fetches the url and hands back the Date header along with
+    the browsers clock readings around the request. Slower than HttpDateSampler because of the driver round trip but it
+    goes through the exact same network path (proxies, cookies, etc.) as the purchase tabs.
+    '''
+
+    __sample_script = """
+        const done = arguments[arguments.length - 1];
+        const sentAt = Date.now();
+        fetch(arguments[0], {method: 'HEAD', cache: 'no-store', credentials: 'include'})
+            .then(response => done([sentAt, Date.now(), response.headers.get('Date')]))
+            .catch(error => done([sentAt, Date.now(), null]));
+    """
+
+    def __init__(self, driver, url: str):
+        self.driver = driver
+        self.url = url
+
+    def take_sample(self):
+        sent_at_ms, received_at_ms, date_header = self.driver.execute_async_script(DriverDateSampler.__sample_script, self.url)
+        if not date_header:
+            raise Exception(f"Browser fetch of {self.url} did not expose a Date header to calibrate against!")
+        return sent_at_ms / 1000.0, received_at_ms / 1000.0, email.utils.parsedate_to_datetime(date_header).timestamp()
+
+class ServerClockCalibrator():
+    '''
+    Estimates how far the local clock is off from the server clock so that release times read off the site can be turned
+    into wake-ups that line up with the sites clock instead of ours. Without a sampler it never calibrates and the
+    local clock is taken as the servers.
+
+    The Date header only has a resolution of one second, so a single sample only tells us that the offset is somewhere in
+    [date - received_at, date + 1 - sent_at]. Samples are staggered across a second and their ranges are intersected, which
+    narrows the estimate down to roughly the spacing between samples plus the round trip time.
+    '''
+
+    # How many samples to take per calibration, they are staggered evenly over one second
+    __SAMPLES_PER_CALIBRATION = 10
+    # How often to re-calibrate in the background so the estimate stays fresh
+    __REFRESH_SECONDS = 10 * 60
+    # Only tell listeners about offset changes bigger than this
+    __OFFSET_CHANGE_THRESHOLD_SECONDS = 0.05
+
+    def __init__(self, sampler=None, samples_per_calibration: int = None, refresh_seconds: float = None, clock=None):
+        self.sampler = sampler
+        self.clock = clock or SYSTEM_CLOCK
+        self.samples_per_calibration = samples_per_calibration or self.__SAMPLES_PER_CALIBRATION
+        self.refresh_seconds = refresh_seconds or self.__REFRESH_SECONDS
+        self.logger = LocalLogging.get_local_logger("server_clock_calibrator")
+
+        # server clock - local clock in seconds, 0 until the first calibration finishes
+        self.offset_seconds = 0.0
+        # +/- how far off the estimate could be, None until calibrated
+        self.uncertainty_seconds = None
+        self.calibrated_at = None
+
+        self._listeners = []
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
+
+    def add_listener(self, listener):
+        '''
+        Registers a callable that gets the new offset whenever a calibration moves it noticeably. It is called on the
+        background refresh thread.
+        '''
+        self._listeners.append(listener)
+
+    def calibrate(self) -> float:
+        '''
+        Takes a new round of samples and updates the offset estimate
+        :return: the new offset in seconds (server - local)
+        '''
+        low_bound = float("-inf")
+        high_bound = float("inf")
+        midpoints = []
+        spacing = 1.0 / self.samples_per_calibration
+
+        for sample_index in range(self.samples_per_calibration):
+            if sample_index:
+                self.clock.wait(self._stop_event, spacing)
+            try:
+                sent_at, received_at, server_seconds = self.sampler.take_sample()
+            except Exception as e:
+                self.logger.error(f"Failed to take clock sample - {e}")
+                continue
+
+            low_bound = max(low_bound, server_seconds - received_at)
+            high_bound = min(high_bound, server_seconds + 1 - sent_at)
+            midpoints.append(server_seconds + 0.5 - (sent_at + received_at) / 2)
+
+        if not midpoints:
+            raise Exception("Unable to take any clock samples, keeping the previous clock offset!")
+
+        if low_bound <= high_bound:
+            new_offset = (low_bound + high_bound) / 2
+            uncertainty = (high_bound - low_bound) / 2
+        else:
+            # The ranges did not overlap (server jitter or a clock step mid calibration), fall back on the median midpoint
+            midpoints.sort()
+            new_offset = midpoints[len(midpoints) // 2]
+            uncertainty = 0.5
+
+        previous_offset = self.offset_seconds
+        self.offset_seconds = new_offset
+        self.uncertainty_seconds = uncertainty
+        self.calibrated_at = self.clock.monotonic()
+        self.logger.info(f"Calibrated server clock offset to {new_offset:.3f}s (+/- {uncertainty:.3f}s) from {len(midpoints)} samples")
+
+        if abs(new_offset - previous_offset) > self.__OFFSET_CHANGE_THRESHOLD_SECONDS:
+            for listener in self._listeners:
+                try:
+                    listener(new_offset)
+                except Exception as e:
+                    self.logger.error(f"Clock offset listener raised an exception - {e}")
+        return new_offset
+
+    def start(self):
+        '''
+        Calibrates on a background thread right away and then again every refresh_seconds
+        '''
+        if self._refresh_thread:
+            return
+        if self.sampler is None:
+            self.logger.info("No clock calibration sampler, taking the local clock as the servers clock")
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="server_clock_calibrator", daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._refresh_thread:
+            self._refresh_thread.join()
+        self._refresh_thread = None
+
+    def server_now(self) -> datetime.datetime:
+        '''
+        :return: timezone aware (UTC) best guess of what the servers clock currently reads
+        '''
+        return datetime.datetime.fromtimestamp(self.clock.time() + self.offset_seconds, tz=datetime.timezone.utc)
+
+    def to_monotonic_deadline(self, server_dt: datetime.datetime) -> float:
+        '''
+        Turns a timezone aware datetime on the servers clock into a monotonic() deadline on our clock for the scheduler
+        '''
+        if server_dt.tzinfo is None:
+            raise Exception(f"Cannot turn the naive datetime {server_dt} into a deadline, it needs a timezone!")
+        seconds_until = server_dt.timestamp() - (self.clock.time() + self.offset_seconds)
+        return self.clock.monotonic() + seconds_until
+
+    def _refresh_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.calibrate()
+            except Exception as e:
+                self.logger.error(f"Clock calibration failed - {e}")
+            self.clock.wait(self._stop_event, self.refresh_seconds)
@@ -0,0 +1,220 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+
+from src.config.local_logging import LocalLogging
+from src.utils.clock import SYSTEM_CLOCK
+from src.utils.percentiles import percentile
+
+class DeadlineScheduler():
+    '''
+    Scheduler that keeps every pending wake-up in a single heap keyed on the clocks monotonic() deadlines. One dispatcher
+    thread sleeps until exactly the earliest deadline and then runs whatever callbacks are due, instead of spinning up
+    an OS thread per timer or polling on a fixed interval. Every dispatch records how late it ran compared to its
+    deadline so that we can keep an eye on the wake-up jitter.
+
+    Callbacks are run on the dispatcher thread, so they should be quick (e.g. hand a sneaker url off to a queue) and
+    never touch the web driver themselves. On a virtual clock there is no dispatcher thread, due callbacks are run by
+    whoever moves the clock.
+    '''
+
+    # How many of the most recent lag samples to keep for percentiles
+    __LAG_SAMPLE_SIZE = 4096
+
+    class ScheduledCallback():
+        '''
+        A single entry in the heap. Entries are cancelled lazily, they stay in the heap and are skipped once popped.
+        '''
+        __slots__ = ("deadline", "sequence", "callback", "key", "cancelled")
+
+        def __init__(self, deadline: float, sequence: int, callback, key=None):
+            self.deadline = deadline
+            self.sequence = sequence
+            self.callback = callback
+            self.key = key
+            self.cancelled = False
+
+        def __lt__(self, other):
+            return (self.deadline, self.sequence) < (other.deadline, other.sequence)
+
+    def __init__(self, name: str = "deadline_scheduler", clock=None):
+        self.name = name
+        self.clock = clock or SYSTEM_CLOCK
+        self.logger = LocalLogging.get_local_logger(name)
+
+        self._heap = []
+        self._sequence = itertools.count()
+        # Only one pending callback per key, scheduling the same key again replaces the old one
+        self._keyed_entries = {}
+        self._condition = threading.Condition()
+        self._running = False
+        self._dispatcher_thread = None
+
+        # Dispatch lag counters (seconds)
+        self._dispatched_count = 0
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+        self._lag_samples = deque(maxlen=self.__LAG_SAMPLE_SIZE)
+
+    def start(self):
+        '''
+        Starts the dispatcher thread, calling start on an already running scheduler does nothing
+        '''
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            if self.clock.is_virtual:
+                self.clock.add_listener(self._on_clock_moved)
+                return
+            self._dispatcher_thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._dispatcher_thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self.clock.remove_listener(self._on_clock_moved)
+
+        if self._dispatcher_thread and self._dispatcher_thread is not threading.current_thread():
+            self._dispatcher_thread.join()
+        self._dispatcher_thread = None
+
+    def schedule_at(self, deadline: float, callback, key=None):
+        '''
+        Schedules the callback to run at the given monotonic() deadline on the schedulers clock. Deadlines in the past run right away.
+        :param key: optional identifier, any callback already pending under the same key is cancelled
+        :return: the scheduled entry
+        '''
+        with self._condition:
+            if key is not None:
+                self._cancel_locked(key)
+
+            entry = self.ScheduledCallback(deadline, next(self._sequence), callback, key)
+            heapq.heappush(self._heap, entry)
+            if key is not None:
+                self._keyed_entries[key] = entry
+
+            # Only need to wake the dispatcher if this is now the earliest deadline
+            if self._heap[0] is entry:
+                self._condition.notify()
+            return entry
+
+    def schedule_in(self, delay_seconds: float, callback, key=None):
+        return self.schedule_at(self.clock.monotonic() + delay_seconds, callback, key)
+
+    def cancel(self, key) -> bool:
+        with self._condition:
+            return self._cancel_locked(key)
+
+    def has_pending(self, key) -> bool:
+        with self._condition:
+            return key in self._keyed_entries
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return sum(1 for entry in self._heap if not entry.cancelled)
+
+    def next_deadline(self):
+        '''
+        :return: the earliest pending deadline or None if nothing is scheduled
+        '''
+        with self._condition:
+            entry = self._peek_locked()
+            return entry.deadline if entry else None
+
+    def dispatch_due(self, now: float = None) -> int:
+        '''
+        Runs every callback whose deadline has passed on the calling thread. This is what the dispatcher thread does
+        each time it wakes up, but it can also be called directly to drive the scheduler without a thread.
+        :return: number of callbacks that were run
+        '''
+        with self._condition:
+            due_entries = self._pop_due_locked(self.clock.monotonic() if now is None else now)
+        return self._run_entries(due_entries)
+
+    def get_lag_stats(self) -> dict:
+        '''
+        :return: dispatch lag counters in milliseconds, percentiles are over the most recent dispatches
+        '''
+        with self._condition:
+            samples = list(self._lag_samples)
+            dispatched = self._dispatched_count
+            total_lag = self._total_lag
+            max_lag = self._max_lag
+
+        def lag_ms(pct):
+            return (percentile(samples, pct) or 0.0) * 1000.0
+
+        return {
+            "dispatched": dispatched,
+            "mean_lag_ms": (total_lag / dispatched * 1000.0) if dispatched else 0.0,
+            "max_lag_ms": max_lag * 1000.0,
+            "p50_lag_ms": lag_ms(50),
+            "p99_lag_ms": lag_ms(99),
+        }
+
+    def _on_clock_moved(self, now: float):
+        if self._running:
+            self.dispatch_due(now)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    entry = self._peek_locked()
+                    if entry is None:
+                        self._condition.wait()
+                        continue
+
+                    timeout = entry.deadline - self.clock.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+
+                if not self._running:
+                    return
+                due_entries = self._pop_due_locked(self.clock.monotonic())
+
+            # Run the callbacks outside the lock so they are free to schedule more work
+            self._run_entries(due_entries)
+
+    def _run_entries(self, entries) -> int:
+        for entry in entries:
+            lag = self.clock.monotonic() - entry.deadline
+            with self._condition:
+                self._dispatched_count += 1
+                self._total_lag += lag
+                self._max_lag = max(self._max_lag, lag)
+                self._lag_samples.append(lag)
+
+            try:
+                entry.callback()
+            except Exception as e:
+                self.logger.error(f"Scheduled callback for key {entry.key} raised an exception - {e}")
+        return len(entries)
+
+    def _peek_locked(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+        return self._heap[0] if self._heap else None
+
+    def _pop_due_locked(self, now: float):
+        due_entries = []
+        while True:
+            entry = self._peek_locked()
+            if entry is None or entry.deadline > now:
+                break
+            heapq.heappop(self._heap)
+            if entry.key is not None and self._keyed_entries.get(entry.key) is entry:
+                del self._keyed_entries[entry.key]
+            due_entries.append(entry)
+        return due_entries
+
+    def _cancel_locked(self, key) -> bool:
+        entry = self._keyed_entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        return True
@@ -0,0 +1,74 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.clock import SYSTEM_CLOCK
+
+class DriverExecutor():
+    '''
+    Runs blocking WebDriver work for coroutines on one dedicated thread. The driver is not thread safe, so there is only
+    ever one call in flight and they run in the order they were asked for. At most max_pending coroutines can be queued
+    up behind it, any more wait their turn in the event loop instead of piling up work on the thread.
+
+    Cancelling a coroutine that is waiting on a call that already started does not stop the call, it runs to the end and
+    its result is thrown away.
+    '''
+
+    def __init__(self, max_pending: int = 64, name: str = "driver_executor", clock=None):
+        self.max_pending = max_pending
+        self.clock = clock or SYSTEM_CLOCK
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_pending)
+        # callables run on the event loop every time a call finishes
+        self._listeners = []
+
+        # calls queued or running right now
+        self.pending = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.max_queue_seconds = 0.0
+
+    async def call(self, fn, *args, **kwargs):
+        '''
+        Runs fn(*args, **kwargs) on the driver thread
+        :return: whatever fn returned, anything it raised is raised here
+        '''
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            self.pending += 1
+            queued_at = self.clock.monotonic()
+            try:
+                return await loop.run_in_executor(self._executor, functools.partial(self._timed, queued_at, fn, *args, **kwargs))
+            finally:
+                self.pending -= 1
+                for listener in self._listeners:
+                    listener()
+
+    def _timed(self, queued_at: float, fn, *args, **kwargs):
+        started_at = self.clock.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.calls += 1
+            self.busy_seconds += self.clock.monotonic() - started_at
+            self.max_queue_seconds = max(self.max_queue_seconds, started_at - queued_at)
+
+    def add_listener(self, listener):
+        '''
+        Registers a callable run on the event loop every time a call finishes
+        '''
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "busy_ms": self.busy_seconds * 1000.0,
+            "max_queue_ms": self.max_queue_seconds * 1000.0,
+        }
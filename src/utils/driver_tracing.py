@@ -0,0 +1,356 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+
+from selenium.webdriver.remote.webelement import WebElement
+
+from src.utils.clock import SYSTEM_CLOCK
+from src.utils.percentiles import nearest_rank
+
+class LatencyHistogram():
+    '''
+    HDR style histogram of durations. Values are kept in microseconds in log-linear buckets, every power of two is
+    split into 32 sub buckets, so any percentile is within ~3% of the real value however many samples there are and
+    recording is just a dict increment.
+    '''
+
+    __SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        # lower bound of the bucket in microseconds -> count
+        self.counts = {}
+        self.count = 0
+        self.total_seconds = 0.0
+        self.min_seconds = None
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        micros = max(int(seconds * 1e6), 0)
+        shift = max(micros.bit_length() - 1 - self.__SUB_BUCKET_BITS, 0)
+        bucket = (micros >> shift) << shift
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total_seconds += seconds
+        if self.min_seconds is None or seconds < self.min_seconds:
+            self.min_seconds = seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def percentile(self, percent: float) -> float:
+        '''
+        :return: the duration in seconds that percent of the recorded values were at or under
+        '''
+        if not self.count:
+            return 0.0
+        rank = nearest_rank(self.count, percent)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(bucket / 1e6, self.max_seconds)
+        return self.max_seconds
+
+    def cumulative_buckets(self):
+        '''
+        :return: list of (upper bound in seconds, count of values under it) for each non empty bucket
+        '''
+        buckets = []
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            shift = max(bucket.bit_length() - 1 - self.__SUB_BUCKET_BITS, 0)
+            buckets.append(((bucket + (1 << shift)) / 1e6, seen))
+        return buckets
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total_seconds / self.count * 1000.0 if self.count else 0.0,
+            "min_ms": (self.min_seconds or 0.0) * 1000.0,
+            "p50_ms": self.percentile(50) * 1000.0,
+            "p90_ms": self.percentile(90) * 1000.0,
+            "p99_ms": self.percentile(99) * 1000.0,
+            "max_ms": self.max_seconds * 1000.0,
+        }
+
+class TraceSpan():
+    '''
+    A named stretch of work, e.g. handling one sneaker or one purchase attempt, with how long every driver call made
+    inside of it took
+    '''
+    __slots__ = ("name", "sneaker_url", "attempt", "parent", "depth", "started_at", "duration", "operation_seconds")
+
+    def __init__(self, name: str, sneaker_url: str = None, attempt: int = None, parent=None, started_at: float = None):
+        '''
+        :param started_at: monotonic() of the tracers clock the span started at, defaults to now on the real clock
+        '''
+        self.name = name
+        self.sneaker_url = sneaker_url
+        self.attempt = attempt
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent else 0
+        self.started_at = SYSTEM_CLOCK.monotonic() if started_at is None else started_at
+        self.duration = None
+        # driver operation -> seconds spent on it directly inside this span
+        self.operation_seconds = {}
+
+    def path(self) -> str:
+        return f"{self.parent.path()}/{self.name}" if self.parent else self.name
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path(),
+            "sneaker_url": self.sneaker_url,
+            "attempt": self.attempt,
+            "started_at": self.started_at,
+            "duration_ms": (self.duration or 0.0) * 1000.0,
+            "operation_ms": {operation: seconds * 1000.0 for operation, seconds in self.operation_seconds.items()},
+        }
+
+class _SpanContext():
+    __slots__ = ("tracer", "span")
+
+    def __init__(self, tracer, span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self):
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.tracer._finish_span(self.span)
+        return False
+
+class DriverTracer():
+    '''
+    Collects a latency histogram per driver operation and per span, plus the most recent finished spans, and dumps
+    them as JSON or Prometheus text at the end of a run. Spans nest per thread, so every worker thread sharing a tracer
+    gets its own span stack.
+
+    Spans are timed on the tracers clock. Driver calls are too when it is a VirtualClock, on the real one they are
+    timed on the high resolution counter instead, monotonic() is far coarser on some platforms.
+    '''
+
+    __RECENT_SPAN_COUNT = 512
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, clock=None):
+        self.clock = clock or SYSTEM_CLOCK
+        self.operation_timer = self.clock.monotonic if self.clock.is_virtual else time.perf_counter
+        self.operation_histograms = {}
+        self.span_histograms = {}
+        self.recent_spans = deque(maxlen=self.__RECENT_SPAN_COUNT)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def shared(cls):
+        '''
+        :return: the tracer every traced driver in this process records into unless told otherwise
+        '''
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def span(self, name: str, sneaker_url: str = None, attempt: int = None) -> _SpanContext:
+        '''
+        Context manager that opens a span nested under whatever span this thread already has open
+        '''
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        if sneaker_url is None and parent:
+            sneaker_url = parent.sneaker_url
+        span = TraceSpan(name, sneaker_url, attempt, parent, self.clock.monotonic())
+        stack.append(span)
+        return _SpanContext(self, span)
+
+    def record_operation(self, operation: str, seconds: float):
+        stack = self._stack()
+        if stack:
+            span = stack[-1]
+            span.operation_seconds[operation] = span.operation_seconds.get(operation, 0.0) + seconds
+        with self._lock:
+            histogram = self.operation_histograms.get(operation)
+            if histogram is None:
+                histogram = self.operation_histograms[operation] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "operations": {operation: histogram.summary() for operation, histogram in self.operation_histograms.items()},
+                "spans": {name: histogram.summary() for name, histogram in self.span_histograms.items()},
+                "recent_spans": [span.to_dict() for span in self.recent_spans],
+            }
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for metric, label, histograms in (("webdriver_operation_seconds", "operation", self.operation_histograms),
+                                              ("webdriver_span_seconds", "span", self.span_histograms)):
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in sorted(histograms.items()):
+                    for upper_bound, count in histogram.cumulative_buckets():
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{upper_bound:.6f}"}} {count}')
+                    lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.total_seconds:.6f}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, file_path: str) -> str:
+        '''
+        Writes the stats to file_path, as Prometheus text if it ends in .prom and JSON otherwise. Worker processes
+        each write their own file named after the process.
+        :return: the path that was written
+        '''
+        if multiprocessing.parent_process() is not None:
+            root, extension = os.path.splitext(file_path)
+            file_path = f"{root}.{multiprocessing.current_process().name}{extension}"
+
+        with open(file_path, "w", encoding="utf-8") as f:
+            if file_path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.get_stats(), f, indent=2)
+        return file_path
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _finish_span(self, span: TraceSpan):
+        span.duration = self.clock.monotonic() - span.started_at
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif span in stack:
+            stack.remove(span)
+
+        path = span.path()
+        with self._lock:
+            histogram = self.span_histograms.get(path)
+            if histogram is None:
+                histogram = self.span_histograms[path] = LatencyHistogram()
+            histogram.record(span.duration)
+            self.recent_spans.append(span)
+
+def _unwrap(value):
+    '''
+    Hands selenium back its own objects, it only serializes arguments that really are WebElements
+    '''
+    if isinstance(value, TracingWebElement):
+        return value.element
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(item) for item in value)
+    return value
+
+def _wrap(value, tracer):
+    if isinstance(value, WebElement):
+        return TracingWebElement(value, tracer)
+    if isinstance(value, list):
+        return [_wrap(item, tracer) for item in value]
+    if isinstance(value, dict):
+        return {key: _wrap(item, tracer) for key, item in value.items()}
+    return value
+
+def _traced_call(tracer, operation: str, method, args, kwargs):
+    started_at = tracer.operation_timer()
+    try:
+        return _wrap(method(*_unwrap(args), **kwargs), tracer)
+    finally:
+        tracer.record_operation(operation, tracer.operation_timer() - started_at)
+
+class TracingWebElement():
+    '''
+    WebElement stand-in that times every call made on it, anything not listed is passed straight through
+    '''
+
+    traced_methods = frozenset(["click", "send_keys", "clear", "submit", "get_attribute", "get_property", "get_dom_attribute",
+                                "is_displayed", "is_enabled", "is_selected", "find_element", "find_elements", "value_of_css_property"])
+    traced_properties = frozenset(["text", "tag_name", "rect", "location", "size"])
+
+    def __init__(self, element, tracer: DriverTracer):
+        object.__setattr__(self, "element", element)
+        object.__setattr__(self, "tracer", tracer)
+
+    def __getattr__(self, name):
+        if name in self.traced_properties:
+            return _traced_call(self.tracer, f"element.{name}", getattr, (self.element, name), {})
+        attribute = getattr(self.element, name)
+        if name in self.traced_methods:
+            return lambda *args, **kwargs: _traced_call(self.tracer, f"element.{name}", attribute, args, kwargs)
+        return attribute
+
+    def __eq__(self, other):
+        return self.element == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self.element)
+
+    def __repr__(self):
+        return f"TracingWebElement({self.element!r})"
+
+class TracingSwitchTo():
+    def __init__(self, switch_to, tracer: DriverTracer):
+        self._switch_to = switch_to
+        self._tracer = tracer
+
+    def window(self, window_name):
+        return _traced_call(self._tracer, "switch_to.window", self._switch_to.window, (window_name,), {})
+
+    def frame(self, frame_reference):
+        return _traced_call(self._tracer, "switch_to.frame", self._switch_to.frame, (frame_reference,), {})
+
+    def default_content(self):
+        return _traced_call(self._tracer, "switch_to.default_content", self._switch_to.default_content, (), {})
+
+    def parent_frame(self):
+        return _traced_call(self._tracer, "switch_to.parent_frame", self._switch_to.parent_frame, (), {})
+
+    def __getattr__(self, name):
+        return getattr(self._switch_to, name)
+
+class TracingWebDriver():
+    '''
+    Wraps a WebDriver so every command it sends is timed into a DriverTracer. Everything it does not know about is
+    passed straight through to the real driver, and elements handed out are wrapped so clicks and key presses on them
+    are timed too.
+    '''
+
+    traced_methods = frozenset(["get", "refresh", "back", "find_element", "find_elements", "execute_script", "execute_async_script",
+                                "get_cookies", "add_cookie", "delete_all_cookies", "close", "execute_cdp_cmd", "set_window_size"])
+    traced_properties = frozenset(["current_url", "current_window_handle", "window_handles", "page_source", "title"])
+
+    def __init__(self, driver, tracer: DriverTracer = None):
+        object.__setattr__(self, "driver", driver)
+        object.__setattr__(self, "tracer", tracer or DriverTracer.shared())
+
+    @property
+    def switch_to(self):
+        return TracingSwitchTo(self.driver.switch_to, self.tracer)
+
+    def __getattr__(self, name):
+        if name in self.traced_properties:
+            return _traced_call(self.tracer, name, getattr, (self.driver, name), {})
+        attribute = getattr(self.driver, name)
+        if name in self.traced_methods:
+            return lambda *args, **kwargs: _traced_call(self.tracer, name, attribute, args, kwargs)
+        return attribute
+
+    def __setattr__(self, name, value):
+        setattr(self.driver, name, value)
+
+def trace_driver(driver, tracer: DriverTracer = None):
+    '''
+    :return: the driver wrapped in a TracingWebDriver, or as is if it already is one
+    '''
+    if isinstance(driver, TracingWebDriver):
+        return driver
+    return TracingWebDriver(driver, tracer)
@@ -0,0 +1,81 @@
+from src.utils.clock import SYSTEM_CLOCK
+
+class DriverWatchdog():
+    '''
+    Health checks a WebDriver with the cheapest command there is, asking for its window handles, and keeps track of how
+    long it took to get back on a working driver once one died. It never touches the driver on its own, whoever owns
+    the driver calls check() on its heartbeat from the thread the driver is used on.
+    '''
+
+    def __init__(self, clock=None, recheck_seconds: float = 0.5):
+        '''
+        :param recheck_seconds: how long to wait before checking a second time, one failed command is not always a dead driver
+        '''
+        self.clock = clock or SYSTEM_CLOCK
+        self.recheck_seconds = recheck_seconds
+        # clock.monotonic() the driver last answered at and the first check it failed at, None while it is healthy
+        self.last_healthy_at = None
+        self.failed_at = None
+
+        self.heartbeats = 0
+        self.failed_checks = 0
+        self.recoveries = 0
+        self.failed_recoveries = 0
+        self.total_recovery_seconds = 0.0
+        self.max_recovery_seconds = 0.0
+        self.last_recovery_seconds = None
+
+    def is_responding(self, driver) -> bool:
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            return False
+
+    def check(self, driver) -> bool:
+        '''
+        :return: true if the driver answered, either straight away or on the recheck
+        '''
+        self.heartbeats += 1
+        if self.is_responding(driver):
+            self.last_healthy_at = self.clock.monotonic()
+            return True
+
+        self.failed_checks += 1
+        failed_at = self.clock.monotonic()
+        self.clock.sleep(self.recheck_seconds)
+        if self.is_responding(driver):
+            self.last_healthy_at = self.clock.monotonic()
+            return True
+        if self.failed_at is None:
+            self.failed_at = failed_at
+        return False
+
+    def recovery_failed(self):
+        self.failed_recoveries += 1
+
+    def recovered(self) -> float:
+        '''
+        Records that a working driver is back
+        :return: seconds from the failed check to now
+        '''
+        now = self.clock.monotonic()
+        recovery_seconds = now - (self.failed_at if self.failed_at is not None else now)
+        self.recoveries += 1
+        self.total_recovery_seconds += recovery_seconds
+        self.max_recovery_seconds = max(self.max_recovery_seconds, recovery_seconds)
+        self.last_recovery_seconds = recovery_seconds
+        self.failed_at = None
+        self.last_healthy_at = now
+        return recovery_seconds
+
+    def get_stats(self) -> dict:
+        return {
+            "heartbeats": self.heartbeats,
+            "failed_checks": self.failed_checks,
+            "recoveries": self.recoveries,
+            "failed_recoveries": self.failed_recoveries,
+            "last_recovery_ms": self.last_recovery_seconds * 1000.0 if self.last_recovery_seconds is not None else None,
+            "mean_recovery_ms": self.total_recovery_seconds / self.recoveries * 1000.0 if self.recoveries else 0.0,
+            "max_recovery_ms": self.max_recovery_seconds * 1000.0,
+        }
@@ -0,0 +1,165 @@
+import heapq
+import json
+from collections import deque
+from enum import Enum
+
+from src.utils.clock import SYSTEM_CLOCK
+
+class SneakerEventCode(Enum):
+    '''
+    Everything that can happen to a sneaker, the value is the template its message is formatted from when it is read
+    '''
+    TAB_CREATED = "Created Tab for sneaker at : {url}"
+    TAB_OPEN_FAILED = "Could not create tab for sneaker at : {url}"
+    HANDED_OFF_TO_TAB = "Handed sneaker over from the HTTP monitor to a tab for sneaker at : {url}"
+    TAB_REUSED = "Reused a pooled tab for sneaker at : {url}"
+    TAB_OVER_CAP = "Opened a tab over the cap of {max_tabs} for sneaker at : {url}, no other sneaker could give one up"
+    TAB_PARKED = "Parked the tab of sneaker at : {url}, its next wake up is in {wait_seconds}"
+    TAB_EVICTED = "Gave the tab of sneaker at : {url} to {evicted_for}, its next wake up is in {wait_seconds}"
+    TAB_RECLAIMED = "Took the tab of finished sneaker at : {url} for {evicted_for}"
+    TAB_UNPARKED = "Reopened a tab for parked sneaker at : {url}"
+    TAB_RECOVERED = "Reopened a tab for sneaker at : {url} to pick it back up from where it was"
+    RESUMED_FROM_CHECKPOINT = "Resumed sneaker at : {url} from its checkpoint in {state} state"
+    ROLLED_BACK = "Sneaker at : {url} moved on a browser that was dying, put back to {restored_state} from its checkpoint"
+    PRE_RELEASE_SCHEDULED = "Scheduled wake up in {wait_seconds} for url: {url} and moved state to Pre Release"
+    PRE_RELEASE_SCHEDULED_WITHOUT_TAB = "{source} scheduled wake up in {wait_seconds} for url: {url} and moved state to Pre Release without a tab"
+    HTTP_RELEASE_MOVED = "HTTP monitor saw the release move to {release_dt}, rescheduled wake up in {wait_seconds} for url: {url}"
+    HTTP_RELEASE_LOST = "HTTP monitor lost the release time for url: {url}, waking it up now"
+    WAKEUP_HANDLED = "Wake up for sneaker at : {url} is in {state} state and was handled {lag_seconds} after its deadline!"
+    NEAR_RELEASE_SCHEDULED = "Scheduled wake up in {wait_seconds} for url: {url} and moved state to NEAR_RELEASE"
+    RELEASE_RELOAD_TIMED = "Reloading sneaker at : {url} {lead_seconds}s ahead of its release so the page lands on it ({align})"
+    NEAR_RELEASE_RETRY = "Scheduled wake up in {wait_seconds} for url: {url} and kept state at NEAR_RELEASE"
+    WAKEUP_RETRY = "Scheduled wake up in {wait_seconds} for url: {url}, it is in {state} state but still shows a release time"
+    RELEASE_DETECTED = "Sneaker cannot find availability element! Might now be purchasable!"
+    PURCHASED = "Sucessfully purchased sneaker!"
+    PURCHASE_FAILED = "Failed to purchase sneaker!"
+    STATE_UNKNOWN = "Could not process the state for sneaker at : {url}. Given error is {error}"
+    CHECKOUT_BUTTON_FAILED = "Was not able to find and click the checkout element!"
+    CHECKOUT_NAVIGATION_FAILED = "Clicked checkout button but was not able to navigate to checkout page!"
+    CVV_OR_ORDER_REVIEW_FAILED = "Could not find cvv element or order review button to checkout!"
+    SUBMIT_PAYMENT_FAILED = "Could not find and click the submit payment button!"
+    PAYMENT_REJECTED = "Payment was submitted but rejected by website for some error - {error_text}"
+    RESIZED = "Size for sneaker at : {url} changed to {size} in the sneaker file"
+    RETIRED = "Sneaker at : {url} was removed from the sneaker file and is no longer monitored"
+
+class SneakerEvent():
+    '''
+    A single thing that happened to a sneaker. Only the code and payload are kept, the message is formatted when
+    something actually reads it.
+    '''
+    __slots__ = ("sneaker_url", "code", "state", "monotonic", "payload")
+
+    def __init__(self, sneaker_url: str, code: SneakerEventCode, state=None, monotonic: float = None, payload: dict = None):
+        self.sneaker_url = sneaker_url
+        self.code = code
+        self.state = state
+        self.monotonic = SYSTEM_CLOCK.monotonic() if monotonic is None else monotonic
+        self.payload = payload
+
+    @property
+    def message(self) -> str:
+        return self.code.value.format(url=self.sneaker_url, state=self.state, **(self.payload or {}))
+
+    def to_dict(self) -> dict:
+        return {
+            "sneaker_url": self.sneaker_url,
+            "code": self.code.name,
+            "state": getattr(self.state, "name", self.state),
+            "monotonic": self.monotonic,
+            "message": self.message,
+            "payload": self.payload,
+        }
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"SneakerEvent({self.code.name}, {self.sneaker_url}, state={self.state}, monotonic={self.monotonic})"
+
+class SneakerEventStore():
+    '''
+    Keeps the most recent events of every sneaker in a fixed size ring buffer, so a sneaker refreshing for hours in
+    NEAR_RELEASE stays at a flat memory footprint instead of growing a list of strings forever.
+    '''
+
+    __DEFAULT_CAPACITY_PER_SNEAKER = 256
+
+    def __init__(self, sneaker_urls=(), capacity_per_sneaker: int = None, clock=None):
+        self.capacity_per_sneaker = capacity_per_sneaker or self.__DEFAULT_CAPACITY_PER_SNEAKER
+        self.clock = clock or SYSTEM_CLOCK
+        self._events = {}
+        # sneaker url -> how many events fell off the front of its buffer
+        self.dropped_counts = {}
+        for sneaker_url in sneaker_urls:
+            self.add_sneaker(sneaker_url)
+
+    def record(self, sneaker_url: str, code: SneakerEventCode, state=None, **payload) -> SneakerEvent:
+        return self.add(SneakerEvent(sneaker_url, code, state, self.clock.monotonic(), payload or None))
+
+    def add(self, event: SneakerEvent) -> SneakerEvent:
+        buffer = self._buffer(event.sneaker_url)
+        if len(buffer) == buffer.maxlen:
+            self.dropped_counts[event.sneaker_url] += 1
+        buffer.append(event)
+        return event
+
+    def add_sneaker(self, sneaker_url: str):
+        self._buffer(sneaker_url)
+
+    def sneaker_urls(self):
+        return list(self._events)
+
+    def query(self, sneaker_url: str = None, state=None, code: SneakerEventCode = None, since: float = None, until: float = None):
+        '''
+        Yields the events matching every given filter, oldest first
+        :param since: only events at or after this monotonic() time of the stores clock
+        :param until: only events before this monotonic() time of the stores clock
+        '''
+        if sneaker_url is not None:
+            buffers = [self._events.get(sneaker_url, ())]
+        else:
+            buffers = list(self._events.values())
+
+        # each buffer is already in time order, so they only need merging
+        for event in heapq.merge(*[list(buffer) for buffer in buffers], key=lambda event: event.monotonic):
+            if state is not None and event.state != state:
+                continue
+            if code is not None and event.code != code:
+                continue
+            if since is not None and event.monotonic < since:
+                continue
+            if until is not None and event.monotonic >= until:
+                continue
+            yield event
+
+    def get_messages(self) -> dict:
+        '''
+        :return: sneaker url -> formatted messages of its buffered events, the shape get_purchase_logs has always had
+        '''
+        return {sneaker_url: [event.message for event in buffer] for sneaker_url, buffer in self._events.items()}
+
+    def export_jsonl(self, file_path, **filters) -> int:
+        '''
+        Streams the events matching the query filters to file_path, one JSON object per line
+        :return: how many events were written
+        '''
+        written = 0
+        with open(file_path, "w", encoding="utf-8") as f:
+            for event in self.query(**filters):
+                f.write(json.dumps(event.to_dict(), default=str))
+                f.write("\n")
+                written += 1
+        return written
+
+    def __contains__(self, sneaker_url):
+        return sneaker_url in self._events
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self._events.values())
+
+    def _buffer(self, sneaker_url: str) -> deque:
+        buffer = self._events.get(sneaker_url)
+        if buffer is None:
+            buffer = self._events[sneaker_url] = deque(maxlen=self.capacity_per_sneaker)
+            self.dropped_counts[sneaker_url] = 0
+        return buffer
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+from src.config.local_logging import LocalLogging
+from src.utils.wait_conditions import WaitCondition
+
+# Name of the Runtime binding the message tab calls into when a devtools connection is listening for it
+KEY_SIGNAL_BINDING = "snaggerKeySignal"
+
+# Added to the message tab once per page. With the binding there every key press (and the page itself loading) is
+# pushed out through it, without it key presses are kept on window.keyEvents for whoever polls the page. Running it
+# again after clearing snaggerKeysListening swaps out the listener that is there instead of adding a second one
+KEY_LISTENER_SCRIPT = """
+    if (!window.snaggerKeysListening) {
+        window.snaggerKeysListening = true;
+        window.keyEvents = [];
+        if (window.snaggerKeyListener) {
+            document.removeEventListener('keydown', window.snaggerKeyListener, true);
+        }
+        const signal = window.snaggerKeysPolled ? undefined : window['%s'];
+        window.snaggerKeyListener = function (event) {
+            const keyEvent = {key: event.key, code: event.code, shift: event.shiftKey, ctrl: event.ctrlKey, alt: event.altKey, meta: event.metaKey};
+            if (signal) {
+                signal(JSON.stringify({kind: 'key', event: keyEvent}));
+            } else {
+                window.keyEvents.push(keyEvent);
+            }
+        };
+        document.addEventListener('keydown', window.snaggerKeyListener, true); // Use capturing phase
+        if (signal) {
+            signal(JSON.stringify({kind: 'loaded'}));
+        }
+    }
+""" % KEY_SIGNAL_BINDING
+
+# The listener for a tab that is polled, keys go on window.keyEvents even when a devtools binding was left on the page
+POLLED_KEY_LISTENER_SCRIPT = "window.snaggerKeysPolled = true; window.snaggerKeysListening = false;" + KEY_LISTENER_SCRIPT
+
+class PolledKeyChannel():
+    '''
+    Key presses on the message tab read by polling the page, for browsers we cannot open a devtools connection to.
+    Every poll is a single script that hands back the keys pressed since the last one and clears them, a page without
+    the listener (a new one, or it was reloaded) is reported as changed and listen() puts the listener back. The page
+    is reported as changed on the first take too, a push channel before us may have left a listener that only signals.
+    '''
+
+    pushes = False
+
+    __drain_script = """
+        const keyEvents = window.keyEvents;
+        if (keyEvents !== undefined) { window.keyEvents = []; }
+        return keyEvents === undefined ? null : keyEvents;
+    """
+
+    def __init__(self, driver, waiter, tab_focus, poll_seconds: float = 0.1):
+        self.driver = driver
+        self.waiter = waiter
+        self.tab_focus = tab_focus
+        self.poll_seconds = poll_seconds
+        self.tab_handle = None
+        # keys a poll while waiting already took off the page, handed out by the next take()
+        self._pending_keys = []
+        self._page_reloaded = True
+        self.polls = 0
+
+    def start(self, tab_handle: str):
+        self.tab_handle = tab_handle
+        return self
+
+    def take(self):
+        '''
+        Has to be called with the driver on the message tab
+        :return: tuple of the key codes pressed since the last take, and whether the page was reloaded since, in which
+            case listen() has to be called before any more keys are seen
+        '''
+        if not self._pending_keys and not self._page_reloaded:
+            self._drain(self.driver)
+        keys, page_reloaded = self._pending_keys, self._page_reloaded
+        self._pending_keys = []
+        self._page_reloaded = False
+        return keys, page_reloaded
+
+    def listen(self):
+        self.driver.execute_script(POLLED_KEY_LISTENER_SCRIPT)
+
+    def _drain(self, driver) -> bool:
+        # only ever read keys off the message tab, whatever tab the driver was left on
+        if self.tab_focus.current != self.tab_handle:
+            return False
+        self.polls += 1
+        key_events = driver.execute_script(self.__drain_script)
+        if key_events is None:
+            self._page_reloaded = True
+            return True
+        self._pending_keys += [key_event["code"] for key_event in key_events]
+        return bool(self._pending_keys)
+
+    def _key_pressed(self) -> WaitCondition:
+        return WaitCondition("key events pending", self._drain)
+
+    def wait(self, timeout: float):
+        self.waiter.until_or_none(self._key_pressed(), timeout, step="user_input", poll_seconds=self.poll_seconds)
+
+    async def wait_async(self, timeout: float, driver_calls):
+        await self.waiter.until_or_none_async(self._key_pressed(), driver_calls, timeout, step="user_input", poll_seconds=self.poll_seconds)
+
+    def tab_count(self):
+        '''
+        :return: how many tabs the browser has open, None as polling has no way of knowing without asking the driver
+        '''
+        return None
+
+    def listening(self) -> bool:
+        return True
+
+    def stop(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {"channel": "polled", "polls": self.polls}
+
+class CdpKeyChannel():
+    '''
+    Key presses on the message tab pushed to us over a devtools connection of our own, so the driver is never asked.
+    The message tab gets a Runtime binding and the listener script on every new document, the page calls the binding
+    on every keydown and when it loads, and tabs opening and closing come in as target events. A background thread runs
+    the connection (selenium's trio based cdp module) and puts every signal on a queue the moment it arrives, wait()
+    just blocks on that queue. start() only returns once the tab signalled it is listening, a binding that never
+    fires would otherwise leave every wait() sitting out its whole timeout.
+    '''
+
+    pushes = True
+
+    # How long opening the connection and setting up the tab can take before we give up and poll instead
+    __START_TIMEOUT_SECONDS = 5
+    # Events the connection holds for us before dropping them, far more than anyone can type between two reads
+    __EVENT_BUFFER_SIZE = 100
+
+    def __init__(self, driver, start_timeout_seconds: float = None):
+        '''
+        :param start_timeout_seconds: how long start() waits for the tab to signal before giving up, defaults to
+        __START_TIMEOUT_SECONDS
+        '''
+        self.driver = driver
+        self.start_timeout_seconds = start_timeout_seconds or self.__START_TIMEOUT_SECONDS
+        self.logger = LocalLogging.get_local_logger("Key_Channel")
+        self.tab_handle = None
+        self._signals = queue.Queue()
+        self._started = threading.Event()
+        self._start_error = None
+        self._thread = None
+        self._trio_token = None
+        self._cancel_scope = None
+        # target ids of every open page, None until the connection has listed them
+        self._pages = None
+        self.signals = 0
+
+    def start(self, tab_handle: str):
+        '''
+        :return: self once the message tab is listening, raises if the browser cannot give us a devtools connection or the
+            tab never signals over it
+        '''
+        self.tab_handle = tab_handle
+        give_up_at = time.monotonic() + self.start_timeout_seconds
+        version, websocket_url = self._devtools_endpoint()
+        self._thread = threading.Thread(target=self._run, args=(version, websocket_url), name="key-channel", daemon=True)
+        self._thread.start()
+        if not self._started.wait(self.start_timeout_seconds):
+            self.stop()
+            raise Exception(f"Devtools connection for the message tab did not open in {self.start_timeout_seconds} seconds")
+        if self._start_error:
+            raise Exception(f"Unable to listen for keys over devtools - {self._start_error}")
+        # the listener put on the tab while starting signals it loaded straight away, wait for it
+        try:
+            self._signals.put(self._signals.get(timeout=max(give_up_at - time.monotonic(), 0.0)))
+        except queue.Empty:
+            self.stop()
+            raise Exception(f"The message tab never signalled over devtools in {self.start_timeout_seconds} seconds")
+        return self
+
+    def _devtools_endpoint(self):
+        '''
+        :return: tuple of the browsers major version and its devtools websocket url, the same way selenium finds them
+        '''
+        capabilities = self.driver.capabilities
+        if capabilities.get("se:cdp"):
+            return capabilities.get("se:cdpVersion", capabilities.get("browserVersion", "")).split(".")[0], capabilities["se:cdp"]
+        return self.driver._get_cdp_details()
+
+    def _run(self, version: str, websocket_url: str):
+        import trio
+        try:
+            trio.run(self._listen, version, websocket_url)
+        except Exception as e:
+            self._start_error = e
+            if self._started.is_set():
+                self.logger.error(f"Devtools connection for the message tab closed - {e}")
+        finally:
+            self._started.set()
+
+    async def _listen(self, version: str, websocket_url: str):
+        import trio
+        from selenium.webdriver.common.bidi import cdp
+
+        devtools = cdp.import_devtools(version)
+        async with cdp.open_cdp(websocket_url) as connection:
+            async with trio.open_nursery() as nursery:
+                self._trio_token = trio.lowlevel.current_trio_token()
+                self._cancel_scope = nursery.cancel_scope
+                # window handles are the target ids of the tabs
+                async with connection.open_session(devtools.target.TargetID(self.tab_handle)) as session:
+                    await session.execute(devtools.runtime.enable())
+                    await session.execute(devtools.runtime.add_binding(KEY_SIGNAL_BINDING))
+                    await session.execute(devtools.page.add_script_to_evaluate_on_new_document(KEY_LISTENER_SCRIPT))
+                    # a page already showing added its listener before the binding was there, give it one that uses it
+                    await session.execute(devtools.runtime.evaluate("window.snaggerKeysPolled = false; window.snaggerKeysListening = false;" + KEY_LISTENER_SCRIPT))
+
+                    targets = await connection.execute(devtools.target.get_targets())
+                    self._pages = {target.target_id for target in targets if target.type_ == "page"}
+                    nursery.start_soon(self._listen_for_tabs, connection, devtools)
+                    await connection.execute(devtools.target.set_discover_targets(True))
+
+                    self._started.set()
+                    async for binding_called in session.listen(devtools.runtime.BindingCalled, buffer_size=self.__EVENT_BUFFER_SIZE):
+                        if binding_called.name == KEY_SIGNAL_BINDING:
+                            self._signal(json.loads(binding_called.payload))
+
+    async def _listen_for_tabs(self, connection, devtools):
+        async for event in connection.listen(devtools.target.TargetCreated, devtools.target.TargetDestroyed, buffer_size=self.__EVENT_BUFFER_SIZE):
+            if isinstance(event, devtools.target.TargetCreated):
+                if event.target_info.type_ != "page" or event.target_info.target_id in self._pages:
+                    continue
+                self._pages.add(event.target_info.target_id)
+            elif event.target_id in self._pages:
+                self._pages.discard(event.target_id)
+            else:
+                continue
+            self._signal({"kind": "tabs"})
+
+    def listen(self):
+        # the connection adds the listener to every new page itself
+        pass
+
+    def _signal(self, signal: dict):
+        self.signals += 1
+        self._signals.put(signal)
+
+    def take(self):
+        '''
+        :return: tuple of the key codes pressed since the last take, and whether anything the message depends on (the
+            page loading or tabs opening and closing) changed since
+        '''
+        keys = []
+        changed = False
+        while True:
+            try:
+                signal = self._signals.get_nowait()
+            except queue.Empty:
+                break
+            if signal["kind"] == "key":
+                keys.append(signal["event"]["code"])
+            else:
+                changed = True
+        return keys, changed
+
+    def wait(self, timeout: float):
+        '''
+        Returns as soon as a signal comes in, leaving it for take()
+        '''
+        try:
+            self._signals.put(self._signals.get(timeout=timeout))
+        except queue.Empty:
+            pass
+
+    async def wait_async(self, timeout: float, driver_calls):
+        # blocks on the queue off the loop, the driver thread is left free for the purchaser
+        await asyncio.get_running_loop().run_in_executor(None, self.wait, timeout)
+
+    def tab_count(self):
+        return len(self._pages) if self._pages is not None else None
+
+    def listening(self) -> bool:
+        '''
+        :return: false once the connection closed, nothing is pushed to us any more
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        if self._cancel_scope is not None:
+            import trio
+            try:
+                trio.from_thread.run_sync(self._cancel_scope.cancel, trio_token=self._trio_token)
+            except trio.RunFinishedError:
+                pass
+        if self._thread is not None:
+            self._thread.join(self.start_timeout_seconds)
+
+    def get_stats(self) -> dict:
+        return {"channel": "cdp", "signals": self.signals}
+
+def open_key_channel(driver, waiter, tab_focus, tab_handle: str, push: bool = True, poll_seconds: float = 0.1):
+    '''
+    Listens for keys on the message tab, pushed over devtools when push is on and the browser lets us, polled otherwise
+    '''
+    if push:
+        try:
+            return CdpKeyChannel(driver).start(tab_handle)
+        except Exception as e:
+            LocalLogging.get_local_logger("Key_Channel").info(f"Polling the message tab for keys, no devtools connection for it - {e}")
+    return PolledKeyChannel(driver, waiter, tab_focus, poll_seconds).start(tab_handle)
+
+class MessageOverlay():
+    '''
+    The box the message for the user is shown in on the message tab. The page is only touched when the message or its
+    color actually changed, with one script that adds the box if the page does not have it and sets both. Anything
+    that can lose the box (a reload, a new browser) has to call invalidate() so the next render puts it back.
+    '''
+
+    __render_script = """
+        let statusDiv = document.getElementById(arguments[0]);
+        if (!statusDiv) {
+            statusDiv = document.createElement('div');
+            statusDiv.id = arguments[0];
+            statusDiv.style.position = 'fixed';
+            statusDiv.style.top = '50%';
+            statusDiv.style.left = '50%';
+            statusDiv.style.transform = 'translate(-50%, -50%)';
+            statusDiv.style.padding = '10px';
+            statusDiv.style.zIndex = '9999';
+            document.body.appendChild(statusDiv);
+        }
+        statusDiv.textContent = arguments[1];
+        statusDiv.style.backgroundColor = arguments[2];
+    """
+
+    def __init__(self, driver, element_id: str):
+        self.driver = driver
+        self.element_id = element_id
+        # (message, color) last put on the page, None when the page may not be showing it
+        self.shown = None
+        self.renders = 0
+        self.skipped = 0
+
+    def render(self, message: str, color: str) -> bool:
+        '''
+        :return: true if the page had to be updated
+        '''
+        if self.shown == (message, color):
+            self.skipped += 1
+            return False
+        self.shown = None
+        self.driver.execute_script(self.__render_script, self.element_id, message, color)
+        self.shown = (message, color)
+        self.renders += 1
+        return True
+
+    def invalidate(self):
+        self.shown = None
+
+    def get_stats(self) -> dict:
+        return {"renders": self.renders, "skipped": self.skipped}
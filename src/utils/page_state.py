@@ -0,0 +1,171 @@
+import re
+from html.parser import HTMLParser
+
+class AccountPageState():
+    '''
+    What we care about on a nike page while setting up an account, pulled out of a single parse of the page
+    '''
+    __slots__ = ("default_payment_set", "default_address_set", "nav_item_count")
+
+    def __init__(self, default_payment_set=False, default_address_set=False, nav_item_count=None):
+        self.default_payment_set = default_payment_set
+        self.default_address_set = default_address_set
+        # Number of <li> in the desktop nav list, None if the page does not have one
+        self.nav_item_count = nav_item_count
+
+    @property
+    def logged_in(self):
+        '''
+        :return: True/False when the nav list says so (3 items logged in, 4 logged out), None if it cant tell
+        '''
+        if self.nav_item_count == 3:
+            return True
+        if self.nav_item_count == 4:
+            return False
+        return None
+
+    def __repr__(self):
+        return f"AccountPageState(default_payment_set={self.default_payment_set}, default_address_set={self.default_address_set}, nav_item_count={self.nav_item_count})"
+
+class AccountPageScanner(HTMLParser):
+    '''
+    Single pass scanner over raw page html. It is a replacement for building a BeautifulSoup tree and running
+    soup.find(lambda tag: tag.get_text() == ...) which re-computes the text of every subtree. Instead every text
+    fragment is stored once and an elements text is only joined together when its length could possibly match one of
+    the phrases we are looking for, so the whole page is handled in linear time.
+    '''
+
+    # State attribute -> phrase that an element's whole text has to equal (case and whitespace insensitive)
+    phrases = {
+        "default_payment_set": "Default Payment Method",
+        "default_address_set": "Default Delivery Address",
+    }
+    nav_list_class = "desktop-list"
+
+    __whitespace_pattern = re.compile(r"\s+")
+    # Elements that never have an end tag
+    __void_tags = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"])
+    # Elements whose text is never shown so it should not count towards an elements text
+    __hidden_text_tags = frozenset(["script", "style", "template", "noscript"])
+    # Elements that implicitly close an open sibling of the same type
+    __self_closing_siblings = frozenset(["li", "p", "option", "tr", "td", "th"])
+
+    __compiled_phrases = {name: " ".join(phrase.split()).casefold() for name, phrase in phrases.items()}
+    # The raw text of a matching element is at least as long as the phrase, and we allow for a lot of extra whitespace
+    __min_text_length = min(len(phrase) for phrase in __compiled_phrases.values())
+    __max_text_length = 4 * max(len(phrase) for phrase in __compiled_phrases.values()) + 64
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.state = AccountPageState()
+        self._text_fragments = []
+        self._text_length = 0
+        # (tag, index of the first text fragment inside it, text length when it opened, is it the nav list)
+        self._open_elements = []
+        self._hidden_depth = 0
+        self._nav_list_seen = False
+
+    @classmethod
+    def scan(cls, page_html: str) -> AccountPageState:
+        scanner = cls()
+        scanner.feed(page_html)
+        scanner.close()
+        return scanner.state
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.__void_tags:
+            return
+        if tag in self.__self_closing_siblings and self._open_elements and self._open_elements[-1][0] == tag:
+            self._close_top_element()
+
+        is_nav_list = False
+        if tag == "ul" and not self._nav_list_seen:
+            for name, value in attrs:
+                if name == "class" and value == self.nav_list_class:
+                    is_nav_list = True
+                    self._nav_list_seen = True
+                    self.state.nav_item_count = 0
+                    break
+        elif tag == "li" and self._open_elements and self._open_elements[-1][3]:
+            self.state.nav_item_count += 1
+
+        if tag in self.__hidden_text_tags:
+            self._hidden_depth += 1
+        self._open_elements.append((tag, len(self._text_fragments), self._text_length, is_nav_list))
+
+    def handle_startendtag(self, tag, attrs):
+        # <div/> style tags open and close right away and cannot hold text
+        return
+
+    def handle_endtag(self, tag):
+        # Forgive unclosed children by closing everything up to the matching open element, ignore stray end tags
+        for index in range(len(self._open_elements) - 1, -1, -1):
+            if self._open_elements[index][0] == tag:
+                while len(self._open_elements) > index:
+                    self._close_top_element()
+                return
+
+    def handle_data(self, data):
+        if self._hidden_depth or not data:
+            return
+        self._text_fragments.append(data)
+        self._text_length += len(data)
+
+    def close(self):
+        super().close()
+        while self._open_elements:
+            self._close_top_element()
+
+    def _close_top_element(self):
+        tag, first_fragment, length_at_open, _ = self._open_elements.pop()
+        if tag in self.__hidden_text_tags:
+            self._hidden_depth -= 1
+            return
+
+        text_length = self._text_length - length_at_open
+        if text_length < self.__min_text_length or text_length > self.__max_text_length:
+            return
+
+        text = self.__whitespace_pattern.sub(" ", "".join(self._text_fragments[first_fragment:])).strip().casefold()
+        for name, phrase in self.__compiled_phrases.items():
+            if text == phrase:
+                setattr(self.state, name, True)
+
+class PageStateExtractor():
+    '''
+    Gets the AccountPageState of the current tab, caching it per tab and navigation so asking again about a page that
+    has not changed costs one small execute_script instead of pulling and parsing the whole page source again.
+    '''
+
+    # Returns the navigation key, and the page html only when the key does not match the one we already have cached
+    __snapshot_script = """
+        const key = performance.timeOrigin + '|' + location.href + '|' + document.getElementsByTagName('*').length;
+        if (key === arguments[0]) {
+            return [key, null];
+        }
+        return [key, document.documentElement.outerHTML];
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        # tab handle -> (navigation key, AccountPageState)
+        self._cache = {}
+
+    def get_state(self, tab_handle: str) -> AccountPageState:
+        '''
+        :param tab_handle: handle of the tab the driver is currently switched to, used as the cache key
+        '''
+        cached_key, cached_state = self._cache.get(tab_handle, (None, None))
+        navigation_key, page_html = self.driver.execute_script(PageStateExtractor.__snapshot_script, cached_key)
+        if page_html is None and cached_state is not None:
+            return cached_state
+
+        state = AccountPageScanner.scan(page_html or "")
+        self._cache[tab_handle] = (navigation_key, state)
+        return state
+
+    def invalidate(self, tab_handle: str = None):
+        if tab_handle is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(tab_handle, None)
@@ -0,0 +1,18 @@
+import math
+
+def nearest_rank(count: int, pct: float) -> int:
+    '''
+    :return: the 1 based rank of the pct percentile in count ordered values, the smallest rank that has at least pct
+    percent of the values at or under it
+    '''
+    return min(max(math.ceil(pct * count / 100.0), 1), count)
+
+def percentile(samples, pct: float):
+    '''
+    Nearest rank percentile of the samples, they do not have to be sorted
+    :return: the sample at the percentile, None when there are none
+    '''
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[nearest_rank(len(ordered), pct) - 1]
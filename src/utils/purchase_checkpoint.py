@@ -0,0 +1,130 @@
+import datetime
+import sqlite3
+import threading
+from pathlib import Path
+
+from src.utils.clock import SYSTEM_CLOCK
+
+class SneakerCheckpoint():
+    '''
+    Where a sneaker was at the last checkpoint, enough to pick it back up on a new browser or after a restart
+    '''
+    __slots__ = ("url", "state", "attempts", "wakeup_target", "had_tab", "saved_at")
+
+    def __init__(self, url: str, state: str, attempts: int = 0, wakeup_target: datetime.datetime = None, had_tab: bool = False, saved_at: float = None):
+        '''
+        :param state: name of the PurchaseState it was in
+        :param wakeup_target: timezone aware server time of its next wake-up, None if it was not waiting on one
+        :param saved_at: time() of the clock the store judges ages by when it was taken, defaults to now on the real clock
+        '''
+        self.url = url
+        self.state = state
+        self.attempts = attempts
+        self.wakeup_target = wakeup_target
+        self.had_tab = had_tab
+        self.saved_at = SYSTEM_CLOCK.time() if saved_at is None else saved_at
+
+    def __repr__(self):
+        return f"SneakerCheckpoint({self.url}, {self.state}, attempts={self.attempts}, wakeup_target={self.wakeup_target})"
+
+class PurchaseCheckpointStore():
+    '''
+    The last known good state of every sneaker. The latest checkpoint of each one is always kept in memory, and when a
+    path is given it is also written to a table in that SQLite file (the release cache file by default, it is opened in
+    WAL mode like ReleaseMetadataCache so both can share it) so a restarted run can resume from it.
+
+    Checkpoints older than max_age_seconds are left alone when loading, a run from yesterday has nothing to resume.
+    '''
+
+    # How long a write waits for another process to finish its write before giving up
+    __BUSY_TIMEOUT_SECONDS = 5
+    __DEFAULT_MAX_AGE_SECONDS = 24 * 60 * 60
+
+    __schema = """
+        CREATE TABLE IF NOT EXISTS purchase_checkpoints (
+            url TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL,
+            wakeup_target TEXT,
+            had_tab INTEGER NOT NULL,
+            saved_at REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path: Path = None, max_age_seconds: float = None, clock=None):
+        '''
+        :param path: sqlite file to write checkpoints to, None only keeps them in memory
+        :param clock: clock the age of checkpoints is judged by, defaults to the real one
+        '''
+        self.path = Path(path) if path else None
+        self.clock = clock or SYSTEM_CLOCK
+        self.max_age_seconds = max_age_seconds or self.__DEFAULT_MAX_AGE_SECONDS
+        # url -> the SneakerCheckpoint last saved for it
+        self.checkpoints = {}
+        self.saves = 0
+        self.rows_written = 0
+
+        self._lock = threading.Lock()
+        self._connection = None
+        if self.path:
+            self._connection = sqlite3.connect(str(self.path), timeout=self.__BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(self.__schema)
+
+    def get(self, url: str):
+        return self.checkpoints.get(url)
+
+    def save(self, checkpoints) -> int:
+        '''
+        Saves the given SneakerCheckpoints in one transaction
+        :return: how many were saved
+        '''
+        checkpoints = list(checkpoints)
+        if not checkpoints:
+            return 0
+        with self._lock:
+            if self._connection:
+                rows = [(checkpoint.url, checkpoint.state, checkpoint.attempts,
+                         checkpoint.wakeup_target.isoformat() if checkpoint.wakeup_target else None,
+                         int(checkpoint.had_tab), checkpoint.saved_at) for checkpoint in checkpoints]
+                self._connection.execute("BEGIN IMMEDIATE")
+                try:
+                    self._connection.executemany("INSERT OR REPLACE INTO purchase_checkpoints (url, state, attempts, wakeup_target, had_tab, saved_at) "
+                                                 "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                    self._connection.execute("COMMIT")
+                except Exception:
+                    self._connection.execute("ROLLBACK")
+                    raise
+            for checkpoint in checkpoints:
+                self.checkpoints[checkpoint.url] = checkpoint
+            self.saves += 1
+            self.rows_written += len(checkpoints)
+        return len(checkpoints)
+
+    def load(self) -> dict:
+        '''
+        Reads back every checkpoint young enough to resume from
+        :return: url -> SneakerCheckpoint
+        '''
+        if not self._connection:
+            return dict(self.checkpoints)
+        with self._lock:
+            rows = self._connection.execute("SELECT url, state, attempts, wakeup_target, had_tab, saved_at FROM purchase_checkpoints WHERE saved_at > ?",
+                                            (self.clock.time() - self.max_age_seconds,)).fetchall()
+        for url, state, attempts, wakeup_target, had_tab, saved_at in rows:
+            self.checkpoints[url] = SneakerCheckpoint(url, state, attempts, datetime.datetime.fromisoformat(wakeup_target) if wakeup_target else None,
+                                                      bool(had_tab), saved_at)
+        return dict(self.checkpoints)
+
+    def remove(self, url: str):
+        with self._lock:
+            self.checkpoints.pop(url, None)
+            if self._connection:
+                self._connection.execute("DELETE FROM purchase_checkpoints WHERE url = ?", (url,))
+
+    def close(self):
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,159 @@
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from src.utils.clock import SYSTEM_CLOCK
+
+class ReleaseMetadataCache():
+    '''
+    On disk cache of what we last read off each sneakers page (release time, size grid and last purchase state) so a
+    run started an hour after the last one can schedule its wake-ups straight away instead of opening and parsing every
+    page again. Every entry has its own TTL, expired ones are purged whenever the cache is opened, and storing a value
+    whose content differs from the cached one drops what was cached off the old content for that url (a new release
+    time means the last purchase state was about a different drop, a reordered size grid changes nothing else).
+
+    It is a single SQLite file in WAL mode, so several processes (e.g. browser workers) can read and write it at the
+    same time, writers just wait on each other for up to the busy timeout.
+    '''
+
+    RELEASE = "release"
+    SIZE_GRID = "size_grid"
+    PAGE_STATE = "page_state"
+
+    # How long each kind of entry can be trusted for
+    __DEFAULT_TTL_SECONDS = {
+        RELEASE: 6 * 60 * 60,
+        SIZE_GRID: 60 * 60,
+        PAGE_STATE: 24 * 60 * 60,
+    }
+    # kind -> the kinds cached for the same url that are stale once its content changes
+    __DEPENDENT_KINDS = {
+        RELEASE: (PAGE_STATE,),
+        SIZE_GRID: (),
+    }
+    # How long a write waits for another process to finish its write before giving up
+    __BUSY_TIMEOUT_SECONDS = 5
+
+    __schema = """
+        CREATE TABLE IF NOT EXISTS release_metadata (
+            url TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            fingerprint TEXT,
+            stored_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (url, kind)
+        )
+    """
+
+    def __init__(self, path: Path, ttl_seconds: dict = None, clock=None):
+        '''
+        :param path: sqlite file to keep the cache in, created if it does not exist
+        :param ttl_seconds: kind -> seconds to override the default TTLs with
+        :param clock: clock entries are stamped and expired by, defaults to the real one
+        '''
+        self.path = Path(path)
+        self.clock = clock or SYSTEM_CLOCK
+        self.ttl_seconds = dict(self.__DEFAULT_TTL_SECONDS)
+        self.ttl_seconds.update(ttl_seconds or {})
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        # autocommit, transactions are started explicitly where a read has to be consistent with the write after it
+        self._connection = sqlite3.connect(str(self.path), timeout=self.__BUSY_TIMEOUT_SECONDS, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(self.__schema)
+        self.purge_expired()
+
+    @staticmethod
+    def fingerprint(content: str) -> str:
+        return hashlib.blake2b((content or "").encode(), digest_size=16).hexdigest()
+
+    def get(self, url: str, kind: str):
+        '''
+        :return: the cached json value or None if there is not one or it has expired
+        '''
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM release_metadata WHERE url = ? AND kind = ? AND expires_at > ?",
+                                           (url, kind, self.clock.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, url: str, kind: str, value, fingerprint: str = None) -> bool:
+        '''
+        Stores the value, if the fingerprint differs from the one cached for this kind the kinds that depend on it are
+        dropped for the url as they went with the old content
+        :return: true if the page content changed since it was last cached
+        '''
+        now = self.clock.time()
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute("SELECT fingerprint FROM release_metadata WHERE url = ? AND kind = ?", (url, kind)).fetchone()
+                changed = row is not None and fingerprint is not None and row[0] != fingerprint
+                dependent_kinds = self.__DEPENDENT_KINDS.get(kind, ())
+                if changed and dependent_kinds:
+                    self._connection.execute(f"DELETE FROM release_metadata WHERE url = ? AND kind IN ({', '.join('?' * len(dependent_kinds))})",
+                                             (url,) + tuple(dependent_kinds))
+                self._connection.execute("INSERT OR REPLACE INTO release_metadata (url, kind, value, fingerprint, stored_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                         (url, kind, json.dumps(value), fingerprint, now, now + self.ttl_seconds.get(kind, 0)))
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+        return changed
+
+    def get_release(self, url: str):
+        '''
+        :return: the cached timezone aware release datetime or None
+        '''
+        value = self.get(url, self.RELEASE)
+        return datetime.datetime.fromisoformat(value["release_dt"]) if value else None
+
+    def put_release(self, url: str, availability_text: str, release_dt: datetime.datetime) -> bool:
+        '''
+        :return: true if the availability text changed since it was last cached
+        '''
+        return self.put(url, self.RELEASE, {"availability_text": availability_text, "release_dt": release_dt.isoformat()},
+                        self.fingerprint(availability_text))
+
+    def get_size_labels(self, url: str):
+        return self.get(url, self.SIZE_GRID)
+
+    def put_size_labels(self, url: str, labels) -> bool:
+        return self.put(url, self.SIZE_GRID, list(labels), self.fingerprint("\n".join(labels)))
+
+    def get_page_state(self, url: str):
+        return self.get(url, self.PAGE_STATE)
+
+    def put_page_state(self, url: str, state: str):
+        self.put(url, self.PAGE_STATE, state)
+
+    def invalidate(self, url: str = None):
+        '''
+        Drops everything cached for the url, or the whole cache if no url is given
+        '''
+        with self._lock:
+            if url is None:
+                self._connection.execute("DELETE FROM release_metadata")
+            else:
+                self._connection.execute("DELETE FROM release_metadata WHERE url = ?", (url,))
+
+    def purge_expired(self) -> int:
+        '''
+        :return: how many expired entries were removed
+        '''
+        with self._lock:
+            return self._connection.execute("DELETE FROM release_metadata WHERE expires_at <= ?", (self.clock.time(),)).rowcount
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
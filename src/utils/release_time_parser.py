@@ -0,0 +1,164 @@
+import datetime
+import functools
+import re
+from zoneinfo import ZoneInfo
+
+class ReleaseTimeParseException(Exception):
+    pass
+
+# Zones the site might name after the time, they win over the parsers source timezone
+TIMEZONE_ABBREVIATIONS = {
+    "ET": "America/New_York", "EST": "America/New_York", "EDT": "America/New_York",
+    "CT": "America/Chicago", "CST": "America/Chicago", "CDT": "America/Chicago",
+    "MT": "America/Denver", "MST": "America/Denver", "MDT": "America/Denver",
+    "PT": "America/Los_Angeles", "PST": "America/Los_Angeles", "PDT": "America/Los_Angeles",
+    "UTC": "UTC", "GMT": "UTC",
+}
+
+MONTH_NAMES = {"jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12}
+
+# Pieces the grammars are built out of, everything is matched case insensitively on whitespace collapsed text
+_VERB = r"(?:(?:available|launching|launches|releasing|releases|dropping|drops|arriving)(?:\s+on)?\s+)?"
+_WEEKDAY = r"(?:(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?,?\s+)?"
+_NUMERIC_DATE = r"(?P<month>\d{1,2})/(?P<day>\d{1,2})(?:/(?P<year>\d{4}|\d{2}))?"
+_NAMED_DATE = r"(?P<month_name>" + "|".join(MONTH_NAMES) + r")[a-z]*\.?\s+(?P<day>\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(?P<year>\d{4}))?"
+_AT = r"\s*,?\s*(?:(?:at|@)\s*)?"
+_TIME_12H = r"(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>[ap])\.?\s*m\b\.?"
+_TIME_24H = r"(?P<hour>\d{1,2}):(?P<minute>\d{2})(?!\s*[ap]\.?\s*m\b)"
+_ZONE = r"(?:\s*(?P<zone>" + "|".join(TIMEZONE_ABBREVIATIONS) + r")\b)?"
+
+# Tried in order, 12 hour times first so "9:00 AM" is never read as a 24 hour 9:00
+GRAMMARS = [
+    (name, re.compile(r"\b" + _VERB + _WEEKDAY + date + _AT + time + _ZONE, re.IGNORECASE))
+    for name, date, time in (
+        ("numeric_date_12h", _NUMERIC_DATE, _TIME_12H),
+        ("named_date_12h", _NAMED_DATE, _TIME_12H),
+        ("numeric_date_24h", _NUMERIC_DATE, _TIME_24H),
+        ("named_date_24h", _NAMED_DATE, _TIME_24H),
+    )
+]
+
+_WHITESPACE = re.compile(r"\s+")
+
+class ReleaseTimeParts():
+    '''
+    What a release text says, before it is placed in a year and timezone
+    '''
+    __slots__ = ("month", "day", "year", "hour", "minute", "zone", "grammar")
+
+    def __init__(self, month: int, day: int, year, hour: int, minute: int, zone, grammar: str):
+        self.month = month
+        self.day = day
+        # None when the text leaves it out, the closest year to now is picked when resolving
+        self.year = year
+        self.hour = hour
+        self.minute = minute
+        # IANA name of a zone the text named, None if it did not
+        self.zone = zone
+        self.grammar = grammar
+
+    def __repr__(self):
+        return f"ReleaseTimeParts({self.year}/{self.month}/{self.day} {self.hour}:{self.minute:02d} {self.zone}, grammar={self.grammar})"
+
+@functools.lru_cache(maxsize=4096)
+def parse_release_parts(release_text: str):
+    '''
+    Runs the grammars over the text, memoized on the raw text since every shoe on a drop shows the same few strings
+    over and over again
+    :return: ReleaseTimeParts, or None if no grammar matched a valid date and time
+    '''
+    text = _WHITESPACE.sub(" ", release_text or "").strip()
+    for grammar_name, grammar in GRAMMARS:
+        match = grammar.search(text)
+        if not match:
+            continue
+
+        groups = match.groupdict()
+        month = MONTH_NAMES[groups["month_name"][:3].lower()] if groups.get("month_name") else int(groups["month"])
+        day = int(groups["day"])
+        year = groups.get("year")
+        if year is not None:
+            year = int(year) + (2000 if len(year) == 2 else 0)
+        hour = int(groups["hour"])
+        minute = int(groups["minute"] or 0)
+
+        meridiem = groups.get("meridiem")
+        if meridiem:
+            if not 1 <= hour <= 12:
+                continue
+            hour = hour % 12 + (12 if meridiem.lower() == "p" else 0)
+        if not (1 <= month <= 12 and 1 <= day <= 31 and 0 <= hour <= 23 and 0 <= minute <= 59):
+            continue
+
+        zone = groups.get("zone")
+        return ReleaseTimeParts(month, day, year, hour, minute, TIMEZONE_ABBREVIATIONS[zone.upper()] if zone else None, grammar_name)
+    return None
+
+class ReleaseTimeParser():
+    '''
+    Turns the release text shown on a product page ("Available 2/22 at 9:00 AM", "Launching Sat, Feb 22 @ 10:00 ET",
+    "Drops 2/22 21:00", ...) into a timezone aware datetime. The text is read in the timezone it names, or the source
+    timezone the parser was made with when it does not name one.
+    '''
+
+    # How long after a release its text can still be on the page, anything older is taken to be next years
+    RECENT_RELEASE_GRACE = datetime.timedelta(days=1)
+
+    def __init__(self, source_timezone=None):
+        '''
+        :param source_timezone: tzinfo or IANA name the site shows times in, None means the same as this pc
+        '''
+        self.source_timezone = ZoneInfo(source_timezone) if isinstance(source_timezone, str) else source_timezone
+
+    def parse(self, release_text: str, now: datetime.datetime = None) -> datetime.datetime:
+        '''
+        :param now: timezone aware current time on the sites clock, used to work out the year when the text leaves it out
+        :raises ReleaseTimeParseException: if the text does not hold a release time
+        '''
+        parts = parse_release_parts(release_text)
+        if parts is None:
+            raise ReleaseTimeParseException(f"Release text {release_text!r} does not match any known release time format")
+        return self.resolve(parts, now or datetime.datetime.now(datetime.timezone.utc))
+
+    def parse_many(self, release_texts, now: datetime.datetime = None, return_exceptions: bool = False):
+        '''
+        Parses the release text of many shoes at once, each distinct text is only parsed and resolved once
+        :return: list lined up with release_texts of datetimes, with None (or the exception when return_exceptions)
+        for texts that could not be parsed
+        '''
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        resolved = {}
+        results = []
+        for release_text in release_texts:
+            if release_text not in resolved:
+                try:
+                    resolved[release_text] = self.parse(release_text, now)
+                except ReleaseTimeParseException as e:
+                    resolved[release_text] = e if return_exceptions else None
+            results.append(resolved[release_text])
+        return results
+
+    def resolve(self, parts: ReleaseTimeParts, now: datetime.datetime) -> datetime.datetime:
+        timezone = ZoneInfo(parts.zone) if parts.zone else self.source_timezone
+        local_now = now.astimezone(timezone) if timezone else now.astimezone()
+
+        # Without a year the first one that is not long gone wins, so a release shown in december for january lands next
+        # year and one that went live a moment ago is not pushed a whole year out
+        years = [parts.year] if parts.year is not None else [local_now.year - 1, local_now.year, local_now.year + 1]
+        candidates = []
+        for year in years:
+            try:
+                release_dt = datetime.datetime(year, parts.month, parts.day, parts.hour, parts.minute)
+            except ValueError:
+                continue
+            candidates.append(release_dt.replace(tzinfo=timezone) if timezone else release_dt.astimezone())
+        if not candidates:
+            raise ReleaseTimeParseException(f"{parts} is not a real date")
+        for release_dt in candidates:
+            if release_dt >= now - self.RECENT_RELEASE_GRACE:
+                return release_dt
+        return candidates[-1]
+
+    @staticmethod
+    def cache_info():
+        return parse_release_parts.cache_info()
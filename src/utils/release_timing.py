@@ -0,0 +1,175 @@
+from collections import deque
+
+from src.utils.percentiles import percentile
+
+# How far into a navigation the site started answering, read off the page once it has loaded
+RESPONSE_START_SCRIPT = """
+    const navigation = performance.getEntriesByType('navigation')[0];
+    return navigation ? navigation.responseStart / 1000 : null;
+"""
+
+class LatencyWindow():
+    '''
+    The most recent latency samples of something, with percentiles over them
+    '''
+    __slots__ = ("samples",)
+
+    def __init__(self, size: int):
+        self.samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float):
+        '''
+        :return: the nearest ranked sample, None when there are none
+        '''
+        return percentile(self.samples, pct)
+
+    def __len__(self):
+        return len(self.samples)
+
+class ReleaseReloadTimer():
+    '''
+    Learns how long reloading each sneakers page takes and uses it to time the reload that decides the drop, instead of
+    only starting it at the release and losing a whole page load to it.
+
+    Two latencies are kept per sneaker over its last reloads: how long the reload took to come back with the page ready
+    to read (navigation), and how far into it the site started answering (response). Aligned on "response" the decisive
+    reload is started so the site answers it just after the release, which is the earliest it can show the sneaker
+    released. Aligned on "interactive" it is started so the page is ready to read at the release, which only pays off
+    on pages that fetch their availability after they load. A sneaker without enough samples of its own goes by
+    everyone's, and without those the reload is not moved at all.
+
+    Warm up reloads in the minute before the decisive one keep the samples fresh, and reloads after it are spaced by
+    how long a reload takes instead of a fixed second.
+    '''
+
+    ALIGNMENTS = ("response", "interactive")
+
+    # The lead comes off the fast end of the samples, a reload that lands early still shows the release time and costs
+    # a whole retry, one that lands late only costs the difference
+    __LEAD_PERCENTILE = 10
+    __RETRY_PERCENTILE = 50
+    # How long after the release the site should answer, on top of however far off the clock calibration can be
+    __LANDING_MARGIN_SECONDS = 0.05
+    # Warm ups stop this long before the decisive reload, and are never closer together than the minimum
+    __WARMUP_GUARD_SECONDS = 5
+    __MIN_WARMUP_SPACING_SECONDS = 1
+    # Retries go half a reload apart, but never faster than the minimum
+    __RETRY_RELOAD_FRACTION = 0.5
+    __MIN_RETRY_SECONDS = 0.25
+
+    def __init__(self, align: str = "response", warmup_reloads: int = 3, warmup_seconds: float = 60, window_size: int = 20,
+                 min_samples: int = 3, max_lead_seconds: float = 10):
+        '''
+        :param warmup_reloads: how many reloads to measure the page with before each release
+        :param warmup_seconds: how long before the decisive reload the warm ups start
+        :param window_size: how many of the most recent reloads the percentiles are over
+        :param min_samples: how many samples a sneaker needs before they are trusted over everyone's
+        :param max_lead_seconds: the most the decisive reload is moved ahead of the release, whatever the samples say
+        '''
+        if align not in self.ALIGNMENTS:
+            raise Exception(f"Unknown release reload alignment {align}, expected one of {self.ALIGNMENTS}")
+        self.align = align
+        self.warmup_reloads = warmup_reloads
+        self.warmup_seconds = warmup_seconds
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.max_lead_seconds = max_lead_seconds
+
+        # sneaker url -> LatencyWindow of navigation and of response seconds, and the same over every sneaker
+        self.navigation = {}
+        self.response = {}
+        self.all_navigation = LatencyWindow(window_size)
+        self.all_response = LatencyWindow(window_size)
+        # sneaker url -> (release it is warming up for, warm ups scheduled for it so far)
+        self._warmups = {}
+        # how long after the release each decisive reload had the page ready to read, negative is before
+        self.landings = LatencyWindow(window_size)
+        self.warmups_scheduled = 0
+
+    def record(self, sneaker_url: str, navigation_seconds: float, response_seconds: float = None):
+        self.navigation.setdefault(sneaker_url, LatencyWindow(self.window_size)).add(navigation_seconds)
+        self.all_navigation.add(navigation_seconds)
+        if response_seconds is not None:
+            self.response.setdefault(sneaker_url, LatencyWindow(self.window_size)).add(response_seconds)
+            self.all_response.add(response_seconds)
+
+    def record_landing(self, seconds_after_release: float):
+        self.landings.add(seconds_after_release)
+
+    def forget(self, sneaker_url: str):
+        self.navigation.pop(sneaker_url, None)
+        self.response.pop(sneaker_url, None)
+        self._warmups.pop(sneaker_url, None)
+
+    def _samples(self, per_sneaker: dict, everyone: LatencyWindow, sneaker_url: str):
+        samples = per_sneaker.get(sneaker_url)
+        if samples is not None and len(samples) >= self.min_samples:
+            return samples
+        return everyone if len(everyone) >= self.min_samples else None
+
+    def lead_seconds(self, sneaker_url: str, clock_uncertainty_seconds: float = 0.0) -> float:
+        '''
+        :param clock_uncertainty_seconds: how far off our idea of the servers clock can be, the release could be that
+            much later than we think
+        :return: how long before the release to start the decisive reload, 0 until there are enough samples
+        '''
+        if self.align == "response":
+            samples = self._samples(self.response, self.all_response, sneaker_url)
+        else:
+            samples = self._samples(self.navigation, self.all_navigation, sneaker_url)
+        if samples is None:
+            return 0.0
+        margin_seconds = self.__LANDING_MARGIN_SECONDS + (clock_uncertainty_seconds or 0.0)
+        return min(max(samples.percentile(self.__LEAD_PERCENTILE) - margin_seconds, 0.0), self.max_lead_seconds)
+
+    def retry_seconds(self, sneaker_url: str, fastest_refresh_seconds: float) -> float:
+        '''
+        :return: how long to wait before reloading again a page that should have shown the sneaker released by now
+        '''
+        samples = self._samples(self.navigation, self.all_navigation, sneaker_url)
+        if samples is None:
+            return fastest_refresh_seconds
+        return min(max(samples.percentile(self.__RETRY_PERCENTILE) * self.__RETRY_RELOAD_FRACTION, self.__MIN_RETRY_SECONDS), fastest_refresh_seconds)
+
+    def next_warmup(self, sneaker_url: str, release, reload_in_seconds: float):
+        '''
+        Spreads the warm ups of a release over the warm up window, one at a time, each one is counted as it is handed out
+        :param release: what the sneaker releases at, warm ups are counted per release
+        :param reload_in_seconds: how far away the decisive reload is
+        :return: seconds from now to reload the sneaker to measure it, None once it had its warm ups or there is no room
+            left for one before the decisive reload
+        '''
+        planned_release, scheduled = self._warmups.get(sneaker_url, (None, 0))
+        if planned_release != release:
+            scheduled = 0
+        left = self.warmup_reloads - scheduled
+        if left <= 0:
+            return None
+
+        # the first one waits for the window to open, from then on they are spread evenly over what is left of it
+        wait_seconds = reload_in_seconds - self.warmup_seconds
+        if wait_seconds < self.__MIN_WARMUP_SPACING_SECONDS:
+            wait_seconds = (reload_in_seconds - self.__WARMUP_GUARD_SECONDS) / left
+        if wait_seconds < self.__MIN_WARMUP_SPACING_SECONDS:
+            return None
+        self._warmups[sneaker_url] = (release, scheduled + 1)
+        self.warmups_scheduled += 1
+        return wait_seconds
+
+    def get_stats(self) -> dict:
+        def ms(samples: LatencyWindow, pct: float):
+            seconds = samples.percentile(pct)
+            return seconds * 1000.0 if seconds is not None else None
+
+        return {
+            "align": self.align,
+            "warmups_scheduled": self.warmups_scheduled,
+            "navigation_p50_ms": ms(self.all_navigation, 50),
+            "response_p50_ms": ms(self.all_response, 50),
+            "landings": len(self.landings),
+            "landing_p50_ms": ms(self.landings, 50),
+            "landing_max_ms": ms(self.landings, 100),
+        }
@@ -0,0 +1,168 @@
+from local_config import LocalConfig
+from src.config.local_logging import LocalLogging
+
+# Network.setBlockedURLs only matches on urls, so resource types are blocked by what their urls end in
+RESOURCE_TYPE_PATTERNS = {
+    "image": ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mov*", "*.mp3*", "*.m4s*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+}
+
+# New Relic is known to trip Kasada, it is only blocked when LocalConfig.BLOCK_NEW_RELIC is on
+NEW_RELIC_DOMAINS = ["bam.nr-data.net", "js-agent.newrelic.com"]
+
+# Third party analytics and ads, none of it is needed to buy a shoe
+ANALYTICS_DOMAINS = NEW_RELIC_DOMAINS + ["google-analytics.com", "googletagmanager.com", "doubleclick.net",
+                                         "connect.facebook.net", "bat.bing.com", "analytics.tiktok.com", "snap.licdn.com",
+                                         "ct.pinterest.com", "static.hotjar.com", "cdn.optimizely.com"]
+
+# Nike serves its product imagery and video off extensionless urls, so they are blocked by path
+NIKE_MEDIA_URLS = ["*://static.nike.com/a/images/*", "*://static.nike.com/a/videos/*"]
+
+class ResourceProfile():
+    '''
+    What a tab is allowed to download and how much rendering it does. Profiles are applied per tab over CDP, except
+    headless which can only be picked when the browser is launched.
+    '''
+
+    def __init__(self, name: str, blocked_types=(), blocked_domains=(), blocked_urls=(), reduced_rendering: bool = False, headless: bool = False):
+        '''
+        :param blocked_types: keys of RESOURCE_TYPE_PATTERNS to block
+        :param blocked_domains: domains to block along with all of their subdomains
+        :param blocked_urls: extra Network.setBlockedURLs patterns
+        :param reduced_rendering: render the tab on a small viewport at scale 1 with reduced motion
+        :param headless: launch browsers made for this profile headless
+        '''
+        self.name = name
+        self.blocked_types = tuple(blocked_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.blocked_urls = tuple(blocked_urls)
+        self.reduced_rendering = reduced_rendering
+        self.headless = headless
+
+        unknown_types = set(self.blocked_types) - set(RESOURCE_TYPE_PATTERNS)
+        if unknown_types:
+            raise Exception(f"Resource profile {name} blocks unknown resource types {sorted(unknown_types)}")
+
+    def blocked_url_patterns(self) -> list:
+        patterns = [pattern for resource_type in self.blocked_types for pattern in RESOURCE_TYPE_PATTERNS[resource_type]]
+        for domain in self.blocked_domains:
+            patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+        return patterns + list(self.blocked_urls)
+
+    def with_blocked_domains(self, *domains):
+        '''
+        :return: a copy of the profile that also blocks the given domains
+        '''
+        return ResourceProfile(self.name, self.blocked_types, self.blocked_domains + domains, self.blocked_urls,
+                               self.reduced_rendering, self.headless)
+
+    def without_blocked_domains(self, *domains):
+        '''
+        :return: a copy of the profile that lets the given domains through
+        '''
+        return ResourceProfile(self.name, self.blocked_types, [domain for domain in self.blocked_domains if domain not in domains],
+                               self.blocked_urls, self.reduced_rendering, self.headless)
+
+    def __repr__(self):
+        return f"ResourceProfile({self.name})"
+
+RESOURCE_PROFILES = {
+    # logging in and checking the account settings, the user is looking at these so only the trackers go
+    "setup": ResourceProfile("setup", blocked_domains=ANALYTICS_DOMAINS),
+    # product pages that are only read and reloaded until the drop, nothing but the html and scripts are needed. The
+    # viewport is left alone, a tab whose screen size changes right before it buys is easy to fingerprint
+    "monitoring": ResourceProfile("monitoring", ["image", "media", "font"], ANALYTICS_DOMAINS, NIKE_MEDIA_URLS),
+    # buying, anything the payment iframe or the bot checks might need is left alone
+    "checkout": ResourceProfile("checkout", ["media"], ANALYTICS_DOMAINS, NIKE_MEDIA_URLS),
+}
+
+def configured_resource_profiles() -> dict:
+    '''
+    :return: RESOURCE_PROFILES, letting New Relic through unless LocalConfig.BLOCK_NEW_RELIC is on
+    '''
+    if LocalConfig.BLOCK_NEW_RELIC:
+        return RESOURCE_PROFILES
+    return {name: profile.without_blocked_domains(*NEW_RELIC_DOMAINS) for name, profile in RESOURCE_PROFILES.items()}
+
+class TabResourceProfiles():
+    '''
+    Applies named ResourceProfiles to tabs over CDP. CDP commands go to the tab the driver is switched to and stay with
+    that tab, so a profile only has to be sent once per tab and only affects what the tab loads after it was applied.
+    '''
+
+    # Viewport reduced rendering tabs are drawn at
+    __REDUCED_WIDTH = 800
+    __REDUCED_HEIGHT = 600
+
+    __PAGE_LOAD_SCRIPT = """
+        const navigation = performance.getEntriesByType('navigation')[0];
+        const resources = performance.getEntriesByType('resource');
+        return {
+            load_ms: navigation ? navigation.loadEventEnd - navigation.startTime : null,
+            document_bytes: navigation ? navigation.transferSize : 0,
+            resource_bytes: resources.reduce((total, entry) => total + entry.transferSize, 0),
+            resources: resources.length,
+            heap_bytes: performance.memory ? performance.memory.usedJSHeapSize : null
+        };
+    """
+
+    def __init__(self, driver, profiles: dict = None):
+        '''
+        :param profiles: profile name -> ResourceProfile, defaults to configured_resource_profiles()
+        '''
+        self.driver = driver
+        self.profiles = profiles or configured_resource_profiles()
+        self.logger = LocalLogging.get_local_logger("tab_resource_profiles")
+        # tab handle -> name of the profile it has
+        self.tab_profiles = {}
+        # profile name -> how many tabs it was applied to
+        self.applied_counts = {}
+
+    def apply(self, profile_name: str, tab_handle: str = None) -> bool:
+        '''
+        Applies the profile to the tab the driver is switched to
+        :param tab_handle: handle of that tab, used to skip sending a profile it already has
+        :return: false if the tab already had the profile
+        '''
+        if tab_handle is not None and self.tab_profiles.get(tab_handle) == profile_name:
+            return False
+        profile = self.profiles[profile_name]
+        previous_profile = self.profiles.get(self.tab_profiles.get(tab_handle))
+
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile.blocked_url_patterns()})
+        if profile.reduced_rendering:
+            self.driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {"width": self.__REDUCED_WIDTH, "height": self.__REDUCED_HEIGHT,
+                                                                             "deviceScaleFactor": 1, "mobile": False})
+            self.driver.execute_cdp_cmd("Emulation.setEmulatedMedia", {"features": [{"name": "prefers-reduced-motion", "value": "reduce"}]})
+        elif previous_profile is not None and previous_profile.reduced_rendering:
+            # undo the reduced rendering profile the tab had before
+            self.driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+            self.driver.execute_cdp_cmd("Emulation.setEmulatedMedia", {"features": []})
+
+        self.logger.debug(f"Applied the {profile_name} resource profile to tab {tab_handle}")
+        if tab_handle is not None:
+            self.tab_profiles[tab_handle] = profile_name
+        self.applied_counts[profile_name] = self.applied_counts.get(profile_name, 0) + 1
+        return True
+
+    def forget(self, tab_handle: str):
+        self.tab_profiles.pop(tab_handle, None)
+
+    def reset(self, driver):
+        '''
+        Moves over to a new driver, none of its tabs have a profile yet
+        '''
+        self.driver = driver
+        self.tab_profiles = {}
+
+    def measure_page_load(self) -> dict:
+        '''
+        :return: how long the page the driver is switched to took to load and how many bytes it pulled over the
+        network, read off the browsers resource timing
+        '''
+        return self.driver.execute_script(self.__PAGE_LOAD_SCRIPT)
+
+    def get_stats(self) -> dict:
+        return dict(self.applied_counts)
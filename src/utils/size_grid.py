@@ -0,0 +1,81 @@
+import re
+
+class SizeGrid():
+    '''
+    Index of the size buttons on a product page keyed on normalized size labels. A label like "M 11 / W 12.5" is
+    indexed under "M 11 / W 12.5", "M 11" and "W 12.5" so a configured size is found with a single exact lookup,
+    meaning "M 1" can no longer match the button for "M 11".
+    '''
+
+    __whitespace_pattern = re.compile(r"\s+")
+    # "M11", "m 11", "W12.5" -> gender letter and size so they can be written back out the same way
+    __gendered_size_pattern = re.compile(r"^([MW])\s*(\d+(?:\.\d+)?)$")
+
+    def __init__(self, size_entries, purchase_button=None):
+        '''
+        :param size_entries: list of (label, button handle) in the order they show up on the page
+        :param purchase_button: handle of the buy button, None if the page did not have one
+        '''
+        self.labels = [label for label, _ in size_entries]
+        self.purchase_button = purchase_button
+        self._buttons_by_size = {}
+
+        for label, button in size_entries:
+            for key in self._index_keys(label):
+                # first button on the page wins if two labels normalize to the same thing
+                self._buttons_by_size.setdefault(key, button)
+
+    @staticmethod
+    def normalize_size(size_text: str) -> str:
+        '''
+        Upper cases, collapses whitespace and spaces out the gender prefix, e.g. " m11 " -> "M 11"
+        '''
+        normalized = SizeGrid.__whitespace_pattern.sub(" ", size_text or "").strip().upper()
+        match = SizeGrid.__gendered_size_pattern.match(normalized)
+        if match:
+            return f"{match.group(1)} {match.group(2)}"
+        return normalized
+
+    def find(self, size: str):
+        '''
+        :return: button handle for the given size or None if that size is not on the page
+        '''
+        return self._buttons_by_size.get(self.normalize_size(size))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _index_keys(self, label: str):
+        keys = [self.normalize_size(label)]
+        if "/" in label:
+            keys.extend(self.normalize_size(part) for part in label.split("/"))
+        return keys
+
+class SizeGridExtractor():
+    '''
+    Reads every size label, its button and the buy button off the current page in a single execute_script call
+    instead of a find_element and .text round trip per size.
+    '''
+
+    __extraction_script = """
+        const snapshot = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        const sizes = [];
+        for (let i = 0; i < snapshot.snapshotLength; i++) {
+            const button = snapshot.snapshotItem(i).querySelector('button');
+            if (button) {
+                sizes.push([button.innerText || button.textContent || '', button]);
+            }
+        }
+        const purchaseButton = document.evaluate(arguments[1], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+        return [sizes, purchaseButton];
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def extract(self, sizes_xpath: str, purchase_button_xpath: str) -> SizeGrid:
+        '''
+        :return: SizeGrid of the current tab
+        '''
+        size_entries, purchase_button = self.driver.execute_script(SizeGridExtractor.__extraction_script, sizes_xpath, purchase_button_xpath)
+        return SizeGrid([(label, button) for label, button in size_entries], purchase_button)
@@ -0,0 +1,119 @@
+import itertools
+import math
+
+from src.utils.clock import SYSTEM_CLOCK
+
+class TabFocus():
+    '''
+    Keeps track of which tab the driver is switched to, so asking for the tab it is already on costs nothing instead of
+    a WebDriver round trip. Every switch that does happen is counted and timed.
+
+    Anything that switches or closes tabs on the driver behind its back has to call forget(), otherwise it would skip a
+    switch that was needed.
+    '''
+
+    def __init__(self, driver, clock=None):
+        self.driver = driver
+        self.clock = clock or SYSTEM_CLOCK
+        # handle the driver is switched to, None when we do not know
+        self.current = None
+
+        self.requested = 0
+        self.switched = 0
+        self.switch_seconds = 0.0
+        self.max_switch_seconds = 0.0
+
+    def focus(self, tab_handle: str) -> bool:
+        '''
+        Switches the driver to the tab, unless it is already on it
+        :return: true if the driver actually had to switch
+        '''
+        self.requested += 1
+        if tab_handle is not None and tab_handle == self.current:
+            return False
+
+        started_at = self.clock.monotonic()
+        try:
+            self.driver.switch_to.window(tab_handle)
+        except Exception:
+            # a failed switch can leave the driver anywhere
+            self.current = None
+            raise
+        elapsed = self.clock.monotonic() - started_at
+
+        self.current = tab_handle
+        self.switched += 1
+        self.switch_seconds += elapsed
+        self.max_switch_seconds = max(self.max_switch_seconds, elapsed)
+        return True
+
+    def close(self, tab_handle: str):
+        '''
+        Closes the tab, after which the driver is not switched to anything
+        '''
+        self.focus(tab_handle)
+        self.current = None
+        self.driver.close()
+
+    def forget(self):
+        self.current = None
+
+    def get_switch_stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "switched": self.switched,
+            "skipped": self.requested - self.switched,
+            "total_ms": self.switch_seconds * 1000.0,
+            "mean_ms": self.switch_seconds / self.switched * 1000.0 if self.switched else 0.0,
+            "max_ms": self.max_switch_seconds * 1000.0,
+        }
+
+class TabWorkQueue():
+    '''
+    Work waiting on browser tabs, grouped by tab handle so everything queued for one tab runs back to back after a single
+    switch. Tabs are served most urgent first, by priority (lower first) and then by the earliest deadline of their
+    work, and between equally urgent tabs the one the driver is already on goes first.
+    '''
+
+    class TabWork():
+        __slots__ = ("tab_handle", "items", "priority", "deadline", "sequence")
+
+        def __init__(self, tab_handle, priority: int, deadline: float, sequence: int):
+            self.tab_handle = tab_handle
+            self.items = []
+            self.priority = priority
+            self.deadline = deadline
+            self.sequence = sequence
+
+    def __init__(self):
+        self._work = {}
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return sum(len(work.items) for work in self._work.values())
+
+    def put(self, tab_handle, item, deadline: float = None, priority: int = 0):
+        '''
+        Queues work for the tab, the same item queued twice before it is drained only runs once
+        :param tab_handle: tab the work runs on, work that has no tab yet is grouped under None
+        :param deadline: monotonic deadline the work was due at, None if it has none
+        '''
+        deadline = math.inf if deadline is None else deadline
+        work = self._work.get(tab_handle)
+        if work is None:
+            work = self._work[tab_handle] = self.TabWork(tab_handle, priority, deadline, next(self._sequence))
+        else:
+            work.priority = min(work.priority, priority)
+            work.deadline = min(work.deadline, deadline)
+        if item not in work.items:
+            work.items.append(item)
+
+    def drain(self, current_tab=None) -> list:
+        '''
+        :param current_tab: handle the driver is switched to right now
+        :return: every queued item, in the order they should run, leaving the queue empty
+        '''
+        ordered = sorted(self._work.values(),
+                         key=lambda work: (work.priority, work.deadline, current_tab is None or work.tab_handle != current_tab, work.sequence))
+        self._work = {}
+        return [item for work in ordered for item in work.items]
@@ -0,0 +1,141 @@
+class TabPool():
+    '''
+    Keeps the browser tabs sneakers are watched in under a cap. A sneaker is given a tab when it needs one and hands it
+    back when it is parked or finished with, tabs that are handed back are blanked and kept around for the next sneaker
+    instead of being closed and opened again (up to max_idle_tabs of them, the rest are closed).
+
+    The pool only keeps track of the tabs, which sneaker gives its tab up when every tab is taken is up to the caller
+    through pick_victim, and the pool only goes over max_tabs when the caller could not find one.
+    '''
+
+    # How acquire got hold of the tab
+    OPENED = "opened"
+    REUSED = "reused"
+    OVER_CAP = "over_cap"
+
+    __BLANK_URL = "about:blank"
+
+    def __init__(self, driver, tab_focus, open_tab, max_tabs: int, max_idle_tabs: int = 1):
+        '''
+        :param tab_focus: TabFocus every switch and close goes through
+        :param open_tab: callable that opens a new tab and returns its handle
+        :param max_tabs: most tabs the pool keeps open, counting idle ones
+        :param max_idle_tabs: most blanked tabs kept open for reuse
+        '''
+        self.driver = driver
+        self.tab_focus = tab_focus
+        self.open_tab = open_tab
+        self.max_tabs = max_tabs
+        self.max_idle_tabs = max_idle_tabs
+        # sneaker url -> handle of the tab it has
+        self.tabs = {}
+        # handles of blanked tabs nobody has
+        self.idle = []
+
+        self.opened = 0
+        self.reused = 0
+        self.released = 0
+        self.closed = 0
+        self.over_cap = 0
+        self.peak_open = 0
+
+    @property
+    def open_count(self) -> int:
+        return len(self.tabs) + len(self.idle)
+
+    def is_full(self) -> bool:
+        '''
+        :return: true if a sneaker asking for a tab now would have to take one off another sneaker
+        '''
+        return not self.idle and self.open_count >= self.max_tabs
+
+    def pick_victim(self, rank):
+        '''
+        :param rank: callable(sneaker_url) -> sort key, the lowest key gives its tab up first, None when that sneaker
+        cannot give its tab up
+        :return: url of the sneaker that should give its tab up, None if none of them can
+        '''
+        ranked = [(key, sneaker_url) for sneaker_url, key in ((sneaker_url, rank(sneaker_url)) for sneaker_url in self.tabs) if key is not None]
+        return min(ranked)[1] if ranked else None
+
+    def acquire(self, sneaker_url: str):
+        '''
+        Gives the sneaker a tab, a blanked one if there is one otherwise a new one, and switches to it
+        :return: tuple of (tab handle, how it was got: OPENED, REUSED or OVER_CAP)
+        '''
+        if self.idle:
+            tab_handle = self.idle.pop()
+            self.tab_focus.focus(tab_handle)
+            self.reused += 1
+            how = self.REUSED
+        else:
+            how = self.OVER_CAP if self.open_count >= self.max_tabs else self.OPENED
+            tab_handle = self.open_tab()
+            self.opened += 1
+            if how == self.OVER_CAP:
+                self.over_cap += 1
+
+        self.tabs[sneaker_url] = tab_handle
+        self.peak_open = max(self.peak_open, self.open_count)
+        return tab_handle, how
+
+    def release(self, sneaker_url: str):
+        '''
+        Takes the sneakers tab back, blanking it so whatever page it had stops using memory, or closing it when enough
+        blanked tabs are already kept around
+        :return: the handle that was released, None if the sneaker did not have a tab
+        '''
+        tab_handle = self.tabs.pop(sneaker_url, None)
+        if tab_handle is None:
+            return None
+        self.released += 1
+        if len(self.idle) >= self.max_idle_tabs or self.open_count >= self.max_tabs:
+            self._close(tab_handle)
+            return tab_handle
+
+        try:
+            self.tab_focus.focus(tab_handle)
+            self.driver.get(self.__BLANK_URL)
+            self.idle.append(tab_handle)
+        except Exception:
+            # a tab that cannot be blanked is not worth keeping
+            self._close(tab_handle)
+        return tab_handle
+
+    def close(self, sneaker_url: str):
+        '''
+        Closes the sneakers tab instead of keeping it for reuse
+        :return: the handle that was closed, None if the sneaker did not have a tab
+        '''
+        tab_handle = self.tabs.pop(sneaker_url, None)
+        if tab_handle is not None:
+            self._close(tab_handle)
+        return tab_handle
+
+    def reset(self, driver):
+        '''
+        Forgets every tab, they went with the browser the old driver was on, and moves over to the new driver
+        '''
+        self.driver = driver
+        self.tabs = {}
+        self.idle = []
+
+    def _close(self, tab_handle: str):
+        try:
+            self.tab_focus.close(tab_handle)
+        finally:
+            self.closed += 1
+
+    def get_pool_stats(self) -> dict:
+        return {
+            "max_tabs": self.max_tabs,
+            "open": self.open_count,
+            "occupied": len(self.tabs),
+            "idle": len(self.idle),
+            "peak_open": self.peak_open,
+            "opened": self.opened,
+            "reused": self.reused,
+            "released": self.released,
+            "closed": self.closed,
+            "over_cap": self.over_cap,
+        }
@@ -0,0 +1,285 @@
+import asyncio
+from collections import deque
+
+from selenium.webdriver.common.by import By
+
+from src.utils.clock import SYSTEM_CLOCK
+
+
+class WaitTimeoutException(Exception):
+    pass
+
+class WaitCondition():
+    '''
+    A named check that is run against the driver until it returns something truthy, which is then handed back to
+    whoever was waiting on it (e.g. the element that showed up). Conditions compose with & and |.
+    '''
+
+    def __init__(self, name: str, check):
+        self.name = name
+        self.check = check
+
+    def __call__(self, driver):
+        return self.check(driver)
+
+    def __and__(self, other):
+        return all_of(self, other)
+
+    def __or__(self, other):
+        return any_of(self, other)
+
+    def __repr__(self):
+        return f"WaitCondition({self.name})"
+
+def all_of(*conditions) -> WaitCondition:
+    '''
+    Ready once every condition is, hands back the value of the last one
+    '''
+    def check(driver):
+        value = None
+        for condition in conditions:
+            value = condition(driver)
+            if not value:
+                return False
+        return value
+    return WaitCondition(" and ".join(condition.name for condition in conditions), check)
+
+def any_of(*conditions) -> WaitCondition:
+    '''
+    Ready as soon as one condition is, hands back the value of the first one that was
+    '''
+    def check(driver):
+        for condition in conditions:
+            try:
+                value = condition(driver)
+            except Exception:
+                continue
+            if value:
+                return value
+        return False
+    return WaitCondition(" or ".join(condition.name for condition in conditions), check)
+
+def element_present(xpath: str) -> WaitCondition:
+    def check(driver):
+        elements = driver.find_elements(By.XPATH, xpath)
+        return elements[0] if elements else False
+    return WaitCondition(f"element present {xpath}", check)
+
+_CLICKABLE_SCRIPT = """
+    const element = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    if (!element || element.disabled) {
+        return null;
+    }
+    const rect = element.getBoundingClientRect();
+    return (rect.width > 0 && rect.height > 0) ? element : null;
+"""
+
+def element_clickable(xpath: str) -> WaitCondition:
+    '''
+    Ready once the element is rendered with a size and is not disabled, checked in one script instead of
+    find_element + is_displayed + is_enabled
+    '''
+    return WaitCondition(f"element clickable {xpath}", lambda driver: driver.execute_script(_CLICKABLE_SCRIPT, xpath) or False)
+
+def element_with_text(xpath: str, text: str) -> WaitCondition:
+    '''
+    Ready once one of the elements matching the xpath contains the text
+    '''
+    def check(driver):
+        for element in driver.find_elements(By.XPATH, xpath):
+            element_text = element.text
+            if element_text and text in element_text:
+                return element
+        return False
+    return WaitCondition(f"element {xpath} with text {text}", check)
+
+def element_value_filled(xpath: str, length: int) -> WaitCondition:
+    '''
+    Ready once the input holds at least length characters. Payment frames mask or reformat what was typed into them, so
+    what is there can not be compared to what was typed
+    '''
+    def check(driver):
+        elements = driver.find_elements(By.XPATH, xpath)
+        return bool(elements) and len(elements[0].get_attribute("value") or "") >= length
+    return WaitCondition(f"element {xpath} has {length} characters", check)
+
+def iframe_ready(xpath: str) -> WaitCondition:
+    '''
+    Ready once the iframe exists and its document has finished loading. The frame might be cross origin so the check
+    has to switch into it, when it is ready the driver is left switched into the frame, otherwise it is always switched
+    back out, even when the check raises.
+    '''
+    def check(driver):
+        frames = driver.find_elements(By.XPATH, xpath)
+        if not frames:
+            return False
+        driver.switch_to.frame(frames[0])
+        ready = False
+        try:
+            ready = driver.execute_script("return document.readyState;") == "complete"
+        finally:
+            if not ready:
+                driver.switch_to.default_content()
+        return frames[0] if ready else False
+    return WaitCondition(f"iframe ready {xpath}", check)
+
+def url_contains(fragment: str) -> WaitCondition:
+    return WaitCondition(f"url contains {fragment}", lambda driver: fragment in driver.current_url)
+
+def url_changed(from_url: str) -> WaitCondition:
+    def check(driver):
+        current_url = driver.current_url
+        return current_url if current_url != from_url else False
+    return WaitCondition(f"url changed from {from_url}", check)
+
+def new_window_opened(previous_handles) -> WaitCondition:
+    '''
+    Ready once there is a window handle that was not in previous_handles, hands back the new handle
+    '''
+    previous_handles = set(previous_handles)
+    def check(driver):
+        for handle in reversed(driver.window_handles):
+            if handle not in previous_handles:
+                return handle
+        return False
+    return WaitCondition("new window opened", check)
+
+def document_ready() -> WaitCondition:
+    return WaitCondition("document ready", lambda driver: driver.execute_script("return document.readyState;") == "complete")
+
+_NETWORK_IDLE_SCRIPT = """
+    if (document.readyState !== 'complete') {
+        return false;
+    }
+    let lastResponseEnd = 0;
+    for (const entry of performance.getEntriesByType('resource')) {
+        lastResponseEnd = Math.max(lastResponseEnd, entry.responseEnd);
+    }
+    return performance.now() - lastResponseEnd >= arguments[0];
+"""
+
+def network_idle(quiet_seconds: float = 0.5) -> WaitCondition:
+    '''
+    Ready once the document has loaded and no resource has finished loading for quiet_seconds
+    '''
+    return WaitCondition(f"network idle for {quiet_seconds}s", lambda driver: driver.execute_script(_NETWORK_IDLE_SCRIPT, quiet_seconds * 1000))
+
+class ReadinessWaiter():
+    '''
+    Polls wait conditions quickly until they are ready or their step times out, and records how long every wait
+    actually took per step so slow steps show up.
+    '''
+
+    # How often conditions are re-checked
+    __POLL_SECONDS = 0.02
+    # How long a step gets when the caller does not say
+    __DEFAULT_TIMEOUT_SECONDS = 10
+    # How many of the most recent wait durations to keep per step
+    __TIMING_SAMPLE_SIZE = 256
+
+    def __init__(self, driver, poll_seconds: float = None, clock=None):
+        self.driver = driver
+        self.clock = clock or SYSTEM_CLOCK
+        self.poll_seconds = poll_seconds or self.__POLL_SECONDS
+        # step name -> durations in seconds of the most recent waits
+        self.wait_timings = {}
+        # step name -> how many times it timed out
+        self.wait_timeouts = {}
+
+    def until(self, condition: WaitCondition, timeout: float = None, step: str = None, poll_seconds: float = None):
+        '''
+        Waits until the condition is ready
+        :param step: name the wait duration is recorded under, defaults to the conditions name
+        :return: whatever the condition returned once it was ready
+        :raises WaitTimeoutException: if the condition was not ready in time
+        '''
+        step = step or condition.name
+        timeout = self.__DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout
+        poll_seconds = poll_seconds or self.poll_seconds
+
+        started_at = self.clock.monotonic()
+        give_up_at = started_at + timeout
+        last_exception = None
+        while True:
+            try:
+                value = condition(self.driver)
+                if value:
+                    self._record(step, self.clock.monotonic() - started_at)
+                    return value
+            except Exception as e:
+                # elements going stale or missing mid check just means it is not ready yet
+                last_exception = e
+
+            remaining = give_up_at - self.clock.monotonic()
+            if remaining <= 0:
+                self._record(step, self.clock.monotonic() - started_at)
+                self.wait_timeouts[step] = self.wait_timeouts.get(step, 0) + 1
+                raise WaitTimeoutException(f"Timed out after {timeout}s waiting for {condition.name}" + (f" - last error {last_exception}" if last_exception else ""))
+            self.clock.sleep(min(poll_seconds, remaining))
+
+    def until_or_none(self, condition: WaitCondition, timeout: float = None, step: str = None, poll_seconds: float = None):
+        '''
+        Same as until but hands back None instead of raising when the condition was not ready in time
+        '''
+        try:
+            return self.until(condition, timeout, step, poll_seconds)
+        except WaitTimeoutException:
+            return None
+
+    async def until_async(self, condition: WaitCondition, driver_calls, timeout: float = None, step: str = None, poll_seconds: float = None):
+        '''
+        until for coroutines, every check runs on the driver thread and the polls sleep on the event loop in between
+        :param driver_calls: DriverExecutor the driver is used through
+        '''
+        step = step or condition.name
+        timeout = self.__DEFAULT_TIMEOUT_SECONDS if timeout is None else timeout
+        poll_seconds = poll_seconds or self.poll_seconds
+
+        started_at = self.clock.monotonic()
+        give_up_at = started_at + timeout
+        last_exception = None
+        while True:
+            try:
+                value = await driver_calls.call(condition, self.driver)
+                if value:
+                    self._record(step, self.clock.monotonic() - started_at)
+                    return value
+            except Exception as e:
+                last_exception = e
+
+            remaining = give_up_at - self.clock.monotonic()
+            if remaining <= 0:
+                self._record(step, self.clock.monotonic() - started_at)
+                self.wait_timeouts[step] = self.wait_timeouts.get(step, 0) + 1
+                raise WaitTimeoutException(f"Timed out after {timeout}s waiting for {condition.name}" + (f" - last error {last_exception}" if last_exception else ""))
+            if self.clock.is_virtual:
+                # a virtual clock is only moved by sleeping on it, let the rest of the loop run in between
+                self.clock.sleep(min(poll_seconds, remaining))
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(min(poll_seconds, remaining))
+
+    async def until_or_none_async(self, condition: WaitCondition, driver_calls, timeout: float = None, step: str = None, poll_seconds: float = None):
+        try:
+            return await self.until_async(condition, driver_calls, timeout, step, poll_seconds)
+        except WaitTimeoutException:
+            return None
+
+    def get_wait_stats(self) -> dict:
+        '''
+        :return: per step wait counts, timeouts and durations in milliseconds
+        '''
+        stats = {}
+        for step, durations in self.wait_timings.items():
+            stats[step] = {
+                "count": len(durations),
+                "timeouts": self.wait_timeouts.get(step, 0),
+                "mean_ms": sum(durations) / len(durations) * 1000.0,
+                "max_ms": max(durations) * 1000.0,
+            }
+        return stats
+
+    def _record(self, step: str, duration: float):
+        if step not in self.wait_timings:
+            self.wait_timings[step] = deque(maxlen=self.__TIMING_SAMPLE_SIZE)
+        self.wait_timings[step].append(duration)
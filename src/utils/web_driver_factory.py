@@ -1,45 +1,68 @@
 import os.path
-
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium_stealth import stealth
-from selenium.webdriver.firefox.service import Service as FireFoxService
-from selenium.webdriver.remote.webdriver import BaseWebDriver
-import undetected_chromedriver as uc
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
 
 from local_config import LocalConfig
 from src.config.local_logging import LocalLogging
+from src.utils.resource_profiles import RESOURCE_PROFILES, TabResourceProfiles
 
 class WebDriverFactory():
     '''
     Factory class that allows us to specify drivers that will be used for specific functions
     (Visual if need be, non-visual, etc.)
+
+    selenium, undetected_chromedriver and selenium_stealth take a while to import, so they are only imported once a
+    driver is actually being made, which lets main get on with loading config while the browser boots.
     '''
 
     logger = LocalLogging.get_local_logger("web_driver_factory")
 
-    def chrome_browser_options(self) -> Options:
+    # How long a chrome we launched ourselves gets to start listening on its debugging port
+    __DEBUGGER_STARTUP_TIMEOUT_SECONDS = 15
+    __DEBUGGER_POLL_SECONDS = 0.1
+
+    def chrome_browser_options(self, use_profile: bool = True, resource_profile: str = "setup"):
+        import undetected_chromedriver as uc
+
         options = uc.ChromeOptions()
         options.add_argument('--disable-blink-features=AutomationControlled')
         options.add_argument("--disable-extensions")
         options.add_argument('--disable-popup-blocking')
-        self._apply_profile(options)
+        if RESOURCE_PROFILES[resource_profile].headless:
+            options.add_argument("--headless=new")
+        if use_profile:
+            self._apply_profile(options)
         return options
 
-    def firefox_browser_options(self) -> Options:
+    def firefox_browser_options(self):
+        from selenium import webdriver
+
         options = webdriver.FirefoxOptions()
         return options
 
-    def get_chrome_web_driver(self) -> BaseWebDriver:
+    def get_chrome_web_driver(self, use_profile: bool = True, resource_profile: str = "setup"):
         '''
+        :param use_profile: whether to launch with the configured chrome profile, only one browser can have a profile
+        open at a time so extra browsers (e.g. pool workers) launch without one
+        :param resource_profile: name of the ResourceProfile the first tab gets, it also decides whether the browser is
+        launched headless. Ignored when attaching to an already running chrome
         :return: web-driver for chrome
         '''
+        # The main browser can be left running between runs and attached to, so a restart skips booting chrome
+        if use_profile and LocalConfig.CHROME_DEBUGGER_ADDRESS:
+            return self.get_attached_chrome_web_driver(LocalConfig.CHROME_DEBUGGER_ADDRESS)
+
+        import undetected_chromedriver as uc
+
         try:
             # Use webdriver_manager to handle ChromeDriver
-            driver = uc.Chrome(use_subprocess=False, options=self.chrome_browser_options())
+            driver = uc.Chrome(use_subprocess=False, options=self.chrome_browser_options(use_profile, resource_profile))
             self.logger.debug("Chrome Browser initialized successfully.")
             self._apply_stealth(driver)
-            self._apply_interceptors(driver)
+            self._apply_interceptors(driver, resource_profile)
 
             return driver
 
@@ -47,11 +70,79 @@ class WebDriverFactory():
             self.logger.error(f"Failed to initialize chrome browser: {e}")
             raise RuntimeError(f"Failed to initialize chrome browser: {e}")
 
+    def get_attached_chrome_web_driver(self, debugger_address: str):
+        '''
+        Attaches to the chrome listening on debugger_address (e.g. "127.0.0.1:9222"), starting one there first if
+        there is not one yet. That chrome is not tied to this process, so it and its logged in tabs are still there
+        for the next run to attach to.
+        :return: web-driver for chrome
+        '''
+        try:
+            if not self._debugger_listening(debugger_address):
+                self._launch_debuggable_chrome(debugger_address)
+
+            from selenium import webdriver
+            from selenium.webdriver.chrome.service import Service
+            from undetected_chromedriver.patcher import Patcher
+
+            # the patched chromedriver, same as undetected_chromedriver would have launched us with
+            patcher = Patcher()
+            patcher.auto()
+            options = webdriver.ChromeOptions()
+            options.add_experimental_option("debuggerAddress", debugger_address)
+            driver = webdriver.Chrome(service=Service(patcher.executable_path), options=options)
+            self.logger.info(f"Attached to running chrome at {debugger_address}")
+            self._apply_stealth(driver)
+            self._apply_interceptors(driver)
+
+            return driver
+
+        except Exception as e:
+            self.logger.error(f"Failed to attach to chrome at {debugger_address}: {e}")
+            raise RuntimeError(f"Failed to attach to chrome at {debugger_address}: {e}")
+
+    def _debugger_listening(self, debugger_address: str) -> bool:
+        try:
+            with urllib.request.urlopen(f"http://{debugger_address}/json/version", timeout=0.5) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def _launch_debuggable_chrome(self, debugger_address: str):
+        '''
+        Starts chrome detached from this process with remote debugging on the port of debugger_address
+        '''
+        from undetected_chromedriver import find_chrome_executable
+
+        port = debugger_address.rsplit(":", 1)[-1]
+        # chrome only allows remote debugging on a profile outside of its default data directory
+        user_data_dir = LocalConfig.CHROME_USER_DATA_PATH if LocalConfig.CHROME_PROFILE else os.path.join(tempfile.gettempdir(), "sneaker_snagger_chrome")
+        arguments = [find_chrome_executable(), f"--remote-debugging-port={port}", f"--user-data-dir={user_data_dir}",
+                     "--disable-blink-features=AutomationControlled", "--disable-extensions", "--disable-popup-blocking",
+                     "--no-first-run", "--no-default-browser-check"]
+        if LocalConfig.CHROME_PROFILE:
+            arguments.append(f"--profile-directory={LocalConfig.CHROME_PROFILE}")
+
+        if sys.platform == "win32":
+            detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            detach = {"start_new_session": True}
+        subprocess.Popen(arguments, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **detach)
+        self.logger.info(f"Launched chrome with remote debugging at {debugger_address}")
+
+        give_up_at = time.monotonic() + self.__DEBUGGER_STARTUP_TIMEOUT_SECONDS
+        while not self._debugger_listening(debugger_address):
+            if time.monotonic() > give_up_at:
+                raise Exception(f"Chrome did not start listening on {debugger_address} within {self.__DEBUGGER_STARTUP_TIMEOUT_SECONDS}s")
+            time.sleep(self.__DEBUGGER_POLL_SECONDS)
+
     def _apply_stealth(self, driver):
         '''
         utility method to apply selenium stealth on a selinum driver
         '''
         if LocalConfig.USE_STEALTH:
+            from selenium_stealth import stealth
+
             stealth(driver,
                 languages=["en-US", "en"],
                 vendor="Google Inc.",
@@ -62,12 +153,15 @@ class WebDriverFactory():
                 fix_hairline=True,
                 )
 
-    def _apply_interceptors(self, driver):
+    def _apply_interceptors(self, driver, resource_profile: str = "setup"):
         '''
-        Utiltity method that will apply interceptors on the driver that are triggering Kasada to catch the bot
+        Utiltity method that will apply interceptors on the driver that are triggering Kasada to catch the bot, with
+        TAB_RESOURCE_PROFILES on the first tab gets the whole resource profile
         '''
 
-        if LocalConfig.BLOCK_NEW_RELIC:
+        if LocalConfig.TAB_RESOURCE_PROFILES:
+            TabResourceProfiles(driver).apply(resource_profile)
+        elif LocalConfig.BLOCK_NEW_RELIC:
             driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": ["https://bam.nr-data.net/*"]})
 
 
@@ -0,0 +1,49 @@
+import pytest
+
+from src.config import local_logging
+
+# tests log to the console only, a run should not leave a log file behind
+local_logging.LOG_TO_FILE = False
+
+from local_config import LocalConfig
+
+# Every LocalConfig setting that turns part of the app on or off or tunes it, so the tests run the same whatever
+# local_config.py was edited to. Subsystems that write to disk or reach outside the test are off, the rest are on
+# at their shipped settings so the end to end tests go through them
+PINNED_CONFIG = {
+    "USE_STEALTH": False,
+    "BLOCK_NEW_RELIC": True,
+    "CHROME_DEBUGGER_ADDRESS": None,
+    "TAB_RESOURCE_PROFILES": True,
+    "TAB_POOL_MAX_TABS": 12,
+    "TAB_POOL_IDLE_TABS": 1,
+    "TAB_POOL_PARK_AFTER_SECONDS": 600,
+    "SNEAKER_CONFIG_HOT_RELOAD": False,
+    "RELEASE_TIMEZONE": None,
+    "CLOCK_CALIBRATION_URL": None,
+    "MONITORING_ENGINE": "thread",
+    "BROWSER_WORKERS": 1,
+    "BROWSER_WORKER_MODE": "thread",
+    "HTTP_PRE_RELEASE_MONITOR": False,
+    "RELEASE_CACHE_PATH": None,
+    "PURCHASE_CHECKPOINTS": True,
+    "RESUME_FROM_CHECKPOINTS": False,
+    "DRIVER_WATCHDOG": True,
+    "DRIVER_HEARTBEAT_SECONDS": 10,
+    "PUSH_KEY_EVENTS": False,
+    "RELEASE_RELOAD_ALIGN": None,
+    "RELEASE_WARMUP_RELOADS": 3,
+    "DRIVER_TRACING": False,
+}
+# Settings that only say where things are on this pc or what to type, they do not change which parts of the app run
+UNPINNED_CONFIG = {"CHROME_USER_DATA_PATH", "CHROME_PROFILE", "CVV_NUMBER", "DRIVER_TRACE_FILE"}
+
+@pytest.fixture(autouse=True)
+def pinned_config(monkeypatch):
+    '''
+    Pins every setting in PINNED_CONFIG, a test can still monkeypatch one of them to what it needs
+    '''
+    unpinned = {name for name in vars(LocalConfig) if name.isupper()} - PINNED_CONFIG.keys() - UNPINNED_CONFIG
+    assert not unpinned, f"Pin {sorted(unpinned)} in PINNED_CONFIG so the tests do not depend on local_config.py"
+    for name, value in PINNED_CONFIG.items():
+        monkeypatch.setattr(LocalConfig, name, value)
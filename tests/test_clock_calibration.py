@@ -0,0 +1,102 @@
+import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.utils.clock import VirtualClock
+from src.utils.clock_calibration import ServerClockCalibrator
+
+class ScriptedSampler():
+    '''
+    Answers like a server whose clock is offset_seconds ahead of ours, with a whole second Date header, each request
+    taking the next of the given round trips. The round trip is reported rather than slept, the clock is being moved
+    by the test thread
+    '''
+
+    def __init__(self, clock: VirtualClock, offset_seconds: float, round_trips):
+        self.clock = clock
+        self.offset_seconds = offset_seconds
+        self.round_trips = list(round_trips)
+        self.samples = 0
+
+    def take_sample(self):
+        round_trip = self.round_trips[self.samples % len(self.round_trips)]
+        self.samples += 1
+        sent_at = self.clock.time()
+        # the server stamps the response half way through the round trip
+        server_seconds = int(sent_at + round_trip / 2 + self.offset_seconds)
+        return sent_at, sent_at + round_trip, float(server_seconds)
+
+def calibrate(clock: VirtualClock, calibrator: ServerClockCalibrator) -> float:
+    '''
+    Calibrates on a worker thread, it waits on the clock between samples so the test thread moves the clock meanwhile
+    '''
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        offset = executor.submit(calibrator.calibrate)
+        while not offset.done():
+            clock.advance(0.01)
+            time.sleep(0.001)
+        return offset.result()
+
+def calibrated(offset_seconds: float, round_trips, samples: int = 10):
+    clock = VirtualClock(start_time=1_700_000_000.0)
+    calibrator = ServerClockCalibrator(ScriptedSampler(clock, offset_seconds, round_trips), samples_per_calibration=samples, clock=clock)
+    calibrate(clock, calibrator)
+    return clock, calibrator
+
+@pytest.mark.parametrize("offset_seconds", [0.0, 2.37, -1.62])
+def test_offset_is_found_to_within_the_sample_spacing(offset_seconds):
+    _, calibrator = calibrated(offset_seconds, [0.02])
+
+    assert calibrator.offset_seconds == pytest.approx(offset_seconds, abs=0.12)
+    assert calibrator.uncertainty_seconds < 0.12
+
+def test_slow_round_trips_do_not_widen_the_estimate():
+    _, fast = calibrated(1.25, [0.02])
+    # every other sample takes most of a second to come back, its range is too wide to narrow anything
+    _, mixed = calibrated(1.25, [0.02, 0.9])
+
+    assert mixed.offset_seconds == pytest.approx(1.25, abs=0.2)
+    assert mixed.uncertainty_seconds <= fast.uncertainty_seconds * 2 + 0.1
+
+def test_deadlines_are_on_the_servers_clock():
+    clock, calibrator = calibrated(5.0, [0.02])
+    server_release = calibrator.server_now() + datetime.timedelta(seconds=60)
+
+    deadline = calibrator.to_monotonic_deadline(server_release)
+
+    assert deadline - clock.monotonic() == pytest.approx(60.0, abs=1e-6)
+    assert calibrator.server_now().timestamp() - clock.time() == pytest.approx(calibrator.offset_seconds)
+
+def test_listeners_only_hear_about_offsets_that_moved():
+    clock = VirtualClock(start_time=1_700_000_000.0)
+    sampler = ScriptedSampler(clock, 3.0, [0.02])
+    # a single sample per calibration never waits between samples, so the clock can be moved on this thread
+    calibrator = ServerClockCalibrator(sampler, samples_per_calibration=1, clock=clock)
+    offsets = []
+    calibrator.add_listener(offsets.append)
+
+    calibrator.calibrate()
+    clock.advance(0.02)
+    calibrator.calibrate()
+    assert len(offsets) == 1
+
+    sampler.offset_seconds = 4.0
+    clock.advance(0.02)
+    calibrator.calibrate()
+    assert len(offsets) == 2
+    assert offsets[1] - offsets[0] == pytest.approx(1.0, abs=0.05)
+
+def test_failed_samples_keep_the_previous_offset():
+    class FailingSampler():
+        def take_sample(self):
+            raise Exception("no Date header")
+
+    clock = VirtualClock()
+    calibrator = ServerClockCalibrator(FailingSampler(), samples_per_calibration=3, clock=clock)
+
+    with pytest.raises(Exception, match="Unable to take any clock samples"):
+        calibrate(clock, calibrator)
+    assert calibrator.offset_seconds == 0.0
+    assert calibrator.uncertainty_seconds is None
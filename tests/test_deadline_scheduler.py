@@ -0,0 +1,69 @@
+from src.utils.clock import VirtualClock
+from src.utils.deadline_scheduler import DeadlineScheduler
+
+def started_scheduler():
+    clock = VirtualClock()
+    scheduler = DeadlineScheduler(clock=clock)
+    scheduler.start()
+    return clock, scheduler
+
+def test_callbacks_run_in_deadline_order():
+    clock, scheduler = started_scheduler()
+    ran = []
+    for name, delay in [("c", 3.0), ("a", 1.0), ("d", 3.0), ("b", 2.0)]:
+        scheduler.schedule_in(delay, lambda name=name: ran.append(name))
+
+    clock.advance(0.5)
+    assert ran == []
+    clock.advance(10.0)
+
+    # due callbacks run in deadline order, ties in the order they were scheduled
+    assert ran == ["a", "b", "c", "d"]
+    assert scheduler.pending_count() == 0
+    scheduler.stop()
+
+def test_callbacks_run_as_the_clock_reaches_them():
+    clock, scheduler = started_scheduler()
+    ran = []
+    start = clock.monotonic()
+    for delay in (2.0, 1.0, 3.0):
+        scheduler.schedule_at(start + delay, lambda delay=delay: ran.append(delay))
+
+    assert scheduler.next_deadline() == start + 1.0
+    clock.advance_to(start + 1.0)
+    assert ran == [1.0]
+    clock.advance_to(start + 2.5)
+    assert ran == [1.0, 2.0]
+    assert scheduler.next_deadline() == start + 3.0
+    scheduler.stop()
+
+def test_scheduling_a_key_again_replaces_it():
+    clock, scheduler = started_scheduler()
+    ran = []
+    scheduler.schedule_in(1.0, lambda: ran.append("first"), key="shoe")
+    scheduler.schedule_in(5.0, lambda: ran.append("second"), key="shoe")
+    scheduler.schedule_in(2.0, lambda: ran.append("cancelled"), key="other")
+    assert scheduler.cancel("other")
+    assert not scheduler.cancel("other")
+
+    clock.advance(3.0)
+    assert ran == []
+    assert scheduler.has_pending("shoe")
+    clock.advance(3.0)
+    assert ran == ["second"]
+    assert not scheduler.has_pending("shoe")
+    scheduler.stop()
+
+def test_lag_is_measured_against_the_deadline():
+    clock, scheduler = started_scheduler()
+    scheduler.schedule_in(1.0, lambda: None)
+    scheduler.schedule_in(2.0, lambda: None)
+
+    # both are dispatched when the clock jumps straight past them
+    clock.advance(2.5)
+
+    stats = scheduler.get_lag_stats()
+    assert stats["dispatched"] == 2
+    assert stats["max_lag_ms"] == 1500.0
+    assert stats["mean_lag_ms"] == 1000.0
+    scheduler.stop()
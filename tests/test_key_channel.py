@@ -0,0 +1,45 @@
+import threading
+from pathlib import Path
+
+from local_config import LocalConfig
+from src.nike_purchaser import NikePurchaser
+from src.testing.fake_web_driver import FakeWebDriver
+from src.utils import key_channel
+from src.utils.key_channel import CdpKeyChannel, PolledKeyChannel
+
+class SilentCdpKeyChannel(CdpKeyChannel):
+    '''
+    A devtools connection that opens fine but whose binding never fires
+    '''
+
+    def __init__(self, driver):
+        super().__init__(driver, start_timeout_seconds=0.2)
+        self._stopped = threading.Event()
+
+    def _devtools_endpoint(self):
+        return "0", "ws://localhost:0/devtools/browser"
+
+    def _run(self, version: str, websocket_url: str):
+        self._started.set()
+        self._stopped.wait()
+
+    def stop(self):
+        self._stopped.set()
+        super().stop()
+
+def test_push_channel_that_never_signals_falls_back_to_polling(monkeypatch):
+    monkeypatch.setattr(LocalConfig, "PUSH_KEY_EVENTS", True)
+    monkeypatch.setattr(key_channel, "CdpKeyChannel", SilentCdpKeyChannel)
+    driver = FakeWebDriver()
+    purchaser = NikePurchaser(driver, Path("shoes_to_snag.json"), sneakers=[])
+    handled = []
+    monkeypatch.setattr(purchaser, "_handle_user_interaction", handled.append)
+
+    # the first read opens the channel and puts the polled listener on the message tab
+    assert purchaser._read_user_input() == (False, False)
+    assert isinstance(purchaser.key_channel, PolledKeyChannel)
+
+    driver.press_key("Enter")
+    assert purchaser._read_user_input() == (False, True)
+    assert handled == ["Enter"]
+    purchaser._close_key_channel()
@@ -0,0 +1,70 @@
+import datetime
+
+from src.utils.clock import VirtualClock
+from src.utils.purchase_checkpoint import PurchaseCheckpointStore, SneakerCheckpoint
+
+SHOE_URL = "https://www.nike.com/launch/t/test-shoe"
+OTHER_SHOE_URL = "https://www.nike.com/launch/t/other-shoe"
+WAKEUP = datetime.datetime(2026, 2, 22, 14, 0, tzinfo=datetime.timezone.utc)
+
+def checkpoint(clock: VirtualClock, url: str = SHOE_URL, state: str = "NEAR_RELEASE") -> SneakerCheckpoint:
+    return SneakerCheckpoint(url, state, attempts=2, wakeup_target=WAKEUP, had_tab=True, saved_at=clock.time())
+
+def test_saved_checkpoints_load_back_in_a_new_store(tmp_path):
+    clock = VirtualClock(start_time=1_700_000_000.0)
+    path = tmp_path / "release_cache.sqlite3"
+    store = PurchaseCheckpointStore(path, clock=clock)
+    assert store.save([checkpoint(clock), checkpoint(clock, OTHER_SHOE_URL, "PRE_RELEASE")]) == 2
+    assert store.save([]) == 0
+    store.close()
+
+    loaded = PurchaseCheckpointStore(path, clock=clock).load()
+
+    assert sorted(loaded) == [OTHER_SHOE_URL, SHOE_URL]
+    restored = loaded[SHOE_URL]
+    assert (restored.state, restored.attempts, restored.wakeup_target, restored.had_tab, restored.saved_at) == \
+           ("NEAR_RELEASE", 2, WAKEUP, True, clock.time())
+
+def test_saving_again_replaces_the_checkpoint(tmp_path):
+    clock = VirtualClock(start_time=1_700_000_000.0)
+    store = PurchaseCheckpointStore(tmp_path / "release_cache.sqlite3", clock=clock)
+    store.save([checkpoint(clock)])
+    clock.advance(10)
+    store.save([checkpoint(clock, state="PURCHASED")])
+
+    assert store.get(SHOE_URL).state == "PURCHASED"
+    assert {url: saved.state for url, saved in store.load().items()} == {SHOE_URL: "PURCHASED"}
+    assert (store.saves, store.rows_written) == (2, 2)
+
+def test_checkpoints_older_than_max_age_are_not_loaded(tmp_path):
+    clock = VirtualClock(start_time=1_700_000_000.0)
+    path = tmp_path / "release_cache.sqlite3"
+    store = PurchaseCheckpointStore(path, max_age_seconds=60, clock=clock)
+    store.save([checkpoint(clock)])
+    clock.advance(30)
+    store.save([checkpoint(clock, OTHER_SHOE_URL)])
+    store.close()
+
+    clock.advance(45)
+    loaded = PurchaseCheckpointStore(path, max_age_seconds=60, clock=clock).load()
+
+    assert sorted(loaded) == [OTHER_SHOE_URL]
+
+def test_removed_checkpoints_are_not_loaded(tmp_path):
+    clock = VirtualClock(start_time=1_700_000_000.0)
+    path = tmp_path / "release_cache.sqlite3"
+    store = PurchaseCheckpointStore(path, clock=clock)
+    store.save([checkpoint(clock), checkpoint(clock, OTHER_SHOE_URL)])
+    store.remove(SHOE_URL)
+    store.close()
+
+    assert sorted(PurchaseCheckpointStore(path, clock=clock).load()) == [OTHER_SHOE_URL]
+
+def test_store_without_a_path_keeps_checkpoints_in_memory():
+    clock = VirtualClock()
+    store = PurchaseCheckpointStore(clock=clock)
+    store.save([checkpoint(clock)])
+
+    assert store.get(SHOE_URL).state == "NEAR_RELEASE"
+    assert sorted(store.load()) == [SHOE_URL]
+    store.close()
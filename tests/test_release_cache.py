@@ -0,0 +1,76 @@
+import datetime
+
+import pytest
+
+from src.utils.clock import VirtualClock
+from src.utils.release_cache import ReleaseMetadataCache
+
+SHOE_URL = "https://www.nike.com/launch/t/test-shoe"
+RELEASE_DT = datetime.datetime(2026, 2, 22, 9, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=-5)))
+
+@pytest.fixture
+def clock():
+    return VirtualClock(start_time=1_700_000_000.0)
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = ReleaseMetadataCache(tmp_path / "release_cache.sqlite3", ttl_seconds={ReleaseMetadataCache.SIZE_GRID: 60}, clock=clock)
+    yield cache
+    cache.close()
+
+def test_entries_expire_after_their_ttl(cache, clock):
+    cache.put_release(SHOE_URL, "Available 2/22 at 9:00 AM", RELEASE_DT)
+    cache.put_size_labels(SHOE_URL, ["M 10", "M 11"])
+
+    clock.advance(59)
+    assert cache.get_size_labels(SHOE_URL) == ["M 10", "M 11"]
+    clock.advance(1)
+    assert cache.get_size_labels(SHOE_URL) is None
+    # the release keeps its own, longer TTL
+    assert cache.get_release(SHOE_URL) == RELEASE_DT
+    assert (cache.hits, cache.misses) == (2, 1)
+
+def test_expired_entries_are_purged_when_the_cache_is_opened(tmp_path, clock):
+    path = tmp_path / "release_cache.sqlite3"
+    cache = ReleaseMetadataCache(path, ttl_seconds={ReleaseMetadataCache.SIZE_GRID: 60}, clock=clock)
+    cache.put_size_labels(SHOE_URL, ["M 11"])
+    cache.put_page_state(SHOE_URL, "PRE_RELEASE")
+    cache.close()
+
+    clock.advance(120)
+    reopened = ReleaseMetadataCache(path, ttl_seconds={ReleaseMetadataCache.SIZE_GRID: 60}, clock=clock)
+    assert reopened.purge_expired() == 0
+    assert reopened.get_page_state(SHOE_URL) == "PRE_RELEASE"
+    reopened.close()
+
+def test_new_release_text_drops_the_page_state(cache):
+    cache.put_release(SHOE_URL, "Available 2/22 at 9:00 AM", RELEASE_DT)
+    cache.put_size_labels(SHOE_URL, ["M 10", "M 11"])
+    cache.put_page_state(SHOE_URL, "PURCHASED")
+
+    assert not cache.put_release(SHOE_URL, "Available 2/22 at 9:00 AM", RELEASE_DT)
+    assert cache.get_page_state(SHOE_URL) == "PURCHASED"
+
+    # a new drop, the purchase state was about the old one but the size grid still holds
+    assert cache.put_release(SHOE_URL, "Available 3/1 at 10:00 AM", RELEASE_DT + datetime.timedelta(days=7))
+    assert cache.get_page_state(SHOE_URL) is None
+    assert cache.get_size_labels(SHOE_URL) == ["M 10", "M 11"]
+    assert cache.get_release(SHOE_URL) == RELEASE_DT + datetime.timedelta(days=7)
+
+def test_new_size_grid_drops_nothing_else(cache):
+    cache.put_release(SHOE_URL, "Available 2/22 at 9:00 AM", RELEASE_DT)
+    cache.put_size_labels(SHOE_URL, ["M 10", "M 11"])
+    cache.put_page_state(SHOE_URL, "NEAR_RELEASE")
+
+    assert cache.put_size_labels(SHOE_URL, ["M 11", "M 10"])
+    assert cache.get_release(SHOE_URL) == RELEASE_DT
+    assert cache.get_page_state(SHOE_URL) == "NEAR_RELEASE"
+
+def test_invalidate_only_drops_the_url(cache):
+    other_url = "https://www.nike.com/launch/t/other-shoe"
+    cache.put_page_state(SHOE_URL, "PRE_RELEASE")
+    cache.put_page_state(other_url, "PRE_RELEASE")
+
+    cache.invalidate(SHOE_URL)
+    assert cache.get_page_state(SHOE_URL) is None
+    assert cache.get_page_state(other_url) == "PRE_RELEASE"
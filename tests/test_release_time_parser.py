@@ -0,0 +1,32 @@
+import datetime
+import json
+from pathlib import Path
+
+import pytest
+
+from src.utils.release_time_parser import ReleaseTimeParseException, ReleaseTimeParser
+
+# the same corpus benchmarks/release_time_parse.py checks before timing the parser
+CORPUS = json.loads((Path(__file__).parent.parent / "benchmarks" / "fixtures" / "release_times.json").read_text())
+
+@pytest.mark.parametrize("case", CORPUS["cases"], ids=lambda case: repr(case["text"]))
+def test_release_text_parses_to_the_expected_time(case):
+    parser = ReleaseTimeParser(CORPUS["source_timezone"])
+    now = datetime.datetime.fromisoformat(case.get("now", CORPUS["now"]))
+
+    if case["expected"] is None:
+        with pytest.raises(ReleaseTimeParseException):
+            parser.parse(case["text"], now)
+    else:
+        parsed = parser.parse(case["text"], now)
+        assert parsed == datetime.datetime.fromisoformat(case["expected"])
+        assert parsed.utcoffset() == datetime.datetime.fromisoformat(case["expected"]).utcoffset()
+
+def test_parse_many_lines_up_with_the_texts():
+    parser = ReleaseTimeParser(CORPUS["source_timezone"])
+    now = datetime.datetime.fromisoformat(CORPUS["now"])
+    cases = [case for case in CORPUS["cases"] if "now" not in case]
+
+    parsed = parser.parse_many([case["text"] for case in cases], now)
+
+    assert [result.isoformat() if result else None for result in parsed] == [case["expected"] for case in cases]
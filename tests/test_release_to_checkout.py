@@ -0,0 +1,108 @@
+import math
+import os
+
+import pytest
+
+import local_config
+from local_config import LocalConfig
+from src.async_sneaker_purchase_process import AsyncSneakerPurchaseProcess
+from src.purchase_state_machine import PurchaseState
+from src.sneaker_purchase_process import SneakerPurchaseProcess
+from src.testing.fake_nike_site import FakeNikeSite
+from src.testing.fake_web_driver import FakeElement, FakePage, FakeSite, FakeWebDriver
+from src.utils.clock import VirtualClock
+from src.utils.event_store import SneakerEventCode
+from src.utils.purchase_checkpoint import PurchaseCheckpointStore
+from src.utils.release_cache import ReleaseMetadataCache
+
+ENGINES = {"thread": SneakerPurchaseProcess, "asyncio": AsyncSneakerPurchaseProcess}
+
+def next_release_at(site: FakeSite, lead_seconds: float) -> float:
+    # the site only shows release times to the minute
+    return math.ceil((site.server_time() + lead_seconds) / 60.0) * 60.0
+
+def event_codes(process, sneaker_url: str):
+    return [event.code for event in process.get_event_store().query(sneaker_url=sneaker_url)]
+
+def snag(engine: str, site: FakeSite, clock: VirtualClock, shoe_url: str):
+    process = ENGINES[engine](FakeWebDriver(site, command_seconds=0.005), sneakers=[{"shoe_url": shoe_url, "size": "M 11"}],
+                              clock=clock, clock_sampler=site.date_sampler())
+    process.start_monitoring_sneakers()
+    return process
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_sneaker_is_bought_once_it_releases(engine):
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock)
+    shoe_url = site.product_url("test-shoe")
+    site.schedule_release(next_release_at(site, 10))
+
+    process = snag(engine, site, clock, shoe_url)
+
+    assert process.get_purchase_states()[shoe_url] == PurchaseState.PURCHASED
+    assert site.orders == 1
+    codes = event_codes(process, shoe_url)
+    flow = [SneakerEventCode.PRE_RELEASE_SCHEDULED, SneakerEventCode.NEAR_RELEASE_SCHEDULED, SneakerEventCode.RELEASE_DETECTED,
+            SneakerEventCode.PURCHASED]
+    assert [code for code in codes if code in flow] == flow
+
+    # nothing was clicked before the release went live, and the order went in straight after it
+    stage_times = process.get_stage_times()[shoe_url]
+    release_live = site.events["release_live"]
+    assert release_live <= stage_times["release_detected"] < stage_times["payment_submitted"]
+    assert stage_times["payment_submitted"] - release_live < 1.0
+
+def test_rejected_payment_errors_the_sneaker():
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock, payment_error="Card declined")
+    shoe_url = site.product_url("test-shoe")
+    site.schedule_release(next_release_at(site, 10))
+
+    process = snag("thread", site, clock, shoe_url)
+
+    assert process.get_purchase_states()[shoe_url] == PurchaseState.ERROR
+    assert site.orders == 1
+    assert SneakerEventCode.PAYMENT_REJECTED in event_codes(process, shoe_url)
+    assert SneakerEventCode.PURCHASED not in event_codes(process, shoe_url)
+
+def test_unreadable_release_backs_off_then_errors():
+    clock = VirtualClock()
+    site = FakeSite(clock=clock)
+    shoe_url = "https://www.nike.com/launch/t/unreadable-shoe"
+    site.add_page(shoe_url, FakePage("Unreadable Shoe", {SneakerPurchaseProcess.availability_xpath: [FakeElement("Available when it is ready")]}))
+
+    process = snag("thread", site, clock, shoe_url)
+
+    assert process.get_purchase_states()[shoe_url] == PurchaseState.ERROR
+    unknown = list(process.get_event_store().query(sneaker_url=shoe_url, code=SneakerEventCode.STATE_UNKNOWN))
+    assert len(unknown) == process.purchase_machine.max_unreadable_reads
+    waits = [event.payload["wait_seconds"] for event in unknown if "wait_seconds" in event.payload]
+    assert waits == sorted(waits) and waits[0] < waits[-1]
+
+def test_cache_and_checkpoints_are_written_to_the_configured_file(tmp_path, monkeypatch):
+    cache_path = tmp_path / "cache" / "release_cache.sqlite3"
+    cache_path.parent.mkdir()
+    started_in = tmp_path / "started_in"
+    started_in.mkdir()
+    monkeypatch.chdir(started_in)
+    monkeypatch.setattr(LocalConfig, "RELEASE_CACHE_PATH", str(cache_path))
+    clock = VirtualClock()
+    site = FakeNikeSite(clock=clock)
+    shoe_url = site.product_url("test-shoe")
+    site.schedule_release(next_release_at(site, 30))
+
+    process = snag("thread", site, clock, shoe_url)
+
+    assert process.get_purchase_states()[shoe_url] == PurchaseState.PURCHASED
+    assert os.listdir(started_in) == []
+    cache = ReleaseMetadataCache(cache_path, clock=clock)
+    assert cache.get_page_state(shoe_url) == PurchaseState.PURCHASED.name
+    cache.close()
+    assert PurchaseCheckpointStore(cache_path, clock=clock).load()[shoe_url].state == PurchaseState.PURCHASED.name
+
+def test_relative_file_settings_are_next_to_local_config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_folder = os.path.dirname(os.path.abspath(local_config.__file__))
+
+    assert LocalConfig.resolve_path("release_cache.sqlite3") == os.path.join(config_folder, "release_cache.sqlite3")
+    assert LocalConfig.resolve_path(str(tmp_path / "cache.sqlite3")) == str(tmp_path / "cache.sqlite3")
@@ -0,0 +1,26 @@
+from local_config import LocalConfig
+from src.testing.fake_web_driver import FakeWebDriver
+from src.utils.resource_profiles import TabResourceProfiles
+
+def blocked_urls(driver: FakeWebDriver) -> list:
+    return [args["urls"] for cmd, args in driver.cdp_commands if cmd == "Network.setBlockedURLs"][-1]
+
+def test_switching_profiles_never_touches_the_viewport():
+    driver = FakeWebDriver()
+    profiles = TabResourceProfiles(driver)
+    tab_handle = driver.current_window_handle
+
+    assert profiles.apply("monitoring", tab_handle)
+    assert profiles.apply("checkout", tab_handle)
+    assert not profiles.apply("checkout", tab_handle)
+    assert not [cmd for cmd, args in driver.cdp_commands if cmd.startswith("Emulation.")]
+
+def test_new_relic_is_only_blocked_when_configured(monkeypatch):
+    for block_new_relic in (True, False):
+        monkeypatch.setattr(LocalConfig, "BLOCK_NEW_RELIC", block_new_relic)
+        driver = FakeWebDriver()
+        TabResourceProfiles(driver).apply("monitoring")
+        urls = blocked_urls(driver)
+        assert ("*://bam.nr-data.net/*" in urls) == block_new_relic
+        assert ("*://js-agent.newrelic.com/*" in urls) == block_new_relic
+        assert "*://google-analytics.com/*" in urls
@@ -0,0 +1,39 @@
+import pytest
+
+from src.utils.size_grid import SizeGrid
+
+def grid(*labels) -> SizeGrid:
+    # the label doubles as its button handle so a lookup says which button it found
+    return SizeGrid([(label, label) for label in labels], purchase_button="buy")
+
+def test_size_does_not_match_a_longer_size_it_prefixes():
+    size_grid = grid("M 11", "M 1", "M 10.5")
+
+    assert size_grid.find("M 1") == "M 1"
+    assert size_grid.find("M 11") == "M 11"
+    assert size_grid.find("M 10") is None
+
+def test_prefix_of_a_size_that_is_not_on_the_page_is_not_found():
+    assert grid("M 11", "M 12").find("M 1") is None
+
+def test_dual_label_is_found_by_either_half_and_the_whole_label():
+    size_grid = grid("M 10 / W 11.5", "M 11 / W 12.5")
+
+    assert size_grid.find("M 11") == "M 11 / W 12.5"
+    assert size_grid.find("W 12.5") == "M 11 / W 12.5"
+    assert size_grid.find("M 11 / W 12.5") == "M 11 / W 12.5"
+    assert size_grid.find("W 11.5") == "M 10 / W 11.5"
+
+@pytest.mark.parametrize("size", ["M 11", "m 11", "M11", "m11", "  M   11 ", "M\t11"])
+def test_whitespace_and_case_are_normalized(size):
+    assert SizeGrid.normalize_size(size) == "M 11"
+    assert grid("m11 / w12.5").find(size) == "m11 / w12.5"
+
+def test_unknown_size_is_not_found():
+    size_grid = grid("M 11", "M 12")
+
+    assert size_grid.find("M 13") is None
+    assert size_grid.find("") is None
+    assert size_grid.find(None) is None
+    assert len(size_grid) == 2
+    assert size_grid.purchase_button == "buy"
@@ -0,0 +1,63 @@
+import json
+import os
+
+import pytest
+
+from src.config.sneaker_config import InvalidSneakerConfigException, SneakerConfigWatcher, compile_sneakers, load_sneaker_config
+
+SHOE_URL = "https://www.nike.com/launch/t/test-shoe"
+OTHER_SHOE_URL = "https://www.nike.com/launch/t/other-shoe"
+
+def write_sneakers(sneaker_file, sneakers):
+    sneaker_file.write_text(sneakers if isinstance(sneakers, str) else json.dumps(sneakers))
+    # the watcher looks at the modified time, make sure every write moves it on
+    stat = os.stat(sneaker_file)
+    os.utime(sneaker_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+@pytest.mark.parametrize("sneaker, problem", [
+    ({"shoe_url": SHOE_URL}, "'size' is a required property"),
+    ({"size": "M 11"}, "'shoe_url' is a required property"),
+    ({"shoe_url": SHOE_URL, "size": 11}, "11 is not of type 'string'"),
+    ({"shoe_url": "not a url", "size": "M 11"}, "does not match"),
+])
+def test_invalid_entries_are_rejected(sneaker, problem):
+    with pytest.raises(InvalidSneakerConfigException, match=problem):
+        compile_sneakers([sneaker])
+
+def test_extra_keys_are_ignored():
+    entries = compile_sneakers([{"shoe_url": SHOE_URL, "size": "M 11", "email": "someone@example.com", "_comment": "hi"}])
+
+    assert [(entry.url, entry.size) for entry in entries] == [(SHOE_URL, "M 11")]
+
+def test_duplicate_urls_keep_the_first_entry():
+    entries = compile_sneakers([{"shoe_url": SHOE_URL, "size": "M 11"}, {"shoe_url": OTHER_SHOE_URL, "size": "M 9"},
+                                {"shoe_url": SHOE_URL.replace("www.nike.com", "WWW.NIKE.COM") + "#sizes", "size": "M 12"}])
+
+    assert [(entry.url, entry.size) for entry in entries] == [(SHOE_URL, "M 11"), (OTHER_SHOE_URL, "M 9")]
+
+def test_file_that_is_not_a_list_is_rejected(tmp_path):
+    sneaker_file = tmp_path / "shoes_to_snag.json"
+    write_sneakers(sneaker_file, {"shoe_url": SHOE_URL, "size": "M 11"})
+
+    with pytest.raises(InvalidSneakerConfigException, match="list of sneakers"):
+        load_sneaker_config(sneaker_file)
+
+def test_hot_reload_keeps_the_last_good_config(tmp_path):
+    sneaker_file = tmp_path / "shoes_to_snag.json"
+    write_sneakers(sneaker_file, [{"shoe_url": SHOE_URL, "size": "M 11"}])
+    changes = []
+    watcher = SneakerConfigWatcher(sneaker_file, load_sneaker_config(sneaker_file), lambda *change: changes.append(change))
+
+    write_sneakers(sneaker_file, '[{"shoe_url": "%s", "size": "M 11"},' % SHOE_URL)
+    assert not watcher.check()
+    write_sneakers(sneaker_file, [{"shoe_url": SHOE_URL, "size": 12}])
+    assert not watcher.check()
+    assert changes == []
+    assert [(url, entry.size) for url, entry in watcher.entries.items()] == [(SHOE_URL, "M 11")]
+
+    write_sneakers(sneaker_file, [{"shoe_url": SHOE_URL, "size": "M 12"}, {"shoe_url": OTHER_SHOE_URL, "size": "M 9"}])
+    assert watcher.check()
+    added, retired, resized = changes[0]
+    assert [entry.url for entry in added] == [OTHER_SHOE_URL]
+    assert retired == []
+    assert [(entry.url, entry.size) for entry in resized] == [(SHOE_URL, "M 12")]